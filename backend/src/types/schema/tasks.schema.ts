@@ -2,6 +2,7 @@ export type TaskStatus =
   | 'added'
   | 'in_queue'
   | 'reading_dataset'
+  | 'reading_dataset_progression'
   | 'reading_dataset_done'
   | 'process_cleaning'
   | 'process_cleaning_done'
@@ -22,12 +23,26 @@ export interface TaskFileInfo {
   type: string | null;
 }
 
+export interface TaskNearDuplicates {
+  clusters: number;                 // Clusters of near-identical posts
+  posts_skipped: number;            // Posts labelled from their cluster's first post
+  largest: number;                  // Posts in the largest cluster
+  sizes: Record<string, number>;    // Number of clusters by size
+}
+
+export interface TaskTopicAlias {
+  topic: string;                    // Topic as written by the model
+  canonical: string;                // Canonical label it was rewritten to
+}
+
 export interface TaskData {
   file_id: string;
   file_path: string;
   status: TaskStatus;
   file_cleaned?: TaskFileInfo;
   file_analysed?: TaskFileInfo;
+  near_duplicates?: TaskNearDuplicates;
+  topic_aliases?: TaskTopicAlias[];
 }
 
 export interface Task {
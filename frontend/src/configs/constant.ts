@@ -52,6 +52,7 @@ export const TASK_EVENTS = {
   ADDED: 'added',
   IN_QUEUE: 'in_queue',
   READING_DATASET: 'reading_dataset',
+  READING_DATASET_PROGRESSION: 'reading_dataset_progression',
   READING_DATASET_DONE: 'reading_dataset_done',
   PROCESS_CLEANING: 'process_cleaning',
   PROCESS_CLEANING_DONE: 'process_cleaning_done',
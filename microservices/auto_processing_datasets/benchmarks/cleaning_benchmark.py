@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark the column-level text cleaning engine against the legacy
+row-wise remove_emoji implementation.
+
+Usage:
+    python benchmarks/cleaning_benchmark.py --rows 1000000
+    python benchmarks/cleaning_benchmark.py --rows 1000000 --workers 8
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Add project root to path for absolute imports
+_current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _current_dir not in sys.path:
+    sys.path.insert(0, _current_dir)
+
+from src.services.cleaning import clean_text_series
+
+
+def legacy_remove_emoji(text: str) -> str:
+    """Row-wise implementation used before the column-level engine."""
+    if pd.isna(text):
+        return text
+    
+    text = str(text)
+    emoji_pattern = re.compile(
+        "["
+        "\U0001F600-\U0001F64F"
+        "\U0001F300-\U0001F5FF"
+        "\U0001F680-\U0001F6FF"
+        "\U0001F1E0-\U0001F1FF"
+        "\U00002702-\U000027B0"
+        "\U000024C2-\U0001F251"
+        "]+",
+        flags=re.UNICODE
+    )
+    text = emoji_pattern.sub('', text)
+    
+    mention_pattern = re.compile(r'@\w+')
+    mentions = mention_pattern.findall(text)
+    for i, mention in enumerate(mentions):
+        text = text.replace(mention, f'__MENTION_{i}__', 1)
+    
+    text = re.sub(r'[^\w\s.,!?;:()\-]', '', text)
+    
+    for i, mention in enumerate(mentions):
+        text = text.replace(f'__MENTION_{i}__', mention, 1)
+    
+    text = re.sub(r'\s+', ' ', text).strip()
+    
+    return text
+
+
+_FRAGMENTS = [
+    '@free', '@Freebox', '@SFR', 'RT @free:', 'panne', 'réseau', 'depuis', 'ce matin',
+    'merci', 'service client', 'injoignable', '#FreeMobile', 'https://t.co/abc123',
+    '😀', '😡', '🎉', '📱', '!!!', '?', '...', '€', '©', '&', '"', "'", '—', '  ',
+]
+
+
+def generate_texts(rows: int, seed: int = 42) -> pd.Series:
+    """Generate synthetic tweet-like texts with mentions, emojis and symbols."""
+    rng = random.Random(seed)
+    texts = [
+        ' '.join(rng.choice(_FRAGMENTS) for _ in range(rng.randint(4, 30)))
+        for _ in range(rows)
+    ]
+    series = pd.Series(texts, dtype=object)
+    # A few missing values, as found in real exports
+    series.iloc[::997] = np.nan
+    return series
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Number of rows to clean')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for text generation')
+    parser.add_argument('--workers', type=int, default=1, help='Cleaning pool processes (1 = in-process)')
+    args = parser.parse_args()
+    
+    print(f"Generating {args.rows} rows...")
+    series = generate_texts(args.rows, args.seed)
+    
+    start = time.perf_counter()
+    legacy = series.apply(legacy_remove_emoji)
+    legacy_seconds = time.perf_counter() - start
+    
+    if args.workers > 1:
+        # Start the pool outside the timed section
+        start = time.perf_counter()
+        clean_text_series(series.head(args.workers), workers=args.workers, parallel_min_rows=0)
+        print(f"{'pool startup:':<30}{time.perf_counter() - start:8.2f}s")
+    
+    start = time.perf_counter()
+    engine = clean_text_series(series, workers=args.workers, parallel_min_rows=0)
+    engine_seconds = time.perf_counter() - start
+    
+    missing = legacy.isna()
+    identical = (
+        missing.equals(engine.isna())
+        and legacy[~missing].tolist() == engine[~missing].tolist()
+    )
+    
+    print(f"{'legacy apply(remove_emoji):':<30}{legacy_seconds:8.2f}s  {args.rows / legacy_seconds:12,.0f} rows/s")
+    print(f"{f'clean_text_series ({args.workers} proc):':<30}{engine_seconds:8.2f}s  {args.rows / engine_seconds:12,.0f} rows/s")
+    print(f"speedup: {legacy_seconds / engine_seconds:.2f}x, identical output: {identical}")
+    
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
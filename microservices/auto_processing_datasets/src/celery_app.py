@@ -1,6 +1,6 @@
 """Celery application configuration."""
 from celery import Celery
-from celery.signals import setup_logging
+from celery.signals import setup_logging, worker_process_init
 import logging
 from src.configs.env import RABBITMQ_URL
 from src.utils.logger import setup_logger
@@ -42,6 +42,15 @@ celery_app.conf.update(
 if sys.platform == 'win32':
     celery_app.conf.worker_pool = 'solo'
 
+
+
+@worker_process_init.connect
+def warmup_local_models(**kwargs):
+    """Load the Ollama models of OLLAMA_WARMUP_MODELS when a worker process starts."""
+    from src.lib.llm import warmup_ollama_models
+    warmup_ollama_models()
+
+
 # Task routing - use different queue name to avoid conflict with event listener
 celery_app.conf.task_routes = {
     'src.tasks.processor.process_dataset': {'queue': 'celery_processing_queue'},
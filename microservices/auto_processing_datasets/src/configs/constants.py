@@ -4,6 +4,7 @@
 TASK_STATUS_ADDED = 'added'
 TASK_STATUS_IN_QUEUE = 'in_queue'
 TASK_STATUS_READING_DATASET = 'reading_dataset'
+TASK_STATUS_READING_DATASET_PROGRESS = 'reading_dataset_progression'
 TASK_STATUS_READING_DATASET_DONE = 'reading_dataset_done'
 TASK_STATUS_PROCESS_CLEANING = 'process_cleaning'
 TASK_STATUS_PROCESS_CLEANING_DONE = 'process_cleaning_done'
@@ -29,6 +30,9 @@ COLLECTION_TASKS = 'tasks'
 COLLECTION_FILES = 'files'
 COLLECTION_LOGS = 'logs'
 
+# LLM prompt version (bump when the prompt or label format changes to invalidate cached results)
+LLM_PROMPT_VERSION = '1'
+
 # AI modes
 AI_MODE_LOCAL = 'local'
 AI_MODE_EXTERNAL = 'external'
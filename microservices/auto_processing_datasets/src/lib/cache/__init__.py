@@ -0,0 +1,6 @@
+from .base import BaseCache
+from .sqlite import SqliteCache
+from .mongodb import MongoCache
+from .service import create_llm_cache
+
+__all__ = ['BaseCache', 'SqliteCache', 'MongoCache', 'create_llm_cache']
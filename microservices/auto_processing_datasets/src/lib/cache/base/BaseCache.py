@@ -0,0 +1,36 @@
+from abc import ABC, abstractmethod
+import hashlib
+
+
+class BaseCache(ABC):
+    """Base interface for the persistent LLM classification cache.
+    
+    Values are dictionaries with ``sentiment``, ``priority`` and ``topic``
+    keys. Entries expire ``ttl_seconds`` after being written and the least
+    recently used entries are evicted once ``max_entries`` is exceeded.
+    """
+    
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+    
+    @staticmethod
+    def make_key(normalized_text: str, model_uid: str, prompt_version: str) -> str:
+        """Build the cache key for a normalized text, model and prompt version."""
+        raw = f"{prompt_version}\x1f{model_uid}\x1f{normalized_text}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    @abstractmethod
+    def get_many(self, keys: list) -> dict:
+        """Get cached values for keys, returning only the hits."""
+        pass
+    
+    @abstractmethod
+    def set_many(self, items: dict) -> None:
+        """Store values by key and evict entries beyond max_entries."""
+        pass
+    
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry."""
+        pass
@@ -0,0 +1,3 @@
+from .BaseCache import BaseCache
+
+__all__ = ['BaseCache']
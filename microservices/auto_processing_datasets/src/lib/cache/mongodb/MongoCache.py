@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, UpdateOne
+
+from ..base import BaseCache
+
+# Keys per $in query (one query holding every key of a large dataset exceeds the 16 MB document limit)
+_QUERY_CHUNK_SIZE = 500
+
+
+class MongoCache(BaseCache):
+    """LLM cache stored in a MongoDB collection, shared by every worker.
+    
+    Expiry relies on a TTL index on ``createdAt``; size is bounded by
+    deleting the least recently accessed documents after writes.
+    """
+    
+    def __init__(self, db_adapter, collection: str, max_entries: int, ttl_seconds: int):
+        super().__init__(max_entries, ttl_seconds)
+        self.db_adapter = db_adapter
+        self.collection_name = collection
+        self._indexes_created = False
+    
+    def _collection(self):
+        """Get the cache collection, creating indexes on first use."""
+        collection = self.db_adapter.get_collection(self.collection_name)
+        if not self._indexes_created:
+            collection.create_index([('createdAt', ASCENDING)], expireAfterSeconds=self.ttl_seconds)
+            collection.create_index([('accessedAt', ASCENDING)])
+            self._indexes_created = True
+        return collection
+    
+    def get_many(self, keys: list) -> dict:
+        """Get cached values for keys, returning only the hits."""
+        if not keys:
+            return {}
+        collection = self._collection()
+        now = datetime.utcnow()
+        hits = {}
+        for start in range(0, len(keys), _QUERY_CHUNK_SIZE):
+            # The TTL monitor only runs periodically, so filter expired entries too
+            documents = collection.find({
+                '_id': {'$in': keys[start:start + _QUERY_CHUNK_SIZE]},
+                'createdAt': {'$gte': now - timedelta(seconds=self.ttl_seconds)},
+            })
+            chunk_hits = {document['_id']: document['value'] for document in documents}
+            if chunk_hits:
+                collection.update_many({'_id': {'$in': list(chunk_hits)}}, {'$set': {'accessedAt': now}})
+            hits.update(chunk_hits)
+        return hits
+    
+    def set_many(self, items: dict) -> None:
+        """Store values by key and evict least recently used entries."""
+        if not items:
+            return
+        collection = self._collection()
+        now = datetime.utcnow()
+        collection.bulk_write([
+            UpdateOne(
+                {'_id': key},
+                {'$set': {'value': value, 'createdAt': now, 'accessedAt': now}},
+                upsert=True
+            )
+            for key, value in items.items()
+        ], ordered=False)
+        
+        count = collection.estimated_document_count()
+        if count > self.max_entries:
+            stale = collection.find({}, {'_id': 1}).sort('accessedAt', ASCENDING).limit(count - self.max_entries)
+            stale_ids = [document['_id'] for document in stale]
+            for start in range(0, len(stale_ids), _QUERY_CHUNK_SIZE):
+                collection.delete_many({'_id': {'$in': stale_ids[start:start + _QUERY_CHUNK_SIZE]}})
+    
+    def clear(self) -> None:
+        """Remove every entry."""
+        self._collection().delete_many({})
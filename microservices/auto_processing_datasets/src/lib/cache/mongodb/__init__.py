@@ -0,0 +1,3 @@
+from .MongoCache import MongoCache
+
+__all__ = ['MongoCache']
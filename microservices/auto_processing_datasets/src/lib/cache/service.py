@@ -0,0 +1,34 @@
+import os
+from typing import Optional
+
+from .base import BaseCache
+from .sqlite import SqliteCache
+from .mongodb import MongoCache
+
+
+def create_llm_cache(db_adapter=None) -> Optional[BaseCache]:
+    """
+    Create the LLM classification cache configured by LLM_CACHE_BACKEND.
+    
+    Args:
+        db_adapter: Database adapter (required for the 'mongodb' backend)
+    
+    Returns:
+        Cache instance, or None if caching is disabled
+    """
+    from src.configs.env import (
+        LLM_CACHE_BACKEND, LLM_CACHE_PATH, LLM_CACHE_COLLECTION,
+        LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS
+    )
+    
+    backend = (LLM_CACHE_BACKEND or 'none').lower()
+    if backend == 'sqlite':
+        return SqliteCache(LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS)
+    elif backend == 'mongodb':
+        if db_adapter is None:
+            raise ValueError("The 'mongodb' LLM cache backend requires a database adapter")
+        return MongoCache(db_adapter, LLM_CACHE_COLLECTION, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS)
+    elif backend in ('none', ''):
+        return None
+    else:
+        raise ValueError(f"Unsupported LLM cache backend: {LLM_CACHE_BACKEND}")
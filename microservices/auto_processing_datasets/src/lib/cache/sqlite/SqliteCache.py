@@ -0,0 +1,105 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from ..base import BaseCache
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK_SIZE = 500
+# Writes between exact entry counts (other processes may share the database file)
+_RECOUNT_WRITES = 100
+
+
+class SqliteCache(BaseCache):
+    """
+    Local on-disk LLM cache backed by SQLite.
+    
+    The number of entries is kept as a running count (new keys added,
+    expired and evicted rows removed) instead of being counted on every
+    write, and only recounted every ``_RECOUNT_WRITES`` writes to take in the
+    entries written by other processes.
+    """
+    
+    def __init__(self, path: str, max_entries: int, ttl_seconds: int):
+        super().__init__(max_entries, ttl_seconds)
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS llm_cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache (created_at)')
+        self.conn.commit()
+        self._count = None
+        self._writes = 0
+    
+    def get_many(self, keys: list) -> dict:
+        """Get cached values for keys, returning only the hits."""
+        now = time.time()
+        min_created = now - self.ttl_seconds
+        hits = {}
+        with self.lock:
+            for start in range(0, len(keys), _QUERY_CHUNK_SIZE):
+                chunk = keys[start:start + _QUERY_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.conn.execute(
+                    f'SELECT key, value FROM llm_cache WHERE key IN ({placeholders}) AND created_at >= ?',
+                    (*chunk, min_created)
+                ).fetchall()
+                for key, value in rows:
+                    hits[key] = json.loads(value)
+                if rows:
+                    hit_keys = [key for key, _ in rows]
+                    self.conn.execute(
+                        f'UPDATE llm_cache SET accessed_at = ? WHERE key IN ({",".join("?" * len(hit_keys))})',
+                        (now, *hit_keys)
+                    )
+            self.conn.commit()
+        return hits
+    
+    def set_many(self, items: dict) -> None:
+        """Store values by key and evict expired and least recently used entries."""
+        if not items:
+            return
+        now = time.time()
+        keys = list(items)
+        with self.lock:
+            if self._count is None or self._writes % _RECOUNT_WRITES == 0:
+                self._count = self.conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+            self._writes += 1
+            existing = 0
+            for start in range(0, len(keys), _QUERY_CHUNK_SIZE):
+                chunk = keys[start:start + _QUERY_CHUNK_SIZE]
+                existing += self.conn.execute(
+                    f'SELECT COUNT(*) FROM llm_cache WHERE key IN ({",".join("?" * len(chunk))})', chunk
+                ).fetchone()[0]
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                [(key, json.dumps(value, ensure_ascii=False), now, now) for key, value in items.items()]
+            )
+            self._count += len(keys) - existing
+            expired = self.conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (now - self.ttl_seconds,))
+            self._count -= max(expired.rowcount, 0)
+            if self._count > self.max_entries:
+                evicted = self.conn.execute(
+                    'DELETE FROM llm_cache WHERE key IN '
+                    '(SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)',
+                    (self._count - self.max_entries,)
+                )
+                self._count -= max(evicted.rowcount, 0)
+            self.conn.commit()
+    
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self.lock:
+            self.conn.execute('DELETE FROM llm_cache')
+            self.conn.commit()
+            self._count = 0
@@ -0,0 +1,3 @@
+from .SqliteCache import SqliteCache
+
+__all__ = ['SqliteCache']
@@ -97,4 +97,8 @@ class MongoDatabase(BaseAdapter):
         """Update one document in a collection."""
         self.ensure_connected()
         self.db[collection].update_one(filter, {"$set": update})
-
+    
+    def get_collection(self, collection: str):
+        """Get a collection handle for operations beyond find_one/update_one."""
+        self.ensure_connected()
+        return self.db[collection]
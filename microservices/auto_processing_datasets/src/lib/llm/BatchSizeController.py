@@ -0,0 +1,55 @@
+import math
+from typing import Optional
+
+
+class BatchSizeController:
+    """
+    Additive-increase / multiplicative-decrease control of the LLM batch size.
+
+    Every answered batch is reported with its latency and whether the answer
+    was usable. A full batch answered quickly and completely lets the size
+    grow by a fixed step; a slow, failed, truncated or misaligned answer cuts
+    it by a factor. Batches smaller than the current size (end of data or
+    token budget reached) say nothing about larger ones and do not grow it.
+    """
+
+    def __init__(self, initial: int, min_size: int, max_size: int, target_latency: float,
+                 increase: Optional[int] = None, decrease: float = 0.5):
+        """
+        Args:
+            initial: Starting batch size
+            min_size: Smallest batch size
+            max_size: Largest batch size
+            target_latency: Seconds above which an answer counts as slow
+            increase: Rows added after a good batch (defaults to a tenth of initial)
+            decrease: Factor applied after a bad batch
+        """
+        self.min_size = max(1, int(min_size))
+        self.max_size = max(self.min_size, int(max_size))
+        self.target_latency = target_latency
+        self.increase = max(1, int(increase if increase is not None else initial // 10))
+        self.decrease = decrease
+        self._size = min(max(int(initial), self.min_size), self.max_size)
+
+    @property
+    def size(self) -> int:
+        """Get the batch size for the next batches."""
+        return self._size
+
+    def record(self, batch_size: int, latency: float, ok: bool) -> int:
+        """
+        Adjust the batch size from the outcome of one batch.
+
+        Args:
+            batch_size: Number of rows in the batch
+            latency: Seconds taken to get the answer
+            ok: Whether the answer was complete and well-formed
+
+        Returns:
+            New batch size
+        """
+        if not ok or latency > self.target_latency:
+            self._size = max(self.min_size, math.floor(self._size * self.decrease))
+        elif batch_size >= self._size:
+            self._size = min(self.max_size, self._size + self.increase)
+        return self._size
@@ -0,0 +1,260 @@
+import json
+import os
+import re
+import threading
+import zlib
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class CascadeClassifier:
+    """
+    Local linear classifier distilled from LLM labels, tried before the LLM.
+
+    Texts are turned into hashed word unigrams and bigrams (mentions and
+    hashtags kept) and three softmax heads predict sentiment, priority and
+    topic. The heads are trained online from the labels the LLM returns, and
+    a text skips the LLM only when every head is at least ``threshold``
+    confident and the model has seen ``min_samples`` labelled texts. Topics
+    are limited to the ``max_topics`` first seen; any other topic is learnt
+    as "other", which is never trusted.
+
+    Every save writes a new numbered version next to a ``current.json``
+    pointer (the last ``keep_versions`` are kept); labels only count for the
+    prompt version they were produced with.
+    """
+
+    SENTIMENTS = ['negative', 'neutral', 'positive']
+    PRIORITIES = [0, 1, 2]
+    OTHER_TOPIC = '__other__'
+
+    _TOKENS = re.compile(r'[@#]?\w+')
+
+    def __init__(self, directory: str, label_version: str, threshold: float = 0.9,
+                 min_samples: int = 2000, n_features: int = 2 ** 16, max_topics: int = 30,
+                 learning_rate: float = 0.5, keep_versions: int = 3, seed: int = 0):
+        """
+        Args:
+            directory: Directory holding the model versions
+            label_version: Version of the prompt the training labels come from
+            threshold: Smallest probability of every head for a text to skip the LLM
+            min_samples: Labelled texts needed before any text skips the LLM
+            n_features: Size of the hashed feature space
+            max_topics: Largest number of topics predicted
+            learning_rate: Step of the online updates
+            keep_versions: Number of saved versions kept on disk
+            seed: Seed of the training order shuffle
+        """
+        self.directory = directory
+        self.label_version = str(label_version)
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.n_features = int(n_features)
+        self.max_topics = max_topics
+        self.learning_rate = learning_rate
+        self.keep_versions = max(1, keep_versions)
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        """Start from an untrained model."""
+        self.version = 0
+        self.samples = 0
+        self.topics = [self.OTHER_TOPIC]
+        self.weights = {
+            'sentiment': np.zeros((self.n_features, len(self.SENTIMENTS)), dtype=np.float32),
+            'priority': np.zeros((self.n_features, len(self.PRIORITIES)), dtype=np.float32),
+            'topic': np.zeros((self.n_features, 1), dtype=np.float32),
+        }
+        self.bias = {head: np.zeros(weights.shape[1], dtype=np.float32) for head, weights in self.weights.items()}
+
+    @property
+    def ready(self) -> bool:
+        """Check whether the model has seen enough labels to be trusted."""
+        return self.samples >= self.min_samples
+
+    def _features(self, text) -> np.ndarray:
+        """Get the hashed feature indices of a text."""
+        tokens = self._TOKENS.findall(str(text).casefold())
+        grams = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+        return np.unique(np.array(
+            [zlib.crc32(gram.encode('utf-8')) % self.n_features for gram in grams], dtype=np.int64
+        ))
+
+    def _probabilities(self, head: str, features: np.ndarray) -> np.ndarray:
+        """Get the class probabilities of one head."""
+        logits = self.bias[head].astype(np.float64)
+        if len(features):
+            logits = logits + self.weights[head][features].sum(axis=0) / np.sqrt(len(features))
+        logits -= logits.max()
+        exp = np.exp(logits)
+        return exp / exp.sum()
+
+    def predict(self, texts: List[str]) -> List[Tuple[str, int, str, float]]:
+        """
+        Predict labels for texts.
+
+        Args:
+            texts: Texts to classify
+
+        Returns:
+            List of (sentiment, priority, topic, confidence) tuples, confidence
+            being the lowest top probability of the three heads (0 for "other" topics)
+        """
+        results = []
+        with self.lock:
+            for text in texts:
+                features = self._features(text)
+                sentiment = self._probabilities('sentiment', features)
+                priority = self._probabilities('priority', features)
+                topic = self._probabilities('topic', features)
+                label = self.topics[int(topic.argmax())]
+                confidence = 0.0 if label == self.OTHER_TOPIC else \
+                    float(min(sentiment.max(), priority.max(), topic.max()))
+                results.append((
+                    self.SENTIMENTS[int(sentiment.argmax())],
+                    self.PRIORITIES[int(priority.argmax())],
+                    label,
+                    confidence,
+                ))
+        return results
+
+    def classify(self, texts: List[str]) -> List[Optional[Tuple[str, int, str]]]:
+        """
+        Get the labels of the texts the model is confident about.
+
+        Args:
+            texts: Texts to classify
+
+        Returns:
+            (sentiment, priority, topic) per text, or None where the LLM is needed
+        """
+        if not self.ready:
+            return [None] * len(texts)
+        return [
+            (sentiment, priority, topic) if confidence >= self.threshold else None
+            for sentiment, priority, topic, confidence in self.predict(texts)
+        ]
+
+    def _topic_class(self, topic) -> int:
+        """Get the class of a topic, adding it while there is room."""
+        if topic in self.topics:
+            return self.topics.index(topic)
+        if not isinstance(topic, str) or not topic or len(self.topics) > self.max_topics:
+            return 0
+        self.topics.append(topic)
+        self.weights['topic'] = np.hstack([
+            self.weights['topic'], np.zeros((self.n_features, 1), dtype=np.float32)
+        ])
+        self.bias['topic'] = np.append(self.bias['topic'], np.float32(0))
+        return len(self.topics) - 1
+
+    def _step(self, head: str, features: np.ndarray, target: int) -> None:
+        """Apply one softmax regression update."""
+        gradient = self._probabilities(head, features)
+        gradient[target] -= 1.0
+        gradient = (self.learning_rate * gradient).astype(np.float32)
+        if len(features):
+            self.weights[head][features] -= gradient / np.float32(np.sqrt(len(features)))
+        self.bias[head] -= gradient
+
+    def update(self, texts: List[str], sentiments: List, priorities: List, topics: List) -> None:
+        """
+        Train on texts labelled by the LLM.
+
+        Args:
+            texts: Labelled texts
+            sentiments: Sentiment of each text
+            priorities: Priority of each text (0, 1 or 2)
+            topics: Topic of each text
+        """
+        with self.lock:
+            topic_classes = [self._topic_class(topic) for topic in topics]
+            for position in self.rng.permutation(len(texts)):
+                features = self._features(texts[position])
+                if sentiments[position] in self.SENTIMENTS:
+                    self._step('sentiment', features, self.SENTIMENTS.index(sentiments[position]))
+                if priorities[position] in self.PRIORITIES:
+                    self._step('priority', features, self.PRIORITIES.index(priorities[position]))
+                self._step('topic', features, topic_classes[position])
+                self.samples += 1
+
+    def _pointer_path(self) -> str:
+        return os.path.join(self.directory, 'current.json')
+
+    def _read_pointer(self) -> Optional[dict]:
+        """Read the pointer to the latest saved version."""
+        try:
+            with open(self._pointer_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self) -> str:
+        """
+        Write the model as a new version and point current.json to it.
+
+        Returns:
+            Path of the saved version
+        """
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            pointer = self._read_pointer() or {}
+            self.version = max(self.version, int(pointer.get('version', 0))) + 1
+            path = os.path.join(self.directory, f"cascade-v{self.version}.npz")
+            with open(f"{path}.tmp", 'wb') as f:
+                np.savez_compressed(
+                    f,
+                    sentiment=self.weights['sentiment'], sentiment_bias=self.bias['sentiment'],
+                    priority=self.weights['priority'], priority_bias=self.bias['priority'],
+                    topic=self.weights['topic'], topic_bias=self.bias['topic'],
+                )
+            os.replace(f"{path}.tmp", path)
+
+            pointer = {
+                'version': self.version,
+                'file': os.path.basename(path),
+                'labelVersion': self.label_version,
+                'nFeatures': self.n_features,
+                'samples': self.samples,
+                'topics': self.topics,
+                'createdAt': datetime.utcnow().isoformat(),
+            }
+            with open(f"{self._pointer_path()}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(pointer, f, ensure_ascii=False)
+            os.replace(f"{self._pointer_path()}.tmp", self._pointer_path())
+
+            for old in range(self.version - self.keep_versions, 0, -1):
+                old_path = os.path.join(self.directory, f"cascade-v{old}.npz")
+                if not os.path.exists(old_path):
+                    break
+                os.remove(old_path)
+            return path
+
+    def load(self) -> bool:
+        """
+        Load the latest saved version if it is newer than the one in memory.
+
+        Versions trained on another prompt version or feature size are ignored.
+
+        Returns:
+            True if a version was loaded
+        """
+        pointer = self._read_pointer()
+        if pointer is None or int(pointer.get('version', 0)) <= self.version:
+            return False
+        if pointer.get('labelVersion') != self.label_version or pointer.get('nFeatures') != self.n_features:
+            return False
+        with np.load(os.path.join(self.directory, pointer['file'])) as data:
+            arrays = {name: data[name] for name in data.files}
+        with self.lock:
+            self.version = int(pointer['version'])
+            self.samples = int(pointer.get('samples', 0))
+            self.topics = list(pointer['topics'])
+            for head in ('sentiment', 'priority', 'topic'):
+                self.weights[head] = arrays[head]
+                self.bias[head] = arrays[f"{head}_bias"]
+        return True
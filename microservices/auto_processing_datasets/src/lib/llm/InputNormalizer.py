@@ -0,0 +1,82 @@
+import re
+
+
+class InputNormalizer:
+    """
+    Shortens posts before they are put in a prompt.
+
+    Leading ``RT @user:`` prefixes and links (mostly t.co short links) are
+    dropped, chains of mentions are cut to their first ``max_mentions``
+    handles, a hashtag repeated in a post is only kept the first time, runs
+    of the same word are cut to one and whitespace is collapsed. Posts still longer than ``max_chars`` are cut at
+    the last word boundary before it. None of this carries signal for the
+    sentiment, priority or topic of a post, but all of it costs tokens in
+    every batch.
+
+    Only the texts sent to the model are affected, the cleaned dataset keeps
+    the full posts. The posts it gets have been through cleaning(), which
+    strips ``/``, ``#`` and the like: links arrive as ``https:t.coAbC123``
+    and hashtags as bare words (``#free #Free`` becomes ``free Free``), so
+    both forms are matched.
+    """
+
+    _RETWEET_PREFIX = re.compile(r'^\s*(?:rt\s+@\w+\s*:?\s*)+', re.IGNORECASE)
+    _LINKS = re.compile(r'https?:\S+|www\.\S+', re.IGNORECASE)
+    _REPEATED_WORDS = re.compile(r'\b(\w+)(?:\s+#?\1\b)+', re.IGNORECASE)
+    _MENTION_CHAINS = re.compile(r'@\w+(?:\s+@\w+)+')
+    _HASHTAGS = re.compile(r'#\w+')
+    # Bump when the rules change, cached answers for the old texts are then not reused
+    _VERSION = '2'
+
+    def __init__(self, max_chars: int = 1000, max_mentions: int = 2):
+        """
+        Args:
+            max_chars: Longest text sent, in characters (0 = no cap)
+            max_mentions: Mentions kept from each chain of mentions
+        """
+        self.max_chars = max(0, int(max_chars))
+        self.max_mentions = max(0, int(max_mentions))
+
+    def _cut_mentions(self, match) -> str:
+        return ' '.join(match.group(0).split()[:self.max_mentions])
+
+    def _truncate(self, text: str) -> str:
+        """Cut a text at the last word boundary before max_chars."""
+        if not self.max_chars or len(text) <= self.max_chars:
+            return text
+        cut = text[:self.max_chars]
+        space = cut.rfind(' ')
+        if space > self.max_chars // 2:
+            cut = cut[:space]
+        return cut.rstrip() + '…'
+
+    def normalize(self, text):
+        """
+        Shorten a post for the prompt.
+
+        Args:
+            text: Post text (non-string values are returned unchanged)
+
+        Returns:
+            Shortened text
+        """
+        if not isinstance(text, str):
+            return text
+        seen = set()
+
+        def first_hashtag(match) -> str:
+            tag = match.group(0).casefold()
+            if tag in seen:
+                return ''
+            seen.add(tag)
+            return match.group(0)
+
+        text = self._LINKS.sub(' ', self._RETWEET_PREFIX.sub('', text))
+        text = self._REPEATED_WORDS.sub(r'\1', self._MENTION_CHAINS.sub(self._cut_mentions, text))
+        text = self._HASHTAGS.sub(first_hashtag, text)
+        return self._truncate(' '.join(text.split()))
+
+    @property
+    def settings(self) -> str:
+        """Get the settings the normalised texts depend on (for cache keys)."""
+        return f"{self._VERSION}-{self.max_chars}-{self.max_mentions}"
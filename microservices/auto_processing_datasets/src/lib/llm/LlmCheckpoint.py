@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+
+class LlmCheckpoint:
+    """
+    Durable per-file record of LLM batches already classified.
+    
+    Each completed batch is appended as one JSON line and fsynced, so a
+    worker that dies mid-run can resume without re-sending finished
+    batches. Results are keyed by a hash of the prompt version and the
+    normalized text, which keeps them valid when rows are re-read in a
+    different order or chunking. A torn last line (crash during a write)
+    is ignored on load. The topic vocabulary of a run, when one is used,
+    is recorded as well so resumed runs and later chunks share it.
+    """
+    
+    def __init__(self, path: str, prompt_version: str):
+        self.path = path
+        self.prompt_version = prompt_version
+        self.lock = threading.Lock()
+        self._results: Optional[Dict[str, dict]] = None
+        self._topics: Optional[List[str]] = None
+    
+    def key(self, text_key: str) -> str:
+        """Get the checkpoint key for a normalized text."""
+        return hashlib.sha1(f"{self.prompt_version}\x1f{text_key}".encode('utf-8')).hexdigest()
+    
+    def _load(self) -> Dict[str, dict]:
+        if self._results is not None:
+            return self._results
+        
+        results = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'rb+') as f:
+                data = f.read()
+                # Drop a torn last line so the next append starts on a fresh line
+                complete = data.rfind(b'\n') + 1
+                if complete < len(data):
+                    f.truncate(complete)
+            for line in data[:complete].splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if 'topics' in record:
+                    self._topics = record['topics']
+                    continue
+                for key, sentiment, priority, topic in zip(
+                    record['keys'], record['sentiment'], record['priority'], record['topic']
+                ):
+                    results[key] = {'sentiment': sentiment, 'priority': priority, 'topic': topic}
+        self._results = results
+        return results
+    
+    def get_many(self, text_keys: List[str]) -> Dict[str, dict]:
+        """
+        Get checkpointed results for normalized texts.
+        
+        Args:
+            text_keys: Normalized texts
+        
+        Returns:
+            Dict mapping each text found to {'sentiment', 'priority', 'topic'}
+        """
+        with self.lock:
+            results = self._load()
+            hits = {}
+            for text_key in text_keys:
+                value = results.get(self.key(text_key))
+                if value is not None:
+                    hits[text_key] = value
+            return hits
+    
+    def append(self, text_keys: List[str], sentiments: list, priorities: list, topics: list,
+               model_uid: Optional[str] = None) -> None:
+        """
+        Durably record the results of one completed batch.
+        
+        Args:
+            text_keys: Normalized texts of the batch
+            sentiments: Sentiment per text
+            priorities: Priority per text
+            topics: Topic per text
+            model_uid: Model that produced the results
+        """
+        keys = [self.key(text_key) for text_key in text_keys]
+        line = json.dumps({
+            'keys': keys,
+            'sentiment': list(sentiments),
+            'priority': list(priorities),
+            'topic': list(topics),
+            'model_uid': model_uid,
+        })
+        with self.lock:
+            results = self._load()
+            self._write(line)
+            for key, sentiment, priority, topic in zip(keys, sentiments, priorities, topics):
+                results[key] = {'sentiment': sentiment, 'priority': priority, 'topic': topic}
+    
+    def get_topics(self) -> Optional[List[str]]:
+        """Get the recorded topic vocabulary, None if none was recorded."""
+        with self.lock:
+            self._load()
+            return self._topics
+    
+    def set_topics(self, topics: List[str]) -> None:
+        """
+        Durably record the topic vocabulary of the run.
+        
+        Args:
+            topics: Topic labels, in id order
+        """
+        with self.lock:
+            self._load()
+            self._write(json.dumps({'topics': list(topics)}))
+            self._topics = list(topics)
+    
+    def _write(self, line: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def remove(self) -> None:
+        """Delete the checkpoint once the results are saved."""
+        with self.lock:
+            self._results = None
+            self._topics = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
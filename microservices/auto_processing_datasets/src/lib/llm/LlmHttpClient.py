@@ -0,0 +1,63 @@
+import gzip
+import json
+from typing import Optional, Tuple, Union
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
+
+
+class LlmHttpClient:
+    """
+    Keep-alive HTTP client for one LLM endpoint.
+
+    Wraps a requests session whose connection pool is sized for the batches
+    kept in flight, so consecutive and concurrent requests reuse open
+    connections instead of paying a TCP and TLS handshake each. Bodies are
+    serialized once as UTF-8 and, when asked, gzip-compressed above a size
+    threshold. The session is shared by the dispatch threads of a process.
+    """
+
+    def __init__(self, pool_size: int, gzip_min_bytes: int):
+        """
+        Args:
+            pool_size: Maximum number of pooled connections to the endpoint
+            gzip_min_bytes: Smallest body compressed when compression is requested
+        """
+        if requests is None:
+            raise ImportError("requests library is not installed. Run: pip install requests")
+
+        self.gzip_min_bytes = gzip_min_bytes
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size), max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post_json(self, url: str, body: dict, headers: Optional[dict] = None,
+                  timeout: Union[float, Tuple[float, float], None] = None, compress: bool = False):
+        """
+        POST a JSON body.
+
+        Args:
+            url: Request URL
+            body: JSON-serializable body
+            headers: Extra request headers
+            timeout: Read timeout, or (connect, read) timeouts in seconds
+            compress: Gzip the body (sent with Content-Encoding: gzip) when large enough
+
+        Returns:
+            requests.Response
+        """
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        request_headers = {'Content-Type': 'application/json'}
+        request_headers.update(headers or {})
+        if compress and len(data) >= self.gzip_min_bytes:
+            data = gzip.compress(data, compresslevel=5)
+            request_headers['Content-Encoding'] = 'gzip'
+        return self.session.post(url, data=data, headers=request_headers, timeout=timeout)
+
+    def close(self) -> None:
+        """Close pooled connections."""
+        self.session.close()
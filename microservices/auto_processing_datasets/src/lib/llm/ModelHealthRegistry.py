@@ -0,0 +1,237 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class ModelHealthRegistry:
+    """
+    Circuit breakers and health statistics of the LLM models used by a process.
+
+    Each model has a breaker: closed while it answers, open after
+    failure_threshold consecutive failures, and half-open once open_seconds
+    have passed, when a single probe request is let through at most every
+    probe_interval seconds. A successful request closes the breaker, a failed
+    probe opens it again. Latency and error rate are tracked as moving
+    averages so selection can prefer healthy models over degraded ones.
+
+    With a database adapter, breaker changes are written to a collection and
+    the states written by other workers are adopted every sync_seconds, so
+    one worker finding a model down spares the others the retries.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, open_seconds: float = 60.0,
+                 probe_interval: float = 30.0, degraded_error_rate: float = 0.5,
+                 alpha: float = 0.2, db_adapter=None, collection: str = 'llm_model_health',
+                 sync_seconds: float = 10.0, clock: Callable[[], float] = time.time):
+        """
+        Args:
+            failure_threshold: Consecutive failures opening the breaker
+            open_seconds: Seconds an open breaker rejects requests before probing
+            probe_interval: Smallest interval between two recovery probes of a model
+            degraded_error_rate: Error rate above which a model is only used after healthy ones
+            alpha: Weight of the latest request in the latency and error rate averages
+            db_adapter: Database adapter used to share breaker states (optional)
+            collection: Collection holding the shared states
+            sync_seconds: Smallest interval between two reads of the shared states
+            clock: Time source in seconds (wall clock, shared states compare timestamps)
+        """
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.open_seconds = max(0.0, float(open_seconds))
+        self.probe_interval = max(0.0, float(probe_interval))
+        self.degraded_error_rate = degraded_error_rate
+        self.alpha = alpha
+        self.db_adapter = db_adapter
+        self.collection_name = collection
+        self.sync_seconds = sync_seconds
+        self.clock = clock
+        self.lock = threading.Lock()
+        self._models: Dict[str, dict] = {}
+        self._synced_at: Optional[float] = None
+
+    def _model(self, uid: str) -> dict:
+        """Get the health record of a model, creating it on first use."""
+        if uid not in self._models:
+            self._models[uid] = {
+                'state': self.CLOSED,
+                'failures': 0,
+                'opened_at': None,
+                'probe_at': None,
+                'latency': None,
+                'error_rate': 0.0,
+                'updated_at': 0.0,
+            }
+        return self._models[uid]
+
+    def _state(self, record: dict, now: float) -> str:
+        """Get the breaker state, an open breaker turning half-open after open_seconds."""
+        if record['state'] == self.OPEN and (record['opened_at'] is None
+                                             or now - record['opened_at'] >= self.open_seconds):
+            return self.HALF_OPEN
+        return record['state']
+
+    def _available(self, record: dict, now: float) -> bool:
+        """Check whether a request may be sent (closed breaker, or probe slot free)."""
+        state = self._state(record, now)
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            return record['probe_at'] is None or now - record['probe_at'] >= self.probe_interval
+        return False
+
+    def state(self, uid: str) -> str:
+        """Get the breaker state of a model."""
+        with self.lock:
+            return self._state(self._model(uid), self.clock())
+
+    def pick(self, uids: List[str]) -> Optional[str]:
+        """
+        Choose the model to send the next requests to.
+
+        Models whose breaker is open are skipped. Healthy models come first
+        in the given preference order, then degraded ones by error rate and
+        latency. A half-open model picked here gets the probe slot.
+
+        Args:
+            uids: Candidate model UIDs in preference order
+
+        Returns:
+            Chosen model UID, or None if every breaker is open
+        """
+        self._sync(uids)
+        with self.lock:
+            now = self.clock()
+            ranked = []
+            for index, uid in enumerate(uids):
+                record = self._model(uid)
+                if not self._available(record, now):
+                    continue
+                if record['error_rate'] < self.degraded_error_rate:
+                    ranked.append(((0, 0.0, 0.0, index), uid))
+                else:
+                    ranked.append(((1, record['error_rate'], record['latency'] or 0.0, index), uid))
+            if not ranked:
+                return None
+            uid = min(ranked)[1]
+            record = self._model(uid)
+            if self._state(record, now) == self.HALF_OPEN:
+                record['probe_at'] = now
+                print(f"Probing model {uid} after its circuit breaker opened")
+            return uid
+
+    def record_success(self, uid: str, latency: float) -> None:
+        """
+        Record a request answered by a model, closing its breaker.
+
+        Args:
+            uid: Model UID
+            latency: Seconds taken by the request
+        """
+        with self.lock:
+            record = self._model(uid)
+            changed = record['state'] != self.CLOSED
+            record['state'] = self.CLOSED
+            record['failures'] = 0
+            record['opened_at'] = None
+            record['probe_at'] = None
+            record['error_rate'] *= 1 - self.alpha
+            if record['latency'] is None:
+                record['latency'] = latency
+            else:
+                record['latency'] += self.alpha * (latency - record['latency'])
+            record['updated_at'] = self.clock()
+            document = self._document(uid, record) if changed else None
+        if changed:
+            print(f"Circuit breaker of model {uid} closed")
+            self._publish(document)
+
+    def record_failure(self, uid: str) -> None:
+        """
+        Record a request a model failed to answer, opening its breaker when due.
+
+        Args:
+            uid: Model UID
+        """
+        with self.lock:
+            now = self.clock()
+            record = self._model(uid)
+            record['failures'] += 1
+            record['error_rate'] += self.alpha * (1.0 - record['error_rate'])
+            record['updated_at'] = now
+            # A failed probe, or too many failures in a row, (re)opens the breaker
+            opened = record['state'] == self.OPEN or record['failures'] >= self.failure_threshold
+            if opened:
+                record['state'] = self.OPEN
+                record['opened_at'] = now
+                record['probe_at'] = None
+            document = self._document(uid, record) if opened else None
+        if opened:
+            print(f"Circuit breaker of model {uid} open for {self.open_seconds:.0f}s")
+            self._publish(document)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Get the state, consecutive failures, latency and error rate of every known model."""
+        with self.lock:
+            now = self.clock()
+            return {
+                uid: {
+                    'state': self._state(record, now),
+                    'failures': record['failures'],
+                    'latency': record['latency'],
+                    'errorRate': record['error_rate'],
+                }
+                for uid, record in self._models.items()
+            }
+
+    @staticmethod
+    def _document(uid: str, record: dict) -> dict:
+        """Build the shared document of a model."""
+        return {
+            '_id': uid,
+            'state': record['state'],
+            'failures': record['failures'],
+            'openedAt': record['opened_at'],
+            'latency': record['latency'],
+            'errorRate': record['error_rate'],
+            'updatedAt': record['updated_at'],
+        }
+
+    def _publish(self, document: dict) -> None:
+        """Write a breaker change to the shared collection."""
+        if self.db_adapter is None:
+            return
+        try:
+            self.db_adapter.get_collection(self.collection_name).update_one(
+                {'_id': document['_id']}, {'$set': document}, upsert=True
+            )
+        except Exception as e:
+            print(f"Warning: could not share model health: {e}")
+
+    def _sync(self, uids: List[str]) -> None:
+        """Adopt breaker states written by other workers more recently than ours."""
+        if self.db_adapter is None:
+            return
+        now = self.clock()
+        if self._synced_at is not None and now - self._synced_at < self.sync_seconds:
+            return
+        self._synced_at = now
+        try:
+            documents = list(self.db_adapter.get_collection(self.collection_name).find({'_id': {'$in': uids}}))
+        except Exception as e:
+            print(f"Warning: could not read shared model health: {e}")
+            return
+        with self.lock:
+            for document in documents:
+                record = self._model(document['_id'])
+                if document.get('updatedAt', 0.0) <= record['updated_at']:
+                    continue
+                record['state'] = document.get('state', self.CLOSED)
+                record['failures'] = document.get('failures', 0)
+                record['opened_at'] = document.get('openedAt')
+                record['latency'] = document.get('latency')
+                record['error_rate'] = document.get('errorRate', 0.0)
+                record['updated_at'] = document['updatedAt']
+                record['probe_at'] = None
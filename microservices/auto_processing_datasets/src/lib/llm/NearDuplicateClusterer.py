@@ -0,0 +1,118 @@
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class NearDuplicateClusterer:
+    """
+    MinHash LSH clustering of near-identical posts.
+
+    Links and mentions are dropped before word bigrams are taken, so
+    the same complaint addressed to another @handle, with another short
+    link or an extra hashtag ends up with almost the same bigrams. Each text
+    gets a MinHash signature whose bands are indexed: a text is only
+    compared with the cluster representatives sharing a band, and joins the
+    first one whose estimated Jaccard similarity reaches ``threshold``,
+    otherwise it starts a new cluster. Members are compared with the
+    representative itself (never chained through other members), and the
+    work stays close to linear in the number of texts.
+
+    Texts with fewer than ``min_tokens`` words are left alone, too little
+    differs between two short posts to tell a variant from another post.
+    """
+
+    # Cleaning strips the slashes of links: https://t.co/x -> https:t.cox
+    _LINKS = re.compile(r'https?:\S+|www\.\S+')
+    _MENTIONS = re.compile(r'@\w+')
+    _TOKENS = re.compile(r'#?\w+')
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, min_tokens: int = 3, seed: int = 1):
+        """
+        Args:
+            threshold: Smallest estimated Jaccard similarity of word bigrams to join a cluster
+            num_perm: Number of MinHash permutations
+            min_tokens: Fewest words for a text to be clustered
+            seed: Seed of the MinHash permutations
+        """
+        self.threshold = min(max(float(threshold), 0.0), 1.0)
+        self.num_perm = int(num_perm)
+        self.min_tokens = max(1, int(min_tokens))
+        self.bands, self.rows = self._banding(self.threshold, self.num_perm)
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: odd 64-bit multipliers, the top 32 bits are kept
+        self.multipliers = rng.integers(1, 2 ** 63, self.num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.increments = rng.integers(0, 2 ** 63, self.num_perm, dtype=np.uint64)
+
+    @staticmethod
+    def _banding(threshold: float, num_perm: int) -> Tuple[int, int]:
+        """
+        Get the number of bands and rows per band of the LSH index.
+
+        The widest bands whose collision curve turns up clearly below the
+        threshold are chosen, so similar pairs are almost always compared
+        while unrelated ones almost never are.
+        """
+        rows = 1
+        for candidate in range(1, num_perm + 1):
+            if num_perm % candidate == 0 and (candidate / num_perm) ** (1 / candidate) <= threshold - 0.1:
+                rows = candidate
+        return num_perm // rows, rows
+
+    def _shingles(self, text) -> Optional[np.ndarray]:
+        """Get the hashed word bigrams of a text, None if it is too short."""
+        words = self._TOKENS.findall(self._MENTIONS.sub(' ', self._LINKS.sub(' ', str(text).casefold())))
+        if len(words) < self.min_tokens:
+            return None
+        grams = [f"{first} {second}" for first, second in zip(words, words[1:])] or words
+        return np.unique(np.array([zlib.crc32(gram.encode('utf-8')) for gram in grams], dtype=np.uint64))
+
+    def signature(self, text) -> Optional[np.ndarray]:
+        """
+        Get the MinHash signature of a text.
+
+        Returns:
+            Array of num_perm 32-bit minimums, None if the text is too short
+        """
+        shingles = self._shingles(text)
+        if shingles is None:
+            return None
+        hashed = (self.multipliers[:, None] * shingles[None, :] + self.increments[:, None]) >> np.uint64(32)
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def cluster(self, texts: List[str]) -> List[int]:
+        """
+        Group near-identical texts.
+
+        Args:
+            texts: Texts to cluster
+
+        Returns:
+            Index of the representative (the first text of its cluster) of each text
+        """
+        representatives = list(range(len(texts)))
+        signatures: Dict[int, np.ndarray] = {}
+        buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        for index, text in enumerate(texts):
+            signature = self.signature(text)
+            if signature is None:
+                continue
+            raw, width = signature.tobytes(), self.rows * signature.itemsize
+            keys = [raw[band * width:(band + 1) * width] for band in range(self.bands)]
+            compared = set()
+            for band, key in enumerate(keys):
+                for candidate in buckets[band].get(key, ()):
+                    if candidate in compared:
+                        continue
+                    compared.add(candidate)
+                    if np.mean(signatures[candidate] == signature) >= self.threshold:
+                        representatives[index] = candidate
+                        break
+                if representatives[index] != index:
+                    break
+            if representatives[index] == index:
+                signatures[index] = signature
+                for band, key in enumerate(keys):
+                    buckets[band].setdefault(key, []).append(index)
+        return representatives
@@ -0,0 +1,95 @@
+import re
+from typing import Optional, Tuple, Union
+
+from .LlmHttpClient import LlmHttpClient
+
+
+class OllamaClient:
+    """
+    Client for the native Ollama API of one server.
+
+    Requests set ``keep_alive`` so the model stays loaded between batches,
+    an explicit ``num_ctx`` (Ollama silently truncates prompts longer than
+    its default context) and JSON format mode. The same ``num_ctx`` must be
+    sent on every request of a model, a change makes Ollama reload it.
+    """
+
+    def __init__(self, base_url: str, http_client: LlmHttpClient):
+        """
+        Args:
+            base_url: Server URL (an OpenAI-compatible /v1 suffix is dropped)
+            http_client: Pooled HTTP client for the server
+        """
+        self.base_url = self.api_base(base_url)
+        self.http_client = http_client
+
+    @staticmethod
+    def keep_alive(value: Union[str, int]) -> Union[str, int]:
+        """Get a keep_alive value as Ollama expects it (a duration string or seconds)."""
+        if isinstance(value, str) and re.fullmatch(r'-?\d+', value.strip()):
+            return int(value)
+        return value
+
+    @staticmethod
+    def api_base(base_url: str) -> str:
+        """Get the server root from a configured base URL."""
+        url = base_url.rstrip('/')
+        for suffix in ('/chat/completions', '/v1', '/api/chat', '/api/generate', '/api'):
+            if url.endswith(suffix):
+                url = url[:-len(suffix)].rstrip('/')
+        return url
+
+    def chat(self, model_name: str, prompt: str, keep_alive: Union[str, int], num_ctx: int,
+             timeout: Union[float, Tuple[float, float], None] = None) -> Tuple[str, Optional[str]]:
+        """
+        Ask a model for a JSON answer to one prompt.
+
+        Args:
+            model_name: Ollama model name
+            prompt: User message
+            keep_alive: How long the model stays loaded after the request (e.g. '30m', -1 = forever)
+            num_ctx: Context window in tokens
+            timeout: Read timeout, or (connect, read) timeouts in seconds
+
+        Returns:
+            Tuple of (message content, done_reason; 'length' when the answer was cut)
+        """
+        response = self.http_client.post_json(
+            f"{self.base_url}/api/chat",
+            {
+                'model': model_name,
+                'messages': [{'role': 'user', 'content': prompt}],
+                'format': 'json',
+                'stream': False,
+                'keep_alive': self.keep_alive(keep_alive),
+                'options': {'num_ctx': num_ctx, 'temperature': 0},
+            },
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data.get('message', {}).get('content', ''), data.get('done_reason')
+
+    def warmup(self, model_name: str, keep_alive: Union[str, int], num_ctx: int,
+               timeout: Union[float, Tuple[float, float], None] = None) -> None:
+        """
+        Load a model into memory without generating anything.
+
+        Args:
+            model_name: Ollama model name
+            keep_alive: How long the model stays loaded
+            num_ctx: Context window the model is loaded with (same as the later requests)
+            timeout: Read timeout, or (connect, read) timeouts in seconds
+        """
+        response = self.http_client.post_json(
+            f"{self.base_url}/api/generate",
+            {
+                'model': model_name,
+                'prompt': '',
+                'stream': False,
+                'keep_alive': self.keep_alive(keep_alive),
+                'options': {'num_ctx': num_ctx},
+            },
+            timeout=timeout,
+        )
+        response.raise_for_status()
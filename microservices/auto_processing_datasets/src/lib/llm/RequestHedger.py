@@ -0,0 +1,95 @@
+import math
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class RequestHedger:
+    """
+    Tail-latency control by sending slow LLM requests a second time.
+
+    Latencies of answered requests are kept over a sliding window; once
+    min_samples are known, a request still unanswered after the given
+    percentile of them may be hedged: the same batch is sent to another
+    model and the first valid answer wins. Hedges are capped at max_fraction
+    of the requests answered so far so they cannot double the spend.
+
+    Requests run on the hedger's own thread pool so the caller can stop
+    waiting for the slower one; a request already sent cannot be aborted,
+    its late answer is discarded.
+    """
+
+    def __init__(self, percentile: float = 95.0, max_fraction: float = 0.1,
+                 min_samples: int = 20, window: int = 200, max_workers: int = 8):
+        """
+        Args:
+            percentile: Latency percentile after which a request is hedged
+            max_fraction: Largest share of hedged requests
+            min_samples: Answered requests needed before hedging
+            window: Number of recent latencies the percentile is taken over
+            max_workers: Threads running hedged requests
+        """
+        self.percentile = min(max(float(percentile), 0.0), 100.0)
+        self.max_fraction = max(0.0, float(max_fraction))
+        self.min_samples = max(1, int(min_samples))
+        self.max_workers = max(2, int(max_workers))
+        self.latencies = deque(maxlen=max(self.min_samples, int(window)))
+        self.requests = 0
+        self.hedges = 0
+        self.wins = 0
+        self.lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def record(self, latency: float) -> None:
+        """Record the latency of an answered request."""
+        with self.lock:
+            self.latencies.append(latency)
+            self.requests += 1
+
+    def delay(self) -> Optional[float]:
+        """
+        Get how long to wait for an answer before hedging.
+
+        Returns:
+            Latency percentile in seconds, or None until min_samples are known
+        """
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        rank = max(1, math.ceil(self.percentile / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+    def acquire(self) -> bool:
+        """
+        Reserve a hedge within the max_fraction cap.
+
+        Returns:
+            True if a hedged request may be sent
+        """
+        with self.lock:
+            if self.hedges + 1 > self.max_fraction * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def won(self) -> None:
+        """Record a hedged request answering before the original one."""
+        with self.lock:
+            self.wins += 1
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Run a request on the hedging thread pool."""
+        with self.lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='llm-hedge')
+            pool = self._pool
+        return pool.submit(fn, *args)
+
+    def close(self) -> None:
+        """Release the thread pool without waiting for discarded requests."""
+        with self.lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
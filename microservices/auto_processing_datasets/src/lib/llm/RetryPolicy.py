@@ -0,0 +1,154 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+
+class RetryPolicy:
+    """
+    Retry decisions for LLM requests, shared by every request of a task.
+
+    Errors are classified (rate limit, timeout, connection, server, parse,
+    client) and only transient ones are retried. The wait before a retry is
+    the server's ``Retry-After`` when it sends one on 429/503, otherwise a
+    decorrelated jitter delay that grows from the previous one without
+    synchronising concurrent batches. Every retry and every second waited is
+    charged to a budget for the whole task: once spent, failures are raised
+    at once so fallback models take over instead of a worker sleeping on a
+    dead endpoint.
+    """
+
+    RATE_LIMIT = 'rate_limit'
+    TIMEOUT = 'timeout'
+    CONNECTION = 'connection'
+    SERVER = 'server'
+    PARSE = 'parse'
+    CLIENT = 'client'
+    UNKNOWN = 'unknown'
+
+    def __init__(self, base_delay: float = 1.0, max_delay: float = 60.0,
+                 budget_retries: int = 100, budget_seconds: float = 600.0,
+                 parse_retries: int = 1, rng: Optional[random.Random] = None):
+        """
+        Args:
+            base_delay: Smallest wait before a retry, in seconds
+            max_delay: Largest wait before a retry; a longer Retry-After is not waited for
+            budget_retries: Retries allowed for the whole task
+            budget_seconds: Seconds of waiting allowed for the whole task
+            parse_retries: Retries of a request whose answer could not be parsed
+            rng: Random generator for the jitter
+        """
+        self.base_delay = max(0.0, float(base_delay))
+        self.max_delay = max(self.base_delay, float(max_delay))
+        self.budget_retries = max(0, int(budget_retries))
+        self.budget_seconds = max(0.0, float(budget_seconds))
+        self.parse_retries = max(0, int(parse_retries))
+        self.rng = rng or random.Random()
+        self.retries = 0
+        self.waited = 0.0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def classify(cls, error: Exception) -> str:
+        """
+        Get the kind of a request failure.
+
+        Args:
+            error: Exception raised by a request or while reading its answer
+
+        Returns:
+            One of the RetryPolicy kind constants
+        """
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+        if status == 429:
+            return cls.RATE_LIMIT
+        if status == 408:
+            return cls.TIMEOUT
+        if status is not None and status >= 500:
+            return cls.SERVER
+        if status is not None and status >= 400:
+            return cls.CLIENT
+        if requests is not None:
+            if isinstance(error, requests.exceptions.Timeout):
+                return cls.TIMEOUT
+            if isinstance(error, requests.exceptions.ConnectionError):
+                return cls.CONNECTION
+        if isinstance(error, ValueError):
+            return cls.PARSE
+        return cls.UNKNOWN
+
+    @staticmethod
+    def retry_after(error: Exception) -> Optional[float]:
+        """
+        Get the wait requested by a 429 or 503 answer.
+
+        Args:
+            error: Exception raised by a request
+
+        Returns:
+            Seconds to wait (0 or more), or None if the server did not say
+        """
+        response = getattr(error, 'response', None)
+        if getattr(response, 'status_code', None) not in (429, 503):
+            return None
+        value = (getattr(response, 'headers', None) or {}).get('Retry-After')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def next_delay(self, error: Exception, attempt: int, max_retries: int,
+                   previous_delay: float = 0.0) -> Optional[float]:
+        """
+        Decide whether a failed request is retried and how long to wait first.
+
+        The retry is charged to the task budget when granted.
+
+        Args:
+            error: Exception raised by the failed attempt
+            attempt: Number of retries already made for this request
+            max_retries: Retries allowed for this request
+            previous_delay: Wait before the previous retry of this request (0 for the first)
+
+        Returns:
+            Seconds to wait before retrying, or None to give up
+        """
+        kind = self.classify(error)
+        if kind == self.CLIENT or attempt >= max_retries:
+            return None
+        if kind == self.PARSE and attempt >= self.parse_retries:
+            return None
+
+        delay = self.retry_after(error)
+        if delay is not None:
+            if delay > self.max_delay:
+                return None
+        else:
+            # Decorrelated jitter: uniform between the base and three times the last wait
+            upper = max(self.base_delay, previous_delay * 3)
+            delay = min(self.max_delay, self.rng.uniform(self.base_delay, upper))
+
+        with self.lock:
+            if self.retries >= self.budget_retries or self.waited + delay > self.budget_seconds:
+                return None
+            self.retries += 1
+            self.waited += delay
+        return delay
+
+    @property
+    def exhausted(self) -> bool:
+        """Check whether the task has no retries left."""
+        with self.lock:
+            return self.retries >= self.budget_retries or self.waited >= self.budget_seconds
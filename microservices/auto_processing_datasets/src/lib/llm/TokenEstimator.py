@@ -0,0 +1,34 @@
+import math
+import re
+
+
+class TokenEstimator:
+    """
+    Fast local estimate of the number of tokens in a text.
+
+    Mirrors how BPE vocabularies split text without loading one: word runs
+    cost one token per chars_per_token characters (short common words stay
+    whole, long ones are split), every other non-space character costs one
+    token. It errs on the high side so packed batches stay within budget.
+    """
+
+    _PIECES = re.compile(r'(\w+)|[^\w\s]')
+
+    def __init__(self, chars_per_token: float = 4.0):
+        self.chars_per_token = max(float(chars_per_token), 1.0)
+
+    def count(self, text: str) -> int:
+        """Estimate the number of tokens in text."""
+        tokens = 0
+        for match in self._PIECES.finditer(text):
+            word = match.group(1)
+            tokens += math.ceil(len(word) / self.chars_per_token) if word else 1
+        return tokens
+
+
+class CharTokenEstimator(TokenEstimator):
+    """Token estimate proportional to the text length, for models without word-level vocabularies."""
+
+    def count(self, text: str) -> int:
+        """Estimate the number of tokens in text."""
+        return math.ceil(len(text) / self.chars_per_token)
@@ -0,0 +1,189 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional
+
+
+class TopicCanonicalizer:
+    """
+    Rewrites noisy topic labels to canonical ones kept in a persistent alias table.
+
+    A label is reduced to a key: accents and case folded, stop words
+    dropped, each word stripped of its plural ending and the words
+    sorted ("Problèmes de Réseaux" and "réseau problème" share a key). A key
+    already in the alias table gets its canonical label. Otherwise the
+    canonical labels sharing a word with it are scored by the similarity of
+    their keys' character trigrams (typos, extra letters), and the best one
+    at or above ``threshold`` is taken; below it, the label becomes a new
+    canonical label. Either way the key is added to the table.
+
+    Only distinct labels are looked at, and each only against the canonical
+    labels sharing one of its words, so datasets of millions of rows with
+    thousands of distinct topics are canonicalised in near-linear time. The
+    table is a JSON file shared by every dataset, so labels stay stable from
+    one file to the next; saving merges the entries other workers added.
+    """
+
+    _WORDS = re.compile(r'[a-z0-9]+')
+    _STOP_WORDS = {
+        'a', 'au', 'aux', 'd', 'de', 'des', 'du', 'en', 'et', 'l', 'la', 'le', 'les', 'par', 'pour', 'sur', 'un',
+        'une', 'an', 'and', 'for', 'of', 'on', 'the', 'to', 'with',
+    }
+    # Plural endings, the first that matches is stripped
+    _SUFFIXES = [('eaux', 'eau'), ('aux', 'al'), ('s', ''), ('x', '')]
+
+    def __init__(self, path: str, threshold: float = 0.8):
+        """
+        Args:
+            path: JSON file of the alias table
+            threshold: Smallest trigram similarity for a label to join a canonical label
+        """
+        self.path = path
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.aliases: Dict[str, str] = {}
+        self._added: Dict[str, str] = {}
+        self._index: Dict[str, List[str]] = {}
+        self._keys: Dict[str, str] = {}
+        self._mtime: Optional[float] = None
+        self._load()
+
+    @classmethod
+    def _lemma(cls, word: str) -> str:
+        """Strip the plural ending of a folded word."""
+        for suffix, replacement in cls._SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) + len(replacement) >= 3:
+                return word[:-len(suffix)] + replacement
+        return word
+
+    @classmethod
+    def key(cls, label) -> str:
+        """
+        Get the key a label is matched with.
+
+        Args:
+            label: Topic label
+
+        Returns:
+            Sorted distinct lemmas of the label's words ('' for labels without words)
+        """
+        folded = unicodedata.normalize('NFKD', str(label)).encode('ascii', 'ignore').decode('ascii').casefold()
+        words = [word for word in cls._WORDS.findall(folded) if word not in cls._STOP_WORDS]
+        return ' '.join(sorted({cls._lemma(word) for word in words}))
+
+    @staticmethod
+    def _trigrams(key: str) -> set:
+        padded = f"  {key} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def _similarity(self, first: str, second: str) -> float:
+        """Dice coefficient of the character trigrams of two keys."""
+        a, b = self._trigrams(first), self._trigrams(second)
+        return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+    def _add_canonical(self, label: str) -> None:
+        """Index a canonical label by the words of its key."""
+        if label in self._keys:
+            return
+        key = self.key(label)
+        self._keys[label] = key
+        for word in key.split():
+            self._index.setdefault(word, []).append(label)
+
+    def _read(self) -> Dict[str, str]:
+        """Read the saved alias table."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('aliases', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _modified_time(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def _load(self) -> None:
+        """Take in the saved alias table (saved labels win over unsaved ones)."""
+        self._mtime = self._modified_time()
+        for key, label in self._read().items():
+            self.aliases[key] = label
+            self._add_canonical(label)
+
+    def _match(self, key: str) -> Optional[str]:
+        """Get the canonical label closest to a new key, None below the threshold."""
+        best, best_score = None, self.threshold
+        candidates = dict.fromkeys(label for word in key.split() for label in self._index.get(word, ()))
+        for label in candidates:
+            score = self._similarity(key, self._keys[label])
+            if score >= best_score:
+                best, best_score = label, score
+        return best
+
+    def canonicalize(self, labels: Iterable, counts: Optional[Iterable[int]] = None) -> Dict[str, str]:
+        """
+        Map labels to their canonical labels, adding new ones to the table.
+
+        Args:
+            labels: Topic labels (duplicates and non-string values are fine)
+            counts: Rows of each label; the most frequent variant of a new
+                topic becomes its canonical label
+
+        Returns:
+            Dict mapping each distinct string label to its canonical label
+        """
+        totals: Dict[str, int] = {}
+        for label, count in zip(labels, counts if counts is not None else repeat(1)):
+            if isinstance(label, str) and label.strip():
+                totals[label] = totals.get(label, 0) + count
+
+        mapping = {}
+        with self.lock:
+            # Pick up the aliases other workers saved meanwhile
+            if self._modified_time() != self._mtime:
+                self._load()
+            for label, _ in sorted(totals.items(), key=lambda item: -item[1]):
+                key = self.key(label)
+                if not key:
+                    mapping[label] = label
+                    continue
+                canonical = self.aliases.get(key)
+                if canonical is None:
+                    canonical = self._match(key) or ' '.join(label.split())
+                    self.aliases[key] = canonical
+                    self._added[key] = canonical
+                    self._add_canonical(canonical)
+                mapping[label] = canonical
+        return mapping
+
+    def save(self) -> int:
+        """
+        Write the alias table, merged with the entries saved by other workers.
+
+        Keys saved by another worker meanwhile keep the label it gave them.
+
+        Returns:
+            Number of aliases added by this process since the last save
+        """
+        with self.lock:
+            added, self._added = self._added, {}
+            if not added:
+                return 0
+            saved = self._read()
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'aliases': {**added, **saved}}, f, ensure_ascii=False, indent=0, sort_keys=True)
+            os.replace(temp_path, self.path)
+            self._load()
+            return len(added)
+
+    @property
+    def canonical_labels(self) -> List[str]:
+        """Get the canonical labels known to the table."""
+        with self.lock:
+            return list(self._keys)
@@ -0,0 +1,50 @@
+from .BatchSizeController import BatchSizeController
+from .CascadeClassifier import CascadeClassifier
+from .InputNormalizer import InputNormalizer
+from .LlmCheckpoint import LlmCheckpoint
+from .LlmHttpClient import LlmHttpClient
+from .ModelHealthRegistry import ModelHealthRegistry
+from .NearDuplicateClusterer import NearDuplicateClusterer
+from .OllamaClient import OllamaClient
+from .RequestHedger import RequestHedger
+from .RetryPolicy import RetryPolicy
+from .TokenEstimator import TokenEstimator, CharTokenEstimator
+from .TopicCanonicalizer import TopicCanonicalizer
+from .service import (
+    create_llm_cascade, create_llm_checkpoint, create_near_duplicate_clusterer, create_request_hedger,
+    create_retry_policy, get_input_normalizer, get_llm_http_client, get_model_health_registry, get_ollama_client,
+    get_ollama_num_ctx, get_token_estimator, get_topic_canonicalizer, reset_model_health_registry, reset_topic_canonicalizer,
+    warmup_ollama_model, warmup_ollama_models
+)
+
+__all__ = [
+    'BatchSizeController',
+    'CascadeClassifier',
+    'InputNormalizer',
+    'LlmCheckpoint',
+    'LlmHttpClient',
+    'ModelHealthRegistry',
+    'NearDuplicateClusterer',
+    'OllamaClient',
+    'RequestHedger',
+    'RetryPolicy',
+    'TokenEstimator',
+    'CharTokenEstimator',
+    'TopicCanonicalizer',
+    'create_llm_cascade',
+    'create_llm_checkpoint',
+    'create_near_duplicate_clusterer',
+    'create_request_hedger',
+    'create_retry_policy',
+    'get_input_normalizer',
+    'get_llm_http_client',
+    'get_model_health_registry',
+    'get_ollama_client',
+    'get_ollama_num_ctx',
+    'get_token_estimator',
+    'get_topic_canonicalizer',
+    'reset_model_health_registry',
+    'reset_topic_canonicalizer',
+    'warmup_ollama_model',
+    'warmup_ollama_models',
+]
@@ -0,0 +1,357 @@
+import os
+import threading
+from typing import Optional
+from urllib.parse import urlsplit
+
+from .CascadeClassifier import CascadeClassifier
+from .InputNormalizer import InputNormalizer
+from .LlmCheckpoint import LlmCheckpoint
+from .LlmHttpClient import LlmHttpClient
+from .ModelHealthRegistry import ModelHealthRegistry
+from .NearDuplicateClusterer import NearDuplicateClusterer
+from .OllamaClient import OllamaClient
+from .RequestHedger import RequestHedger
+from .RetryPolicy import RetryPolicy
+from .TokenEstimator import TokenEstimator, CharTokenEstimator
+from .TopicCanonicalizer import TopicCanonicalizer
+
+# HTTP clients by (process, scheme, host), connections must not be shared across forks
+_http_clients = {}
+_http_clients_lock = threading.Lock()
+
+# Ollama models loaded by the current process, by (process, server, model, context window)
+_ollama_warm = set()
+
+# Model health of the current process, shared by its tasks
+_model_health = None
+_model_health_lock = threading.Lock()
+
+# Topic alias table of the process
+_topic_canonicalizer = None
+_topic_canonicalizer_lock = threading.Lock()
+
+# Token estimators selectable per model with data.tokenizer
+TOKEN_ESTIMATORS = {
+    'words': TokenEstimator,
+    'chars': CharTokenEstimator,
+}
+
+
+def create_llm_checkpoint(file_id: str) -> LlmCheckpoint:
+    """
+    Create the LLM checkpoint of a dataset.
+    
+    Args:
+        file_id: File identifier
+    
+    Returns:
+        LlmCheckpoint stored under STORAGE_CHECKPOINTS
+    """
+    from src.configs.env import STORAGE_CHECKPOINTS
+    from src.configs.constants import LLM_PROMPT_VERSION
+    
+    return LlmCheckpoint(os.path.join(STORAGE_CHECKPOINTS, f"{file_id}.llm.jsonl"), LLM_PROMPT_VERSION)
+
+
+def create_llm_cascade() -> Optional[CascadeClassifier]:
+    """
+    Create the cascade classifier, loaded with its latest saved version.
+    
+    Returns:
+        CascadeClassifier stored under STORAGE_CASCADE, or None if LLM_CASCADE_ENABLED is off
+    """
+    from src.configs.env import (
+        LLM_CASCADE_ENABLED, STORAGE_CASCADE, LLM_CASCADE_THRESHOLD, LLM_CASCADE_MIN_SAMPLES,
+        LLM_CASCADE_MAX_TOPICS, LLM_CASCADE_KEEP_VERSIONS
+    )
+    from src.configs.constants import LLM_PROMPT_VERSION
+    
+    if not LLM_CASCADE_ENABLED:
+        return None
+    cascade = CascadeClassifier(
+        STORAGE_CASCADE, LLM_PROMPT_VERSION,
+        threshold=LLM_CASCADE_THRESHOLD,
+        min_samples=LLM_CASCADE_MIN_SAMPLES,
+        max_topics=LLM_CASCADE_MAX_TOPICS,
+        keep_versions=LLM_CASCADE_KEEP_VERSIONS,
+    )
+    cascade.load()
+    return cascade
+
+
+def create_near_duplicate_clusterer() -> Optional[NearDuplicateClusterer]:
+    """
+    Create the clusterer grouping near-identical posts before they are sent.
+    
+    Returns:
+        NearDuplicateClusterer, or None if LLM_NEAR_DUPLICATE_THRESHOLD is 0
+    """
+    from src.configs.env import LLM_NEAR_DUPLICATE_THRESHOLD, LLM_NEAR_DUPLICATE_MIN_TOKENS
+    
+    if LLM_NEAR_DUPLICATE_THRESHOLD <= 0:
+        return None
+    return NearDuplicateClusterer(LLM_NEAR_DUPLICATE_THRESHOLD, min_tokens=LLM_NEAR_DUPLICATE_MIN_TOKENS)
+
+
+def get_token_estimator(model: dict) -> TokenEstimator:
+    """
+    Get the token estimator configured for a model.
+    
+    Args:
+        model: Model configuration dictionary (``data.tokenizer`` selects the
+            estimator, ``data.charsPerToken`` tunes it)
+    
+    Returns:
+        TokenEstimator instance (word-based by default)
+    """
+    data = model.get('data', {})
+    name = data.get('tokenizer', 'words')
+    estimator_class = TOKEN_ESTIMATORS.get(name)
+    if estimator_class is None:
+        print(f"Warning: unknown tokenizer '{name}', using 'words'")
+        estimator_class = TokenEstimator
+    
+    try:
+        chars_per_token = float(data.get('charsPerToken', 4.0))
+    except (TypeError, ValueError):
+        chars_per_token = 4.0
+    return estimator_class(chars_per_token)
+
+
+def get_input_normalizer(model: dict) -> Optional[InputNormalizer]:
+    """
+    Get the normaliser of the posts sent to a model.
+    
+    Args:
+        model: Model configuration dictionary (``data.normalizeInput`` enables
+            it, ``data.maxInputChars`` caps the length of the posts)
+    
+    Returns:
+        InputNormalizer, or None if the model gets the posts unchanged
+    """
+    from src.configs.env import DEFAULT_LLM_NORMALIZE_INPUT, DEFAULT_LLM_MAX_INPUT_CHARS, LLM_INPUT_MAX_MENTIONS
+    
+    data = model.get('data', {})
+    if not data.get('normalizeInput', DEFAULT_LLM_NORMALIZE_INPUT):
+        return None
+    try:
+        max_chars = int(data.get('maxInputChars', DEFAULT_LLM_MAX_INPUT_CHARS))
+    except (TypeError, ValueError):
+        max_chars = DEFAULT_LLM_MAX_INPUT_CHARS
+    return InputNormalizer(max_chars, LLM_INPUT_MAX_MENTIONS)
+
+
+def get_llm_http_client(endpoint: str) -> LlmHttpClient:
+    """
+    Get the keep-alive HTTP client of the current process for an endpoint.
+    
+    Args:
+        endpoint: Request URL (clients are shared per scheme and host)
+    
+    Returns:
+        LlmHttpClient with a pool sized for MAX_CONCURRENT_REQUESTS
+    """
+    from src.configs.env import MAX_CONCURRENT_REQUESTS, LLM_GZIP_MIN_BYTES
+    
+    parts = urlsplit(endpoint)
+    key = (os.getpid(), parts.scheme, parts.netloc)
+    with _http_clients_lock:
+        client = _http_clients.get(key)
+        if client is None:
+            # Clients inherited from a parent process are dropped, not closed
+            for stale in [k for k in _http_clients if k[0] != key[0]]:
+                del _http_clients[stale]
+            client = LlmHttpClient(MAX_CONCURRENT_REQUESTS, LLM_GZIP_MIN_BYTES)
+            _http_clients[key] = client
+        return client
+
+
+def create_retry_policy() -> RetryPolicy:
+    """
+    Create the retry policy of a task.
+    
+    Returns:
+        RetryPolicy with the task budget from LLM_RETRY_BUDGET_RETRIES / LLM_RETRY_BUDGET_SECONDS
+    """
+    from src.configs.env import (
+        LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY,
+        LLM_RETRY_BUDGET_RETRIES, LLM_RETRY_BUDGET_SECONDS, LLM_PARSE_RETRIES
+    )
+    
+    return RetryPolicy(
+        base_delay=LLM_RETRY_BASE_DELAY,
+        max_delay=LLM_RETRY_MAX_DELAY,
+        budget_retries=LLM_RETRY_BUDGET_RETRIES,
+        budget_seconds=LLM_RETRY_BUDGET_SECONDS,
+        parse_retries=LLM_PARSE_RETRIES,
+    )
+
+
+def get_ollama_client(base_url: str) -> OllamaClient:
+    """
+    Get a native Ollama API client over the pooled connections of a server.
+    
+    Args:
+        base_url: Configured model base URL
+    
+    Returns:
+        OllamaClient for the server
+    """
+    root = OllamaClient.api_base(base_url)
+    return OllamaClient(root, get_llm_http_client(root))
+
+
+def get_ollama_num_ctx(model: dict) -> int:
+    """
+    Get the Ollama context window of a model, large enough for its batch token budget.
+    
+    Ollama reloads a model whose context window changes, so requests and
+    warmups of a model must use this same value.
+    
+    Args:
+        model: Model configuration dictionary (``data.numCtx``, ``data.maxBatchTokens``)
+    
+    Returns:
+        Context window in tokens
+    """
+    from src.configs.env import OLLAMA_NUM_CTX, DEFAULT_BATCH_TOKEN_BUDGET
+    
+    data = model.get('data', {})
+    try:
+        num_ctx = int(data.get('numCtx', OLLAMA_NUM_CTX))
+    except (TypeError, ValueError):
+        num_ctx = OLLAMA_NUM_CTX
+    try:
+        token_budget = max(0, int(data.get('maxBatchTokens', DEFAULT_BATCH_TOKEN_BUDGET)))
+    except (TypeError, ValueError):
+        token_budget = DEFAULT_BATCH_TOKEN_BUDGET
+    return max(num_ctx, token_budget)
+
+
+def warmup_ollama_model(base_url: str, model_name: str, keep_alive, num_ctx: int, timeout=None) -> bool:
+    """
+    Load an Ollama model once per process so the first batch does not wait for it.
+    
+    Args:
+        base_url: Configured model base URL
+        model_name: Ollama model name
+        keep_alive: How long the model stays loaded
+        num_ctx: Context window (must match the one sent with requests)
+        timeout: Read timeout, or (connect, read) timeouts in seconds
+    
+    Returns:
+        True if the model was loaded now, False if already done or loading failed
+    """
+    key = (os.getpid(), OllamaClient.api_base(base_url), model_name, num_ctx)
+    if key in _ollama_warm:
+        return False
+    try:
+        get_ollama_client(base_url).warmup(model_name, keep_alive, num_ctx, timeout=timeout)
+    except Exception as e:
+        print(f"Warning: could not load Ollama model {model_name}: {e}")
+        return False
+    _ollama_warm.add(key)
+    print(f"Loaded Ollama model {model_name} (num_ctx={num_ctx}, keep_alive={keep_alive})")
+    return True
+
+
+def warmup_ollama_models() -> None:
+    """
+    Load the models listed in OLLAMA_WARMUP_MODELS (called when a worker process starts).
+    
+    Models are loaded with the context window their requests use when they
+    have no ``numCtx`` / ``maxBatchTokens`` of their own (see get_ollama_num_ctx).
+    """
+    from src.configs.env import (
+        OLLAMA_BASE_URL, OLLAMA_WARMUP_MODELS, OLLAMA_KEEP_ALIVE, LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT
+    )
+    
+    for model_name in [name.strip() for name in OLLAMA_WARMUP_MODELS.split(',') if name.strip()]:
+        num_ctx = get_ollama_num_ctx({'data': {'model': model_name}})
+        warmup_ollama_model(OLLAMA_BASE_URL, model_name, OLLAMA_KEEP_ALIVE, num_ctx,
+                            timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT))
+
+
+def create_request_hedger(max_in_flight: int) -> RequestHedger:
+    """
+    Create the request hedger of a calling_llm run.
+    
+    Args:
+        max_in_flight: Batches kept in flight (each may run two requests)
+    
+    Returns:
+        RequestHedger configured by LLM_HEDGE_PERCENTILE / LLM_HEDGE_MAX_FRACTION / LLM_HEDGE_MIN_SAMPLES
+    """
+    from src.configs.env import LLM_HEDGE_PERCENTILE, LLM_HEDGE_MAX_FRACTION, LLM_HEDGE_MIN_SAMPLES
+    
+    return RequestHedger(
+        percentile=LLM_HEDGE_PERCENTILE,
+        max_fraction=LLM_HEDGE_MAX_FRACTION,
+        min_samples=LLM_HEDGE_MIN_SAMPLES,
+        max_workers=2 * max(1, max_in_flight),
+    )
+
+
+def get_model_health_registry(db_adapter=None) -> ModelHealthRegistry:
+    """
+    Get the model health registry of the current process.
+    
+    Args:
+        db_adapter: Database adapter; with LLM_HEALTH_BACKEND='mongodb', the
+            first one given shares breaker states with the other workers
+    
+    Returns:
+        ModelHealthRegistry shared by every task of the process
+    """
+    global _model_health
+    from src.configs.env import (
+        LLM_BREAKER_FAILURES, LLM_BREAKER_OPEN_SECONDS, LLM_BREAKER_PROBE_INTERVAL,
+        LLM_HEALTH_DEGRADED_ERROR_RATE, LLM_HEALTH_BACKEND, LLM_HEALTH_COLLECTION, LLM_HEALTH_SYNC_SECONDS
+    )
+    
+    with _model_health_lock:
+        if _model_health is None:
+            _model_health = ModelHealthRegistry(
+                failure_threshold=LLM_BREAKER_FAILURES,
+                open_seconds=LLM_BREAKER_OPEN_SECONDS,
+                probe_interval=LLM_BREAKER_PROBE_INTERVAL,
+                degraded_error_rate=LLM_HEALTH_DEGRADED_ERROR_RATE,
+                collection=LLM_HEALTH_COLLECTION,
+                sync_seconds=LLM_HEALTH_SYNC_SECONDS,
+            )
+        if db_adapter is not None and _model_health.db_adapter is None \
+                and (LLM_HEALTH_BACKEND or 'memory').lower() == 'mongodb':
+            _model_health.db_adapter = db_adapter
+        return _model_health
+
+
+def reset_model_health_registry() -> None:
+    """Forget the model health of the current process."""
+    global _model_health
+    with _model_health_lock:
+        _model_health = None
+
+
+def get_topic_canonicalizer() -> Optional[TopicCanonicalizer]:
+    """
+    Get the topic canonicalizer of the current process.
+    
+    Returns:
+        TopicCanonicalizer over LLM_TOPIC_ALIASES_PATH, or None if LLM_TOPIC_CANONICALIZE_ENABLED is off
+    """
+    global _topic_canonicalizer
+    from src.configs.env import LLM_TOPIC_CANONICALIZE_ENABLED, LLM_TOPIC_ALIASES_PATH, LLM_TOPIC_MATCH_THRESHOLD
+    
+    if not LLM_TOPIC_CANONICALIZE_ENABLED:
+        return None
+    with _topic_canonicalizer_lock:
+        if _topic_canonicalizer is None:
+            _topic_canonicalizer = TopicCanonicalizer(LLM_TOPIC_ALIASES_PATH, LLM_TOPIC_MATCH_THRESHOLD)
+        return _topic_canonicalizer
+
+
+def reset_topic_canonicalizer() -> None:
+    """Forget the topic alias table loaded by the current process."""
+    global _topic_canonicalizer
+    with _topic_canonicalizer_lock:
+        _topic_canonicalizer = None
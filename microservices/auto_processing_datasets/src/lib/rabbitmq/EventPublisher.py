@@ -0,0 +1,293 @@
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+import pika
+from pika.spec import Basic
+
+
+class EventPublisher:
+    """Long-lived RabbitMQ publisher shared by all threads of a worker process.
+    
+    pika connections are not thread-safe, so a single background thread owns
+    the connection and runs its I/O loop; callers only queue messages and
+    wake the loop. The channel is in publisher confirm mode and queued
+    messages are published without waiting for each confirm, up to
+    ``batch_size`` unconfirmed at a time. The broker acks them
+    asynchronously (one ack usually covers several messages), so a batch
+    costs one round trip rather than one per message. Nacked messages are
+    published again. When the connection drops, the thread reconnects and
+    re-publishes the messages not confirmed yet; messages are dropped after
+    ``max_attempts`` failed connections in a row. Heartbeats are serviced by
+    the I/O loop.
+    """
+    
+    def __init__(self, url: str, exchange: str, batch_size: int = 50,
+                 reconnect_delay: float = 0.5, max_attempts: int = 3, logger=None):
+        self.url = url
+        self.exchange = exchange
+        self.batch_size = max(1, batch_size)
+        self.reconnect_delay = reconnect_delay
+        self.max_attempts = max(1, max_attempts)
+        self.logger = logger
+        self.connection: Optional[pika.SelectConnection] = None
+        self.channel = None
+        # (routing_key, body, nacks) waiting to be published, shared with callers
+        self._messages: deque = deque()
+        self._messages_lock = threading.Lock()
+        # Published but not confirmed yet, by delivery tag (I/O thread only)
+        self._unconfirmed: OrderedDict = OrderedDict()
+        self._delivery_tag = 0
+        # Channel ready to publish / reached once on the current connection
+        self._ready = False
+        self._opened = False
+        self._pending = 0
+        self._pending_lock = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+    
+    def _log(self, level: str, message: str) -> None:
+        """Log through the configured logger, or print if none."""
+        if self.logger is not None:
+            getattr(self.logger, level)(message)
+        else:
+            print(message)
+    
+    def _ensure_thread(self) -> None:
+        """Start the publishing thread if it is not running."""
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name='rabbitmq-publisher', daemon=True
+                )
+                self._thread.start()
+    
+    def publish(self, routing_key: str, body: str) -> None:
+        """
+        Queue a message for publishing on the exchange.
+        
+        Args:
+            routing_key: Routing key for the message
+            body: Serialized message body
+        """
+        with self._pending_lock:
+            self._pending += 1
+        with self._messages_lock:
+            self._messages.append((routing_key, body, 0))
+        self._ensure_thread()
+        self._wakeup.set()
+        self._call_in_loop(self._drain)
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued message has been confirmed by the broker (or dropped).
+        
+        Args:
+            timeout: Maximum number of seconds to wait (None waits forever)
+        
+        Returns:
+            True if the queue was drained, False on timeout
+        """
+        with self._pending_lock:
+            return self._pending_lock.wait_for(lambda: self._pending == 0, timeout)
+    
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Flush pending messages, stop the thread and close the connection."""
+        if self._thread is not None and self._thread.is_alive():
+            self.flush(timeout)
+            self._stopping.set()
+            self._wakeup.set()
+            self._call_in_loop(self._close_connection)
+            self._thread.join(timeout)
+    
+    def _call_in_loop(self, callback) -> None:
+        """Run a callback on the I/O thread (dropped if no connection is running)."""
+        connection = self.connection
+        if connection is None:
+            return
+        try:
+            connection.ioloop.add_callback_threadsafe(callback)
+        except Exception:
+            # The connection is going away, the next one drains the queue
+            pass
+    
+    def _settle(self, count: int) -> None:
+        """Count messages confirmed or dropped."""
+        if count:
+            with self._pending_lock:
+                self._pending -= count
+                self._pending_lock.notify_all()
+    
+    def _run(self) -> None:
+        """Connection loop owned by the background thread."""
+        failures = 0
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._messages_lock:
+                idle = not self._messages
+            if idle:
+                if self._stopping.is_set():
+                    return
+                continue
+            
+            self._ready = self._opened = False
+            self.connection = pika.SelectConnection(
+                pika.URLParameters(self.url),
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_error,
+                on_close_callback=self._on_connection_closed,
+            )
+            try:
+                self.connection.ioloop.start()
+            finally:
+                self.connection = None
+                self.channel = None
+                self._ready = False
+                self._requeue(list(self._unconfirmed.values()))
+                self._unconfirmed.clear()
+            
+            failures = 0 if self._opened else failures + 1
+            with self._messages_lock:
+                remaining = len(self._messages)
+                if failures >= self.max_attempts:
+                    self._messages.clear()
+            if failures >= self.max_attempts:
+                self._log('error', f"Dropped {remaining} event(s) after {self.max_attempts} failed connections")
+                self._settle(remaining)
+                failures = 0
+            elif remaining:
+                time.sleep(min(self.reconnect_delay * max(failures, 1), 2.0))
+                self._wakeup.set()
+    
+    def _requeue(self, messages: list) -> None:
+        """Put messages back at the front of the queue, in order."""
+        with self._messages_lock:
+            self._messages.extendleft(reversed(messages))
+    
+    def _on_connection_open(self, connection) -> None:
+        connection.channel(on_open_callback=self._on_channel_open)
+    
+    def _on_connection_error(self, connection, error) -> None:
+        self._log('warning', f"Could not connect to RabbitMQ: {error!r}")
+        connection.ioloop.stop()
+    
+    def _on_connection_closed(self, connection, reason) -> None:
+        if not self._stopping.is_set():
+            self._log('warning', f"RabbitMQ connection closed, {len(self._unconfirmed)} event(s) unconfirmed: {reason}")
+        connection.ioloop.stop()
+    
+    def _on_channel_open(self, channel) -> None:
+        self.channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        # Declare exchange before publishing
+        channel.exchange_declare(
+            exchange=self.exchange,
+            exchange_type='topic',
+            durable=True,
+            callback=self._on_exchange_declared,
+        )
+    
+    def _on_channel_closed(self, channel, reason) -> None:
+        self._close_connection()
+    
+    def _on_exchange_declared(self, frame) -> None:
+        self._delivery_tag = 0
+        self.channel.confirm_delivery(ack_nack_callback=self._on_confirm, callback=self._on_confirm_selected)
+    
+    def _on_confirm_selected(self, frame) -> None:
+        self._ready = self._opened = True
+        self._drain()
+    
+    def _close_connection(self) -> None:
+        """Close the connection, the I/O loop stops once it is closed."""
+        connection = self.connection
+        if connection is None or connection.is_closing or connection.is_closed:
+            return
+        try:
+            connection.close()
+        except Exception as e:
+            self._log('warning', f"Closing the RabbitMQ connection failed: {e}")
+            connection.ioloop.stop()
+    
+    def _drain(self) -> None:
+        """Publish queued messages until batch_size of them are unconfirmed."""
+        if not self._ready:
+            return
+        while len(self._unconfirmed) < self.batch_size:
+            with self._messages_lock:
+                if not self._messages:
+                    return
+                message = self._messages.popleft()
+            routing_key, body, _ = message
+            try:
+                self.channel.basic_publish(
+                    exchange=self.exchange,
+                    routing_key=routing_key,
+                    body=body,
+                    properties=pika.BasicProperties(delivery_mode=2),
+                )
+            except Exception as e:
+                self._log('warning', f"Publishing an event failed, reconnecting: {e}")
+                self._requeue([message])
+                self._ready = False
+                self._close_connection()
+                return
+            self._delivery_tag += 1
+            self._unconfirmed[self._delivery_tag] = message
+    
+    def _on_confirm(self, frame) -> None:
+        """Settle the messages an ack or nack covers, publishing nacked ones again."""
+        method = frame.method
+        if method.multiple:
+            tags = [tag for tag in self._unconfirmed if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag] if method.delivery_tag in self._unconfirmed else []
+        messages = [self._unconfirmed.pop(tag) for tag in tags]
+        if isinstance(method, Basic.Nack):
+            retried = [(key, body, nacks + 1) for key, body, nacks in messages if nacks + 1 < self.max_attempts]
+            dropped = len(messages) - len(retried)
+            self._log('warning', f"Broker nacked {len(messages)} event(s), publishing {len(retried)} again")
+            if dropped:
+                self._log('error', f"Dropped {dropped} event(s) nacked {self.max_attempts} times")
+            self._requeue(retried)
+            self._settle(dropped)
+        else:
+            self._settle(len(messages))
+        self._drain()
+
+
+_publisher: Optional[EventPublisher] = None
+_publisher_pid: Optional[int] = None
+_publisher_lock = threading.Lock()
+
+
+def get_event_publisher(logger=None) -> EventPublisher:
+    """Get the event publisher for the current process.
+    
+    Celery prefork children inherit module state from the parent, but not
+    its threads or a usable socket, so the publisher is re-created whenever
+    the process id changes.
+    """
+    global _publisher, _publisher_pid
+    
+    with _publisher_lock:
+        if _publisher is None or _publisher_pid != os.getpid():
+            from src.configs.env import (
+                RABBITMQ_URL, RABBITMQ_TOPIC_TASKS, RABBITMQ_PUBLISH_BATCH_SIZE
+            )
+            _publisher = EventPublisher(
+                RABBITMQ_URL,
+                RABBITMQ_TOPIC_TASKS,
+                batch_size=RABBITMQ_PUBLISH_BATCH_SIZE,
+                logger=logger,
+            )
+            _publisher_pid = os.getpid()
+            atexit.register(_publisher.close)
+        return _publisher
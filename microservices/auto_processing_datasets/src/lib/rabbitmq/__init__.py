@@ -0,0 +1,3 @@
+from .EventPublisher import EventPublisher, get_event_publisher
+
+__all__ = ['EventPublisher', 'get_event_publisher']
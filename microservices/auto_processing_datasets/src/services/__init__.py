@@ -1,4 +1,4 @@
-from .reading_file import reading_file
+from .reading_file import reading_file, collect_dataset
 from .cleaning import cleaning
 from .calling_llm import calling_llm
 from .appending_columns import appending_columns
@@ -7,6 +7,7 @@ from .retry_step import retry_step
 
 __all__ = [
     'reading_file',
+    'collect_dataset',
     'cleaning',
     'calling_llm',
     'appending_columns',
@@ -1,7 +1,12 @@
 """Callback function for calling LLM API."""
+import hashlib
 import json
 import time
-from typing import Dict, List, Optional
+import threading
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
 import sys
 import os
 import pandas as pd
@@ -17,11 +22,36 @@ from src.configs.constants import (
     TASK_STATUS_SENDING_TO_LLM,
     TASK_STATUS_SENDING_TO_LLM_PROGRESS,
     TASK_STATUS_SENDING_TO_LLM_DONE,
+    LLM_PROMPT_VERSION,
 )
 from src.configs.env import (
     DEFAULT_PAGINATE_ROWS_LIMIT, DEFAULT_RETRY_REQUESTS,
-    MAX_PAGINATE_ROWS_LIMIT, MAX_RETRY_REQUESTS
+    MAX_PAGINATE_ROWS_LIMIT, MAX_RETRY_REQUESTS,
+    DEFAULT_MAX_CONCURRENT_REQUESTS, MAX_CONCURRENT_REQUESTS,
+    DEFAULT_BATCH_TOKEN_BUDGET, LLM_OUTPUT_TOKENS_PER_ROW, LLM_TARGET_BATCH_LATENCY,
+    LLM_BISECT_MIN_ROWS, LLM_COMPACT_OUTPUT_TOKENS_PER_ROW, DEFAULT_LLM_RESPONSE_FORMAT,
+    DEFAULT_LLM_TOPIC_MODE, LLM_TOPIC_VOCABULARY_SIZE, LLM_TOPIC_SAMPLE_ROWS,
+    LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT,
+    LOCAL_LLM_BACKEND, OLLAMA_KEEP_ALIVE
 )
+from src.lib.cache.base import BaseCache
+from src.lib.llm import (
+    BatchSizeController, CascadeClassifier, LlmCheckpoint, ModelHealthRegistry, NearDuplicateClusterer,
+    OllamaClient, RequestHedger, RetryPolicy, TokenEstimator, TopicCanonicalizer, create_near_duplicate_clusterer,
+    create_request_hedger, create_retry_policy, get_input_normalizer, get_llm_http_client,
+    get_model_health_registry, get_ollama_client, get_ollama_num_ctx, get_token_estimator, get_topic_canonicalizer
+)
+from src.utils.helpers import normalize_text_key, repair_truncated_json
+
+
+# Single-letter sentiment codes of the compact response format
+_COMPACT_SENTIMENTS = {'n': 'negative', 'u': 'neutral', 'p': 'positive'}
+
+# Topic id 0 of a topic vocabulary, for posts no topic fits
+_OTHER_TOPIC = 'other'
+
+# Keys of the JSON answers the prompts ask for (batch results and topic vocabularies)
+_ANSWER_KEYS = {'r', 'data', 'sentiment', 'analysis', 'priority', 'topic', 'topics'}
 
 
 def _is_external_model(model: dict, ai_config: dict) -> bool:
@@ -65,103 +95,110 @@ def _is_external_model(model: dict, ai_config: dict) -> bool:
     return False
 
 
-def _get_ai_model(ai_config: dict, tried_models: List[str] = None) -> Optional[dict]:
+def _model_candidates(ai_config: dict) -> List[dict]:
     """
-    Get the appropriate AI model based on configuration with fallback logic.
+    Get the models allowed by the configured mode, in preference order.
     
     Args:
         ai_config: AI configuration dictionary
-        tried_models: List of model UIDs that have already been tried
     
     Returns:
-        Model dictionary or None
+        Models with the default model of the mode first (external models
+        before local ones in automatic mode)
     """
-    if tried_models is None:
-        tried_models = []
-    
     preferences = ai_config.get('preferences', {})
     mode = preferences.get('mode', 'local')
+    external_models = ai_config.get('external', [])
+    local_models = ai_config.get('local', [])
     
-    if mode == 'automatic':
-        # Try external first
-        default_external_id = preferences.get('default_external_model_id')
-        external_models = ai_config.get('external', [])
-        
-        if default_external_id and external_models:
-            for model in external_models:
-                if model.get('uid') == default_external_id and model.get('uid') not in tried_models:
-                    return model
-        
-        # Fallback to other external models
-        for model in external_models:
-            if model.get('uid') not in tried_models:
-                return model
-        
-        # Fallback to local models
-        local_models = ai_config.get('local', [])
-        for model in local_models:
-            if model.get('uid') not in tried_models:
-                return model
+    def default_first(models: List[dict], default_id: Optional[str]) -> List[dict]:
+        return [m for m in models if default_id and m.get('uid') == default_id] + \
+            [m for m in models if not default_id or m.get('uid') != default_id]
     
+    if mode == 'automatic':
+        # Try external first, then fall back to local models
+        candidates = default_first(external_models, preferences.get('default_external_model_id')) + local_models
     elif mode == 'external':
-        external_models = ai_config.get('external', [])
-        default_external_id = preferences.get('default_external_model_id')
-        
-        if default_external_id and external_models:
-            for model in external_models:
-                if model.get('uid') == default_external_id and model.get('uid') not in tried_models:
-                    return model
-        
-        for model in external_models:
-            if model.get('uid') not in tried_models:
-                return model
-    
+        candidates = default_first(external_models, preferences.get('default_external_model_id'))
     elif mode == 'local':
-        local_models = ai_config.get('local', [])
-        default_local_id = preferences.get('default_local_model_id')
-        
-        if default_local_id and local_models:
-            for model in local_models:
-                if model.get('uid') == default_local_id and model.get('uid') not in tried_models:
-                    return model
-        
-        for model in local_models:
-            if model.get('uid') not in tried_models:
-                return model
+        candidates = default_first(local_models, preferences.get('default_local_model_id'))
+    else:
+        candidates = []
     
-    return None
+    unique = []
+    seen = set()
+    for model in candidates:
+        if model.get('uid') not in seen:
+            seen.add(model.get('uid'))
+            unique.append(model)
+    return unique
 
 
-def _call_llm_api(model: dict, texts: List[str], ai_config: dict, retry_count: int = 0) -> dict:
+def _get_ai_model(ai_config: dict, tried_models: List[str] = None,
+                  health: Optional[ModelHealthRegistry] = None) -> Optional[dict]:
     """
-    Call LLM API using OpenAI-compatible chat completions format.
-    Uses POST method with JSON body as per OpenAI API standard.
-    Works for both external and local models (as long as they support OpenAI-compatible API).
+    Get the appropriate AI model based on configuration with fallback logic.
+    
+    With a health registry, models whose circuit breaker is open are skipped
+    and healthy models are preferred over degraded ones (see
+    ModelHealthRegistry.pick). If every remaining breaker is open, the first
+    remaining model is used anyway rather than failing the task.
     
     Args:
-        model: Model configuration dictionary (should have baseUrl set to OpenAI-compatible endpoint)
-        texts: List of texts to analyze
-        ai_config: AI configuration dictionary (kept for compatibility, not used)
-        retry_count: Current retry attempt
+        ai_config: AI configuration dictionary
+        tried_models: List of model UIDs that have already been tried
+        health: Model health registry (optional)
     
     Returns:
-        Dictionary with analysis, priority, and topics arrays
+        Model dictionary or None
+    """
+    if tried_models is None:
+        tried_models = []
     
-    Note:
-        The baseUrl should be configured by the user to point to an OpenAI-compatible endpoint.
-        Example for Gemini: https://generativelanguage.googleapis.com/v1beta/openai
-        The function will automatically append /chat/completions to the baseUrl.
+    candidates = [m for m in _model_candidates(ai_config) if m.get('uid') not in tried_models]
+    if not candidates:
+        return None
+    if health is not None:
+        uid = health.pick([m.get('uid') for m in candidates])
+        if uid is None:
+            print(f"Every remaining model has an open circuit breaker, trying {candidates[0].get('uid')}")
+        for model in candidates:
+            if model.get('uid') == uid:
+                return model
+    return candidates[0]
+
+
+def _topic_list(topics: List[str]) -> str:
+    """Get a topic vocabulary as the JSON object of topics by id shown in prompts."""
+    return json.dumps({str(topic_id): topic for topic_id, topic in enumerate(topics)}, ensure_ascii=False)
+
+
+def _build_prompt(texts: List[str], topics: Optional[List[str]] = None) -> str:
     """
-    if requests is None:
-        raise ImportError("requests library is not installed. Run: pip install requests")
+    Build the classification prompt for a batch of texts.
     
-    base_url = model['data']['baseUrl']
-    api_key = model['data'].get('apiKey', '')
-    model_name = model['data']['model']
-    max_retries = min(model['data'].get('retryRequests', DEFAULT_RETRY_REQUESTS), MAX_RETRY_REQUESTS)
+    Args:
+        texts: List of texts to analyze
+        topics: Topic vocabulary to pick topic ids from (free topics if not given)
     
-    # Prepare prompt
-    prompt = f"""You are analyzing customer complaints/messages from social media posts from Twitter, where the user mentioned brand name or company name in telecommunication industry about the customer service, the company is Free Mobile located in France. For each post below, provide:
+    Returns:
+        Prompt asking for sentiment, priority and topic of every text
+    """
+    if topics:
+        return f"""You are analyzing customer complaints/messages from social media posts from Twitter, where the user mentioned brand name or company name in telecommunication industry about the customer service, the company is Free Mobile located in France. For each post below, provide:
+- sentiment: 'negative', 'neutral', or 'positive'
+- priority: 'high', 'normal', or 'low'
+- topic: id of the topic of the post in this list (0 if none fits): {_topic_list(topics)}
+
+I have a list of posts contaiing {len(texts)} posts.
+List of Posts:
+{json.dumps(texts, ensure_ascii=False)}
+
+Return only valid JSON in this exact format, with one value per post in each array:
+{{"data": {{"sentiment": [...], "priority": [...], "topic": [...]}}}}
+
+Where the topic array contains topic ids (numbers) from the list."""
+    return f"""You are analyzing customer complaints/messages from social media posts from Twitter, where the user mentioned brand name or company name in telecommunication industry about the customer service, the company is Free Mobile located in France. For each post below, provide:
 - sentiment: 'negative', 'neutral', or 'positive'
 - priority: 'high', 'normal', or 'low'
 - topic: main topic/subject of the post
@@ -183,374 +220,1754 @@ Where:
 - sentiment array which contains: 'negative', 'neutral', or 'positive' for each post
 - priority array contains: 'high', 'normal', or 'low' for each post
 - topic array contains: the main topic/subject for each post"""
+
+
+def _get_request_timeouts(model: dict) -> tuple[float, float]:
+    """
+    Get the (connect, read) timeouts of a model in seconds.
     
-    # Prepare headers
-    headers = {
-        'Content-Type': 'application/json',
-    }
-    if api_key:
-        headers['Authorization'] = f'Bearer {api_key}'
-    
-    # Use the baseUrl as configured by the user
-    # Append /chat/completions for OpenAI-compatible APIs
-    endpoint = base_url.rstrip('/')
-    
-    # Ensure the endpoint ends with /chat/completions for OpenAI-compatible APIs
-    if not endpoint.endswith('/chat/completions'):
-        # If it ends with /openai, append /chat/completions
-        if endpoint.endswith('/openai'):
-            endpoint = f"{endpoint}/chat/completions"
-        # If it doesn't have /chat/completions at all, append it
-        elif '/chat/completions' not in endpoint:
-            endpoint = f"{endpoint}/chat/completions"
-    
-    print(f"LLM API endpoint: {endpoint}")
-    
-    # Prepare OpenAI-compatible request body
-    # Format: {"model": "...", "messages": [{"role": "user", "content": "..."}], "response_format": {"type": "json_object"}}
-    request_body = {
-        "model": model_name,
-        "messages": [
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        "response_format": {"type": "json_object"}  # Request JSON format
-    }
+    Args:
+        model: Model configuration dictionary (``data.connectTimeout``, ``data.readTimeout``)
     
+    Returns:
+        Tuple of (connect timeout, read timeout)
+    """
+    data = model.get('data', {})
     try:
-        # Use POST method for OpenAI-compatible APIs
-        response = requests.post(
-            endpoint,
-            json=request_body,  # Use json parameter to automatically set Content-Type and serialize
-            headers=headers,
-            timeout=300  # 5 minute timeout for LLM requests
-        )
-        
-        # Check response status
-        response.raise_for_status()
-        
-        # Parse JSON response
-        response_data = response.json()
-        
-        # Handle OpenAI-compatible response format
-        # Expected format: {"choices": [{"message": {"content": "..."}}]}
-        if isinstance(response_data, dict):
-            # Extract content from OpenAI-compatible response
-            if 'choices' in response_data and len(response_data['choices']) > 0:
-                content = response_data['choices'][0].get('message', {}).get('content', '')
-                if content:
-                    # Parse the JSON content from the message
-                    try:
-                        parsed_content = json.loads(content.strip())
-                        return parsed_content
-                    except json.JSONDecodeError:
-                        # Try to extract JSON from text if wrapped
-                        import re
-                        json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                        if json_match:
-                            return json.loads(json_match.group())
-                        raise ValueError(f"Invalid JSON in response content: {content[:500]}")
-            # If not OpenAI format, return as-is (might be direct JSON response)
-            return response_data
-        elif isinstance(response_data, list):
-            return {'data': response_data}
-        elif isinstance(response_data, str):
-            # Try to parse JSON string
-            try:
-                parsed = json.loads(response_data.strip())
-                return parsed if isinstance(parsed, dict) else {'data': parsed}
-            except json.JSONDecodeError:
-                # Try to extract JSON from text
-                import re
-                json_match = re.search(r'\{.*\}', response_data, re.DOTALL)
-                if json_match:
-                    return json.loads(json_match.group())
-                raise ValueError(f"Invalid JSON response from external LLM: {response_data[:500]}")
-        else:
-            raise ValueError(f"Unexpected response type: {type(response_data)}")
+        connect = float(data.get('connectTimeout', LLM_CONNECT_TIMEOUT))
+        read = float(data.get('readTimeout', LLM_READ_TIMEOUT))
+    except (TypeError, ValueError):
+        connect, read = LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT
+    return connect, read
+
+
+def _build_compact_prompt(texts: List[str], topics: Optional[List[str]] = None) -> str:
+    """
+    Build the classification prompt asking for short answers keyed by row id.
     
-    except requests.exceptions.RequestException as e:
-        if retry_count < max_retries:
-            print(f"LLM API call failed (attempt {retry_count + 1}/{max_retries}): {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                try:
-                    error_detail = e.response.json()
-                    print(f"Error response: {error_detail}")
-                except:
-                    print(f"Error response text: {e.response.text[:500]}")
-            time.sleep(2 ** retry_count)  # Exponential backoff
-            return _call_llm_api(model, texts, ai_config, retry_count + 1)
-        else:
-            raise Exception(f"LLM API call failed after {max_retries} retries: {e}")
-    except Exception as e:
-        if retry_count < max_retries:
-            print(f"LLM API call failed (attempt {retry_count + 1}/{max_retries}): {e}")
-            time.sleep(2 ** retry_count)  # Exponential backoff
-            return _call_llm_api(model, texts, ai_config, retry_count + 1)
-        else:
-            raise Exception(f"LLM API call failed after {max_retries} retries: {e}")
+    Args:
+        texts: List of texts to analyze
+        topics: Topic vocabulary to pick topic ids from (free topics if not given)
+    
+    Returns:
+        Prompt asking for one [id, sentiment, priority, topic] tuple per text
+    """
+    posts = {str(position): text for position, text in enumerate(texts, start=1)}
+    if topics:
+        return f"""You are analyzing customer complaints/messages from social media posts from Twitter, where the user mentioned brand name or company name in telecommunication industry about the customer service, the company is Free Mobile located in France.
 
+Posts by id:
+{json.dumps(posts, ensure_ascii=False)}
 
-def calling_llm(file_id: str, df, ai_config: dict, event_emitter: callable, 
-                tried_models: List[str] = None) -> tuple[pd.DataFrame, str]:
+Topics by id:
+{_topic_list(topics)}
+
+For each post return one tuple [id, sentiment, priority, topic] where:
+- sentiment is n (negative), u (neutral) or p (positive)
+- priority is h (high), n (normal) or l (low)
+- topic is the id of the topic of the post (0 if none fits)
+
+Return only valid JSON in this exact format, one tuple per post:
+{{"r": [[1, "n", "h", 3], [2, "p", "l", 0]]}}"""
+    return f"""You are analyzing customer complaints/messages from social media posts from Twitter, where the user mentioned brand name or company name in telecommunication industry about the customer service, the company is Free Mobile located in France.
+
+Posts by id:
+{json.dumps(posts, ensure_ascii=False)}
+
+For each post return one tuple [id, sentiment, priority, topic] where:
+- sentiment is n (negative), u (neutral) or p (positive)
+- priority is h (high), n (normal) or l (low)
+- topic is the main topic/subject of the post, in a few words
+
+Return only valid JSON in this exact format, one tuple per post:
+{{"r": [[1, "n", "h", "network outage"], [2, "p", "l", "customer service"]]}}"""
+
+
+def _build_vocabulary_prompt(texts: List[str], size: int) -> str:
     """
-    Process dataset with LLM to add sentiment, priority, and topics.
+    Build the prompt asking for the topics covering a sample of posts.
     
     Args:
-        file_id: File identifier
-        df: DataFrame with 'full_text' column
+        texts: Sampled posts
+        size: Largest number of topics
+    
+    Returns:
+        Prompt asking for a list of at most size short topic labels
+    """
+    return f"""You are analyzing customer complaints/messages from social media posts from Twitter, where the user mentioned brand name or company name in telecommunication industry about the customer service, the company is Free Mobile located in France.
+
+Here is a sample of the posts:
+{json.dumps(texts, ensure_ascii=False)}
+
+List at most {size} topics, of a few words each, that together cover the subjects of these posts. Topics must not overlap; prefer general topics over topics that only fit one post.
+
+Return only valid JSON in this exact format:
+{{"topics": ["network outage", "billing", "customer service"]}}"""
+
+
+def _get_response_format(model: dict) -> str:
+    """Get the response format of a model: 'arrays' (three parallel arrays) or 'compact' (tuples by row id)."""
+    value = model.get('data', {}).get('responseFormat', DEFAULT_LLM_RESPONSE_FORMAT)
+    return 'compact' if value == 'compact' else 'arrays'
+
+
+def _normalize_texts(model: dict, texts: List[str]) -> List[str]:
+    """Shorten texts for a model's prompt when it normalises its input (see InputNormalizer)."""
+    normalizer = get_input_normalizer(model)
+    if normalizer is None:
+        return texts
+    return [normalizer.normalize(text) for text in texts]
+
+
+def _get_topic_mode(model: dict) -> str:
+    """Get the topic mode of a model: 'free' (written by the model) or 'vocabulary' (ids from a derived list)."""
+    value = model.get('data', {}).get('topicMode', DEFAULT_LLM_TOPIC_MODE)
+    return 'vocabulary' if value == 'vocabulary' else 'free'
+
+
+def _topic_label(value, topics: List[str]) -> str:
+    """Map a topic answer (an id, or a label of the vocabulary) to its label, 'other' when it is neither."""
+    try:
+        topic_id = int(value)
+    except (TypeError, ValueError, OverflowError):
+        folded = str(value).strip().casefold()
+        return next((topic for topic in topics if topic.casefold() == folded), topics[0])
+    return topics[topic_id] if 0 <= topic_id < len(topics) else topics[0]
+
+
+def _stratified_sample(texts: List[str], size: int, strata: int = 10) -> List[int]:
+    """
+    Pick texts spread over the dataset order and over text lengths.
+    
+    The texts are cut into consecutive strata, each giving its share of the
+    sample picked evenly over its texts sorted by length.
+    
+    Args:
+        texts: Texts to sample from
+        size: Sample size
+        strata: Number of strata
+    
+    Returns:
+        Sorted positions of the sampled texts
+    """
+    if len(texts) <= size:
+        return list(range(len(texts)))
+    strata = max(1, min(strata, size))
+    picks = []
+    for stratum in range(strata):
+        start, end = len(texts) * stratum // strata, len(texts) * (stratum + 1) // strata
+        quota = min(size * (stratum + 1) // strata - size * stratum // strata, end - start)
+        by_length = sorted(range(start, end), key=lambda position: len(str(texts[position])))
+        picks.extend(by_length[(2 * k + 1) * len(by_length) // (2 * quota)] for k in range(quota))
+    return sorted(picks)
+
+
+def _derive_topic_vocabulary(model: dict, texts: List[str], ai_config: dict,
+                             retry_policy: Optional[RetryPolicy] = None) -> List[str]:
+    """
+    Ask a model for the topics covering a stratified sample of the texts.
+    
+    The sample holds up to ``LLM_TOPIC_SAMPLE_ROWS`` texts, fewer when they
+    would not fit in the model's batch token budget.
+    
+    Args:
+        model: Model configuration dictionary
+        texts: Texts of the dataset
         ai_config: AI configuration dictionary
-        event_emitter: Function to emit events (file_id, event)
-        tried_models: List of model UIDs that have already been tried
+        retry_policy: Retry policy holding the task retry budget
     
     Returns:
-        Tuple of (DataFrame with new columns, model_uid used)
+        Topic vocabulary: 'other' (id 0) then at most LLM_TOPIC_VOCABULARY_SIZE topics
+    
+    Raises:
+        ValueError: If the answer holds no topics
     """
-    import pandas as pd
+    positions = _stratified_sample(texts, LLM_TOPIC_SAMPLE_ROWS)
+    sample = _normalize_texts(model, [texts[position] for position in positions])
+    token_budget = _get_batch_token_budget(model)
+    if token_budget > 0:
+        estimator = get_token_estimator(model)
+        available = max(1, token_budget - estimator.count(_build_vocabulary_prompt([], LLM_TOPIC_VOCABULARY_SIZE)))
+        cost = sum(estimator.count(str(text)) for text in sample)
+        if cost > available:
+            positions = _stratified_sample(texts, max(1, len(positions) * available // cost))
+            sample = _normalize_texts(model, [texts[position] for position in positions])
     
-    if tried_models is None:
-        tried_models = []
+    prompt = _build_vocabulary_prompt(sample, LLM_TOPIC_VOCABULARY_SIZE)
+    result = _send_prompt(model, prompt, ai_config, retry_policy)
+    labels = result.get('topics', result.get('data')) if isinstance(result, dict) else result
+    if isinstance(labels, dict):
+        labels = labels.get('topics')
     
-    if 'full_text' not in df.columns:
-        raise ValueError("Dataset must have 'full_text' column")
+    vocabulary = [_OTHER_TOPIC]
+    seen = {_OTHER_TOPIC}
+    for label in labels if isinstance(labels, list) else []:
+        label = ' '.join(str(label).split())
+        if label and label.casefold() not in seen and len(vocabulary) <= LLM_TOPIC_VOCABULARY_SIZE:
+            vocabulary.append(label)
+            seen.add(label.casefold())
+    if len(vocabulary) == 1:
+        raise ValueError(f"No topics in vocabulary answer: {str(result)[:200]}")
+    return vocabulary
+
+
+def _get_topic_vocabulary(model: dict, texts: List[str], ai_config: dict,
+                          checkpoint: Optional[LlmCheckpoint] = None,
+                          retry_policy: Optional[RetryPolicy] = None) -> Optional[List[str]]:
+    """
+    Get the topic vocabulary of a dataset, derived once and kept in its checkpoint.
     
-    # Emit LLM processing event
-    event_emitter(file_id, TASK_STATUS_SENDING_TO_LLM)
+    Returns:
+        Topic vocabulary, or None to fall back to free topics when it could not be derived
+    """
+    if checkpoint is not None:
+        try:
+            topics = checkpoint.get_topics()
+        except Exception as e:
+            print(f"Warning: LLM checkpoint read failed: {e}")
+            topics = None
+        if topics:
+            return topics
+    try:
+        topics = _derive_topic_vocabulary(model, texts, ai_config, retry_policy)
+    except Exception as e:
+        print(f"Warning: topic vocabulary could not be derived, using free topics: {e}")
+        return None
+    print(f"Derived topic vocabulary of {len(topics) - 1} topics: {topics[1:]}")
+    if checkpoint is not None:
+        try:
+            checkpoint.set_topics(topics)
+        except Exception as e:
+            print(f"Warning: LLM checkpoint write failed: {e}")
+    return topics
+
+
+def _is_answer(value) -> bool:
+    """Check that parsed JSON has the shape of an answer (a list, or a dict of answer keys)."""
+    return isinstance(value, list) or (isinstance(value, dict) and bool(_ANSWER_KEYS & set(value)))
+
+
+def _parse_json_content(content: str):
+    """
+    Parse the JSON answer of an LLM, salvaging what a truncated answer holds.
     
-    # Get AI model with fallback
-    model = _get_ai_model(ai_config, tried_models)
-    if not model:
-        raise ValueError("No AI model available")
+    Args:
+        content: Answer text (JSON, possibly wrapped in text or cut short)
     
-    model_uid = model.get('uid')
-    paginate_limit = min(
-        model['data'].get('paginateRowsLimit', DEFAULT_PAGINATE_ROWS_LIMIT),
-        MAX_PAGINATE_ROWS_LIMIT
-    )
+    Returns:
+        Parsed JSON value
+    
+    Raises:
+        ValueError: If no JSON could be recovered
+    """
+    try:
+        return json.loads(content.strip())
+    except json.JSONDecodeError:
+        pass
+    
+    # Wrapped in text or cut short: keep every complete element
+    repaired = repair_truncated_json(content, expected=_is_answer)
+    if repaired is not None:
+        try:
+            parsed = json.loads(repaired)
+        except json.JSONDecodeError:
+            parsed = None
+        if parsed is not None:
+            print(f"Recovered JSON from a wrapped or truncated LLM answer ({len(content)} chars)")
+            return parsed
+    raise ValueError(f"Invalid JSON in response content: {content[:500]}")
+
+
+def _call_llm_api(model: dict, texts: List[str], ai_config: dict,
+                 retry_policy: Optional[RetryPolicy] = None, topics: Optional[List[str]] = None) -> dict:
+    """
+    Call LLM API using OpenAI-compatible chat completions format.
+    Uses POST method with JSON body as per OpenAI API standard.
+    Models with ``backend: 'ollama'`` (and local models when
+    LOCAL_LLM_BACKEND is 'ollama') use the native Ollama API instead, see
+    _uses_ollama.
+    Models with ``normalizeInput`` get shortened texts (see InputNormalizer).
     
-    # Initialize new columns
-    sentiments = []
-    priorities = []
-    topics = []
+    Args:
+        model: Model configuration dictionary (should have baseUrl set to OpenAI-compatible endpoint)
+        texts: List of texts to analyze
+        ai_config: AI configuration dictionary (decides whether the model is local)
+        retry_policy: Retry policy holding the task retry budget (a fresh one if not given)
+        topics: Topic vocabulary the topics are picked from as ids (free topics if not given)
     
-    # Process in batches
-    total_rows = len(df)
-    num_batches = (total_rows + paginate_limit - 1) // paginate_limit
+    Returns:
+        Dictionary with analysis, priority, and topics arrays
     
-    print(f"Processing {total_rows} rows in {num_batches} batches of {paginate_limit}")
-    last_success_model = None
+    Note:
+        The baseUrl should be configured by the user to point to an OpenAI-compatible endpoint.
+        Example for Gemini: https://generativelanguage.googleapis.com/v1beta/openai
+        The function will automatically append /chat/completions to the baseUrl.
+    """
+    texts = _normalize_texts(model, texts)
+    if _get_response_format(model) == 'compact':
+        prompt = _build_compact_prompt(texts, topics)
+    else:
+        prompt = _build_prompt(texts, topics)
+    return _send_prompt(model, prompt, ai_config, retry_policy)
+
 
-    for i in range(0, total_rows, paginate_limit):
-        batch = df.iloc[i:i + paginate_limit]
-        texts = batch['full_text'].tolist()
+def _send_prompt(model: dict, prompt: str, ai_config: dict,
+                 retry_policy: Optional[RetryPolicy] = None) -> dict:
+    """
+    Send a prompt to a model and parse its JSON answer, retrying transient failures.
+    
+    Args:
+        model: Model configuration dictionary
+        prompt: User message
+        ai_config: AI configuration dictionary (decides whether the model is local)
+        retry_policy: Retry policy holding the task retry budget (a fresh one if not given)
+    
+    Returns:
+        Parsed JSON answer
+    """
+    if requests is None:
+        raise ImportError("requests library is not installed. Run: pip install requests")
+    
+    base_url = model['data']['baseUrl']
+    api_key = model['data'].get('apiKey', '')
+    model_name = model['data']['model']
+    max_retries = min(model['data'].get('retryRequests', DEFAULT_RETRY_REQUESTS), MAX_RETRY_REQUESTS)
+    
+    if _uses_ollama(model, ai_config):
+        # Ollama backend: native API keeping the model loaded between batches
+        client = get_ollama_client(base_url)
+        print(f"Ollama API endpoint: {client.base_url}/api/chat")
         
-        print(f"Processing batch {i // paginate_limit + 1}/{num_batches} ({len(texts)} rows)")
+        def send() -> dict:
+            return _request_ollama(client, model, prompt)
+    else:
+        # Prepare headers (Content-Type is set by the HTTP client)
+        headers = {}
+        if api_key:
+            headers['Authorization'] = f'Bearer {api_key}'
         
-        try:
-            result = _call_llm_api(model, texts, ai_config)
-            
-            # Log the result structure for debugging (first time only)
-            if i == 0:
-                print(f"Debug: LLM result type: {type(result)}, keys: {result.keys() if isinstance(result, dict) else 'N/A'}")
-            
-            # Extract results - handle multiple response formats
-            # Result can be: {data: {sentiment: [], priority: [], topic: []}} or {sentiment: [], priority: [], topic: []}
-            # Or sometimes just a list
-            if isinstance(result, list):
-                # If result is a list, it's unexpected - log and use defaults
-                print(f"Warning: LLM returned list instead of dict: {result[:3] if len(result) > 3 else result}")
-                batch_sentiments = []
-                batch_priorities = []
-                batch_topics = []
-            elif isinstance(result, dict):
-                # Handle dict format
-                data = result.get('data', result)  # Support both {data: {...}} and {...} formats
-                if isinstance(data, dict):
-                    batch_sentiments = data.get('sentiment', data.get('analysis', []))
-                    batch_priorities = data.get('priority', [])
-                    batch_topics = data.get('topic', data.get('topics', []))
-                    # Log if we got empty results
-                    if not batch_sentiments and not batch_priorities and not batch_topics:
-                        print(f"Warning: Empty results from LLM. Result keys: {result.keys()}, Data keys: {data.keys() if isinstance(data, dict) else 'N/A'}")
-                elif isinstance(data, list):
-                    # If data is a list, attempt to aggregate per-row objects
-                    print(f"Info: LLM returned list in data field: {data[:2] if len(data) > 2 else data}")
-                    aggregated_sentiments = []
-                    aggregated_priorities = []
-                    aggregated_topics = []
-
-                    for item in data:
-                        if isinstance(item, dict):
-                            sentiment_value = item.get('sentiment')
-                            priority_value = item.get('priority')
-                            topic_value = item.get('topic') or item.get('topics')
-
-                            if isinstance(sentiment_value, list):
-                                aggregated_sentiments.extend(sentiment_value)
-                            elif sentiment_value is not None:
-                                aggregated_sentiments.append(sentiment_value)
-
-                            if isinstance(priority_value, list):
-                                aggregated_priorities.extend(priority_value)
-                            elif priority_value is not None:
-                                aggregated_priorities.append(priority_value)
-
-                            if isinstance(topic_value, list):
-                                aggregated_topics.extend(topic_value)
-                            elif topic_value is not None:
-                                aggregated_topics.append(topic_value)
-                        else:
-                            # Attempt to coerce non-dict entries
-                            if item is not None:
-                                aggregated_sentiments.append(str(item))
-
-                    batch_sentiments = aggregated_sentiments
-                    batch_priorities = aggregated_priorities
-                    batch_topics = aggregated_topics
-                else:
-                    print(f"Warning: Unexpected data type in result: {type(data)}")
-                    batch_sentiments = []
-                    batch_priorities = []
-                    batch_topics = []
-            else:
-                # Unexpected type
-                print(f"Warning: Unexpected result type: {type(result)}, value: {str(result)[:200]}")
-                batch_sentiments = []
-                batch_priorities = []
-                batch_topics = []
-            
-            # Ensure we have lists
-            if not isinstance(batch_sentiments, list):
-                print(f"Warning: batch_sentiments is not a list: {type(batch_sentiments)}")
-                batch_sentiments = []
-            if not isinstance(batch_priorities, list):
-                print(f"Warning: batch_priorities is not a list: {type(batch_priorities)}")
-                batch_priorities = []
-            if not isinstance(batch_topics, list):
-                print(f"Warning: batch_topics is not a list: {type(batch_topics)}")
-                batch_topics = []
-            
-            # If we have empty results, this is an error - raise exception to trigger fallback
-            if not batch_sentiments and not batch_priorities and not batch_topics:
-                raise ValueError(f"Empty results from LLM. Expected arrays but got empty lists. Result structure: {type(result)}")
-            
-            # Normalize priority values (high/normal/low to 2/1/0)
-            normalized_priorities = []
-            for p in batch_priorities:
-                if isinstance(p, str):
-                    if p.lower() in ['high', 'h']:
-                        normalized_priorities.append(2)
-                    elif p.lower() in ['normal', 'medium', 'm', 'n']:
-                        normalized_priorities.append(1)
-                    elif p.lower() in ['low', 'l']:
-                        normalized_priorities.append(0)
-                    else:
-                        normalized_priorities.append(1)  # default to normal
-                else:
-                    normalized_priorities.append(int(p) if isinstance(p, (int, float)) else 1)
-            
-            batch_priorities = normalized_priorities
-            
-            # Ensure all arrays have the same length
-            batch_size = len(texts)
-            while len(batch_sentiments) < batch_size:
-                batch_sentiments.append('neutral')
-            while len(batch_priorities) < batch_size:
-                batch_priorities.append(0)
-            while len(batch_topics) < batch_size:
-                batch_topics.append('general')
-            
-            sentiments.extend(batch_sentiments[:batch_size])
-            priorities.extend(batch_priorities[:batch_size])
-            topics.extend(batch_topics[:batch_size])
-            last_success_model = model_uid
-
-            # Calculate progress information
-            current_batch = (i // paginate_limit) + 1
-            rows_processed = min(i + batch_size, total_rows)
-            progress_percentage = int((rows_processed / total_rows) * 100) if total_rows > 0 else 0
-            
-            # Emit progression event with detailed information
-            event_emitter(
-                file_id,
-                TASK_STATUS_SENDING_TO_LLM_PROGRESS,
+        # Use the baseUrl as configured by the user
+        # Append /chat/completions for OpenAI-compatible APIs
+        endpoint = base_url.rstrip('/')
+        
+        # Ensure the endpoint ends with /chat/completions for OpenAI-compatible APIs
+        if not endpoint.endswith('/chat/completions'):
+            # If it ends with /openai, append /chat/completions
+            if endpoint.endswith('/openai'):
+                endpoint = f"{endpoint}/chat/completions"
+            # If it doesn't have /chat/completions at all, append it
+            elif '/chat/completions' not in endpoint:
+                endpoint = f"{endpoint}/chat/completions"
+        
+        print(f"LLM API endpoint: {endpoint}")
+        
+        # Prepare OpenAI-compatible request body
+        # Format: {"model": "...", "messages": [{"role": "user", "content": "..."}], "response_format": {"type": "json_object"}}
+        request_body = {
+            "model": model_name,
+            "messages": [
                 {
-                    'batch': current_batch,
-                    'total_batches': num_batches,
-                    'batch_size': batch_size,
-                    'total_rows': total_rows,
-                    'rows_processed': rows_processed,
-                    'rows_remaining': max(0, total_rows - rows_processed),
-                    'progress_percentage': progress_percentage,
-                    'current_row_index': i + 1,  # 1-indexed starting row
-                    'current_row_end': rows_processed,  # Ending row index (inclusive)
-                    'model_uid': model_uid,
+                    "role": "user",
+                    "content": prompt
                 }
-            )
+            ],
+            "response_format": {"type": "json_object"}  # Request JSON format
+        }
         
-        except Exception as e:
-            print(f"Error processing batch with model {model_uid}: {e}")
-            # Try next model if available
-            tried_models.append(model_uid)
-            next_model = _get_ai_model(ai_config, tried_models)
-            
-            if next_model:
-                print(f"Trying fallback model: {next_model.get('uid')}")
-                model = next_model
-                model_uid = model.get('uid')
-                # Retry this batch with new model
-                i -= paginate_limit  # Retry this batch
-                continue
-            else:
-                # No more models, fill with defaults
-                batch_size = len(texts)
-                sentiments.extend(['neutral'] * batch_size)
-                priorities.extend([0] * batch_size)
-                topics.extend(['general'] * batch_size)
-                fallback_model = model_uid or 'default'
-                last_success_model = fallback_model
-                
-                # Calculate progress information for fallback
-                current_batch = (i // paginate_limit) + 1
-                rows_processed = min(i + batch_size, total_rows)
-                progress_percentage = int((rows_processed / total_rows) * 100) if total_rows > 0 else 0
-                
-                event_emitter(
-                    file_id,
-                    TASK_STATUS_SENDING_TO_LLM_PROGRESS,
-                    {
-                        'batch': current_batch,
-                        'total_batches': num_batches,
-                        'batch_size': batch_size,
-                        'total_rows': total_rows,
-                        'rows_processed': rows_processed,
-                        'rows_remaining': max(0, total_rows - rows_processed),
-                        'progress_percentage': progress_percentage,
-                        'current_row_index': i + 1,
-                        'current_row_end': rows_processed,
-                        'model_uid': fallback_model,
-                        'fallback_used': True,
-                    }
-                )
+        def send() -> dict:
+            return _request_llm(model, endpoint, request_body, headers)
     
-    # Add columns to dataframe (use main_topic as column name)
-    df['sentiment'] = sentiments[:total_rows]
-    df['priority'] = priorities[:total_rows]
-    df['main_topic'] = topics[:total_rows]  # Column name is main_topic
+    if retry_policy is None:
+        retry_policy = create_retry_policy()
+    retry_count = 0
+    delay = 0.0
     
-    print(f"Added columns: sentiment, priority, main_topic")
+    while True:
+        try:
+            return send()
+        except Exception as e:
+            if requests is not None and isinstance(e, requests.exceptions.RequestException) \
+                    and getattr(e, 'response', None) is not None:
+                try:
+                    print(f"Error response: {e.response.json()}")
+                except Exception:
+                    print(f"Error response text: {e.response.text[:500]}")
+            delay = retry_policy.next_delay(e, retry_count, max_retries, delay)
+            if delay is None:
+                raise Exception(f"LLM API call failed after {retry_count + 1} attempt(s): {e}") from e
+            print(f"LLM API call failed ({retry_policy.classify(e)}, attempt {retry_count + 1}/{max_retries + 1}), "
+                  f"retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+            retry_count += 1
+
+
+def _uses_ollama(model: dict, ai_config: dict) -> bool:
+    """
+    Check whether a model is called through the native Ollama API.
     
-    event_emitter(
-        file_id,
-        TASK_STATUS_SENDING_TO_LLM_DONE,
-        {
-            'total_rows': total_rows,
-            'total_batches': num_batches,
-            'model_uid': last_success_model or model_uid,
-        }
-    )
+    Args:
+        model: Model configuration dictionary (``data.backend`` overrides the default)
+        ai_config: AI configuration dictionary
     
-    return df, model_uid
+    Returns:
+        True for models with backend 'ollama', or local models without a backend when LOCAL_LLM_BACKEND is 'ollama'
+    """
+    backend = model.get('data', {}).get('backend')
+    if not backend:
+        backend = 'openai' if _is_external_model(model, ai_config or {}) else LOCAL_LLM_BACKEND
+    return str(backend).lower() == 'ollama'
+
 
+def _request_ollama(client: OllamaClient, model: dict, prompt: str) -> dict:
+    """
+    Send one chat request to the native Ollama API and parse the answer.
+    
+    Args:
+        client: Ollama client of the model's server
+        model: Model configuration dictionary (``data.keepAlive``, ``data.numCtx``)
+        prompt: Classification prompt
+    
+    Returns:
+        Parsed JSON answer
+    """
+    content, done_reason = client.chat(
+        model['data']['model'],
+        prompt,
+        model['data'].get('keepAlive', OLLAMA_KEEP_ALIVE),
+        get_ollama_num_ctx(model),
+        timeout=_get_request_timeouts(model),
+    )
+    if done_reason == 'length':
+        print(f"Warning: answer of model {model.get('uid')} stopped at its length limit")
+    if not content:
+        raise ValueError("Empty answer from Ollama")
+    return _parse_json_content(content)
+
+
+def _request_llm(model: dict, endpoint: str, request_body: dict, headers: dict) -> dict:
+    """
+    Send one chat completions request and parse the answer.
+    
+    Args:
+        model: Model configuration dictionary
+        endpoint: Chat completions URL
+        request_body: OpenAI-compatible request body
+        headers: Extra request headers
+    
+    Returns:
+        Parsed JSON answer
+    """
+    # Use POST method for OpenAI-compatible APIs, over the endpoint's pooled connections
+    response = get_llm_http_client(endpoint).post_json(
+        endpoint,
+        request_body,
+        headers=headers,
+        timeout=_get_request_timeouts(model),
+        compress=bool(model['data'].get('gzipRequests', False)),
+    )
+    
+    # Check response status
+    response.raise_for_status()
+    
+    # Parse JSON response
+    response_data = response.json()
+    
+    # Handle OpenAI-compatible response format
+    # Expected format: {"choices": [{"message": {"content": "..."}}]}
+    if isinstance(response_data, dict):
+        # Extract content from OpenAI-compatible response
+        if 'choices' in response_data and len(response_data['choices']) > 0:
+            content = response_data['choices'][0].get('message', {}).get('content', '')
+            if content:
+                # Parse the JSON content from the message
+                return _parse_json_content(content)
+        # If not OpenAI format, return as-is (might be direct JSON response)
+        return response_data
+    elif isinstance(response_data, list):
+        return {'data': response_data}
+    elif isinstance(response_data, str):
+        # Try to parse JSON string
+        parsed = _parse_json_content(response_data)
+        return parsed if isinstance(parsed, dict) else {'data': parsed}
+    else:
+        raise ValueError(f"Unexpected response type: {type(response_data)}")
+
+
+def _normalize_priority(value) -> int:
+    """Map a priority answer (high/normal/low, their initials or a number) to 2/1/0."""
+    if isinstance(value, str):
+        if value.lower() in ['high', 'h']:
+            return 2
+        elif value.lower() in ['normal', 'medium', 'm', 'n']:
+            return 1
+        elif value.lower() in ['low', 'l']:
+            return 0
+        return 1  # default to normal
+    return int(value) if isinstance(value, (int, float)) else 1
+
+
+def _parse_compact_result(result, batch_size: int) -> tuple[list, list, list, List[bool]]:
+    """
+    Extract sentiment, priority and topic lists from a compact (row id keyed) LLM result.
+    
+    Args:
+        result: Parsed LLM response, ``{"r": [[id, sentiment, priority, topic], ...]}``
+        batch_size: Number of posts sent in the batch
+    
+    Returns:
+        Tuple of (sentiments, priorities, topics, answered), each of batch_size
+        items; answered tells which posts got an answer (others hold defaults)
+    
+    Raises:
+        ValueError: If the result does not contain any answer
+    """
+    rows = result
+    if isinstance(result, dict):
+        rows = result.get('r', result.get('data', []))
+    if not isinstance(rows, list) or not rows:
+        raise ValueError(f"Empty results from LLM. Expected answers by id but got: {str(result)[:200]}")
+    
+    sentiments = ['neutral'] * batch_size
+    priorities = [0] * batch_size
+    topics = ['general'] * batch_size
+    answered = [False] * batch_size
+    for row in rows:
+        if isinstance(row, dict):
+            row = [row.get('id'), row.get('s'), row.get('p'), row.get('t')]
+        if not isinstance(row, list) or len(row) < 4:
+            continue
+        try:
+            position = int(row[0]) - 1
+        except (TypeError, ValueError):
+            continue
+        if not 0 <= position < batch_size or answered[position]:
+            continue
+        sentiment = str(row[1]).lower()
+        sentiments[position] = _COMPACT_SENTIMENTS.get(sentiment, sentiment)
+        priorities[position] = _normalize_priority(row[2])
+        topics[position] = row[3]
+        answered[position] = True
+    
+    return sentiments, priorities, topics, answered
+
+
+def _parse_answer(model: dict, result, batch_size: int,
+                  vocabulary: Optional[List[str]] = None) -> tuple[list, list, list, List[bool], bool]:
+    """
+    Extract the answers of a batch in the response format of the model.
+    
+    Args:
+        model: Model that answered
+        result: Parsed LLM response
+        batch_size: Number of posts sent in the batch
+        vocabulary: Topic vocabulary the topic ids refer to (free topics if not given)
+    
+    Returns:
+        Tuple of (sentiments, priorities, topics, answered, complete)
+    """
+    if _get_response_format(model) == 'compact':
+        sentiments, priorities, topics, answered = _parse_compact_result(result, batch_size)
+        rows = result.get('r', result.get('data')) if isinstance(result, dict) else result
+        complete = all(answered) and len(rows) == batch_size
+    else:
+        sentiments, priorities, topics, received, complete = _parse_llm_result(result, batch_size)
+        answered = [position < received for position in range(batch_size)]
+    if vocabulary:
+        topics = [_topic_label(topic, vocabulary) for topic in topics]
+    return sentiments, priorities, topics, answered, complete
+
+
+def _parse_llm_result(result, batch_size: int) -> tuple[list, list, list, int, bool]:
+    """
+    Extract sentiment, priority and topic lists from an LLM result.
+    
+    Args:
+        result: Parsed LLM response (dict or list)
+        batch_size: Number of posts sent in the batch
+    
+    Returns:
+        Tuple of (sentiments, priorities, topics, received, complete): each list
+        padded/truncated to batch_size, received the number of leading posts that
+        got all three answers, complete False when the arrays did not match the batch
+    
+    Raises:
+        ValueError: If the result does not contain any usable arrays
+    """
+    # Extract results - handle multiple response formats
+    # Result can be: {data: {sentiment: [], priority: [], topic: []}} or {sentiment: [], priority: [], topic: []}
+    # Or sometimes just a list
+    if isinstance(result, list):
+        # If result is a list, it's unexpected - log and use defaults
+        print(f"Warning: LLM returned list instead of dict: {result[:3] if len(result) > 3 else result}")
+        batch_sentiments = []
+        batch_priorities = []
+        batch_topics = []
+    elif isinstance(result, dict):
+        # Handle dict format
+        data = result.get('data', result)  # Support both {data: {...}} and {...} formats
+        if isinstance(data, dict):
+            batch_sentiments = data.get('sentiment', data.get('analysis', []))
+            batch_priorities = data.get('priority', [])
+            batch_topics = data.get('topic', data.get('topics', []))
+            # Log if we got empty results
+            if not batch_sentiments and not batch_priorities and not batch_topics:
+                print(f"Warning: Empty results from LLM. Result keys: {result.keys()}, Data keys: {data.keys() if isinstance(data, dict) else 'N/A'}")
+        elif isinstance(data, list):
+            # If data is a list, attempt to aggregate per-row objects
+            print(f"Info: LLM returned list in data field: {data[:2] if len(data) > 2 else data}")
+            aggregated_sentiments = []
+            aggregated_priorities = []
+            aggregated_topics = []
+
+            for item in data:
+                if isinstance(item, dict):
+                    sentiment_value = item.get('sentiment')
+                    priority_value = item.get('priority')
+                    topic_value = item.get('topic') or item.get('topics')
+
+                    if isinstance(sentiment_value, list):
+                        aggregated_sentiments.extend(sentiment_value)
+                    elif sentiment_value is not None:
+                        aggregated_sentiments.append(sentiment_value)
+
+                    if isinstance(priority_value, list):
+                        aggregated_priorities.extend(priority_value)
+                    elif priority_value is not None:
+                        aggregated_priorities.append(priority_value)
+
+                    if isinstance(topic_value, list):
+                        aggregated_topics.extend(topic_value)
+                    elif topic_value is not None:
+                        aggregated_topics.append(topic_value)
+                else:
+                    # Attempt to coerce non-dict entries
+                    if item is not None:
+                        aggregated_sentiments.append(str(item))
+
+            batch_sentiments = aggregated_sentiments
+            batch_priorities = aggregated_priorities
+            batch_topics = aggregated_topics
+        else:
+            print(f"Warning: Unexpected data type in result: {type(data)}")
+            batch_sentiments = []
+            batch_priorities = []
+            batch_topics = []
+    else:
+        # Unexpected type
+        print(f"Warning: Unexpected result type: {type(result)}, value: {str(result)[:200]}")
+        batch_sentiments = []
+        batch_priorities = []
+        batch_topics = []
+    
+    # Ensure we have lists
+    if not isinstance(batch_sentiments, list):
+        print(f"Warning: batch_sentiments is not a list: {type(batch_sentiments)}")
+        batch_sentiments = []
+    if not isinstance(batch_priorities, list):
+        print(f"Warning: batch_priorities is not a list: {type(batch_priorities)}")
+        batch_priorities = []
+    if not isinstance(batch_topics, list):
+        print(f"Warning: batch_topics is not a list: {type(batch_topics)}")
+        batch_topics = []
+    
+    # If we have empty results, this is an error - raise exception to trigger fallback
+    if not batch_sentiments and not batch_priorities and not batch_topics:
+        raise ValueError(f"Empty results from LLM. Expected arrays but got empty lists. Result structure: {type(result)}")
+    
+    # Normalize priority values (high/normal/low to 2/1/0)
+    batch_priorities = [_normalize_priority(p) for p in batch_priorities]
+    
+    # Missing or extra answers mean a truncated or misaligned response
+    complete = len(batch_sentiments) == len(batch_priorities) == len(batch_topics) == batch_size
+    received = min(len(batch_sentiments), len(batch_priorities), len(batch_topics), batch_size)
+    
+    # Ensure all arrays have the same length
+    while len(batch_sentiments) < batch_size:
+        batch_sentiments.append('neutral')
+    while len(batch_priorities) < batch_size:
+        batch_priorities.append(0)
+    while len(batch_topics) < batch_size:
+        batch_topics.append('general')
+    
+    return batch_sentiments[:batch_size], batch_priorities[:batch_size], batch_topics[:batch_size], received, complete
+
+
+def _get_max_in_flight(model: dict) -> int:
+    """
+    Get the maximum number of concurrent requests allowed for a model.
+    
+    Args:
+        model: Model configuration dictionary
+    
+    Returns:
+        Number of batches that may be in flight for this model (at least 1)
+    """
+    value = model.get('data', {}).get('maxConcurrentRequests', DEFAULT_MAX_CONCURRENT_REQUESTS)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        value = DEFAULT_MAX_CONCURRENT_REQUESTS
+    return max(1, min(value, MAX_CONCURRENT_REQUESTS))
+
+
+def _get_batch_token_budget(model: dict) -> int:
+    """
+    Get the token budget of one request for a model.
+    
+    Args:
+        model: Model configuration dictionary
+    
+    Returns:
+        Tokens allowed per request, prompt and answer included (0 = pack by row count only)
+    """
+    value = model.get('data', {}).get('maxBatchTokens', DEFAULT_BATCH_TOKEN_BUDGET)
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return DEFAULT_BATCH_TOKEN_BUDGET
+
+
+def _pack_batches(indices: List[int], costs: List[int], budget: int, max_rows: int) -> List[List[int]]:
+    """
+    Pack items into consecutive batches bounded by a token budget and a row count.
+    
+    Items keep their order. An item costing more than the budget on its own
+    still gets a batch of its own.
+    
+    Args:
+        indices: Items to pack
+        costs: Estimated tokens of each item (same order as indices)
+        budget: Tokens available per batch for items (0 = no token limit)
+        max_rows: Maximum number of items per batch
+    
+    Returns:
+        List of batches of items
+    """
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    used = 0
+    for index, cost in zip(indices, costs):
+        if batch and (len(batch) >= max_rows or (budget > 0 and used + cost > budget)):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(index)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _get_batch_size_controller(model: dict, initial: int) -> BatchSizeController:
+    """
+    Create the adaptive batch size controller for a model.
+    
+    The size starts at initial and moves between ``data.minBatchRows``
+    (default 1) and ``data.maxBatchRows`` (default initial, capped by
+    MAX_PAGINATE_ROWS_LIMIT); answers slower than ``data.targetBatchLatency``
+    seconds (default LLM_TARGET_BATCH_LATENCY) shrink it.
+    
+    Args:
+        model: Model configuration dictionary
+        initial: Starting batch size
+    
+    Returns:
+        BatchSizeController instance
+    """
+    data = model.get('data', {})
+    try:
+        min_size = int(data.get('minBatchRows', 1))
+        max_size = min(int(data.get('maxBatchRows', initial)), MAX_PAGINATE_ROWS_LIMIT)
+        target_latency = float(data.get('targetBatchLatency', LLM_TARGET_BATCH_LATENCY))
+    except (TypeError, ValueError):
+        min_size, max_size, target_latency = 1, initial, LLM_TARGET_BATCH_LATENCY
+    return BatchSizeController(initial, min_size, max_size, target_latency)
+
+
+def _row_token_costs(estimator: TokenEstimator, texts: List[str], response_format: str = 'arrays') -> List[int]:
+    """Estimate the tokens each text adds to a request: the quoted text in the prompt and its answer."""
+    if response_format == 'compact':
+        # Quoted text with its id, and one short tuple per text
+        return [
+            estimator.count(json.dumps(text, ensure_ascii=False)) + 4 + LLM_COMPACT_OUTPUT_TOKENS_PER_ROW
+            for text in texts
+        ]
+    return [
+        estimator.count(json.dumps(text, ensure_ascii=False)) + 1 + LLM_OUTPUT_TOKENS_PER_ROW
+        for text in texts
+    ]
+
+
+class _ModelSelector:
+    """Thread-safe holder of the model used for new batches, with fallback on failure."""
+    
+    def __init__(self, ai_config: dict, tried_models: List[str], model: dict,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 health: Optional[ModelHealthRegistry] = None,
+                 hedger: Optional[RequestHedger] = None,
+                 topics: Optional[List[str]] = None):
+        self.ai_config = ai_config
+        self.tried_models = tried_models
+        self.model = model
+        self.retry_policy = retry_policy or create_retry_policy()
+        self.health = health
+        self.hedger = hedger
+        self.topics = topics
+        self.lock = threading.Lock()
+        self._slots: Dict[str, threading.Semaphore] = {}
+    
+    def current(self) -> Optional[dict]:
+        """Get the model new batches should start with."""
+        with self.lock:
+            return self.model
+    
+    def fail(self, model: dict) -> Optional[dict]:
+        """
+        Mark a model as failed and get the model to retry with.
+        
+        Args:
+            model: Model that failed
+        
+        Returns:
+            Next model to try, or None if all candidates have been tried
+        """
+        with self.lock:
+            model_uid = model.get('uid')
+            if model_uid not in self.tried_models:
+                self.tried_models.append(model_uid)
+            # Only move on if the shared model is the one that failed;
+            # another batch may already have switched to a fallback
+            if self.model is not None and self.model.get('uid') in self.tried_models:
+                next_model = _get_ai_model(self.ai_config, self.tried_models, self.health)
+                if next_model is not None and next_model.get('uid') in self.tried_models:
+                    next_model = None
+                self.model = next_model
+            return self.model
+    
+    def next_model(self, skipped: List[str]) -> Optional[dict]:
+        """
+        Get a model to retry some texts with, without moving other batches.
+        
+        Args:
+            skipped: Model UIDs that already failed on these texts
+        
+        Returns:
+            Next model to try, or None if all candidates have been tried
+        """
+        with self.lock:
+            return _get_ai_model(self.ai_config, self.tried_models + skipped, self.health)
+    
+    def slot(self, model: dict) -> threading.Semaphore:
+        """Get the semaphore bounding in-flight requests for a model."""
+        with self.lock:
+            model_uid = model.get('uid')
+            if model_uid not in self._slots:
+                self._slots[model_uid] = threading.Semaphore(_get_max_in_flight(model))
+            return self._slots[model_uid]
+
+
+def _is_batch_error(error: Exception) -> bool:
+    """
+    Check whether an LLM failure comes from the texts sent rather than the model.
+    
+    Malformed or empty answers and requests rejected as invalid or too large
+    point at the content of the batch; connection errors, timeouts and server
+    errors point at the model.
+    
+    Args:
+        error: Exception raised while classifying a batch
+    
+    Returns:
+        True if sending fewer texts may succeed
+    """
+    cause = error.__cause__ or error
+    if isinstance(cause, ValueError):
+        return True
+    response = getattr(cause, 'response', None)
+    return response is not None and getattr(response, 'status_code', None) in (400, 413, 422)
+
+
+def _merge_batch_results(parts: List[dict], latency: float) -> dict:
+    """Join the results of consecutive parts of a split batch."""
+    return {
+        'sentiment': [value for part in parts for value in part['sentiment']],
+        'priority': [value for part in parts for value in part['priority']],
+        'topic': [value for part in parts for value in part['topic']],
+        'row_models': [value for part in parts for value in part['row_models']],
+        'model_uid': parts[-1]['model_uid'],
+        'fallback_used': any(part['fallback_used'] for part in parts),
+        'latency': latency + sum(part['latency'] for part in parts),
+        'healthy': False,
+    }
+
+
+def _fill_missing(batch_result: dict, missing: List[int], followup: dict) -> dict:
+    """Put the result of a follow-up request for the missing posts back in their positions."""
+    for key in ('sentiment', 'priority', 'topic', 'row_models'):
+        for position, value in zip(missing, followup[key]):
+            batch_result[key][position] = value
+    batch_result['model_uid'] = followup['model_uid']
+    batch_result['fallback_used'] = followup['fallback_used']
+    batch_result['latency'] += followup['latency']
+    batch_result['healthy'] = False
+    return batch_result
+
+
+def _call_with_hedge(selector: _ModelSelector, model: dict, texts: List[str], ai_config: dict) -> tuple:
+    """
+    Call a model, hedging on the next model when the answer is slow.
+    
+    Without hedging (no hedger, or ``data.hedgeRequests`` not set on the
+    model) this is a plain call. Otherwise, if no answer has arrived after
+    the hedger's latency percentile and the hedge cap allows it, the same
+    texts are sent to the next candidate model and the first answer wins;
+    the other request is cancelled if not started yet, or its answer is
+    discarded. If both fail, the error of the original request is raised.
+    The model health of a request whose answer is not used (failed, or left
+    running when the other one won) is recorded here, the caller only
+    records the winner.
+    
+    Args:
+        selector: Shared model selector
+        model: Model to call
+        texts: List of texts in the batch
+        ai_config: AI configuration dictionary
+    
+    Returns:
+        Tuple of (model that answered, raw answer)
+    """
+    hedger = selector.hedger
+    # Models that were actually called (the backup may find no free slot)
+    called = set()
+    
+    def attempt(candidate: dict, blocking: bool = True) -> dict:
+        slot = selector.slot(candidate)
+        if not slot.acquire(blocking=blocking):
+            raise RuntimeError(f"No request slot free on model {candidate.get('uid')}")
+        called.add(candidate.get('uid'))
+        try:
+            return _call_llm_api(candidate, texts, ai_config, retry_policy=selector.retry_policy,
+                                 topics=selector.topics)
+        finally:
+            slot.release()
+    
+    delay = hedger.delay() if hedger is not None and model['data'].get('hedgeRequests') else None
+    started = time.monotonic()
+    if delay is None:
+        result = attempt(model)
+        if hedger is not None:
+            hedger.record(time.monotonic() - started)
+        return model, result
+    
+    primary = hedger.submit(attempt, model)
+    done, _ = wait([primary], timeout=delay)
+    backup_model = None
+    if not done:
+        backup_model = selector.next_model([model.get('uid')])
+    if backup_model is None or not hedger.acquire():
+        result = primary.result()
+        hedger.record(time.monotonic() - started)
+        return model, result
+    
+    def record_outcome(future, candidate: dict) -> None:
+        # Model failures count against the model's breaker, like in _process_batch
+        if selector.health is None or future.cancelled() or candidate.get('uid') not in called:
+            return
+        error = future.exception()
+        if error is None:
+            selector.health.record_success(candidate.get('uid'), time.monotonic() - started)
+        elif not _is_batch_error(error):
+            selector.health.record_failure(candidate.get('uid'))
+    
+    print(f"No answer from model {model.get('uid')} after {delay:.1f}s, "
+          f"hedging {len(texts)} texts on model {backup_model.get('uid')}")
+    futures = {primary: model, hedger.submit(attempt, backup_model, False): backup_model}
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                if future is primary:
+                    # Recorded by the caller if the backup fails too
+                    error = e
+                else:
+                    record_outcome(future, futures[future])
+                continue
+            if error is not None:
+                record_outcome(primary, model)
+            for loser in pending:
+                # A request already running can't be cancelled, its outcome is recorded when it ends
+                if not loser.cancel():
+                    loser.add_done_callback(lambda f, candidate=futures[loser]: record_outcome(f, candidate))
+            hedger.record(time.monotonic() - started)
+            if future is not primary:
+                hedger.won()
+            return futures[future], result
+    raise error
+
+
+def _process_batch(selector: _ModelSelector, texts: List[str], ai_config: dict,
+                   min_rows: int = LLM_BISECT_MIN_ROWS) -> dict:
+    """
+    Classify one batch, isolating failing texts and falling back to the next model.
+    
+    When an answer stops short, the posts answered are kept and only the
+    missing ones are requested again.
+    When the model is unavailable, it is marked as failed and the batch moves
+    to the next model. When the failure comes from the batch content (see
+    _is_batch_error), the batch is split in halves classified separately,
+    down to min_rows texts; texts still failing then try the next models on
+    their own and get defaults only if every model fails on them.
+    
+    Args:
+        selector: Shared model selector
+        texts: List of texts in the batch
+        ai_config: AI configuration dictionary
+        min_rows: Smallest part a failing batch is split into
+    
+    Returns:
+        Dictionary with sentiment, priority and topic lists, row_models (model
+        UID per text, None where defaults were used), model_uid, fallback_used
+        (some texts got defaults), latency (seconds spent in requests) and
+        healthy (answered on the first try with one answer per text)
+    """
+    model = selector.current()
+    model_uid = model.get('uid') if model else None
+    healthy = True
+    latency = 0.0
+    skipped: List[str] = []
+    
+    while model is not None:
+        model_uid = model.get('uid')
+        try:
+            started = time.monotonic()
+            try:
+                model, result = _call_with_hedge(selector, model, texts, ai_config)
+            finally:
+                elapsed = time.monotonic() - started
+                latency += elapsed
+            model_uid = model.get('uid')
+            if selector.health is not None:
+                selector.health.record_success(model_uid, elapsed)
+            sentiments, priorities, topics, answered, complete = _parse_answer(model, result, len(texts), selector.topics)
+            missing = [position for position, ok in enumerate(answered) if not ok]
+            if len(missing) == len(texts):
+                raise ValueError(f"No complete answer for any of the {len(texts)} posts")
+            batch_result = {
+                'sentiment': sentiments,
+                'priority': priorities,
+                'topic': topics,
+                'row_models': [model_uid if ok else None for ok in answered],
+                'model_uid': model_uid,
+                'fallback_used': False,
+                'latency': latency,
+                'healthy': healthy and complete,
+            }
+            if not missing:
+                return batch_result
+            # Truncated answer: keep what arrived and only ask again for the rest
+            print(f"Got {len(texts) - len(missing)}/{len(texts)} answers from model {model_uid}, "
+                  f"re-requesting the missing posts")
+            followup = _process_batch(selector, [texts[position] for position in missing], ai_config, min_rows)
+            return _fill_missing(batch_result, missing, followup)
+        except Exception as e:
+            print(f"Error processing batch with model {model_uid}: {e}")
+            healthy = False
+            if not _is_batch_error(e):
+                # The model itself failed, move every batch to the next one
+                if selector.health is not None:
+                    selector.health.record_failure(model_uid)
+                model = selector.fail(model)
+            elif len(texts) > min_rows:
+                middle = len(texts) // 2
+                print(f"Splitting batch of {len(texts)} texts to isolate the failing ones")
+                parts = [
+                    _process_batch(selector, texts[:middle], ai_config, min_rows),
+                    _process_batch(selector, texts[middle:], ai_config, min_rows),
+                ]
+                return _merge_batch_results(parts, latency)
+            else:
+                # These texts fail on their own, other batches keep the model
+                skipped.append(model_uid)
+                model = selector.next_model(skipped)
+            if model is not None:
+                print(f"Trying fallback model: {model.get('uid')}")
+    
+    # No more models, fill with defaults
+    batch_size = len(texts)
+    return {
+        'sentiment': ['neutral'] * batch_size,
+        'priority': [0] * batch_size,
+        'topic': ['general'] * batch_size,
+        'row_models': [None] * batch_size,
+        'model_uid': model_uid or 'default',
+        'fallback_used': True,
+        'latency': latency,
+        'healthy': False,
+    }
+
+
+def _dispatch_batches(batches: Iterable, worker: Callable, max_in_flight: int) -> Iterator[tuple[int, object]]:
+    """
+    Run worker over batches keeping at most max_in_flight batches outstanding.
+    
+    Args:
+        batches: Iterable of batch inputs (consumed lazily)
+        worker: Function called with one batch input
+        max_in_flight: Maximum number of concurrent worker calls
+    
+    Yields:
+        Tuples of (batch index, worker result) in completion order
+    """
+    if max_in_flight <= 1:
+        for index, batch in enumerate(batches):
+            yield index, worker(batch)
+        return
+    
+    batch_iter = enumerate(batches)
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='llm-batch') as executor:
+        pending = {
+            executor.submit(worker, batch): index
+            for index, batch in islice(batch_iter, max_in_flight)
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                yield index, future.result()
+            # Refill the window with as many batches as just completed
+            for index, batch in islice(batch_iter, len(done)):
+                pending[executor.submit(worker, batch)] = index
+
+
+def _cache_get(cache, keys: List[str]) -> dict:
+    """Look up keys in the LLM cache, treating cache errors as misses."""
+    try:
+        return cache.get_many(keys)
+    except Exception as e:
+        print(f"Warning: LLM cache lookup failed: {e}")
+        return {}
+
+
+def _cache_set(cache, items: dict) -> None:
+    """Store items in the LLM cache, ignoring cache errors."""
+    try:
+        cache.set_many(items)
+    except Exception as e:
+        print(f"Warning: LLM cache write failed: {e}")
+
+
+def _checkpoint_get(checkpoint: LlmCheckpoint, text_keys: List[str]) -> dict:
+    """Look up texts in the LLM checkpoint, treating read errors as misses."""
+    try:
+        return checkpoint.get_many(text_keys)
+    except Exception as e:
+        print(f"Warning: LLM checkpoint read failed: {e}")
+        return {}
+
+
+def _checkpoint_append(checkpoint: LlmCheckpoint, text_keys: List[str], sentiments: list,
+                       priorities: list, topics: list, model_uid: str) -> None:
+    """Record classified texts in the LLM checkpoint, ignoring write errors."""
+    try:
+        checkpoint.append(text_keys, sentiments, priorities, topics, model_uid)
+    except Exception as e:
+        print(f"Warning: LLM checkpoint write failed: {e}")
+
+
+def _cascade_classify(cascade: CascadeClassifier, texts: List[str]) -> List[Optional[tuple]]:
+    """Get the cascade labels of texts, sending every text to the LLM on errors."""
+    try:
+        cascade.load()
+        return cascade.classify(texts)
+    except Exception as e:
+        print(f"Warning: LLM cascade prediction failed: {e}")
+        return [None] * len(texts)
+
+
+def _cascade_update(cascade: CascadeClassifier, texts: List[str], sentiments: list,
+                    priorities: list, topics: list, save: bool = True) -> None:
+    """Train the cascade on LLM labels and save a new version, ignoring errors."""
+    try:
+        cascade.update(texts, sentiments, priorities, topics)
+        if save:
+            cascade.save()
+    except Exception as e:
+        print(f"Warning: LLM cascade update failed: {e}")
+
+
+def _canonicalize_topics(canonicalizer: TopicCanonicalizer, topics: list,
+                         positions: List[List[int]], save: bool = True) -> Dict[str, str]:
+    """
+    Map topics to their canonical labels and save the alias table.
+    
+    Args:
+        canonicalizer: Topic canonicalizer
+        topics: Topic of each group of rows
+        positions: Row positions of each group (the rows weigh the choice of
+            the canonical label of new topics)
+        save: Whether to save the alias table (new aliases stay in memory otherwise)
+    
+    Returns:
+        Dict mapping each topic to rewrite to its canonical label
+    """
+    mapping = canonicalizer.canonicalize(topics, [len(rows) for rows in positions])
+    if save:
+        _save_topic_aliases(canonicalizer)
+    return {topic: canonical for topic, canonical in mapping.items() if topic != canonical}
+
+
+def _save_topic_aliases(canonicalizer: TopicCanonicalizer) -> None:
+    """Save the alias table, ignoring errors."""
+    try:
+        canonicalizer.save()
+    except Exception as e:
+        print(f"Warning: failed to save topic aliases: {e}")
+
+
+def derive_dataset_topic_vocabulary(df, ai_config: dict, checkpoint: Optional[LlmCheckpoint] = None,
+                                    retry_policy: Optional[RetryPolicy] = None) -> List[str]:
+    """
+    Derive the topic vocabulary of a dataset classified in several calls.
+    
+    The vocabulary is derived from a stratified sample of the given rows
+    (or taken from the checkpoint of an interrupted run) and is meant to be
+    passed to every ``calling_llm`` call of the dataset, so all of them pick
+    topics from the same list.
+    
+    Args:
+        df: DataFrame with 'full_text' column the vocabulary is derived from
+        ai_config: AI configuration dictionary
+        checkpoint: Per-file record the vocabulary is kept in (optional)
+        retry_policy: Retry policy holding the task retry budget
+    
+    Returns:
+        Topic vocabulary, or an empty list when topics are free (the model
+        is not in vocabulary mode or the vocabulary could not be derived)
+    """
+    model = _get_ai_model(ai_config, [], get_model_health_registry())
+    if not model or _get_topic_mode(model) != 'vocabulary' or 'full_text' not in df.columns:
+        return []
+    groups: Dict[str, object] = {}
+    for text in df['full_text'].tolist():
+        groups.setdefault(normalize_text_key(text), text)
+    if not groups:
+        return []
+    return _get_topic_vocabulary(model, list(groups.values()), ai_config, checkpoint, retry_policy) or []
+
+
+def save_shared_llm_state(cascade: Optional[CascadeClassifier] = None) -> None:
+    """
+    Save the cascade and the topic alias table trained by ``calling_llm``
+    calls made with ``save_state=False``, ignoring errors.
+    
+    Args:
+        cascade: Local classifier passed to the calls (optional)
+    """
+    if cascade is not None:
+        try:
+            cascade.save()
+        except Exception as e:
+            print(f"Warning: LLM cascade save failed: {e}")
+    canonicalizer = get_topic_canonicalizer()
+    if canonicalizer is not None:
+        _save_topic_aliases(canonicalizer)
+
+
+def _merge_near_duplicates(clusterer: NearDuplicateClusterer, keys: List[str],
+                           positions: List[List[int]], texts: List[str]) -> tuple[list, list, List[int]]:
+    """
+    Merge groups of identical posts whose texts are near-duplicates.
+    
+    Args:
+        clusterer: Near-duplicate clusterer
+        keys: Text key of each group
+        positions: Row positions of each group
+        texts: Text of each group
+    
+    Returns:
+        Tuple of (keys, positions) of the merged groups (the first group of
+        each cluster stands for it) and the number of rows in each cluster
+        of several groups
+    """
+    representatives = clusterer.cluster(texts)
+    merged: Dict[int, List[int]] = {}
+    groups: Dict[int, int] = {}
+    for index, representative in enumerate(representatives):
+        merged.setdefault(representative, []).extend(positions[index])
+        groups[representative] = groups.get(representative, 0) + 1
+    return (
+        [keys[index] for index in merged],
+        list(merged.values()),
+        [len(merged[index]) for index, count in groups.items() if count > 1],
+    )
+
+
+def update_near_duplicate_stats(file_id: str, cluster_sizes: Dict[str, int], db_adapter=None) -> None:
+    """
+    Store the near-duplicate clusters of a dataset on the task document.
+    
+    Args:
+        file_id: File identifier
+        cluster_sizes: Number of clusters by size (rows per cluster, as a string)
+        db_adapter: Database adapter (nothing is stored when None)
+    """
+    if db_adapter is None:
+        return
+    try:
+        db_adapter.update_one(
+            'tasks',
+            {'data.file_id': file_id},
+            {
+                'data.near_duplicates': {
+                    'clusters': sum(cluster_sizes.values()),
+                    'posts_skipped': sum((int(size) - 1) * count for size, count in cluster_sizes.items()),
+                    'largest': max((int(size) for size in cluster_sizes), default=0),
+                    'sizes': cluster_sizes,
+                },
+                'updatedAt': datetime.utcnow(),
+                'updatedBy': 'system',
+            }
+        )
+    except Exception as exc:
+        print(f"Warning: failed to update task with near-duplicate clusters: {exc}")
+
+
+def update_topic_aliases(file_id: str, aliases: Dict[str, str], db_adapter=None) -> None:
+    """
+    Store the topics of a dataset rewritten to canonical labels on the task document.
+    
+    Args:
+        file_id: File identifier
+        aliases: Dict mapping each rewritten topic to its canonical label
+        db_adapter: Database adapter (nothing is stored when None)
+    """
+    if db_adapter is None:
+        return
+    try:
+        db_adapter.update_one(
+            'tasks',
+            {'data.file_id': file_id},
+            {
+                # Pairs rather than a dict, topics may hold dots or dollar signs
+                'data.topic_aliases': [
+                    {'topic': topic, 'canonical': canonical} for topic, canonical in sorted(aliases.items())
+                ],
+                'updatedAt': datetime.utcnow(),
+                'updatedBy': 'system',
+            }
+        )
+    except Exception as exc:
+        print(f"Warning: failed to update task with topic aliases: {exc}")
+
+
+def calling_llm(file_id: str, df, ai_config: dict, event_emitter: callable, 
+                tried_models: List[str] = None, cache: Optional[BaseCache] = None,
+                checkpoint: Optional[LlmCheckpoint] = None,
+                retry_policy: Optional[RetryPolicy] = None,
+                cascade: Optional[CascadeClassifier] = None,
+                db_adapter=None,
+                topic_vocabulary: Optional[List[str]] = None,
+                save_state: bool = True) -> tuple[pd.DataFrame, str]:
+    """
+    Process dataset with LLM to add sentiment, priority, and topics.
+    
+    Batches are filled up to the model's token budget (``maxBatchTokens``,
+    estimated locally for the prompt, the texts and the expected answer)
+    and an adaptive row limit starting at ``paginateRowsLimit``, which grows
+    while answers are fast and complete and shrinks on slow, failed or
+    truncated ones.
+    Batches are dispatched concurrently when the model allows more than one
+    in-flight request (``maxConcurrentRequests``); results are reassembled in
+    row order regardless of completion order. Rows with the same normalized
+    text (see ``normalize_text_key``) are sent once and share the result.
+    With ``LLM_NEAR_DUPLICATE_THRESHOLD``, near-identical posts (other
+    mentions, links or hashtags, see NearDuplicateClusterer) are grouped too
+    and only the first post of each cluster is sent.
+    With ``topicMode: 'vocabulary'``, the model is first asked for a bounded
+    list of topics covering a stratified sample of the posts (kept in the
+    checkpoint so resumed runs reuse it), then picks one topic id per post
+    from it; main_topic becomes a categorical column. Callers classifying a
+    dataset in chunks pass the vocabulary of the whole dataset instead (see
+    ``derive_dataset_topic_vocabulary``).
+    With ``LLM_TOPIC_CANONICALIZE_ENABLED``, topics are then rewritten to
+    the canonical labels of the alias table shared by every dataset (see
+    TopicCanonicalizer), so case, accent, plural and spelling variants of a
+    topic end up as one label; the rewritten topics are stored on the task.
+    Models with ``normalizeInput`` get posts stripped of links, retweet
+    prefixes, mention chains and repeated hashtags and cut to
+    ``maxInputChars`` (see InputNormalizer); the estimated tokens saved per
+    text sent are reported.
+    When a cache is given, texts already classified by the same model and
+    prompt version are filled from it and only cache misses are sent.
+    When a checkpoint is given, every completed batch is recorded in it and
+    texts recorded by an interrupted earlier run are not sent again.
+    Models whose circuit breaker is open (see ModelHealthRegistry) are
+    skipped, and every answer or failure updates the model's health.
+    On models with ``hedgeRequests``, a batch slower than the usual answer
+    latency is also sent to the next model and the first answer is kept
+    (see RequestHedger).
+    Transient request failures are retried under a retry policy whose
+    budget is shared by every request of the call (or of the task, when the
+    caller passes the same policy to several calls).
+    When a cascade is given, the remaining texts are first labelled by this
+    local classifier and only those it is not confident about are sent; it
+    is then trained on the LLM answers and saved as a new version (its own
+    labels are neither cached nor checkpointed).
+    With ``save_state=False``, the cascade and the topic alias table are
+    only updated in memory, for callers that classify a dataset in chunks
+    and save them once at the end (see ``save_shared_llm_state``).
+    
+    Args:
+        file_id: File identifier
+        df: DataFrame with 'full_text' column
+        ai_config: AI configuration dictionary
+        event_emitter: Function to emit events (file_id, event)
+        tried_models: List of model UIDs that have already been tried
+        cache: Persistent LLM classification cache (optional)
+        checkpoint: Per-file record of completed batches used to resume (optional)
+        retry_policy: Retry policy holding the task retry budget (a fresh one if not given)
+        cascade: Local classifier tried before the LLM (optional)
+        db_adapter: Database adapter the near-duplicate clusters are stored with (optional)
+        topic_vocabulary: Topic vocabulary of the dataset, an empty list for
+            free topics (derived from df when not given)
+        save_state: Whether to save the cascade and the topic alias table
+    
+    Returns:
+        Tuple of (DataFrame with new columns, model_uid used)
+    """
+    if tried_models is None:
+        tried_models = []
+    
+    if 'full_text' not in df.columns:
+        raise ValueError("Dataset must have 'full_text' column")
+    
+    # Emit LLM processing event
+    event_emitter(file_id, TASK_STATUS_SENDING_TO_LLM)
+    
+    # Get AI model with fallback, skipping models known to be down in this process
+    health = get_model_health_registry()
+    model = _get_ai_model(ai_config, tried_models, health)
+    if not model:
+        raise ValueError("No AI model available")
+    
+    model_uid = model.get('uid')
+    paginate_limit = min(
+        model['data'].get('paginateRowsLimit', DEFAULT_PAGINATE_ROWS_LIMIT),
+        MAX_PAGINATE_ROWS_LIMIT
+    )
+    max_in_flight = _get_max_in_flight(model)
+    
+    texts = df['full_text'].tolist()
+    total_rows = len(texts)
+    
+    # Group identical posts (case, whitespace and retweet prefix folded) so
+    # each unique text is classified once and broadcast to its duplicates
+    groups: Dict[str, List[int]] = {}
+    for position, text in enumerate(texts):
+        groups.setdefault(normalize_text_key(text), []).append(position)
+    unique_keys = list(groups)
+    unique_positions = [groups[key] for key in unique_keys]
+    # Near-identical posts join the group of the first post of their cluster
+    clusterer = create_near_duplicate_clusterer()
+    cluster_sizes: List[int] = []
+    if clusterer is not None and len(unique_keys) > 1:
+        unique_keys, unique_positions, cluster_sizes = _merge_near_duplicates(
+            clusterer, unique_keys, unique_positions, [texts[positions[0]] for positions in unique_positions]
+        )
+    unique_texts = [texts[positions[0]] for positions in unique_positions]
+    total_unique = len(unique_keys)
+    
+    unique_sentiments: List = [None] * total_unique
+    unique_priorities: List = [None] * total_unique
+    unique_topics: List = [None] * total_unique
+    
+    # In vocabulary mode, topics are ids in a list derived once per dataset from a sample
+    if retry_policy is None:
+        retry_policy = create_retry_policy()
+    if _get_topic_mode(model) != 'vocabulary' or total_unique == 0 or topic_vocabulary == []:
+        topic_vocabulary = None
+    elif topic_vocabulary is None:
+        topic_vocabulary = _get_topic_vocabulary(model, unique_texts, ai_config, checkpoint, retry_policy)
+    # Labels picked from a vocabulary are only valid for that vocabulary
+    prompt_version = LLM_PROMPT_VERSION
+    if topic_vocabulary is not None:
+        digest = hashlib.sha1(json.dumps(topic_vocabulary).encode('utf-8')).hexdigest()[:12]
+        prompt_version = f"{LLM_PROMPT_VERSION}:topics-{digest}"
+    # So are labels of shortened posts
+    normalizer = get_input_normalizer(model)
+    if normalizer is not None:
+        prompt_version = f"{prompt_version}:input-{normalizer.settings}"
+    
+    # Fill texts already classified for this model and prompt version
+    pending = list(range(total_unique))
+    if cache is not None and total_unique > 0:
+        cache_keys = [BaseCache.make_key(key, model_uid, prompt_version) for key in unique_keys]
+        hits = _cache_get(cache, cache_keys)
+        pending = []
+        for index, cache_key in enumerate(cache_keys):
+            value = hits.get(cache_key)
+            if value is None:
+                pending.append(index)
+                continue
+            unique_sentiments[index] = value['sentiment']
+            unique_priorities[index] = value['priority']
+            unique_topics[index] = value['topic']
+    cache_hits = total_unique - len(pending)
+    
+    # Skip texts already classified by an interrupted run on this file
+    checkpoint_hits = 0
+    if checkpoint is not None and pending:
+        saved = _checkpoint_get(checkpoint, [unique_keys[i] for i in pending])
+        remaining = []
+        for index in pending:
+            value = saved.get(unique_keys[index])
+            if value is None:
+                remaining.append(index)
+                continue
+            unique_sentiments[index] = value['sentiment']
+            unique_priorities[index] = value['priority']
+            unique_topics[index] = value['topic']
+        checkpoint_hits = len(pending) - len(remaining)
+        pending = remaining
+    
+    # Texts the local classifier is confident about skip the LLM
+    cascade_hits = 0
+    cascade_rows = 0
+    if cascade is not None and pending:
+        predictions = _cascade_classify(cascade, [unique_texts[i] for i in pending])
+        remaining = []
+        for index, prediction in zip(pending, predictions):
+            if prediction is None:
+                remaining.append(index)
+                continue
+            unique_sentiments[index], unique_priorities[index], unique_topics[index] = prediction
+            cascade_rows += len(unique_positions[index])
+        cascade_hits = len(pending) - len(remaining)
+        pending = remaining
+    
+    # Posts are shortened in the prompts (see _call_llm_api), batches are packed by their shortened size
+    sent_texts = [unique_texts[i] for i in pending]
+    input_tokens_saved = 0
+    if normalizer is not None and pending:
+        estimator = get_token_estimator(model)
+        normalized = [normalizer.normalize(text) for text in sent_texts]
+        input_tokens_saved = sum(
+            estimator.count(str(text)) - estimator.count(str(short)) for text, short in zip(sent_texts, normalized)
+        )
+        sent_texts = normalized
+        print(f"Input normalisation saves about {input_tokens_saved / len(pending):.1f} tokens per text "
+              f"({input_tokens_saved} in total)")
+    input_rows = len(pending)
+    
+    # Process cache misses in batches of unique texts, filled up to the model's
+    # token budget (what is left once the prompt itself is accounted for)
+    token_budget = _get_batch_token_budget(model)
+    rows_budget = 0
+    costs = [0] * len(pending)
+    if token_budget > 0 and pending:
+        estimator = get_token_estimator(model)
+        response_format = _get_response_format(model)
+        prompt = _build_compact_prompt([], topic_vocabulary) if response_format == 'compact' \
+            else _build_prompt([], topic_vocabulary)
+        rows_budget = max(1, token_budget - estimator.count(prompt))
+        costs = _row_token_costs(estimator, sent_texts, response_format)
+    # The row limit adapts to how the model copes (see _get_batch_size_controller),
+    # so batches are cut lazily as they are dispatched
+    controller = _get_batch_size_controller(model, paginate_limit)
+    batch_indices: List[List[int]] = []
+    
+    def next_batches() -> Iterator[List[int]]:
+        position = 0
+        while position < len(pending):
+            size = controller.size
+            batch = _pack_batches(
+                pending[position:position + size], costs[position:position + size], rows_budget, size
+            )[0]
+            position += len(batch)
+            batch_indices.append(batch)
+            yield batch
+    
+    def estimated_batches() -> int:
+        rows_left = len(pending) - sum(len(batch) for batch in batch_indices)
+        return len(batch_indices) + -(-rows_left // controller.size)
+    
+    print(f"Processing {total_rows} rows ({total_unique} unique texts, {cache_hits} cache hits, "
+          f"{checkpoint_hits} resumed from checkpoint, {cascade_hits} labelled by the cascade) "
+          f"in about {estimated_batches()} batches of {controller.size} rows "
+          f"({controller.min_size}-{controller.max_size} adaptive)"
+          f"{f' / {token_budget} tokens' if token_budget > 0 else ''} ({max_in_flight} in flight)")
+    
+    # Only slow requests to models with data.hedgeRequests are hedged
+    hedger = create_request_hedger(max_in_flight)
+    selector = _ModelSelector(ai_config, tried_models, model, retry_policy, health, hedger, topic_vocabulary)
+    
+    def process_indices(indices: List[int]) -> dict:
+        return _process_batch(selector, [unique_texts[i] for i in indices], ai_config)
+    
+    rows_processed = total_rows - sum(len(unique_positions[i]) for i in pending)
+    unique_processed = cache_hits + checkpoint_hits + cascade_hits
+    # Texts answered by the LLM, the cascade learns from them
+    llm_labelled: List[int] = []
+    batches_completed = 0
+    last_success_model = None
+    
+    try:
+        for batch_number, batch_result in _dispatch_batches(next_batches(), process_indices, max_in_flight):
+            indices = batch_indices[batch_number]
+            controller.record(len(indices), batch_result['latency'], batch_result['healthy'])
+            # Texts classified by each model (defaulted texts are not kept)
+            classified: Dict[str, List[int]] = {}
+            for offset, index in enumerate(indices):
+                unique_sentiments[index] = batch_result['sentiment'][offset]
+                unique_priorities[index] = batch_result['priority'][offset]
+                unique_topics[index] = batch_result['topic'][offset]
+                row_model = batch_result['row_models'][offset]
+                if row_model is not None:
+                    classified.setdefault(row_model, []).append(index)
+                    llm_labelled.append(index)
+            
+            for row_model, classified_indices in classified.items():
+                if cache is not None:
+                    _cache_set(cache, {
+                        BaseCache.make_key(unique_keys[i], row_model, prompt_version): {
+                            'sentiment': unique_sentiments[i],
+                            'priority': unique_priorities[i],
+                            'topic': unique_topics[i],
+                        }
+                        for i in classified_indices
+                    })
+                if checkpoint is not None:
+                    _checkpoint_append(
+                        checkpoint,
+                        [unique_keys[i] for i in classified_indices],
+                        [unique_sentiments[i] for i in classified_indices],
+                        [unique_priorities[i] for i in classified_indices],
+                        [unique_topics[i] for i in classified_indices],
+                        row_model,
+                    )
+            
+            batch_rows = [position for i in indices for position in unique_positions[i]]
+            rows_processed += len(batch_rows)
+            unique_processed += len(indices)
+            batches_completed += 1
+            last_success_model = batch_result['model_uid']
+            
+            # Progress tracks unique texts, which is what the LLM actually processes
+            progress_percentage = int((unique_processed / total_unique) * 100) if total_unique > 0 else 0
+            progress = {
+                'batch': batch_number + 1,
+                'total_batches': estimated_batches(),
+                'batches_completed': batches_completed,
+                'batch_size': len(indices),
+                'next_batch_size': controller.size,
+                'total_rows': total_rows,
+                'rows_processed': rows_processed,
+                'rows_remaining': max(0, total_rows - rows_processed),
+                'total_unique_texts': total_unique,
+                'unique_texts_processed': unique_processed,
+                'progress_percentage': progress_percentage,
+                'current_row_index': min(batch_rows) + 1,  # 1-indexed starting row
+                'current_row_end': max(batch_rows) + 1,  # Ending row index (inclusive)
+                'model_uid': batch_result['model_uid'],
+            }
+            if batch_result['fallback_used']:
+                progress['fallback_used'] = True
+                progress['defaulted_rows'] = sum(
+                    len(unique_positions[index])
+                    for offset, index in enumerate(indices)
+                    if batch_result['row_models'][offset] is None
+                )
+            
+            # Emit progression event with detailed information
+            event_emitter(file_id, TASK_STATUS_SENDING_TO_LLM_PROGRESS, progress)
+    finally:
+        # Late answers of hedged requests are not waited for
+        hedger.close()
+    
+    topic_aliases = None
+    topic_rows_rewritten = 0
+    canonicalizer = get_topic_canonicalizer()
+    if canonicalizer is not None:
+        topic_aliases = _canonicalize_topics(canonicalizer, unique_topics, unique_positions, save=save_state)
+        for index, topic in enumerate(unique_topics):
+            if isinstance(topic, str) and topic in topic_aliases:
+                unique_topics[index] = topic_aliases[topic]
+                topic_rows_rewritten += len(unique_positions[index])
+        if topic_vocabulary is not None:
+            topic_vocabulary = list(dict.fromkeys(topic_aliases.get(topic, topic) for topic in topic_vocabulary))
+    
+    if cascade is not None and llm_labelled:
+        _cascade_update(
+            cascade,
+            [unique_texts[i] for i in llm_labelled],
+            [unique_sentiments[i] for i in llm_labelled],
+            [unique_priorities[i] for i in llm_labelled],
+            [unique_topics[i] for i in llm_labelled],
+            save=save_state,
+        )
+    
+    # Broadcast results of each unique text to all of its rows
+    sentiments: List = [None] * total_rows
+    priorities: List = [None] * total_rows
+    topics: List = [None] * total_rows
+    for index, positions in enumerate(unique_positions):
+        for position in positions:
+            sentiments[position] = unique_sentiments[index]
+            priorities[position] = unique_priorities[index]
+            topics[position] = unique_topics[index]
+    
+    # Add columns to dataframe (use main_topic as column name)
+    df['sentiment'] = sentiments
+    df['priority'] = priorities
+    df['main_topic'] = topics  # Column name is main_topic
+    if topic_vocabulary is not None:
+        # Few distinct topics, vocabulary order first so codes match topic ids
+        df['main_topic'] = pd.Categorical(topics, categories=list(dict.fromkeys(topic_vocabulary + topics)))
+    
+    print(f"Added columns: sentiment, priority, main_topic")
+    
+    current_model = selector.current()
+    if current_model is not None:
+        model_uid = current_model.get('uid')
+    
+    summary = {
+        'total_rows': total_rows,
+        'total_batches': len(batch_indices),
+        'model_uid': last_success_model or model_uid,
+        'unique_texts': total_unique,
+        'duplicates_skipped': total_rows - total_unique,
+        'cache_hits': cache_hits,
+        'cache_misses': total_unique - cache_hits,
+        'checkpoint_hits': checkpoint_hits,
+    }
+    if topic_vocabulary is not None:
+        summary['topic_vocabulary'] = topic_vocabulary
+    if normalizer is not None:
+        summary['input_tokens_saved'] = input_tokens_saved
+        summary['input_rows'] = input_rows
+        summary['input_tokens_saved_per_row'] = round(input_tokens_saved / input_rows, 2) if input_rows > 0 else 0.0
+    if topic_aliases is not None:
+        summary['topic_aliases'] = topic_aliases
+        summary['topic_rows_rewritten'] = topic_rows_rewritten
+        update_topic_aliases(file_id, topic_aliases, db_adapter)
+    if clusterer is not None:
+        sizes: Dict[str, int] = {}
+        for size in cluster_sizes:
+            sizes[str(size)] = sizes.get(str(size), 0) + 1
+        summary['near_duplicate_clusters'] = len(cluster_sizes)
+        summary['near_duplicates_skipped'] = sum(cluster_sizes) - len(cluster_sizes)
+        summary['near_duplicate_sizes'] = sizes
+        update_near_duplicate_stats(file_id, sizes, db_adapter)
+    if cascade is not None:
+        summary['cascade_hits'] = cascade_hits
+        summary['cascade_rows'] = cascade_rows
+        summary['cascade_fraction'] = round(cascade_rows / total_rows, 4) if total_rows > 0 else 0.0
+    if hedger.hedges:
+        summary['hedged_requests'] = hedger.hedges
+        summary['hedge_wins'] = hedger.wins
+    event_emitter(file_id, TASK_STATUS_SENDING_TO_LLM_DONE, summary)
+    
+    return df, model_uid
@@ -4,11 +4,15 @@ import numpy as np
 import os
 import sys
 import re
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from typing import Optional
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from src.configs.env import STORAGE_CLEANED
+from src.configs.env import STORAGE_CLEANED, CLEANING_WORKERS, CLEANING_PARALLEL_MIN_ROWS
 from src.configs.constants import (
     TASK_STATUS_PROCESS_CLEANING,
     TASK_STATUS_PROCESS_CLEANING_DONE,
@@ -16,45 +20,325 @@ from src.configs.constants import (
 from src.utils.helpers import ensure_directory_exists
 
 
+# Emoji / pictograph ranges removed from posts
+_EMOJI_RANGES = (
+    "\U0001F600-\U0001F64F"  # emoticons
+    "\U0001F300-\U0001F5FF"  # symbols & pictographs
+    "\U0001F680-\U0001F6FF"  # transport & map symbols
+    "\U0001F1E0-\U0001F1FF"  # flags (iOS)
+    "\U00002702-\U000027B0"
+    "\U000024C2-\U0001F251"
+)
+
+# Single pass removing emojis and special characters (anything other than
+# letters, numbers, spaces and basic punctuation). An '@' survives when the
+# next non-emoji character is a word character, which preserves @ mentions
+# exactly as if emojis had been removed first.
+_STRIP_PATTERN = re.compile(
+    f"[{_EMOJI_RANGES}]+"
+    rf"|(?!@[{_EMOJI_RANGES}]*(?![{_EMOJI_RANGES}])\w)[^\w\s.,!?;:()\-]"
+)
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_EMOJI_CHAR_PATTERN = re.compile(f"[{_EMOJI_RANGES}]")
+_WORD_CHAR_PATTERN = re.compile(r'\w')
+_SPACE_CHAR_PATTERN = re.compile(r'\s')
+_KEPT_PUNCTUATION = '.,!?;:()-'
+
+# Character classes used by the column-level engine
+_CHAR_REMOVE = 0
+_CHAR_WORD = 1
+_CHAR_SPACE = 2
+_CHAR_PUNCT = 3
+_CHAR_AT = 4
+_CHAR_EMOJI = 5
+_CHAR_UNKNOWN = 255
+
+# Rows encoded into one code point buffer at a time (bounds memory use)
+_ENGINE_CHUNK_ROWS = 50_000
+
+_char_classes = None
+
+# Process pool shared by all cleaning calls of this process
+_cleaning_pool = None
+_cleaning_pool_key = None
+
+
 def remove_emoji(text: str) -> str:
     """Remove emojis and special characters from text, preserving @ mentions."""
     if pd.isna(text):
         return text
     
-    text = str(text)
-    # Remove emojis
-    emoji_pattern = re.compile(
-        "["
-        "\U0001F600-\U0001F64F"  # emoticons
-        "\U0001F300-\U0001F5FF"  # symbols & pictographs
-        "\U0001F680-\U0001F6FF"  # transport & map symbols
-        "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-        "\U00002702-\U000027B0"
-        "\U000024C2-\U0001F251"
-        "]+",
-        flags=re.UNICODE
+    text = _STRIP_PATTERN.sub('', str(text))
+    # Clean up multiple spaces
+    return _WHITESPACE_PATTERN.sub(' ', text).strip()
+
+
+def _classify_char(code_point: int) -> int:
+    """Get the cleaning class of a single code point."""
+    char = chr(code_point)
+    if _EMOJI_CHAR_PATTERN.match(char):
+        return _CHAR_EMOJI
+    if char == '@':
+        return _CHAR_AT
+    if _WORD_CHAR_PATTERN.match(char):
+        return _CHAR_WORD
+    if _SPACE_CHAR_PATTERN.match(char):
+        return _CHAR_SPACE
+    if char in _KEPT_PUNCTUATION:
+        return _CHAR_PUNCT
+    return _CHAR_REMOVE
+
+
+def _get_char_classes() -> np.ndarray:
+    """Get the code point -> class lookup table (BMP precomputed, others on demand)."""
+    global _char_classes
+    if _char_classes is None:
+        table = np.full(0x110000, _CHAR_UNKNOWN, dtype=np.uint8)
+        table[:0x10000] = [_classify_char(cp) for cp in range(0x10000)]
+        _char_classes = table
+    return _char_classes
+
+
+def _segment_bounds(keep: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+    """Get per-row lengths and bounds after compressing a buffer with keep."""
+    kept = np.zeros(keep.size + 1, dtype=np.int64)
+    np.cumsum(keep, out=kept[1:])
+    lengths = kept[ends] - kept[starts]
+    new_ends = np.cumsum(lengths)
+    return lengths, new_ends - lengths, new_ends
+
+
+def _row_edges(size: int, lengths: np.ndarray, starts: np.ndarray, ends: np.ndarray):
+    """Flag the first and last code point of every non-empty row."""
+    non_empty = lengths > 0
+    first = np.zeros(size, dtype=bool)
+    first[starts[non_empty]] = True
+    last = np.zeros(size, dtype=bool)
+    last[ends[non_empty] - 1] = True
+    return first, last
+
+
+def _clean_code_points(code_points: np.ndarray, lengths: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Clean rows stored back to back in a code point buffer.
+    
+    Applies the same rules as ``remove_emoji`` with array operations:
+    drop emojis, drop special characters except '@' directly followed by a
+    word character, collapse whitespace runs to one space and strip rows.
+    
+    Args:
+        code_points: uint32 array of the concatenated rows
+        lengths: Number of code points in each row
+    
+    Returns:
+        Tuple of (cleaned code points, cleaned row lengths)
+    """
+    table = _get_char_classes()
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    
+    classes = table[code_points]
+    unknown = classes == _CHAR_UNKNOWN
+    if unknown.any():
+        for cp in np.unique(code_points[unknown]).tolist():
+            table[cp] = _classify_char(cp)
+        classes = table[code_points]
+    
+    # Remove emojis first so mentions split by an emoji are still detected
+    keep = classes != _CHAR_EMOJI
+    lengths, starts, ends = _segment_bounds(keep, starts, ends)
+    code_points, classes = code_points[keep], classes[keep]
+    
+    # Remove special characters, keeping '@' when a word character follows in the same row
+    first, _ = _row_edges(code_points.size, lengths, starts, ends)
+    mention = np.zeros(code_points.size, dtype=bool)
+    mention[:-1] = (classes[1:] == _CHAR_WORD) & ~first[1:]
+    keep = (classes != _CHAR_REMOVE) & ((classes != _CHAR_AT) | mention)
+    lengths, starts, ends = _segment_bounds(keep, starts, ends)
+    code_points, classes = code_points[keep], classes[keep]
+    
+    # Collapse whitespace runs
+    space = classes == _CHAR_SPACE
+    first, _ = _row_edges(code_points.size, lengths, starts, ends)
+    repeated = np.zeros(code_points.size, dtype=bool)
+    repeated[1:] = space[:-1]
+    keep = ~(space & repeated & ~first)
+    lengths, starts, ends = _segment_bounds(keep, starts, ends)
+    code_points, space = code_points[keep], space[keep]
+    
+    # Strip leading/trailing whitespace
+    first, last = _row_edges(code_points.size, lengths, starts, ends)
+    keep = ~(space & (first | last))
+    lengths, starts, ends = _segment_bounds(keep, starts, ends)
+    code_points, space = code_points[keep], space[keep]
+    
+    code_points = np.where(space, np.uint32(ord(' ')), code_points)
+    return code_points, lengths
+
+
+def _encode_texts(texts: list) -> tuple[np.ndarray, np.ndarray]:
+    """Encode texts into a uint32 code point buffer and row lengths."""
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    buffer = ''.join(texts).encode('utf-32-le', 'surrogatepass')
+    return np.frombuffer(buffer, dtype=np.uint32), lengths
+
+
+def _decode_texts(code_points: np.ndarray, lengths: np.ndarray) -> list:
+    """Decode a uint32 code point buffer back into one string per row."""
+    data = code_points.astype('<u4', copy=False).tobytes().decode('utf-32-le', 'surrogatepass')
+    ends = np.cumsum(lengths).tolist()
+    starts = [0] + ends[:-1]
+    return [data[start:end] for start, end in zip(starts, ends)]
+
+
+def _clean_texts(texts: list) -> list:
+    """Clean a list of strings with the column-level engine."""
+    cleaned = []
+    for start in range(0, len(texts), _ENGINE_CHUNK_ROWS):
+        code_points, lengths = _encode_texts(texts[start:start + _ENGINE_CHUNK_ROWS])
+        cleaned.extend(_decode_texts(*_clean_code_points(code_points, lengths)))
+    return cleaned
+
+
+def _clean_encoded_chunk(buffer: bytes, lengths: bytes) -> tuple[bytes, bytes]:
+    """
+    Clean one encoded chunk in a pool worker.
+    
+    Chunks travel as raw code point / length buffers so only two bytes
+    objects are pickled each way instead of one Python string per row.
+    """
+    code_points, row_lengths = _clean_code_points(
+        np.frombuffer(buffer, dtype=np.uint32),
+        np.frombuffer(lengths, dtype=np.int64),
     )
-    text = emoji_pattern.sub('', text)
+    return code_points.tobytes(), row_lengths.tobytes()
+
+
+def _shutdown_cleaning_pool():
+    """Shut down the cleaning process pool if one was started."""
+    global _cleaning_pool, _cleaning_pool_key
+    if _cleaning_pool is not None:
+        _cleaning_pool.shutdown(wait=False, cancel_futures=True)
+    _cleaning_pool = None
+    _cleaning_pool_key = None
+
+
+def _get_cleaning_pool(workers: int) -> ProcessPoolExecutor:
+    """Get (or create) the cleaning process pool for this process."""
+    global _cleaning_pool, _cleaning_pool_key
+    key = (os.getpid(), workers)
+    if _cleaning_pool is None or _cleaning_pool_key != key:
+        if _cleaning_pool is not None and _cleaning_pool_key[0] == os.getpid():
+            _cleaning_pool.shutdown(wait=False, cancel_futures=True)
+        # Avoid forking a process that already runs threads (event publisher, LLM dispatch)
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        _cleaning_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        _cleaning_pool_key = key
+    return _cleaning_pool
+
+
+def _clean_texts_parallel(texts: list, workers: int) -> list:
+    """Clean a list of strings by spreading chunks over the process pool."""
+    pool = _get_cleaning_pool(workers)
+    chunk_rows = min(_ENGINE_CHUNK_ROWS, -(-len(texts) // workers))
+    
+    futures = []
+    for start in range(0, len(texts), chunk_rows):
+        code_points, lengths = _encode_texts(texts[start:start + chunk_rows])
+        futures.append(pool.submit(_clean_encoded_chunk, code_points.tobytes(), lengths.tobytes()))
+    
+    # Reassemble in submission order
+    cleaned = []
+    for future in futures:
+        buffer, lengths = future.result()
+        cleaned.extend(_decode_texts(
+            np.frombuffer(buffer, dtype=np.uint32),
+            np.frombuffer(lengths, dtype=np.int64),
+        ))
+    return cleaned
+
+
+atexit.register(_shutdown_cleaning_pool)
+
+
+def clean_text_series(
+    series: pd.Series,
+    workers: Optional[int] = None,
+    parallel_min_rows: Optional[int] = None,
+) -> pd.Series:
+    """
+    Remove emojis and special characters from a whole Series of texts.
     
-    # Protect @ mentions (e.g., @username, @user123) by temporarily replacing them
-    # Pattern: @ followed by word characters (letters, numbers, underscore)
-    mention_pattern = re.compile(r'@\w+')
-    mentions = mention_pattern.findall(text)
-    # Replace mentions with placeholders
-    for i, mention in enumerate(mentions):
-        text = text.replace(mention, f'__MENTION_{i}__', 1)
+    Column-level equivalent of ``series.apply(remove_emoji)``: rows are
+    encoded into one code point buffer and cleaned with array operations
+    instead of running regexes row by row. Missing values are left untouched
+    and non-string values are converted to string.
     
-    # Remove special characters except letters, numbers, spaces, and basic punctuation
-    text = re.sub(r'[^\w\s.,!?;:()\-]', '', text)
+    Large Series are split into chunks cleaned by a process pool when more
+    than one worker is configured; smaller ones are cleaned in-process.
     
-    # Restore @ mentions
-    for i, mention in enumerate(mentions):
-        text = text.replace(f'__MENTION_{i}__', mention, 1)
+    Args:
+        series: Series of texts
+        workers: Number of pool processes (defaults to CLEANING_WORKERS)
+        parallel_min_rows: Minimum rows to use the pool (defaults to CLEANING_PARALLEL_MIN_ROWS)
     
-    # Clean up multiple spaces
-    text = re.sub(r'\s+', ' ', text).strip()
+    Returns:
+        Cleaned Series with the same index and name
+    """
+    workers = CLEANING_WORKERS if workers is None else workers
+    parallel_min_rows = CLEANING_PARALLEL_MIN_ROWS if parallel_min_rows is None else parallel_min_rows
+    
+    mask = series.notna().to_numpy()
+    if not mask.any():
+        return series
+    
+    values = series.to_numpy(dtype=object, copy=True)
+    texts = [str(text) for text in values[mask]]
+    
+    cleaned = None
+    if workers > 1 and len(texts) >= parallel_min_rows:
+        try:
+            cleaned = _clean_texts_parallel(texts, workers)
+        except Exception as e:
+            print(f"Warning: Parallel cleaning failed, cleaning in-process: {e}")
+            _shutdown_cleaning_pool()
+    if cleaned is None:
+        cleaned = _clean_texts(texts)
+    values[mask] = cleaned
+    return pd.Series(values, index=series.index, name=series.name).infer_objects()
+
+
+def update_cleaned_file_path(file_id: str, db_adapter=None) -> None:
+    """
+    Store the cleaned file path on the task document.
+    
+    The path is stored relative to the storage root (e.g. "cleaned/{file_id}.csv")
+    so backend and microservice can resolve it against their own mount points.
     
-    return text
+    Args:
+        file_id: File identifier
+        db_adapter: Database adapter (nothing is stored when None)
+    """
+    if db_adapter is None:
+        return
+    try:
+        # Store relative path for cross-container compatibility
+        relative_path = os.path.join('cleaned', f"{file_id}.csv")
+        
+        db_adapter.update_one(
+            'tasks',
+            {'data.file_id': file_id},
+            {
+                'data.file_cleaned.path': relative_path,
+                'data.file_cleaned.type': 'text/csv',
+                'updatedAt': datetime.utcnow(),
+                'updatedBy': 'system',
+            }
+        )
+        print(f"Updated task with cleaned file path (relative): {relative_path}")
+    except Exception as exc:
+        print(f"Warning: failed to update task with cleaned file path: {exc}")
 
 
 def cleaning(file_id: str, df: pd.DataFrame, event_emitter: callable, db_adapter=None) -> pd.DataFrame:
@@ -77,7 +361,7 @@ def cleaning(file_id: str, df: pd.DataFrame, event_emitter: callable, db_adapter
     # Clean 'full_text' column: remove emojis and special characters
     if 'full_text' in df.columns:
         print(f"Cleaning 'full_text' column: removing emojis and special characters...")
-        df['full_text'] = df['full_text'].apply(remove_emoji)
+        df['full_text'] = clean_text_series(df['full_text'])
         print(f"Cleaned {len(df)} rows of text data")
     
     # Remove duplicates
@@ -112,27 +396,7 @@ def cleaning(file_id: str, df: pd.DataFrame, event_emitter: callable, db_adapter
     print(f"Saved cleaned dataset to: {cleaned_path}")
 
     # Persist metadata back to task document if database adapter is provided
-    # Store relative path (e.g., "cleaned/{file_id}.csv") so it works across different container mount points
-    # Both backend and microservice can resolve this relative to their own storage paths
-    if db_adapter is not None:
-        try:
-            # Store relative path for cross-container compatibility
-            # Extract relative path from storage root (e.g., "cleaned/{file_id}.csv")
-            relative_path = os.path.join('cleaned', f"{file_id}.csv")
-            
-            db_adapter.update_one(
-                'tasks',
-                {'data.file_id': file_id},
-                {
-                    'data.file_cleaned.path': relative_path,
-                    'data.file_cleaned.type': 'text/csv',
-                    'updatedAt': datetime.utcnow(),
-                    'updatedBy': 'system',
-                }
-            )
-            print(f"Updated task with cleaned file path (relative): {relative_path}")
-        except Exception as exc:
-            print(f"Warning: failed to update task with cleaned file path: {exc}")
+    update_cleaned_file_path(file_id, db_adapter)
     
     # Emit completion event with metadata
     event_emitter(
@@ -2,32 +2,129 @@
 import pandas as pd
 import sys
 import os
+from typing import Iterator, Optional, Union
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from src.utils.helpers import get_file_id_from_path
+from src.configs.env import (
+    READING_STREAM_MIN_BYTES,
+    READING_CHUNK_ROWS,
+    READING_CHUNK_BYTES,
+)
 from src.configs.constants import (
     TASK_STATUS_READING_DATASET,
+    TASK_STATUS_READING_DATASET_PROGRESS,
     TASK_STATUS_READING_DATASET_DONE,
 )
 
+# Bytes sampled from the head of the file to estimate the average row size
+_ROW_SIZE_SAMPLE_BYTES = 1024 * 1024
+
+
+def _estimate_chunk_rows(file_path: str, chunk_bytes: int) -> int:
+    """
+    Estimate how many rows fit in chunk_bytes from the head of the file.
+
+    Args:
+        file_path: Path to the CSV file
+        chunk_bytes: Target chunk size in bytes
+
+    Returns:
+        Number of rows per chunk (at least 1)
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(_ROW_SIZE_SAMPLE_BYTES)
+    lines = max(sample.count(b'\n'), 1)
+    return max(1, int(chunk_bytes * lines / max(len(sample), 1)))
+
+
+def _stream_chunks(
+    file_id: str,
+    file_path: str,
+    event_emitter: callable,
+    chunk_rows: int,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the CSV file as DataFrame chunks, emitting byte-based progress.
 
-def reading_file(file_path: str, event_emitter: callable) -> tuple[str, pd.DataFrame]:
+    The reading done event is emitted once the last chunk has been read.
+    """
+    total_bytes = os.path.getsize(file_path)
+    rows_read = 0
+    columns = 0
+
+    with open(file_path, 'rb') as f:
+        reader = pd.read_csv(f, chunksize=chunk_rows)
+        for chunk_index, chunk in enumerate(reader, start=1):
+            rows_read += len(chunk)
+            columns = len(chunk.columns)
+            # The parser reads ahead in blocks, so the position is approximate until the end
+            bytes_read = min(f.tell(), total_bytes)
+
+            event_emitter(
+                file_id,
+                TASK_STATUS_READING_DATASET_PROGRESS,
+                {
+                    'chunk': chunk_index,
+                    'chunk_rows': len(chunk),
+                    'rows_read': rows_read,
+                    'bytes_read': bytes_read,
+                    'total_bytes': total_bytes,
+                    'progress_percentage': round(bytes_read / total_bytes * 100, 2) if total_bytes else 100.0,
+                }
+            )
+            yield chunk
+
+    print(f"Read dataset: {rows_read} rows, {columns} columns (streamed)")
+
+    event_emitter(
+        file_id,
+        TASK_STATUS_READING_DATASET_DONE,
+        {'rows': rows_read, 'columns': columns, 'streamed': True}
+    )
+
+
+def reading_file(
+    file_path: str,
+    event_emitter: callable,
+    stream: Optional[bool] = None,
+    chunk_rows: Optional[int] = None,
+    chunk_bytes: Optional[int] = None,
+) -> tuple[str, Union[pd.DataFrame, Iterator[pd.DataFrame]]]:
     """
     Read CSV dataset from file path.
-    
+
+    Files of at least READING_STREAM_MIN_BYTES are streamed: instead of a
+    DataFrame, an iterator of bounded DataFrame chunks is returned and
+    reading progress events are emitted as chunks are consumed.
+
     Args:
         file_path: Path to the CSV file
         event_emitter: Function to emit events (file_id, event)
-    
+        stream: Force (True) or disable (False) streaming; None selects by file size
+        chunk_rows: Rows per streamed chunk (defaults to READING_CHUNK_ROWS)
+        chunk_bytes: Approximate bytes per streamed chunk, used when no row count
+            is set (defaults to READING_CHUNK_BYTES)
+
     Returns:
-        Tuple of (file_id, dataframe)
+        Tuple of (file_id, dataframe) or (file_id, iterator of dataframes) when streaming
     """
     file_id = get_file_id_from_path(file_path)
-    
+
     # Emit reading event
     event_emitter(file_id, TASK_STATUS_READING_DATASET)
-    
+
+    if stream is None:
+        stream = os.path.getsize(file_path) >= READING_STREAM_MIN_BYTES
+
+    if stream:
+        chunk_rows = chunk_rows or READING_CHUNK_ROWS
+        if chunk_rows <= 0:
+            chunk_rows = _estimate_chunk_rows(file_path, chunk_bytes or READING_CHUNK_BYTES)
+        print(f"Streaming dataset in chunks of {chunk_rows} rows")
+        return file_id, _stream_chunks(file_id, file_path, event_emitter, chunk_rows)
+
     # Read CSV
     df = pd.read_csv(file_path)
     print(f"Read dataset: {len(df)} rows, {len(df.columns)} columns")
@@ -38,6 +135,23 @@ def reading_file(file_path: str, event_emitter: callable) -> tuple[str, pd.DataF
         TASK_STATUS_READING_DATASET_DONE,
         {'rows': len(df), 'columns': len(df.columns)}
     )
-    
+
     return file_id, df
 
+
+def collect_dataset(data: Union[pd.DataFrame, Iterator[pd.DataFrame]]) -> pd.DataFrame:
+    """
+    Get a single DataFrame from reading_file output.
+
+    Args:
+        data: DataFrame or iterator of DataFrame chunks
+
+    Returns:
+        The DataFrame itself, or all chunks concatenated
+    """
+    if isinstance(data, pd.DataFrame):
+        return data
+    chunks = list(data)
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
@@ -15,6 +15,36 @@ from datetime import datetime
 from src.utils.helpers import ensure_directory_exists
 
 
+def update_analysed_file_path(file_id: str, db_adapter=None) -> None:
+    """
+    Store the analysed file path on the task document.
+    
+    Args:
+        file_id: File identifier
+        db_adapter: Database adapter (nothing is stored when None)
+    """
+    if db_adapter is None:
+        return
+    try:
+        # Store relative path (e.g., "analysed/{file_id}.csv") for cross-container compatibility
+        # Both backend and microservice can resolve this relative to their own storage paths
+        relative_path = os.path.join('analysed', f"{file_id}.csv")
+        
+        db_adapter.update_one(
+            'tasks',
+            {'data.file_id': file_id},
+            {
+                'data.file_analysed.path': relative_path,
+                'data.file_analysed.type': 'text/csv',
+                'updatedAt': datetime.utcnow(),
+                'updatedBy': 'system',
+            }
+        )
+        print(f"Updated task with analysed file path (relative): {relative_path}")
+    except Exception as exc:
+        print(f"Warning: failed to update task with analysed file path: {exc}")
+
+
 def saving(file_id: str, df, event_emitter: callable, db_adapter=None) -> str:
     """
     Save the analysed dataset.
@@ -41,25 +71,7 @@ def saving(file_id: str, df, event_emitter: callable, db_adapter=None) -> str:
     
     print(f"Saved analysed dataset to: {analysed_path}")
 
-    if db_adapter is not None:
-        try:
-            # Store relative path (e.g., "analysed/{file_id}.csv") for cross-container compatibility
-            # Both backend and microservice can resolve this relative to their own storage paths
-            relative_path = os.path.join('analysed', f"{file_id}.csv")
-            
-            db_adapter.update_one(
-                'tasks',
-                {'data.file_id': file_id},
-                {
-                    'data.file_analysed.path': relative_path,
-                    'data.file_analysed.type': 'text/csv',
-                    'updatedAt': datetime.utcnow(),
-                    'updatedBy': 'system',
-                }
-            )
-            print(f"Updated task with analysed file path (relative): {relative_path}")
-        except Exception as exc:
-            print(f"Warning: failed to update task with analysed file path: {exc}")
+    update_analysed_file_path(file_id, db_adapter)
     
     # Emit saving completion event
     event_emitter(
@@ -0,0 +1,526 @@
+"""Chunked, pipelined execution of the dataset processing steps."""
+import os
+import sys
+import queue
+import shutil
+import sqlite3
+import threading
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Add src to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.configs.env import STORAGE_CLEANED, STORAGE_ANALYSED, PIPELINE_QUEUE_DEPTH, PIPELINE_OUTLIER_SAMPLE_ROWS
+from src.configs.constants import (
+    TASK_STATUS_READING_DATASET_DONE,
+    TASK_STATUS_PROCESS_CLEANING, TASK_STATUS_PROCESS_CLEANING_DONE,
+    TASK_STATUS_SENDING_TO_LLM, TASK_STATUS_SENDING_TO_LLM_PROGRESS,
+    TASK_STATUS_SENDING_TO_LLM_DONE,
+    TASK_STATUS_APPENDING_COLUMNS_DONE,
+    TASK_STATUS_SAVING_FILE, TASK_STATUS_SAVING_FILE_DONE,
+    TASK_STATUS_DONE,
+)
+from src.lib.cache.base import BaseCache
+from src.lib.llm import CascadeClassifier, LlmCheckpoint, create_retry_policy
+from src.services.cleaning import clean_text_series, update_cleaned_file_path
+from src.services.calling_llm import (
+    calling_llm, derive_dataset_topic_vocabulary, save_shared_llm_state,
+    update_near_duplicate_stats, update_topic_aliases,
+)
+from src.services.appending_columns import appending_columns
+from src.services.saving import update_analysed_file_path
+from src.utils.helpers import ensure_directory_exists
+
+# Columns never filtered as outliers (same as cleaning())
+_OUTLIER_EXCLUDED_COLUMNS = ('id', 'user_id')
+
+# Hashes looked up per query when dropping duplicates (SQLite bound parameter limit)
+_SEEN_QUERY_SIZE = 500
+
+# Marks the end of a stage's output
+_END = object()
+# Marks the end of the dataset for the cleaning stage
+_LAST = object()
+
+
+class PipelineAborted(Exception):
+    """Raised inside a stage when another stage has failed."""
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> None:
+    """Put an item on a bounded queue, giving up if the pipeline is stopping."""
+    while True:
+        if stop.is_set():
+            raise PipelineAborted()
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    """Get an item from a queue, giving up if the pipeline is stopping."""
+    while True:
+        if stop.is_set():
+            raise PipelineAborted()
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+
+def run_stages(source: Iterable, stages: List[Callable], queue_depth: int = PIPELINE_QUEUE_DEPTH) -> None:
+    """
+    Run items from source through stages, one thread per stage.
+
+    Stages are connected by queues holding at most queue_depth items, so
+    at most (queue_depth + 1) items per stage are alive at any time and a
+    slow stage applies back-pressure to the ones before it. Each stage is
+    called with one item and returns the item for the next stage (or None
+    to drop it); items keep their source order.
+
+    Args:
+        source: Iterable producing the items (consumed in its own thread)
+        stages: Callables applied in order
+        queue_depth: Maximum items waiting between two stages
+
+    Raises:
+        The first exception raised by the source or any stage
+    """
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    queues = [queue.Queue(maxsize=max(1, queue_depth)) for _ in stages]
+
+    def run(target: Callable) -> None:
+        try:
+            target()
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    def produce() -> None:
+        for item in source:
+            _put(queues[0], item, stop)
+        _put(queues[0], _END, stop)
+
+    def consume(index: int) -> Callable:
+        def stage_loop() -> None:
+            while True:
+                item = _get(queues[index], stop)
+                if item is _END:
+                    break
+                result = stages[index](item)
+                if result is not None and index + 1 < len(stages):
+                    _put(queues[index + 1], result, stop)
+            if index + 1 < len(stages):
+                _put(queues[index + 1], _END, stop)
+        return stage_loop
+
+    threads = [threading.Thread(target=run, args=(produce,), name='pipeline-source', daemon=True)]
+    threads += [
+        threading.Thread(target=run, args=(consume(i),), name=f'pipeline-stage-{i}', daemon=True)
+        for i in range(len(stages))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+
+class _CsvAppender:
+    """Write DataFrame chunks to one CSV file, published atomically on close."""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.partial_path = f"{self.path}.part"
+        self.rows = 0
+        self._header_written = False
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        chunk.to_csv(
+            self.partial_path,
+            mode='a' if self._header_written else 'w',
+            header=not self._header_written,
+            index=False,
+        )
+        self._header_written = True
+        self.rows += len(chunk)
+
+    def close(self, columns: List[str]) -> str:
+        if not self._header_written:
+            pd.DataFrame(columns=columns).to_csv(self.partial_path, index=False)
+        os.replace(self.partial_path, self.path)
+        return self.path
+
+    def discard(self) -> None:
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
+
+
+class _SeenRows:
+    """
+    Hashes of the rows kept so far, to drop later duplicates like cleaning().
+
+    The hashes live in a SQLite table on disk, so memory does not grow with
+    the dataset; each chunk costs one indexed lookup and one insert per row.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=OFF')
+        self.conn.execute('PRAGMA synchronous=OFF')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS seen (hash INTEGER PRIMARY KEY) WITHOUT ROWID')
+
+    @staticmethod
+    def hashes(chunk: pd.DataFrame) -> np.ndarray:
+        """Hash the rows of a chunk (as signed 64-bit integers, which SQLite stores)."""
+        # Hash numeric columns as float so a column parsed as int in one chunk
+        # and float in another still matches, as it would in a single read
+        numeric_columns = chunk.select_dtypes(include=[np.number]).columns
+        hashed = chunk.astype({column: np.float64 for column in numeric_columns})
+        return pd.util.hash_pandas_object(hashed, index=False).to_numpy().view(np.int64)
+
+    def first_seen(self, chunk: pd.DataFrame) -> np.ndarray:
+        """
+        Get the rows of a chunk not seen before, and record them.
+
+        Returns:
+            Boolean mask of the first occurrence of each row over all chunks so far
+        """
+        hashes = self.hashes(chunk)
+        keep = ~pd.Series(hashes).duplicated().to_numpy()
+        candidates = hashes[keep].tolist()
+        seen = set()
+        for start in range(0, len(candidates), _SEEN_QUERY_SIZE):
+            part = candidates[start:start + _SEEN_QUERY_SIZE]
+            seen.update(row[0] for row in self.conn.execute(
+                f'SELECT hash FROM seen WHERE hash IN ({",".join("?" * len(part))})', part
+            ))
+        if seen:
+            keep &= ~np.isin(hashes, np.fromiter(seen, dtype=np.int64, count=len(seen)))
+        self.conn.executemany('INSERT INTO seen (hash) VALUES (?)', ((value,) for value in hashes[keep].tolist()))
+        self.conn.commit()
+        return keep
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class _OutlierBounds:
+    """
+    IQR bounds of the numeric columns, fixed on the first rows of a dataset.
+
+    ``fit`` filters a frame exactly like cleaning() (columns in order, each
+    on the rows left by the previous one) and keeps the bounds it used;
+    ``apply`` filters later chunks with them.
+    """
+
+    def __init__(self):
+        self.bounds: Dict[str, tuple] = {}
+
+    def fit(self, frame: pd.DataFrame) -> pd.DataFrame:
+        numeric_columns = [
+            column for column in frame.select_dtypes(include=[np.number]).columns
+            if column not in _OUTLIER_EXCLUDED_COLUMNS
+        ]
+        for column in numeric_columns:
+            q1 = frame[column].quantile(0.25)
+            q3 = frame[column].quantile(0.75)
+            iqr = q3 - q1
+            if iqr > 0:  # Only if there's variation
+                self.bounds[column] = (q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+                frame = self.apply(frame, [column])
+        return frame
+
+    def apply(self, chunk: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        for column in columns or list(self.bounds):
+            if column in chunk.columns and pd.api.types.is_numeric_dtype(chunk[column]):
+                lower_bound, upper_bound = self.bounds[column]
+                chunk = chunk[(chunk[column] >= lower_bound) & (chunk[column] <= upper_bound)]
+        return chunk
+
+
+class _LlmProgress:
+    """
+    Turn per-chunk calling_llm events into dataset-wide events.
+
+    Start and done events are emitted once for the whole dataset by the
+    pipeline; progress payloads are offset by the chunks already processed.
+    ``total_rows`` is raised by the pipeline as chunks are cleaned.
+    """
+
+    def __init__(self, file_id: str, event_emitter: Callable, total_rows: int):
+        self.file_id = file_id
+        self.event_emitter = event_emitter
+        self.total_rows = total_rows
+        self.rows_before = 0
+        self.batches_before = 0
+        self.unique_before = 0
+        self.chunk = 0
+        self.summary = {
+            'total_rows': 0,
+            'total_batches': 0,
+            'model_uid': None,
+            'unique_texts': 0,
+            'duplicates_skipped': 0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'checkpoint_hits': 0,
+        }
+
+    def emitter_for_chunk(self, chunk_rows: int) -> Callable:
+        self.chunk += 1
+        rows_before, batches_before, unique_before = self.rows_before, self.batches_before, self.unique_before
+        chunk = self.chunk
+
+        def emit(file_id: str, event: str, payload: Optional[Dict] = None):
+            if event == TASK_STATUS_SENDING_TO_LLM:
+                return
+            if event == TASK_STATUS_SENDING_TO_LLM_DONE:
+                for key in ('total_rows', 'total_batches', 'unique_texts',
+                            'duplicates_skipped', 'cache_hits', 'cache_misses', 'checkpoint_hits'):
+                    self.summary[key] += payload.get(key, 0)
+                for key in ('hedged_requests', 'hedge_wins', 'cascade_hits', 'cascade_rows',
+                            'near_duplicate_clusters', 'near_duplicates_skipped', 'topic_rows_rewritten',
+                            'input_tokens_saved', 'input_rows'):
+                    if key in payload:
+                        self.summary[key] = self.summary.get(key, 0) + payload[key]
+                if 'near_duplicate_sizes' in payload:
+                    sizes = self.summary.setdefault('near_duplicate_sizes', {})
+                    for size, count in payload['near_duplicate_sizes'].items():
+                        sizes[size] = sizes.get(size, 0) + count
+                if 'cascade_rows' in self.summary:
+                    self.summary['cascade_fraction'] = round(
+                        self.summary['cascade_rows'] / self.summary['total_rows'], 4
+                    ) if self.summary['total_rows'] > 0 else 0.0
+                if 'input_rows' in self.summary:
+                    self.summary['input_tokens_saved_per_row'] = round(
+                        self.summary['input_tokens_saved'] / self.summary['input_rows'], 2
+                    ) if self.summary['input_rows'] > 0 else 0.0
+                if 'topic_vocabulary' in payload:
+                    self.summary['topic_vocabulary'] = payload['topic_vocabulary']
+                if 'topic_aliases' in payload:
+                    self.summary.setdefault('topic_aliases', {}).update(payload['topic_aliases'])
+                self.summary['model_uid'] = payload.get('model_uid') or self.summary['model_uid']
+                self.batches_before += payload.get('total_batches', 0)
+                self.unique_before += payload.get('unique_texts', 0)
+                return
+            if event == TASK_STATUS_SENDING_TO_LLM_PROGRESS and payload:
+                rows_processed = rows_before + payload['rows_processed']
+                payload = dict(payload)
+                payload.update({
+                    'chunk': chunk,
+                    'batch': batches_before + payload['batch'],
+                    'total_batches': batches_before + payload['total_batches'],
+                    'batches_completed': batches_before + payload['batches_completed'],
+                    'total_rows': self.total_rows,
+                    'rows_processed': rows_processed,
+                    'rows_remaining': max(0, self.total_rows - rows_processed),
+                    'total_unique_texts': unique_before + payload['total_unique_texts'],
+                    'unique_texts_processed': unique_before + payload['unique_texts_processed'],
+                    'progress_percentage': int(rows_processed / self.total_rows * 100) if self.total_rows else 0,
+                    'current_row_index': rows_before + payload['current_row_index'],
+                    'current_row_end': rows_before + payload['current_row_end'],
+                })
+            self.event_emitter(file_id, event, payload)
+
+        self.rows_before += chunk_rows
+        return emit
+
+
+def run_pipeline(
+    file_id: str,
+    chunks: Iterator[pd.DataFrame],
+    ai_config: dict,
+    event_emitter: Callable,
+    db_adapter=None,
+    cache: Optional[BaseCache] = None,
+    checkpoint: Optional[LlmCheckpoint] = None,
+    cascade: Optional[CascadeClassifier] = None,
+    update_status: Optional[Callable[[str], None]] = None,
+    queue_depth: int = PIPELINE_QUEUE_DEPTH,
+    outlier_sample_rows: int = PIPELINE_OUTLIER_SAMPLE_ROWS,
+) -> str:
+    """
+    Process a chunked dataset with overlapping read, clean, LLM and write stages.
+
+    Chunks flow through read -> clean -> LLM -> write in one pass: the next
+    chunk is read and cleaned (and appended to the cleaned file) while the
+    LLM classifies the current one and the previous one is appended to the
+    analysed file. Rows are filtered like ``cleaning()`` with bounded state:
+
+    - duplicates of any earlier row are dropped, the row hashes being kept
+      in a SQLite table on disk rather than in memory;
+    - IQR outlier bounds are computed on the first ``outlier_sample_rows``
+      rows (buffered before they are released) and applied to every later
+      chunk. Datasets no larger than the sample are filtered exactly like
+      ``cleaning()``.
+
+    State shared by the whole dataset is handled once rather than per chunk:
+    in vocabulary mode the topic vocabulary is derived from the first rows
+    released (the outlier sample, or the whole dataset when it is smaller),
+    and the cascade and the topic alias table are saved after the last chunk.
+
+    The cleaned and analysed files only replace existing ones once complete.
+    Until the whole file has been cleaned, LLM progress events count the rows
+    cleaned so far as the total.
+
+    Peak memory is bounded by the queue depth times the chunk size, plus the
+    outlier sample.
+
+    Args:
+        file_id: File identifier
+        chunks: Iterator of raw DataFrame chunks (see ``reading_file``)
+        ai_config: AI configuration dictionary
+        event_emitter: Function to emit events (file_id, event, payload)
+        db_adapter: Database adapter for the cleaned/analysed file paths
+        cache: Persistent LLM classification cache (optional)
+        checkpoint: Per-file record of completed LLM batches used to resume (optional)
+        cascade: Local classifier tried before the LLM (optional)
+        update_status: Called with each completed step status
+        queue_depth: Maximum chunks waiting between two stages
+        outlier_sample_rows: Rows the outlier bounds are computed on
+
+    Returns:
+        Path to the analysed file
+    """
+    update_status = update_status or (lambda status: None)
+
+    ensure_directory_exists(STORAGE_CLEANED)
+    ensure_directory_exists(STORAGE_ANALYSED)
+    work_dir = os.path.join(STORAGE_CLEANED, f".{file_id}.pipeline")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+
+    cleaned_writer = _CsvAppender(os.path.join(STORAGE_CLEANED, f"{file_id}.csv"))
+    analysed_writer = _CsvAppender(os.path.join(STORAGE_ANALYSED, f"{file_id}.csv"))
+    seen = _SeenRows(os.path.join(work_dir, 'seen.sqlite'))
+
+    try:
+        outliers = _OutlierBounds()
+        sample: List[pd.DataFrame] = []
+        columns: List[str] = []
+        dtypes: Dict[str, object] = {}
+        stats = {'chunks': 0, 'initial_rows': 0, 'final_rows': 0, 'duplicates_removed': 0, 'outliers_removed': 0}
+        progress = _LlmProgress(file_id, event_emitter, 0)
+        # One retry budget for the whole dataset, not one per chunk
+        retry_policy = create_retry_policy()
+
+        def filter_rows(frame: pd.DataFrame, fit: bool) -> Optional[pd.DataFrame]:
+            """Drop duplicates and outliers, append what is left to the cleaned file."""
+            before = len(frame)
+            frame = frame[seen.first_seen(frame)]
+            stats['duplicates_removed'] += before - len(frame)
+            before = len(frame)
+            frame = outliers.fit(frame) if fit else outliers.apply(frame)
+            stats['outliers_removed'] += before - len(frame)
+            if not len(frame):
+                return None
+            cleaned_writer.write(frame)
+            stats['final_rows'] += len(frame)
+            progress.total_rows = stats['final_rows']
+            return frame
+
+        def release_sample() -> Optional[pd.DataFrame]:
+            """Fix the outlier bounds on the buffered rows and release them."""
+            frame = pd.concat(sample, ignore_index=True)
+            sample.clear()
+            dtypes.update(frame.dtypes.to_dict())
+            return filter_rows(frame, fit=True)
+
+        def clean_chunk(chunk) -> Optional[pd.DataFrame]:
+            if chunk is _LAST:
+                frame = release_sample() if sample else None
+                if not stats['chunks']:
+                    event_emitter(file_id, TASK_STATUS_PROCESS_CLEANING)
+                update_status(TASK_STATUS_READING_DATASET_DONE)
+                print(f"Cleaned dataset: removed {stats['duplicates_removed']} duplicates, "
+                      f"{stats['outliers_removed']} outliers")
+                print(f"Final dataset: {stats['final_rows']} rows")
+                event_emitter(file_id, TASK_STATUS_PROCESS_CLEANING_DONE, {
+                    **{key: stats[key] for key in ('initial_rows', 'final_rows', 'duplicates_removed',
+                                                   'outliers_removed', 'chunks')},
+                    'cleaned_path': cleaned_writer.path,
+                })
+                update_status(TASK_STATUS_PROCESS_CLEANING_DONE)
+                return frame
+
+            if not stats['chunks']:
+                event_emitter(file_id, TASK_STATUS_PROCESS_CLEANING)
+                columns.extend(chunk.columns)
+            stats['chunks'] += 1
+            stats['initial_rows'] += len(chunk)
+            if 'full_text' in chunk.columns:
+                chunk['full_text'] = clean_text_series(chunk['full_text'])
+
+            if not dtypes:
+                sample.append(chunk)
+                if sum(len(part) for part in sample) < outlier_sample_rows:
+                    return None
+                return release_sample()
+            # A numeric column parsed as int in this chunk but as float before stays float
+            widened = {
+                column: np.float64 for column, dtype in chunk.dtypes.items()
+                if column in dtypes and dtype != dtypes[column]
+                and pd.api.types.is_numeric_dtype(dtype) and pd.api.types.is_float_dtype(dtypes[column])
+            }
+            return filter_rows(chunk.astype(widened) if widened else chunk, fit=False)
+
+        llm_started = []
+        topic_vocabulary: List[str] = []
+
+        def classify_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+            chunk = chunk.reset_index(drop=True)
+            if not llm_started:
+                llm_started.append(True)
+                event_emitter(file_id, TASK_STATUS_SENDING_TO_LLM)
+                topic_vocabulary.extend(derive_dataset_topic_vocabulary(chunk, ai_config, checkpoint, retry_policy))
+            chunk, _ = calling_llm(
+                file_id, chunk, ai_config, progress.emitter_for_chunk(len(chunk)),
+                cache=cache, checkpoint=checkpoint, cascade=cascade, retry_policy=retry_policy,
+                topic_vocabulary=topic_vocabulary, save_state=False,
+            )
+            return chunk
+
+        run_stages(chain(chunks, [_LAST]), [clean_chunk, classify_chunk, analysed_writer.write], queue_depth)
+        if not llm_started:
+            event_emitter(file_id, TASK_STATUS_SENDING_TO_LLM)
+        cleaned_writer.close(columns)
+        update_cleaned_file_path(file_id, db_adapter)
+
+        if llm_started:
+            save_shared_llm_state(cascade)
+        if 'near_duplicate_sizes' in progress.summary:
+            update_near_duplicate_stats(file_id, progress.summary['near_duplicate_sizes'], db_adapter)
+        if 'topic_aliases' in progress.summary:
+            update_topic_aliases(file_id, progress.summary['topic_aliases'], db_adapter)
+        event_emitter(file_id, TASK_STATUS_SENDING_TO_LLM_DONE, progress.summary)
+        update_status(TASK_STATUS_SENDING_TO_LLM_DONE)
+
+        appending_columns(file_id, event_emitter)
+        update_status(TASK_STATUS_APPENDING_COLUMNS_DONE)
+
+        event_emitter(file_id, TASK_STATUS_SAVING_FILE)
+        analysed_path = analysed_writer.close(columns + ['sentiment', 'priority', 'main_topic'])
+        print(f"Saved analysed dataset to: {analysed_path}")
+        update_analysed_file_path(file_id, db_adapter)
+        event_emitter(file_id, TASK_STATUS_SAVING_FILE_DONE, {'analysed_path': analysed_path})
+        event_emitter(file_id, TASK_STATUS_DONE)
+        update_status(TASK_STATUS_DONE)
+
+        return analysed_path
+    finally:
+        seen.close()
+        cleaned_writer.discard()
+        analysed_writer.discard()
+        shutil.rmtree(work_dir, ignore_errors=True)
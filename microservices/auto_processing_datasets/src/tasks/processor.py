@@ -1,7 +1,6 @@
 """Celery tasks for dataset processing."""
 import sys
 import os
-import pandas as pd
 from datetime import datetime
 from typing import Dict, Optional
 
@@ -12,7 +11,7 @@ from src.celery_app import celery_app
 from src.configs.constants import (
     TASK_STATUS_ADDED,
     TASK_STATUS_IN_QUEUE, TASK_STATUS_READING_DATASET,
-    TASK_STATUS_READING_DATASET_DONE,
+    TASK_STATUS_READING_DATASET_PROGRESS, TASK_STATUS_READING_DATASET_DONE,
     TASK_STATUS_PROCESS_CLEANING, TASK_STATUS_PROCESS_CLEANING_DONE,
     TASK_STATUS_SENDING_TO_LLM, TASK_STATUS_SENDING_TO_LLM_PROGRESS,
     TASK_STATUS_SENDING_TO_LLM_DONE,
@@ -20,13 +19,18 @@ from src.configs.constants import (
     TASK_STATUS_SAVING_FILE, TASK_STATUS_SAVING_FILE_DONE,
     TASK_STATUS_DONE, TASK_STATUS_ON_ERROR
 )
-from src.services import (
-    reading_file, cleaning, calling_llm,
-    appending_columns, saving
-)
+from src.services import reading_file
 from src.lib.database.service import DatabaseService
+from src.lib.rabbitmq import get_event_publisher
+from src.lib.cache import create_llm_cache
+from src.lib.llm import create_llm_cascade, create_llm_checkpoint, get_model_health_registry
+from src.tasks.pipeline import run_pipeline
+from src.tasks.stages import (
+    StageContext, pending_stages, remove_stage_artifacts, rerun_from_status, run_stage_graph
+)
 from src.configs.env import (
-    DB_TYPE, DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+    DB_TYPE, DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD,
+    PIPELINE_MODE, READING_STREAM_MIN_BYTES
 )
 from src.utils.logger import setup_logger
 
@@ -75,22 +79,68 @@ def get_db_adapter():
     return adapter
 
 
+_llm_cache = None
+_llm_cache_loaded = False
+
+def get_llm_cache(db_adapter=None):
+    """Get the persistent LLM classification cache (cached per worker process).
+    
+    Returns None if the cache is disabled or could not be opened, in which
+    case every row is sent to the LLM.
+    """
+    global _llm_cache, _llm_cache_loaded
+    
+    if not _llm_cache_loaded:
+        try:
+            _llm_cache = create_llm_cache(db_adapter)
+        except Exception as e:
+            task_logger.warning(f"LLM cache unavailable, continuing without it: {e}")
+            _llm_cache = None
+        _llm_cache_loaded = True
+    
+    return _llm_cache
+
+
+_llm_cascade = None
+_llm_cascade_loaded = False
+
+def get_llm_cascade():
+    """Get the cascade classifier tried before the LLM (cached per worker process).
+    
+    Returns None if the cascade is disabled or could not be loaded, in which
+    case every row is sent to the LLM. Versions saved by other workers are
+    picked up before each use.
+    """
+    global _llm_cascade, _llm_cascade_loaded
+    
+    if not _llm_cascade_loaded:
+        try:
+            _llm_cascade = create_llm_cascade()
+        except Exception as e:
+            task_logger.warning(f"LLM cascade unavailable, continuing without it: {e}")
+            _llm_cascade = None
+        _llm_cascade_loaded = True
+    
+    return _llm_cascade
+
+
+def use_pipeline(file_path: str) -> bool:
+    """Check whether a dataset should run through the chunked pipeline (see PIPELINE_MODE)."""
+    if PIPELINE_MODE == 'always':
+        return True
+    if PIPELINE_MODE == 'never':
+        return False
+    return os.path.getsize(file_path) >= READING_STREAM_MIN_BYTES
+
+
 def emit_event(file_id: str, event: str, db_adapter=None, payload: Optional[Dict] = None):
-    """Emit event to RabbitMQ for frontend to listen."""
+    """Emit event to RabbitMQ for frontend to listen.
+    
+    Events are handed to the per-process publisher, which reuses one
+    connection and publishes queued events in batches with publisher confirms.
+    """
     try:
-        import pika
         import json
-        from src.configs.env import RABBITMQ_URL, RABBITMQ_TOPIC_TASKS
-        
-        connection = pika.BlockingConnection(pika.URLParameters(RABBITMQ_URL))
-        channel = connection.channel()
-        
-        # Declare exchange before publishing
-        channel.exchange_declare(
-            exchange=RABBITMQ_TOPIC_TASKS,
-            exchange_type='topic',
-            durable=True
-        )
         
         message_payload = {'file_id': file_id, 'event': event}
         if payload:
@@ -101,14 +151,8 @@ def emit_event(file_id: str, event: str, db_adapter=None, payload: Optional[Dict
         # Routing key format: {fileId}.{event} to match frontend subscription pattern
         # Frontend subscribes to: /exchange/tasks/{fileId}.*
         routing_key = f"{file_id}.{event}"
-        channel.basic_publish(
-            exchange=RABBITMQ_TOPIC_TASKS,
-            routing_key=routing_key,
-            body=message,
-            properties=pika.BasicProperties(delivery_mode=2)
-        )
+        get_event_publisher(task_logger).publish(routing_key, message)
         
-        connection.close()
         if payload:
             task_logger.info(f"Emitted event: {event} for file_id: {file_id} | payload: {payload}")
         else:
@@ -117,6 +161,15 @@ def emit_event(file_id: str, event: str, db_adapter=None, payload: Optional[Dict
         task_logger.error(f"Error emitting event: {e}", exc_info=True)
 
 
+def flush_events(timeout: float = 30.0) -> None:
+    """Wait for queued events to be confirmed by RabbitMQ."""
+    try:
+        if not get_event_publisher(task_logger).flush(timeout):
+            task_logger.warning(f"Timed out after {timeout}s waiting for events to be published")
+    except Exception as e:
+        task_logger.error(f"Error flushing events: {e}", exc_info=True)
+
+
 def update_task_status(file_id: str, status: str, db_adapter=None):
     """Update task status in database."""
     try:
@@ -150,7 +203,6 @@ def process_dataset(self, file_id: str, file_path: str, ai_config: dict, last_st
         last_step: Last step to resume from (optional)
     """
     db_adapter = None
-    df = None
     
     try:
         task_logger.info(f"Starting task processing for file_id: {file_id}, file_path: {file_path}, last_step: {last_step}")
@@ -161,11 +213,20 @@ def process_dataset(self, file_id: str, file_path: str, ai_config: dict, last_st
         def event_emitter(fid: str, evt: str, payload: Optional[Dict] = None):
             emit_event(fid, evt, payload=payload)
         
+        # Share model circuit breakers with the other workers (LLM_HEALTH_BACKEND=mongodb)
+        get_model_health_registry(db_adapter)
+        # Completed LLM batches are recorded here so a resumed task skips them
+        llm_checkpoint = create_llm_checkpoint(file_id)
+        
+        # The step the task stopped at and the ones after it run again
+        rerun_from = rerun_from_status(last_step)
+
         # Determine starting point
         if not last_step or last_step == TASK_STATUS_IN_QUEUE or last_step == TASK_STATUS_ADDED:
             last_step = TASK_STATUS_IN_QUEUE
         
         step_aliases = {
+            TASK_STATUS_READING_DATASET_PROGRESS: TASK_STATUS_READING_DATASET,
             TASK_STATUS_READING_DATASET_DONE: TASK_STATUS_PROCESS_CLEANING,
             TASK_STATUS_PROCESS_CLEANING_DONE: TASK_STATUS_SENDING_TO_LLM,
             TASK_STATUS_SENDING_TO_LLM_PROGRESS: TASK_STATUS_SENDING_TO_LLM,
@@ -183,166 +244,38 @@ def process_dataset(self, file_id: str, file_path: str, ai_config: dict, last_st
         update_task_status(file_id, last_step, db_adapter)
         task_logger.info(f"Task {file_id} starting from step: {last_step}")
         
-        # Process pipeline based on last_step
-        if last_step == TASK_STATUS_IN_QUEUE:
-            # Start from beginning
-            # Services emit their own events (reading_dataset -> reading_dataset_done, etc.)
-            # We only update database status to reflect current state
-            task_logger.info(f"Task {file_id}: Step 1 - Reading dataset")
-            file_id, df = reading_file(file_path, event_emitter)
-            # reading_file emits reading_dataset and reading_dataset_done events
-            # Update DB to reflect completion of reading_dataset step
-            update_task_status(file_id, TASK_STATUS_READING_DATASET_DONE, db_adapter)
-            
-            task_logger.info(f"Task {file_id}: Step 2 - Cleaning dataset")
-            df = cleaning(file_id, df, event_emitter, db_adapter)
-            # cleaning emits process_cleaning and process_cleaning_done events
-            # Update DB to reflect completion of cleaning step
-            update_task_status(file_id, TASK_STATUS_PROCESS_CLEANING_DONE, db_adapter)
-            
-            task_logger.info(f"Task {file_id}: Step 3 - Calling LLM")
-            df, _ = calling_llm(file_id, df, ai_config, event_emitter)
-            # calling_llm emits sending_to_llm, sending_to_llm_progression, and sending_to_llm_done events
-            # Update DB to reflect completion of LLM step
-            update_task_status(file_id, TASK_STATUS_SENDING_TO_LLM_DONE, db_adapter)
-            
-            task_logger.info(f"Task {file_id}: Step 4 - Appending columns")
-            appending_columns(file_id, event_emitter)
-            # appending_columns emits appending_collumns and appending_collumns_done events
-            # Update DB to reflect completion of appending columns step
-            update_task_status(file_id, TASK_STATUS_APPENDING_COLUMNS_DONE, db_adapter)
-            
-            task_logger.info(f"Task {file_id}: Step 5 - Saving file")
-            saving(file_id, df, event_emitter, db_adapter)
-            # saving emits saving_file, saving_file_done, and done events
-            # Update DB to reflect completion (done event is already emitted by saving service)
-            update_task_status(file_id, TASK_STATUS_DONE, db_adapter)
-            
-        elif last_step == TASK_STATUS_READING_DATASET:
-            # Resume from cleaning - services emit their own events
-            file_id, df = reading_file(file_path, event_emitter)
-            update_task_status(file_id, TASK_STATUS_READING_DATASET_DONE, db_adapter)
-            
-            df = cleaning(file_id, df, event_emitter, db_adapter)
-            update_task_status(file_id, TASK_STATUS_PROCESS_CLEANING_DONE, db_adapter)
-            
-            df, _ = calling_llm(file_id, df, ai_config, event_emitter)
-            update_task_status(file_id, TASK_STATUS_SENDING_TO_LLM_DONE, db_adapter)
-            
-            appending_columns(file_id, event_emitter)
-            update_task_status(file_id, TASK_STATUS_APPENDING_COLUMNS_DONE, db_adapter)
-            
-            saving(file_id, df, event_emitter, db_adapter)
-            update_task_status(file_id, TASK_STATUS_DONE, db_adapter)
-            
-        elif last_step == TASK_STATUS_PROCESS_CLEANING:
-            # Resume from LLM - need to read cleaned file
-            # If cleaned file exists, cleaning was already done, so continue from LLM
-            # Services emit their own events, we just update DB status
-            from src.configs.env import STORAGE_CLEANED
-            cleaned_path = os.path.join(STORAGE_CLEANED, f"{file_id}.csv")
-            if os.path.exists(cleaned_path):
-                # Cleaning already done, continue from LLM
-                # calling_llm will emit sending_to_llm event, so we don't need to emit it here
-                df = pd.read_csv(cleaned_path)
-            else:
-                # Need to redo cleaning
-                file_id, df = reading_file(file_path, event_emitter)
-                update_task_status(file_id, TASK_STATUS_READING_DATASET_DONE, db_adapter)
-                df = cleaning(file_id, df, event_emitter, db_adapter)
-                update_task_status(file_id, TASK_STATUS_PROCESS_CLEANING_DONE, db_adapter)
-            
-            # calling_llm emits sending_to_llm, sending_to_llm_progression, and sending_to_llm_done events
-            df, _ = calling_llm(file_id, df, ai_config, event_emitter)
-            update_task_status(file_id, TASK_STATUS_SENDING_TO_LLM_DONE, db_adapter)
-            
-            # appending_columns emits appending_collumns and appending_collumns_done events
-            appending_columns(file_id, event_emitter)
-            update_task_status(file_id, TASK_STATUS_APPENDING_COLUMNS_DONE, db_adapter)
-            
-            # saving emits saving_file, saving_file_done, and done events
-            saving(file_id, df, event_emitter, db_adapter)
-            update_task_status(file_id, TASK_STATUS_DONE, db_adapter)
-            
-        elif last_step == TASK_STATUS_SENDING_TO_LLM:
-            # Resume from LLM - need to read cleaned file
-            # Services emit their own events, we just update DB status
-            from src.configs.env import STORAGE_CLEANED
-            cleaned_path = os.path.join(STORAGE_CLEANED, f"{file_id}.csv")
-            if os.path.exists(cleaned_path):
-                # Cleaning already done, continue from LLM
-                # calling_llm will emit sending_to_llm event, so we don't need to emit it here
-                df = pd.read_csv(cleaned_path)
-            else:
-                # Need to redo cleaning
-                file_id, df = reading_file(file_path, event_emitter)
-                update_task_status(file_id, TASK_STATUS_READING_DATASET_DONE, db_adapter)
-                df = cleaning(file_id, df, event_emitter, db_adapter)
-                update_task_status(file_id, TASK_STATUS_PROCESS_CLEANING_DONE, db_adapter)
-            
-            # calling_llm emits sending_to_llm, sending_to_llm_progression, and sending_to_llm_done events
-            df, _ = calling_llm(file_id, df, ai_config, event_emitter)
-            update_task_status(file_id, TASK_STATUS_SENDING_TO_LLM_DONE, db_adapter)
-            
-            # appending_columns emits appending_collumns and appending_collumns_done events
-            appending_columns(file_id, event_emitter)
-            update_task_status(file_id, TASK_STATUS_APPENDING_COLUMNS_DONE, db_adapter)
-            
-            # saving emits saving_file, saving_file_done, and done events
-            saving(file_id, df, event_emitter, db_adapter)
-            update_task_status(file_id, TASK_STATUS_DONE, db_adapter)
-            
-        elif last_step == TASK_STATUS_APPENDING_COLUMNS:
-            # Resume from appending - need to read analysed file if exists
-            # Services emit their own events, we just update DB status
-            from src.configs.env import STORAGE_ANALYSED
-            analysed_path = os.path.join(STORAGE_ANALYSED, f"{file_id}.csv")
-            if os.path.exists(analysed_path):
-                # LLM processing already done, continue from appending columns
-                # appending_columns will emit appending_collumns event, so we don't need to emit it here
-                df = pd.read_csv(analysed_path)
-            else:
-                # Need to redo previous steps
-                file_id, df = reading_file(file_path, event_emitter)
-                update_task_status(file_id, TASK_STATUS_READING_DATASET_DONE, db_adapter)
-                df = cleaning(file_id, df, event_emitter, db_adapter)
-                update_task_status(file_id, TASK_STATUS_PROCESS_CLEANING_DONE, db_adapter)
-                df, _ = calling_llm(file_id, df, ai_config, event_emitter)
-                update_task_status(file_id, TASK_STATUS_SENDING_TO_LLM_DONE, db_adapter)
-            
-            # appending_columns emits appending_collumns and appending_collumns_done events
-            appending_columns(file_id, event_emitter)
-            update_task_status(file_id, TASK_STATUS_APPENDING_COLUMNS_DONE, db_adapter)
-            
-            # saving emits saving_file, saving_file_done, and done events
-            saving(file_id, df, event_emitter, db_adapter)
-            update_task_status(file_id, TASK_STATUS_DONE, db_adapter)
-            
-        elif last_step == TASK_STATUS_SAVING_FILE:
-            # Resume from saving - need to read analysed file if exists
-            # Services emit their own events, we just update DB status
-            from src.configs.env import STORAGE_ANALYSED
-            analysed_path = os.path.join(STORAGE_ANALYSED, f"{file_id}.csv")
-            if os.path.exists(analysed_path):
-                # Previous steps already done, continue from saving
-                # saving will emit saving_file event, so we don't need to emit it here
-                df = pd.read_csv(analysed_path)
-            else:
-                # Need to redo previous steps
-                file_id, df = reading_file(file_path, event_emitter)
-                update_task_status(file_id, TASK_STATUS_READING_DATASET_DONE, db_adapter)
-                df = cleaning(file_id, df, event_emitter, db_adapter)
-                update_task_status(file_id, TASK_STATUS_PROCESS_CLEANING_DONE, db_adapter)
-                df, _ = calling_llm(file_id, df, ai_config, event_emitter)
-                update_task_status(file_id, TASK_STATUS_SENDING_TO_LLM_DONE, db_adapter)
-                appending_columns(file_id, event_emitter)
-                update_task_status(file_id, TASK_STATUS_APPENDING_COLUMNS_DONE, db_adapter)
-            
-            # saving emits saving_file, saving_file_done, and done events
-            saving(file_id, df, event_emitter, db_adapter)
-            update_task_status(file_id, TASK_STATUS_DONE, db_adapter)
+        ctx = StageContext(
+            file_id, file_path, ai_config, event_emitter, db_adapter,
+            cache=get_llm_cache(db_adapter),
+            checkpoint=llm_checkpoint,
+            cascade=get_llm_cascade(),
+            update_status=lambda status: update_task_status(file_id, status, db_adapter),
+        )
+
+        # Stages before the step the task stopped at are skipped while their artifacts are valid
+        if last_step == TASK_STATUS_DONE:
+            task_logger.info(f"Task {file_id}: Already done, nothing to run")
+        elif use_pipeline(file_path) and 'clean' in pending_stages(ctx, rerun_from=rerun_from):
+            # Large dataset: read, clean, call the LLM and save chunk by chunk with overlapping stages
+            task_logger.info(f"Task {file_id}: Running chunked pipeline")
+            _, chunks = reading_file(file_path, event_emitter, stream=True)
+            run_pipeline(
+                file_id, chunks, ai_config, event_emitter, db_adapter,
+                cache=ctx.cache,
+                checkpoint=llm_checkpoint,
+                cascade=ctx.cascade,
+                update_status=ctx.update_status,
+            )
+            # Nothing to record: the pipeline discards its output when it fails and
+            # the stage manifest is removed below when it succeeds
+        else:
+            run_stage_graph(ctx, rerun_from=rerun_from)
         
         task_logger.info(f"Task {file_id} completed successfully")
+        # Results are saved, the checkpoint and resume artifacts are no longer needed
+        llm_checkpoint.remove()
+        remove_stage_artifacts(file_id)
+        flush_events()
         return {'success': True, 'file_id': file_id}
         
     except Exception as e:
@@ -352,7 +285,8 @@ def process_dataset(self, file_id: str, file_path: str, ai_config: dict, last_st
         
         if db_adapter:
             update_task_status(file_id, TASK_STATUS_ON_ERROR, db_adapter)
-            event_emitter(file_id, TASK_STATUS_ON_ERROR)
+            emit_event(file_id, TASK_STATUS_ON_ERROR)
+        flush_events()
         
         # Re-raise to let Celery handle retry
         raise self.retry(exc=e, countdown=60, max_retries=3)
@@ -0,0 +1,479 @@
+"""Declarative stage graph for dataset processing with artifact-based resume."""
+import os
+import sys
+import json
+import time
+import hashlib
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# Add src to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.configs.env import (
+    STORAGE_CLEANED, STORAGE_STAGES,
+    DEFAULT_LLM_RESPONSE_FORMAT, DEFAULT_LLM_TOPIC_MODE,
+    LLM_TOPIC_VOCABULARY_SIZE, LLM_TOPIC_SAMPLE_ROWS,
+    DEFAULT_LLM_NORMALIZE_INPUT, DEFAULT_LLM_MAX_INPUT_CHARS, LLM_INPUT_MAX_MENTIONS,
+    LLM_CASCADE_ENABLED, LLM_TOPIC_CANONICALIZE_ENABLED,
+)
+from src.configs.constants import (
+    LLM_PROMPT_VERSION,
+    TASK_STATUS_READING_DATASET, TASK_STATUS_READING_DATASET_PROGRESS,
+    TASK_STATUS_READING_DATASET_DONE,
+    TASK_STATUS_PROCESS_CLEANING, TASK_STATUS_PROCESS_CLEANING_DONE,
+    TASK_STATUS_SENDING_TO_LLM, TASK_STATUS_SENDING_TO_LLM_PROGRESS,
+    TASK_STATUS_SENDING_TO_LLM_DONE,
+    TASK_STATUS_APPENDING_COLUMNS, TASK_STATUS_APPENDING_COLUMNS_DONE,
+    TASK_STATUS_SAVING_FILE,
+    TASK_STATUS_DONE,
+)
+from src.lib.cache.base import BaseCache
+from src.lib.llm import CascadeClassifier, LlmCheckpoint
+from src.services.reading_file import reading_file, collect_dataset
+from src.services.cleaning import cleaning
+from src.services.calling_llm import calling_llm
+from src.services.appending_columns import appending_columns
+from src.services.saving import saving
+from src.utils.helpers import ensure_directory_exists
+
+# Bytes hashed per read when checksumming files
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+# Model settings that change the labels returned for the same posts
+_LABEL_MODEL_FIELDS = ('model', 'responseFormat', 'topicMode', 'normalizeInput', 'maxInputChars')
+
+
+class Stage:
+    """
+    One step of the processing graph.
+
+    A stage consumes named values produced by earlier stages (inputs) and
+    may produce one named value (output). When it declares an artifact, the
+    output is persisted there and later runs load it instead of re-running
+    the stage, as long as the artifact is still valid.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        done_status: str,
+        version: str,
+        run: Callable[..., Any],
+        inputs: Tuple[str, ...] = (),
+        output: Optional[str] = None,
+        artifact: Optional[Callable[[str], str]] = None,
+        dump: Optional[Callable[[Any, str], None]] = None,
+        load: Optional[Callable[[str], Any]] = None,
+        settings: Optional[Callable[['StageContext'], Any]] = None,
+        transient: bool = False,
+    ):
+        """
+        Args:
+            name: Stage name (used in the manifest)
+            done_status: Task status once the stage is complete
+            version: Bump to invalidate artifacts when the stage logic changes
+            run: Called as run(ctx, **inputs), returns the output value
+            inputs: Names of the values the stage needs
+            output: Name of the value the stage produces
+            artifact: Maps a file_id to the artifact path
+            dump: Persists the output to the artifact (None if run() writes it)
+            load: Loads the output back from the artifact
+            settings: Returns the (JSON-serialisable) task settings the output
+                depends on, part of the fingerprint
+            transient: The artifact only serves to resume and is removed once
+                the task is done
+        """
+        self.name = name
+        self.done_status = done_status
+        self.version = version
+        self.run = run
+        self.inputs = inputs
+        self.output = output
+        self.artifact = artifact
+        self.dump = dump
+        self.load = load
+        self.settings = settings
+        self.transient = transient
+
+
+class StageContext:
+    """Everything stages need to run for one dataset."""
+
+    def __init__(
+        self,
+        file_id: str,
+        file_path: str,
+        ai_config: dict,
+        event_emitter: Callable,
+        db_adapter=None,
+        cache: Optional[BaseCache] = None,
+        checkpoint: Optional[LlmCheckpoint] = None,
+        cascade: Optional[CascadeClassifier] = None,
+        update_status: Optional[Callable[[str], None]] = None,
+    ):
+        self.file_id = file_id
+        self.file_path = file_path
+        self.ai_config = ai_config
+        self.event_emitter = event_emitter
+        self.db_adapter = db_adapter
+        self.cache = cache
+        self.checkpoint = checkpoint
+        self.cascade = cascade
+        self.update_status = update_status or (lambda status: None)
+        self._source_checksum = None
+
+    def source_checksum(self) -> str:
+        """Get the sha256 of the source dataset (computed once)."""
+        if self._source_checksum is None:
+            self._source_checksum = file_checksum(self.file_path)
+        return self._source_checksum
+
+
+def _read(ctx: StageContext) -> pd.DataFrame:
+    _, data = reading_file(ctx.file_path, ctx.event_emitter)
+    return collect_dataset(data)
+
+
+def _clean(ctx: StageContext, raw: pd.DataFrame) -> pd.DataFrame:
+    return cleaning(ctx.file_id, raw, ctx.event_emitter, ctx.db_adapter)
+
+
+def _call_llm(ctx: StageContext, cleaned: pd.DataFrame) -> pd.DataFrame:
+    labelled, _ = calling_llm(
+        ctx.file_id, cleaned, ctx.ai_config, ctx.event_emitter,
+        cache=ctx.cache, checkpoint=ctx.checkpoint, cascade=ctx.cascade, db_adapter=ctx.db_adapter,
+    )
+    return labelled
+
+
+def _llm_settings(ctx: StageContext) -> dict:
+    """Get the AI settings and defaults the labels depend on."""
+    preferences = ctx.ai_config.get('preferences', {})
+    models = {
+        kind: [
+            [model.get('uid')] + [model.get('data', {}).get(field) for field in _LABEL_MODEL_FIELDS]
+            for model in ctx.ai_config.get(kind, [])
+        ]
+        for kind in ('external', 'local')
+    }
+    return {
+        'preferences': {
+            key: preferences.get(key)
+            for key in ('mode', 'default_external_model_id', 'default_local_model_id')
+        },
+        'models': models,
+        'defaults': [
+            DEFAULT_LLM_RESPONSE_FORMAT, DEFAULT_LLM_TOPIC_MODE,
+            LLM_TOPIC_VOCABULARY_SIZE, LLM_TOPIC_SAMPLE_ROWS,
+            DEFAULT_LLM_NORMALIZE_INPUT, DEFAULT_LLM_MAX_INPUT_CHARS, LLM_INPUT_MAX_MENTIONS,
+            LLM_CASCADE_ENABLED, LLM_TOPIC_CANONICALIZE_ENABLED,
+        ],
+    }
+
+
+def _append(ctx: StageContext) -> None:
+    appending_columns(ctx.file_id, ctx.event_emitter)
+
+
+def _save(ctx: StageContext, labelled: pd.DataFrame) -> None:
+    saving(ctx.file_id, labelled, ctx.event_emitter, ctx.db_adapter)
+
+
+def cleaned_artifact_path(file_id: str) -> str:
+    """Get the path of the cleaned dataset."""
+    return os.path.abspath(os.path.join(STORAGE_CLEANED, f"{file_id}.csv"))
+
+
+def labelled_artifact_path(file_id: str) -> str:
+    """Get the path of the LLM-labelled dataset kept for resume."""
+    return os.path.abspath(os.path.join(STORAGE_STAGES, f"{file_id}.labelled.pkl"))
+
+
+# Dataset processing graph, in execution order (the last stage is the target)
+DATASET_STAGES: List[Stage] = [
+    Stage('read', TASK_STATUS_READING_DATASET_DONE, '1', _read, output='raw'),
+    Stage(
+        'clean', TASK_STATUS_PROCESS_CLEANING_DONE, '1', _clean,
+        inputs=('raw',), output='cleaned',
+        artifact=cleaned_artifact_path, load=pd.read_csv,
+    ),
+    Stage(
+        'llm', TASK_STATUS_SENDING_TO_LLM_DONE, f"1-prompt{LLM_PROMPT_VERSION}", _call_llm,
+        inputs=('cleaned',), output='labelled',
+        artifact=labelled_artifact_path,
+        dump=lambda df, path: df.to_pickle(path), load=pd.read_pickle,
+        settings=_llm_settings, transient=True,
+    ),
+    Stage('append', TASK_STATUS_APPENDING_COLUMNS_DONE, '1', _append),
+    Stage('save', TASK_STATUS_DONE, '1', _save, inputs=('labelled',)),
+]
+
+
+def file_checksum(path: str) -> str:
+    """Get the sha256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _manifest_path(file_id: str) -> str:
+    return os.path.join(STORAGE_STAGES, f"{file_id}.manifest.json")
+
+
+def load_manifest(file_id: str) -> Dict[str, dict]:
+    """Load the artifact manifest of a dataset (empty if missing or unreadable)."""
+    try:
+        with open(_manifest_path(file_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(file_id: str, manifest: Dict[str, dict]) -> None:
+    ensure_directory_exists(STORAGE_STAGES)
+    path = _manifest_path(file_id)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def stage_fingerprints(stages: List[Stage], ctx: StageContext) -> Dict[str, str]:
+    """
+    Get a fingerprint per stage covering its version and everything upstream.
+
+    A stage's fingerprint changes when its version or settings, the version
+    or settings of any stage feeding it, or the source dataset changes, so an
+    artifact recorded with a different fingerprint is stale.
+    """
+    producers = {stage.output: stage.name for stage in stages if stage.output}
+    fingerprints = {}
+    for stage in stages:
+        parts = [stage.name, stage.version]
+        parts += [fingerprints[producers[name]] for name in stage.inputs]
+        if not stage.inputs:
+            parts.append(ctx.source_checksum())
+        if stage.settings is not None:
+            parts.append(json.dumps(stage.settings(ctx), sort_keys=True, default=str))
+        fingerprints[stage.name] = hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+    return fingerprints
+
+
+def artifact_valid(stage: Stage, file_id: str, manifest: Dict[str, dict], fingerprint: str) -> bool:
+    """Check that a stage artifact exists, matches its checksum and is current."""
+    if stage.artifact is None:
+        return False
+    entry = manifest.get(stage.name)
+    if not entry or entry.get('fingerprint') != fingerprint:
+        return False
+    path = stage.artifact(file_id)
+    if 'checksum' not in entry or not os.path.exists(path):
+        return False
+    return file_checksum(path) == entry['checksum']
+
+
+def record_artifact(stage: Stage, file_id: str, fingerprint: str, duration: Optional[float] = None) -> None:
+    """
+    Record a completed stage in the manifest.
+
+    The checksum of the stage artifact is recorded when it was written, only
+    then can later runs load it instead of running the stage.
+    """
+    entry = {
+        'version': stage.version,
+        'fingerprint': fingerprint,
+        'duration_seconds': duration,
+        'createdAt': datetime.utcnow().isoformat(),
+    }
+    if stage.artifact is not None:
+        path = stage.artifact(file_id)
+        if os.path.exists(path):
+            entry.update({'checksum': file_checksum(path), 'path': path})
+        else:
+            print(f"Stage {stage.name} completed without writing its artifact: {path}")
+    manifest = load_manifest(file_id)
+    manifest[stage.name] = entry
+    _write_manifest(file_id, manifest)
+
+
+def remove_stage_artifacts(file_id: str, stages: Optional[List[Stage]] = None) -> None:
+    """Remove the transient artifacts and the manifest of a dataset once it is done."""
+    stages = stages or DATASET_STAGES
+    paths = [stage.artifact(file_id) for stage in stages if stage.transient and stage.artifact is not None]
+    for path in paths + [_manifest_path(file_id)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Warning: could not remove stage artifact {path}: {e}")
+
+
+# Stage a task must run again when it stopped at a given status
+_RERUN_FROM_STATUS = {
+    TASK_STATUS_READING_DATASET: 'read',
+    TASK_STATUS_READING_DATASET_PROGRESS: 'read',
+    TASK_STATUS_READING_DATASET_DONE: 'clean',
+    TASK_STATUS_PROCESS_CLEANING: 'clean',
+    TASK_STATUS_PROCESS_CLEANING_DONE: 'llm',
+    TASK_STATUS_SENDING_TO_LLM: 'llm',
+    TASK_STATUS_SENDING_TO_LLM_PROGRESS: 'llm',
+    TASK_STATUS_SENDING_TO_LLM_DONE: 'append',
+    TASK_STATUS_APPENDING_COLUMNS: 'append',
+    TASK_STATUS_APPENDING_COLUMNS_DONE: 'save',
+    TASK_STATUS_SAVING_FILE: 'save',
+}
+
+
+def rerun_from_status(status: Optional[str]) -> Optional[str]:
+    """
+    Get the first stage to run again for a task resumed or retried at a status.
+
+    Args:
+        status: Last status of the task
+
+    Returns:
+        Stage name, or None when the status does not point at a stage (task
+        not started yet or done), in which case the artifacts alone decide
+    """
+    return _RERUN_FROM_STATUS.get(status)
+
+
+def plan_stages(
+    stages: List[Stage],
+    file_id: str,
+    manifest: Dict[str, dict],
+    fingerprints: Dict[str, str],
+    rerun_from: Optional[str] = None,
+) -> Tuple[List[str], Dict[str, Stage]]:
+    """
+    Decide which stages to run and which values to load from artifacts.
+
+    Walking back from the target (always run), a needed value is loaded from
+    its producer's artifact when valid, otherwise the producer runs and its
+    own inputs become needed. Artifacts of rerun_from and the stages after it
+    are never loaded. Stages without output (side effects only) run when
+    they come after the first stage that runs.
+
+    Returns:
+        Tuple of (names of stages to run, value name -> stage to load it from)
+    """
+    target = stages[-1]
+    to_run = {target.name}
+    loads: Dict[str, Stage] = {}
+    needed = set(target.inputs)
+    names = [stage.name for stage in stages]
+    stale = set(names[names.index(rerun_from):]) if rerun_from else set()
+
+    for stage in reversed(stages[:-1]):
+        if not stage.output or stage.output not in needed:
+            continue
+        needed.discard(stage.output)
+        if stage.name not in stale and artifact_valid(stage, file_id, manifest, fingerprints.get(stage.name)):
+            loads[stage.output] = stage
+        else:
+            to_run.add(stage.name)
+            needed.update(stage.inputs)
+
+    first = min(index for index, stage in enumerate(stages) if stage.name in to_run)
+    for stage in stages[first:]:
+        if not stage.output:
+            to_run.add(stage.name)
+
+    return [stage.name for stage in stages if stage.name in to_run], loads
+
+
+def _plan(
+    ctx: StageContext,
+    stages: List[Stage],
+    rerun_from: Optional[str],
+) -> Tuple[List[str], Dict[str, Stage], Dict[str, str]]:
+    """
+    Plan a run of the stage graph.
+
+    Without a manifest there is no artifact to check, so the source dataset
+    is not checksummed (fingerprints are then empty).
+
+    Returns:
+        Tuple of (names of stages to run, value name -> stage to load it from, fingerprints)
+    """
+    manifest = load_manifest(ctx.file_id)
+    fingerprints = stage_fingerprints(stages, ctx) if manifest else {}
+    to_run, loads = plan_stages(stages, ctx.file_id, manifest, fingerprints, rerun_from)
+    return to_run, loads, fingerprints
+
+
+def pending_stages(
+    ctx: StageContext,
+    stages: Optional[List[Stage]] = None,
+    rerun_from: Optional[str] = None,
+) -> List[str]:
+    """Get the names of the stages that would run for a dataset."""
+    to_run, _, _ = _plan(ctx, stages or DATASET_STAGES, rerun_from)
+    return to_run
+
+
+def record_stage(ctx: StageContext, name: str, stages: Optional[List[Stage]] = None) -> None:
+    """Record a stage that was completed outside the graph."""
+    stages = stages or DATASET_STAGES
+    fingerprints = stage_fingerprints(stages, ctx)
+    stage = next(stage for stage in stages if stage.name == name)
+    record_artifact(stage, ctx.file_id, fingerprints[name])
+
+
+def run_stage_graph(
+    ctx: StageContext,
+    stages: Optional[List[Stage]] = None,
+    rerun_from: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Run the stage graph for a dataset, reusing valid artifacts.
+
+    Only the stages whose results are missing or stale run, and only the
+    values they need are loaded, so resuming costs the remaining work.
+    Skipped stages still report their done status (with ``skipped``) so
+    the task status moves forward as usual.
+
+    Args:
+        ctx: Stage context for the dataset
+        stages: Stage graph (defaults to DATASET_STAGES)
+        rerun_from: Stage to run again with everything after it, whatever
+            their artifacts (see rerun_from_status)
+
+    Returns:
+        Dict of the values produced or loaded, by name
+    """
+    stages = stages or DATASET_STAGES
+    to_run, loads, fingerprints = _plan(ctx, stages, rerun_from)
+    print(f"Stages to run for {ctx.file_id}: {', '.join(to_run)}")
+
+    values: Dict[str, Any] = {}
+    for stage in stages:
+        if stage.name not in to_run:
+            if stage.output in loads:
+                values[stage.output] = stage.load(stage.artifact(ctx.file_id))
+                print(f"Stage {stage.name}: loaded artifact {stage.artifact(ctx.file_id)}")
+            ctx.event_emitter(ctx.file_id, stage.done_status, {'skipped': True})
+            ctx.update_status(stage.done_status)
+            continue
+
+        started = time.perf_counter()
+        output = stage.run(ctx, **{name: values[name] for name in stage.inputs})
+        duration = time.perf_counter() - started
+        print(f"Stage {stage.name} finished in {duration:.2f}s")
+
+        if stage.output:
+            values[stage.output] = output
+            if stage.artifact is not None and stage.dump is not None:
+                ensure_directory_exists(os.path.dirname(stage.artifact(ctx.file_id)))
+                stage.dump(output, stage.artifact(ctx.file_id))
+        if not fingerprints:
+            fingerprints = stage_fingerprints(stages, ctx)
+        record_artifact(stage, ctx.file_id, fingerprints[stage.name], duration)
+        ctx.update_status(stage.done_status)
+
+    return values
@@ -1,6 +1,12 @@
 """Helper utility functions."""
 import os
+import re
+import json
 from pathlib import Path
+from typing import Any, Callable, Optional, Tuple
+
+# Leading retweet markers such as "RT @free: " (possibly chained)
+_RETWEET_PREFIX_PATTERN = re.compile(r'^(?:rt\s+@\w+\s*:?\s*)+')
 
 
 def ensure_directory_exists(directory_path: str) -> None:
@@ -27,3 +33,105 @@ def get_file_id_from_path(file_path: str) -> str:
     file_id = os.path.splitext(filename)[0]
     return file_id
 
+
+def normalize_text_key(text) -> str:
+    """
+    Normalize a post text into a key used to detect identical posts.
+    
+    Case, whitespace and leading ``RT @user:`` prefixes are folded so that
+    retweets and trivially different copies of the same post map to the
+    same key.
+    
+    Args:
+        text: Post text (non-string values are converted to string)
+    
+    Returns:
+        Normalized text key
+    """
+    if text is None or (isinstance(text, float) and text != text):
+        return ''
+    key = ' '.join(str(text).casefold().split())
+    return _RETWEET_PREFIX_PATTERN.sub('', key)
+
+
+def _close_json(text: str, start: int) -> Tuple[Optional[str], int]:
+    """
+    Extract the JSON document starting at text[start], closing it if it was cut short.
+    
+    Returns:
+        Tuple of (JSON text or None, index where the document ends)
+    """
+    closers = []
+    in_string = escaped = False
+    cut, cut_closers = None, None
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            closers.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if not closers or closers[-1] != char:
+                return None, index
+            closers.pop()
+            if not closers:
+                return text[start:index + 1], index + 1
+            cut, cut_closers = index + 1, list(closers)
+        elif char == ',':
+            cut, cut_closers = index, list(closers)
+    
+    if cut is None:
+        return None, len(text)
+    return text[start:cut] + ''.join(reversed(cut_closers)), len(text)
+
+
+def repair_truncated_json(text: str, expected: Optional[Callable[[Any], bool]] = None) -> Optional[str]:
+    """
+    Extract the JSON document from text, closing it if it was cut short.
+    
+    Every top-level document in the text is tried, from each ``{`` or ``[``
+    that is not inside a previous one. A complete document is taken as is
+    (surrounding text dropped). A truncated one is cut after its last
+    complete element and its open arrays and objects are closed, so every
+    element fully received is kept and partial ones (unterminated strings,
+    numbers that may be cut) are dropped. The longest document that parses
+    and has the expected shape wins, so a short example object in a
+    preamble does not hide the answer that follows it.
+    
+    Args:
+        text: Raw text expected to contain a JSON object or array
+        expected: Checks the shape of a parsed document (any shape if not
+            given, the longest document is used when none has the shape)
+    
+    Returns:
+        JSON text, or None if no complete element could be recovered
+    """
+    best = longest = None
+    position = 0
+    while True:
+        starts = [index for index in (text.find('{', position), text.find('[', position)) if index >= 0]
+        if not starts:
+            break
+        start = min(starts)
+        candidate, end = _close_json(text, start)
+        try:
+            value = json.loads(candidate) if candidate is not None else None
+        except ValueError:
+            candidate = None
+        if candidate is None:
+            # Not a document, one may still start inside it
+            position = start + 1
+            continue
+        position = end
+        if longest is None or len(candidate) > len(longest):
+            longest = candidate
+        if (expected is None or expected(value)) and (best is None or len(candidate) > len(best)):
+            best = candidate
+    return best if best is not None else longest
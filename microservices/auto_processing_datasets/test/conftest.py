@@ -6,3 +6,12 @@ import sys
 # Add src directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../'))
 
+
+
+@pytest.fixture(autouse=True)
+def reset_model_health():
+    """Start every test without model health recorded by previous ones."""
+    from src.lib.llm import reset_model_health_registry
+    reset_model_health_registry()
+    yield
+    reset_model_health_registry()
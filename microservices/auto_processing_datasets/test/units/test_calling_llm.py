@@ -8,7 +8,11 @@ import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
 
-from src.services.calling_llm import _get_ai_model, _call_llm_api, calling_llm
+from src.services.calling_llm import (
+    _get_ai_model, _call_llm_api, _pack_batches, _parse_compact_result, _stratified_sample, _topic_label,
+    calling_llm, derive_dataset_topic_vocabulary, save_shared_llm_state
+)
+from src.lib.llm import BatchSizeController, ModelHealthRegistry, RequestHedger, TopicCanonicalizer
 from src.configs.constants import (
     TASK_STATUS_SENDING_TO_LLM,
     TASK_STATUS_SENDING_TO_LLM_PROGRESS,
@@ -107,6 +111,22 @@ class TestGetAiModel:
         
         model = _get_ai_model(ai_config, [])
         assert model is None
+    
+    def test_get_ai_model_skips_open_breakers(self):
+        """Test that models with an open circuit breaker are skipped while others remain."""
+        ai_config = {
+            'preferences': {'mode': 'automatic', 'default_external_model_id': 'model1'},
+            'external': [{'uid': 'model1', 'data': {}}, {'uid': 'model2', 'data': {}}],
+            'local': [{'uid': 'local1', 'data': {}}]
+        }
+        health = ModelHealthRegistry(failure_threshold=1)
+        health.record_failure('model1')
+        
+        assert _get_ai_model(ai_config, [], health)['uid'] == 'model2'
+        health.record_failure('model2')
+        assert _get_ai_model(ai_config, [], health)['uid'] == 'local1'
+        # Every remaining breaker open: still try a model rather than fail the task
+        assert _get_ai_model(ai_config, ['local1'], health)['uid'] == 'model1'
 
 
 class TestCallLlmApi:
@@ -349,3 +369,938 @@ class TestCallingLlm:
         
         assert 'No AI model available' in str(exc_info.value)
 
+
+
+class TestConcurrentDispatch:
+    """Test cases for concurrent batch dispatch in calling_llm."""
+    
+    @pytest.fixture
+    def sample_dataframe(self):
+        """Create sample DataFrame with enough rows for several batches."""
+        return pd.DataFrame({
+            'id': list(range(10)),
+            'full_text': [f'Post {i}' for i in range(10)]
+        })
+    
+    @pytest.fixture
+    def sample_ai_config(self):
+        """Create AI configuration with a primary and a fallback model."""
+        return {
+            'preferences': {'mode': 'local', 'default_local_model_id': 'local1'},
+            'local': [
+                {
+                    'uid': 'local1',
+                    'data': {
+                        'baseUrl': 'http://localhost:11434',
+                        'model': 'llama3',
+                        'paginateRowsLimit': 2,
+                        'maxConcurrentRequests': 4
+                    }
+                },
+                {
+                    'uid': 'local2',
+                    'data': {
+                        'baseUrl': 'http://localhost:11434',
+                        'model': 'mistral',
+                        'paginateRowsLimit': 2,
+                        'maxConcurrentRequests': 4
+                    }
+                }
+            ]
+        }
+    
+    @staticmethod
+    def _echo_response(model, texts, ai_config, **kwargs):
+        """Build a response whose topics echo the input texts."""
+        return {
+            'data': {
+                'sentiment': ['positive'] * len(texts),
+                'priority': ['high'] * len(texts),
+                'topic': list(texts)
+            }
+        }
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_results_reassembled_in_row_order(self, mock_call_api, sample_dataframe, sample_ai_config):
+        """Test that out-of-order batch completion keeps row alignment."""
+        import time
+        
+        def delayed(model, texts, ai_config, **kwargs):
+            # Earlier batches finish last
+            time.sleep(0.01 * (10 - int(texts[0].split()[1])))
+            return self._echo_response(model, texts, ai_config)
+        
+        mock_call_api.side_effect = delayed
+        emitter = Mock()
+        
+        result_df, model_uid = calling_llm('file_1', sample_dataframe, sample_ai_config, emitter)
+        
+        assert result_df['main_topic'].tolist() == result_df['full_text'].tolist()
+        assert mock_call_api.call_count == 5
+        assert model_uid == 'local1'
+        
+        progress = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_PROGRESS]
+        assert len(progress) == 5
+        assert progress[-1]['rows_processed'] == 10
+        assert progress[-1]['progress_percentage'] == 100
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_failed_batch_retried_with_fallback_model(self, mock_call_api, sample_dataframe, sample_ai_config):
+        """Test that a failing batch is re-sent to the next model instead of skipped."""
+        sample_ai_config['local'][0]['data']['maxConcurrentRequests'] = 1
+        
+        def flaky(model, texts, ai_config, **kwargs):
+            if model['uid'] == 'local1' and texts[0] == 'Post 4':
+                raise Exception('boom')
+            return self._echo_response(model, texts, ai_config)
+        
+        mock_call_api.side_effect = flaky
+        emitter = Mock()
+        
+        result_df, model_uid = calling_llm('file_1', sample_dataframe, sample_ai_config, emitter)
+        
+        assert result_df['main_topic'].tolist() == result_df['full_text'].tolist()
+        assert model_uid == 'local2'
+        used = [c[0][0]['uid'] for c in mock_call_api.call_args_list]
+        # The failed batch also shrinks the following batches (adaptive size)
+        assert used[:4] == ['local1', 'local1', 'local1', 'local2']
+        assert set(used[4:]) == {'local2'}
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_next_task_skips_model_with_open_breaker(self, mock_call_api, sample_dataframe, sample_ai_config):
+        """Test that a model found down by one task is not retried by the next one."""
+        sample_ai_config['local'][0]['data']['maxConcurrentRequests'] = 1
+        
+        def primary_down(model, texts, ai_config, **kwargs):
+            if model['uid'] == 'local1':
+                raise Exception('connection refused')
+            return self._echo_response(model, texts, ai_config)
+        
+        mock_call_api.side_effect = primary_down
+        health = ModelHealthRegistry(failure_threshold=1)
+        with patch('src.services.calling_llm.get_model_health_registry', return_value=health):
+            calling_llm('file_1', sample_dataframe, sample_ai_config, Mock())
+            assert health.state('local1') == ModelHealthRegistry.OPEN
+            mock_call_api.reset_mock()
+            
+            result_df, model_uid = calling_llm('file_2', sample_dataframe, sample_ai_config, Mock())
+        
+        assert model_uid == 'local2'
+        assert {c[0][0]['uid'] for c in mock_call_api.call_args_list} == {'local2'}
+        assert result_df['main_topic'].tolist() == result_df['full_text'].tolist()
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_defaults_when_all_models_fail(self, mock_call_api, sample_dataframe, sample_ai_config):
+        """Test that rows get defaults once every model has failed."""
+        mock_call_api.side_effect = Exception('down')
+        emitter = Mock()
+        
+        result_df, _ = calling_llm('file_1', sample_dataframe, sample_ai_config, emitter)
+        
+        assert (result_df['sentiment'] == 'neutral').all()
+        assert (result_df['main_topic'] == 'general').all()
+        progress = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_PROGRESS]
+        assert all(p.get('fallback_used') for p in progress)
+
+
+class TestCallingLlmCache:
+    """Test cases for the LLM cache integration in calling_llm."""
+    
+    @pytest.fixture
+    def sample_ai_config(self):
+        """Create sample AI configuration."""
+        return {
+            'preferences': {'mode': 'local', 'default_local_model_id': 'local1'},
+            'local': [
+                {'uid': 'local1', 'data': {'baseUrl': 'http://localhost:11434', 'model': 'llama3', 'paginateRowsLimit': 10}}
+            ]
+        }
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_only_cache_misses_are_sent(self, mock_call_api, sample_ai_config, tmp_path):
+        """Test that cached texts are filled in and only misses reach the LLM."""
+        from src.lib.cache import SqliteCache
+        
+        cache = SqliteCache(str(tmp_path / 'cache.sqlite'), 100, 3600)
+        mock_call_api.side_effect = lambda model, texts, ai_config, **kwargs: {
+            'data': {
+                'sentiment': ['negative'] * len(texts),
+                'priority': ['high'] * len(texts),
+                'topic': [t.lower() for t in texts]
+            }
+        }
+        
+        first = pd.DataFrame({'full_text': ['Network down', 'Bill too high']})
+        calling_llm('file_1', first, sample_ai_config, Mock(), cache=cache)
+        assert mock_call_api.call_count == 1
+        
+        emitter = Mock()
+        second = pd.DataFrame({'full_text': ['network  DOWN', 'New complaint']})
+        result_df, _ = calling_llm('file_2', second, sample_ai_config, emitter, cache=cache)
+        
+        assert mock_call_api.call_count == 2
+        assert mock_call_api.call_args[0][1] == ['New complaint']
+        assert result_df['main_topic'].tolist() == ['network down', 'new complaint']
+        assert result_df['priority'].tolist() == [2, 2]
+        
+        done = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_DONE][0]
+        assert done['cache_hits'] == 1
+        assert done['cache_misses'] == 1
+
+
+class TestCallingLlmCheckpoint:
+    """Test cases for resuming calling_llm from a batch checkpoint."""
+    
+    @pytest.fixture
+    def sample_ai_config(self):
+        """Create sample AI configuration."""
+        return {
+            'preferences': {'mode': 'local', 'default_local_model_id': 'local1'},
+            'local': [
+                {'uid': 'local1', 'data': {'baseUrl': 'http://localhost:11434', 'model': 'llama3', 'paginateRowsLimit': 2}}
+            ]
+        }
+    
+    @staticmethod
+    def _respond(model, texts, ai_config, **kwargs):
+        return {
+            'data': {
+                'sentiment': ['negative'] * len(texts),
+                'priority': ['low'] * len(texts),
+                'topic': [t.lower() for t in texts]
+            }
+        }
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_resume_skips_completed_batches(self, mock_call_api, sample_ai_config, tmp_path):
+        """Test that a resumed run only sends the batches not completed before the crash."""
+        from src.lib.llm import LlmCheckpoint
+        
+        path = str(tmp_path / 'file_1.llm.jsonl')
+        mock_call_api.side_effect = self._respond
+        df = pd.DataFrame({'full_text': ['A', 'B', 'C', 'D', 'E', 'F']})
+        
+        # Worker dies after the second batch has been recorded
+        progress_events = []
+        def crashing_emitter(file_id, event, payload=None):
+            if event == TASK_STATUS_SENDING_TO_LLM_PROGRESS:
+                progress_events.append(payload)
+                if len(progress_events) == 2:
+                    raise RuntimeError("worker lost")
+        
+        with pytest.raises(RuntimeError):
+            calling_llm('file_1', df.copy(), sample_ai_config, crashing_emitter,
+                        checkpoint=LlmCheckpoint(path, '1'))
+        assert mock_call_api.call_count == 2
+        
+        mock_call_api.reset_mock()
+        emitter = Mock()
+        result_df, _ = calling_llm('file_1', df.copy(), sample_ai_config, emitter,
+                                   checkpoint=LlmCheckpoint(path, '1'))
+        
+        assert mock_call_api.call_count == 1
+        assert mock_call_api.call_args[0][1] == ['E', 'F']
+        assert result_df['main_topic'].tolist() == ['a', 'b', 'c', 'd', 'e', 'f']
+        done = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_DONE][0]
+        assert done['checkpoint_hits'] == 4
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_fallback_results_not_checkpointed(self, mock_call_api, sample_ai_config, tmp_path):
+        """Test that default labels from a failed batch are retried on resume."""
+        from src.lib.llm import LlmCheckpoint
+        
+        path = str(tmp_path / 'file_1.llm.jsonl')
+        mock_call_api.side_effect = Exception("API down")
+        df = pd.DataFrame({'full_text': ['A', 'B']})
+        calling_llm('file_1', df.copy(), sample_ai_config, Mock(), checkpoint=LlmCheckpoint(path, '1'))
+        
+        assert LlmCheckpoint(path, '1').get_many(['a', 'b']) == {}
+
+
+class TestCallingLlmCascade:
+    """Test cases for the local cascade classifier in calling_llm."""
+
+    @pytest.fixture
+    def sample_ai_config(self):
+        """Create sample AI configuration."""
+        return {
+            'preferences': {'mode': 'local', 'default_local_model_id': 'local1'},
+            'local': [
+                {'uid': 'local1', 'data': {'baseUrl': 'http://localhost:11434', 'model': 'llama3', 'paginateRowsLimit': 10}}
+            ]
+        }
+
+    @staticmethod
+    def _respond(model, texts, ai_config, **kwargs):
+        negative = ['network' in t for t in texts]
+        return {
+            'data': {
+                'sentiment': ['negative' if n else 'positive' for n in negative],
+                'priority': ['high' if n else 'low' for n in negative],
+                'topic': ['network' if n else 'service' for n in negative]
+            }
+        }
+
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_confident_rows_skip_llm(self, mock_call_api, sample_ai_config, tmp_path):
+        """Test that the cascade learns from LLM answers and then short-circuits known texts."""
+        from src.lib.llm import CascadeClassifier
+
+        mock_call_api.side_effect = self._respond
+        cascade = CascadeClassifier(str(tmp_path), '1', threshold=0.8, min_samples=40)
+        training = pd.DataFrame({'full_text': [f"network down {i}" for i in range(20)]
+                                 + [f"great service {i}" for i in range(20)]})
+        for _ in range(5):
+            calling_llm('file_1', training.copy(), sample_ai_config, Mock(), cascade=cascade)
+        assert cascade.ready
+        assert os.path.exists(tmp_path / 'current.json')
+
+        mock_call_api.reset_mock()
+        emitter = Mock()
+        df = pd.DataFrame({'full_text': ['network down 3', 'network down 3', 'great service 7', 'zzz qqq']})
+        result_df, _ = calling_llm('file_2', df, sample_ai_config, emitter, cascade=cascade)
+
+        assert mock_call_api.call_count == 1
+        assert mock_call_api.call_args[0][1] == ['zzz qqq']
+        assert result_df['main_topic'].tolist()[:3] == ['network', 'network', 'service']
+        assert result_df['priority'].tolist()[:3] == [2, 2, 0]
+        done = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_DONE][0]
+        assert done['cascade_hits'] == 2
+        assert done['cascade_rows'] == 3
+        assert done['cascade_fraction'] == 0.75
+
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_state_saved_once_by_caller(self, mock_call_api, sample_ai_config, tmp_path):
+        """Test that calls with save_state=False leave the cascade and alias table to save_shared_llm_state."""
+        from src.lib.llm import CascadeClassifier
+
+        mock_call_api.side_effect = self._respond
+        cascade = CascadeClassifier(str(tmp_path / 'cascade'), '1', min_samples=40)
+        canonicalizer = TopicCanonicalizer(str(tmp_path / 'aliases.json'))
+        with patch('src.services.calling_llm.get_topic_canonicalizer', return_value=canonicalizer):
+            for i in range(3):
+                df = pd.DataFrame({'full_text': [f"network down {i}", f"great service {i}"]})
+                calling_llm('file_1', df, sample_ai_config, Mock(), cascade=cascade, save_state=False)
+            assert cascade.samples == 6
+            assert not os.path.exists(tmp_path / 'cascade' / 'current.json')
+            assert not os.path.exists(tmp_path / 'aliases.json')
+
+            save_shared_llm_state(cascade)
+
+        assert cascade.version == 1
+        assert os.path.exists(tmp_path / 'cascade' / 'current.json')
+        with open(tmp_path / 'aliases.json', encoding='utf-8') as f:
+            assert set(json.load(f)['aliases'].values()) == {'network', 'service'}
+
+
+class TestCallingLlmDeduplication:
+    """Test cases for in-run deduplication in calling_llm."""
+    
+    @pytest.fixture
+    def sample_ai_config(self):
+        """Create sample AI configuration."""
+        return {
+            'preferences': {'mode': 'local', 'default_local_model_id': 'local1'},
+            'local': [
+                {'uid': 'local1', 'data': {'baseUrl': 'http://localhost:11434', 'model': 'llama3', 'paginateRowsLimit': 2}}
+            ]
+        }
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_duplicates_sent_once_and_broadcast(self, mock_call_api, sample_ai_config):
+        """Test that retweets and copies are classified once and share labels."""
+        mock_call_api.side_effect = lambda model, texts, ai_config, **kwargs: {
+            'data': {
+                'sentiment': ['negative'] * len(texts),
+                'priority': ['high'] * len(texts),
+                'topic': [f'topic:{t}' for t in texts]
+            }
+        }
+        df = pd.DataFrame({'full_text': [
+            'Panne réseau à Paris',
+            'RT @free: Panne réseau à Paris',
+            'Merci @free',
+            'panne  RÉSEAU à paris',
+            'Merci @free',
+        ]})
+        emitter = Mock()
+        
+        result_df, _ = calling_llm('file_1', df, sample_ai_config, emitter)
+        
+        sent = [text for c in mock_call_api.call_args_list for text in c[0][1]]
+        assert sent == ['Panne réseau à Paris', 'Merci @free']
+        assert result_df['main_topic'].tolist() == [
+            'topic:Panne réseau à Paris', 'topic:Panne réseau à Paris', 'topic:Merci @free',
+            'topic:Panne réseau à Paris', 'topic:Merci @free',
+        ]
+        
+        progress = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_PROGRESS]
+        assert progress[-1]['rows_processed'] == 5
+        assert progress[-1]['total_unique_texts'] == 2
+        assert progress[-1]['unique_texts_processed'] == 2
+        assert progress[-1]['progress_percentage'] == 100
+        done = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_DONE][0]
+        assert done['duplicates_skipped'] == 3
+
+    @patch('src.configs.env.LLM_NEAR_DUPLICATE_THRESHOLD', 0.7)
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_near_duplicates_sent_once(self, mock_call_api, sample_ai_config):
+        """Test that near-identical posts get the labels of their cluster's first post."""
+        mock_call_api.side_effect = lambda model, texts, ai_config, **kwargs: {
+            'data': {
+                'sentiment': ['negative'] * len(texts),
+                'priority': ['high'] * len(texts),
+                'topic': [f'topic:{t}' for t in texts]
+            }
+        }
+        df = pd.DataFrame({'full_text': [
+            '@free pas de réseau depuis ce matin https://t.co/a',
+            'Facture trop élevée ce mois-ci',
+            '@sfr pas de réseau depuis ce matin #panne',
+            '@bouygues pas de réseau depuis ce matin https://t.co/b',
+            '@free pas de réseau depuis ce matin https://t.co/a',
+        ]})
+        emitter = Mock()
+        db_adapter = Mock()
+
+        result_df, _ = calling_llm('file_1', df, sample_ai_config, emitter, db_adapter=db_adapter)
+
+        sent = [text for c in mock_call_api.call_args_list for text in c[0][1]]
+        assert sent == ['@free pas de réseau depuis ce matin https://t.co/a', 'Facture trop élevée ce mois-ci']
+        assert result_df['main_topic'].tolist()[2:] == ['topic:@free pas de réseau depuis ce matin https://t.co/a'] * 3
+        # Clusters are sized in rows, the exact duplicate included
+        done = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_DONE][0]
+        assert done['near_duplicate_clusters'] == 1
+        assert done['near_duplicates_skipped'] == 3
+        assert done['near_duplicate_sizes'] == {'4': 1}
+        update = db_adapter.update_one.call_args[0][2]
+        assert update['data.near_duplicates'] == {'clusters': 1, 'posts_skipped': 3, 'largest': 4, 'sizes': {'4': 1}}
+
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_topics_canonicalized(self, mock_call_api, sample_ai_config, tmp_path):
+        """Test that topic variants are rewritten to one label and stored on the task."""
+        topics = {'a': 'Réseau mobile', 'b': 'reseau mobiles', 'c': 'Réseau Mobile', 'd': 'Facture'}
+        mock_call_api.side_effect = lambda model, texts, ai_config, **kwargs: {
+            'data': {
+                'sentiment': ['negative'] * len(texts),
+                'priority': ['high'] * len(texts),
+                'topic': [topics[t] for t in texts]
+            }
+        }
+        df = pd.DataFrame({'full_text': ['a', 'b', 'c', 'd', 'a']})
+        emitter = Mock()
+        db_adapter = Mock()
+        canonicalizer = TopicCanonicalizer(str(tmp_path / 'aliases.json'))
+
+        with patch('src.services.calling_llm.get_topic_canonicalizer', return_value=canonicalizer):
+            result_df, _ = calling_llm('file_1', df, sample_ai_config, emitter, db_adapter=db_adapter)
+
+        assert result_df['main_topic'].tolist() == ['Réseau mobile'] * 3 + ['Facture', 'Réseau mobile']
+        done = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_DONE][0]
+        assert done['topic_aliases'] == {'reseau mobiles': 'Réseau mobile', 'Réseau Mobile': 'Réseau mobile'}
+        assert done['topic_rows_rewritten'] == 2
+        update = db_adapter.update_one.call_args[0][2]
+        assert update['data.topic_aliases'] == [
+            {'topic': 'Réseau Mobile', 'canonical': 'Réseau mobile'},
+            {'topic': 'reseau mobiles', 'canonical': 'Réseau mobile'},
+        ]
+        assert os.path.exists(tmp_path / 'aliases.json')
+
+    @patch('src.services.calling_llm._send_prompt')
+    def test_input_normalized_before_prompting(self, mock_send_prompt, sample_ai_config):
+        """Test that models with normalizeInput get shortened posts and the savings are reported."""
+        sample_ai_config['local'][0]['data']['normalizeInput'] = True
+        mock_send_prompt.return_value = {
+            'data': {'sentiment': ['negative'], 'priority': ['high'], 'topic': ['network']}
+        }
+        text = 'RT @free: @a @b @c @d réseau coupé https://t.co/abcdef123 #panne #panne'
+        df = pd.DataFrame({'full_text': [text, text]})
+        emitter = Mock()
+
+        result_df, _ = calling_llm('file_1', df, sample_ai_config, emitter)
+
+        prompt = mock_send_prompt.call_args[0][1]
+        assert '@a @b réseau coupé #panne' in prompt
+        assert 't.co' not in prompt and '@c' not in prompt
+        assert result_df['full_text'].tolist() == [text, text]
+        done = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_DONE][0]
+        assert done['input_rows'] == 1
+        assert done['input_tokens_saved'] > 10
+        assert done['input_tokens_saved_per_row'] == done['input_tokens_saved']
+
+
+class TestTokenBatchPacking:
+    """Test cases for token-aware batch packing in calling_llm."""
+    
+    def test_pack_batches_respects_budget_and_rows(self):
+        """Test that batches stay within the token budget and the row limit."""
+        batches = _pack_batches([0, 1, 2, 3, 4, 5], [30, 30, 50, 10, 10, 10], budget=60, max_rows=2)
+        assert batches == [[0, 1], [2, 3], [4, 5]]
+        
+        batches = _pack_batches([0, 1, 2, 3], [100, 10, 10, 10], budget=60, max_rows=10)
+        assert batches == [[0], [1, 2, 3]]
+    
+    def test_pack_batches_without_budget(self):
+        """Test that a zero budget packs by row count only."""
+        assert _pack_batches(list(range(5)), [1000] * 5, budget=0, max_rows=2) == [[0, 1], [2, 3], [4]]
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_long_texts_get_smaller_batches(self, mock_call_api):
+        """Test that long texts are split across more requests than short ones."""
+        mock_call_api.side_effect = lambda model, texts, ai_config, **kwargs: {
+            'data': {
+                'sentiment': ['neutral'] * len(texts),
+                'priority': ['low'] * len(texts),
+                'topic': ['general'] * len(texts)
+            }
+        }
+        ai_config = {
+            'preferences': {'mode': 'local', 'default_local_model_id': 'local1'},
+            'local': [{'uid': 'local1', 'data': {
+                'baseUrl': 'http://localhost:11434', 'model': 'llama3',
+                'paginateRowsLimit': 100, 'maxBatchTokens': 1500,
+            }}]
+        }
+        short = [f"short post {i}" for i in range(40)]
+        long = [' '.join(f"word{i}x{j}" for j in range(300)) for i in range(4)]
+        df = pd.DataFrame({'full_text': short + long})
+        
+        result_df, _ = calling_llm('file_1', df, ai_config, Mock())
+        
+        batch_sizes = [len(c[0][1]) for c in mock_call_api.call_args_list]
+        assert sum(batch_sizes) == 44
+        assert batch_sizes[0] == 40
+        assert batch_sizes[1:] == [1, 1, 1, 1]
+        assert (result_df['sentiment'] == 'neutral').all()
+
+
+class TestAdaptiveBatchSize:
+    """Test cases for adaptive batch sizing in calling_llm."""
+    
+    def test_controller_grows_and_shrinks(self):
+        """Test additive increase on good full batches and multiplicative decrease on bad ones."""
+        controller = BatchSizeController(10, 2, 14, target_latency=5, increase=2)
+        assert controller.record(10, 1.0, True) == 12
+        assert controller.record(5, 1.0, True) == 12  # partial batch, no growth
+        assert controller.record(12, 1.0, True) == 14
+        assert controller.record(14, 1.0, True) == 14  # capped
+        assert controller.record(14, 9.0, True) == 7  # slow
+        assert controller.record(7, 1.0, False) == 3  # failed or incomplete
+        assert controller.record(3, 1.0, False) == 2  # floored
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_truncated_answers_shrink_batches(self, mock_call_api):
+        """Test that incomplete answers shrink the batch size reported in progress events."""
+        def truncating(model, texts, ai_config, **kwargs):
+            kept = texts if len(texts) <= 2 else texts[:-1]
+            return {'data': {
+                'sentiment': ['neutral'] * len(kept),
+                'priority': ['low'] * len(kept),
+                'topic': ['general'] * len(kept),
+            }}
+        mock_call_api.side_effect = truncating
+        ai_config = {
+            'preferences': {'mode': 'local', 'default_local_model_id': 'local1'},
+            'local': [{'uid': 'local1', 'data': {
+                'baseUrl': 'http://localhost:11434', 'model': 'llama3',
+                'paginateRowsLimit': 8, 'maxBatchRows': 16,
+            }}]
+        }
+        df = pd.DataFrame({'full_text': [f'Post {i}' for i in range(20)]})
+        emitter = Mock()
+        
+        calling_llm('file_1', df, ai_config, emitter)
+        
+        sizes = [len(c[0][1]) for c in mock_call_api.call_args_list]
+        # Each truncated answer is completed by a follow-up request for the missing post
+        assert sizes[:5] == [8, 1, 4, 1, 2]
+        progress = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_PROGRESS]
+        assert [p['batch_size'] for p in progress[:3]] == [8, 4, 2]
+        assert [p['next_batch_size'] for p in progress[:3]] == [4, 2, 3]
+        assert sum(p['batch_size'] for p in progress) == 20
+        assert not any(p.get('fallback_used') for p in progress)
+        done = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_DONE][0]
+        assert done['total_batches'] == len(progress)
+        assert progress[-1]['total_batches'] == len(progress)
+
+
+class TestBatchBisection:
+    """Test cases for splitting failing batches in calling_llm."""
+    
+    @pytest.fixture
+    def sample_ai_config(self):
+        """Create AI configuration with a primary and a fallback model."""
+        return {
+            'preferences': {'mode': 'local', 'default_local_model_id': 'local1'},
+            'local': [
+                {'uid': 'local1', 'data': {'baseUrl': 'http://localhost:11434', 'model': 'llama3', 'paginateRowsLimit': 8}},
+                {'uid': 'local2', 'data': {'baseUrl': 'http://localhost:11434', 'model': 'mistral', 'paginateRowsLimit': 8}},
+            ]
+        }
+    
+    @staticmethod
+    def _poisoned(failing_models):
+        """Answer normally unless the batch contains the bad post on one of failing_models."""
+        def call(model, texts, ai_config, **kwargs):
+            if model['uid'] in failing_models and 'BAD' in texts:
+                raise Exception("LLM API call failed after 3 retries") from ValueError("Invalid JSON in response")
+            return {'data': {
+                'sentiment': ['positive'] * len(texts),
+                'priority': ['high'] * len(texts),
+                'topic': [f"{model['uid']}:{t}" for t in texts],
+            }}
+        return call
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_only_bad_text_gets_defaults(self, mock_call_api, sample_ai_config):
+        """Test that a batch failing on one post is split until that post is isolated."""
+        mock_call_api.side_effect = self._poisoned({'local1', 'local2'})
+        texts = [f'Post {i}' for i in range(3)] + ['BAD'] + [f'Post {i}' for i in range(4, 8)]
+        emitter = Mock()
+        
+        result_df, _ = calling_llm('file_1', pd.DataFrame({'full_text': texts}), sample_ai_config, emitter)
+        
+        assert result_df['main_topic'].tolist() == [
+            f'local1:{t}' if t != 'BAD' else 'general' for t in texts
+        ]
+        # 8 -> 4 -> 2 -> 1, the bad post alone then fails on both models
+        sizes = [len(c[0][1]) for c in mock_call_api.call_args_list]
+        assert sorted(sizes) == [1, 1, 1, 2, 2, 4, 4, 8]
+        progress = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_PROGRESS]
+        assert progress[0]['fallback_used'] is True
+        assert progress[0]['defaulted_rows'] == 1
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_bad_text_retried_on_next_model_only(self, mock_call_api, sample_ai_config):
+        """Test that an isolated text falls back alone while other batches keep the model."""
+        sample_ai_config['local'][0]['data']['paginateRowsLimit'] = 2
+        mock_call_api.side_effect = self._poisoned({'local1'})
+        texts = ['BAD', 'Post 1', 'Post 2', 'Post 3']
+        
+        result_df, model_uid = calling_llm('file_1', pd.DataFrame({'full_text': texts}), sample_ai_config, Mock())
+        
+        assert result_df['main_topic'].tolist() == ['local2:BAD', 'local1:Post 1', 'local1:Post 2', 'local1:Post 3']
+        assert model_uid == 'local1'
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_unavailable_model_is_not_split(self, mock_call_api, sample_ai_config):
+        """Test that connection failures move to the next model without splitting."""
+        mock_call_api.side_effect = Exception('connection refused')
+        
+        calling_llm('file_1', pd.DataFrame({'full_text': [f'Post {i}' for i in range(8)]}), sample_ai_config, Mock())
+        
+        assert [len(c[0][1]) for c in mock_call_api.call_args_list] == [8, 8]
+
+
+class TestPartialAnswerSalvage:
+    """Test cases for salvaging truncated LLM answers."""
+    
+    @pytest.fixture
+    def sample_ai_config(self):
+        """Create sample AI configuration."""
+        return {
+            'preferences': {'mode': 'local', 'default_local_model_id': 'local1'},
+            'local': [
+                {'uid': 'local1', 'data': {'baseUrl': 'http://localhost:11434', 'model': 'llama3', 'paginateRowsLimit': 10}}
+            ]
+        }
+    
+    @patch('requests.Session.post')
+    def test_truncated_json_is_salvaged(self, mock_post, sample_ai_config):
+        """Test that a cut-short answer is parsed instead of retried."""
+        sample_ai_config['local'][0]['data']['backend'] = 'ollama'
+        content = '{"data": {"sentiment": ["negative", "positive"], "priority": ["high", "low"], "topic": ["network", "bil'
+        response = Mock()
+        response.json.return_value = {'message': {'content': content}, 'done_reason': 'length'}
+        response.raise_for_status = Mock()
+        mock_post.return_value = response
+        
+        result = _call_llm_api(sample_ai_config['local'][0], ['a', 'b'], sample_ai_config)
+        
+        assert mock_post.call_count == 1
+        assert result == {'data': {'sentiment': ['negative', 'positive'], 'priority': ['high', 'low'], 'topic': ['network']}}
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_only_missing_rows_are_requested_again(self, mock_call_api, sample_ai_config):
+        """Test that answered rows are kept and the rest sent in a follow-up request."""
+        def answer(model, texts, ai_config, **kwargs):
+            # The first answer stops after 6 topics
+            kept = 6 if len(texts) == 10 else len(texts)
+            return {'data': {
+                'sentiment': ['negative'] * len(texts),
+                'priority': ['high'] * len(texts),
+                'topic': [f'topic:{t}' for t in texts[:kept]],
+            }}
+        mock_call_api.side_effect = answer
+        texts = [f'Post {i}' for i in range(10)]
+        
+        result_df, _ = calling_llm('file_1', pd.DataFrame({'full_text': texts}), sample_ai_config, Mock())
+        
+        assert [c[0][1] for c in mock_call_api.call_args_list] == [texts, texts[6:]]
+        assert result_df['main_topic'].tolist() == [f'topic:{t}' for t in texts]
+
+
+class TestCompactResponseFormat:
+    """Test cases for the row id keyed compact response format."""
+    
+    @pytest.fixture
+    def sample_ai_config(self):
+        """Create AI configuration with a compact format model."""
+        return {
+            'preferences': {'mode': 'local', 'default_local_model_id': 'local1'},
+            'local': [{'uid': 'local1', 'data': {
+                'baseUrl': 'http://localhost:11434', 'model': 'llama3',
+                'paginateRowsLimit': 10, 'responseFormat': 'compact',
+            }}]
+        }
+    
+    def test_parse_compact_result(self):
+        """Test that codes are decoded and unknown or repeated ids are ignored."""
+        sentiments, priorities, topics, answered = _parse_compact_result(
+            {'r': [[2, 'p', 'l', 'offer'], [1, 'n', 'h', 'network'], [1, 'p', 'l', 'dup'], [9, 'u', 'n', 'x']]}, 3
+        )
+        assert sentiments == ['negative', 'positive', 'neutral']
+        assert priorities == [2, 0, 0]
+        assert topics == ['network', 'offer', 'general']
+        assert answered == [True, True, False]
+    
+    @patch('requests.Session.post')
+    def test_prompt_sends_ids(self, mock_post, sample_ai_config):
+        """Test that the compact prompt numbers the posts."""
+        response = Mock()
+        response.json.return_value = {'message': {'content': '{"r": [[1, "u", "n", "x"]]}'}, 'done_reason': 'stop'}
+        response.raise_for_status = Mock()
+        mock_post.return_value = response
+        
+        _call_llm_api(sample_ai_config['local'][0], ['Panne réseau'], sample_ai_config)
+        
+        prompt = json.loads(mock_post.call_args[1]['data'])['messages'][0]['content']
+        assert '{"1": "Panne réseau"}' in prompt
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_missing_ids_requested_again(self, mock_call_api, sample_ai_config):
+        """Test that exactly the posts without an answer are sent again."""
+        def answer(model, texts, ai_config, **kwargs):
+            # The first answer skips the third post
+            return {'r': [
+                [position, 'n', 'h', f'topic:{text}']
+                for position, text in enumerate(texts, start=1)
+                if not (len(texts) == 5 and position == 3)
+            ]}
+        mock_call_api.side_effect = answer
+        texts = [f'Post {i}' for i in range(5)]
+        
+        result_df, _ = calling_llm('file_1', pd.DataFrame({'full_text': texts}), sample_ai_config, Mock())
+        
+        assert [c[0][1] for c in mock_call_api.call_args_list] == [texts, ['Post 2']]
+        assert result_df['main_topic'].tolist() == [f'topic:{t}' for t in texts]
+        assert result_df['sentiment'].tolist() == ['negative'] * 5
+        assert result_df['priority'].tolist() == [2] * 5
+
+
+class TestTopicVocabulary:
+    """Test cases for topics picked from a derived vocabulary."""
+    
+    @pytest.fixture
+    def sample_ai_config(self):
+        """Create AI configuration with a vocabulary topic mode model."""
+        return {
+            'preferences': {'mode': 'local', 'default_local_model_id': 'local1'},
+            'local': [{'uid': 'local1', 'data': {
+                'baseUrl': 'http://localhost:11434', 'model': 'llama3',
+                'paginateRowsLimit': 10, 'responseFormat': 'compact', 'topicMode': 'vocabulary',
+            }}]
+        }
+    
+    def test_stratified_sample(self):
+        """Test that the sample spans the dataset and the post lengths."""
+        texts = ['x' * (i % 7 + 1) for i in range(1000)]
+        sample = _stratified_sample(texts, 50)
+        
+        assert len(sample) == 50
+        assert sample == sorted(set(sample))
+        assert min(sample) < 100 and max(sample) >= 900
+        assert {len(texts[i]) for i in sample} >= {1, 4, 7}
+        assert _stratified_sample(texts[:10], 50) == list(range(10))
+    
+    @patch('requests.Session.post')
+    def test_prompt_lists_topic_ids(self, mock_post, sample_ai_config):
+        """Test that the prompt shows the vocabulary by id."""
+        response = Mock()
+        response.json.return_value = {'message': {'content': '{"r": [[1, "u", "n", 1]]}'}, 'done_reason': 'stop'}
+        response.raise_for_status = Mock()
+        mock_post.return_value = response
+        
+        _call_llm_api(sample_ai_config['local'][0], ['Panne réseau'], sample_ai_config,
+                      topics=['other', 'network outage'])
+        
+        prompt = json.loads(mock_post.call_args[1]['data'])['messages'][0]['content']
+        assert '{"0": "other", "1": "network outage"}' in prompt
+    
+    @patch('src.services.calling_llm._send_prompt')
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_topics_picked_from_vocabulary(self, mock_call_api, mock_send_prompt, sample_ai_config, tmp_path):
+        """Test that the vocabulary is derived once, kept in the checkpoint and mapped back to labels."""
+        from src.lib.llm import LlmCheckpoint
+        
+        mock_send_prompt.return_value = {'topics': ['Network outage', 'billing', 'network outage', '']}
+        def answer(model, texts, ai_config, **kwargs):
+            assert kwargs['topics'] == ['other', 'Network outage', 'billing']
+            ids = [1 if 'réseau' in text else 2 if 'facture' in text else 'weather' for text in texts]
+            return {'r': [[position, 'n', 'h', topic] for position, topic in enumerate(ids, start=1)]}
+        mock_call_api.side_effect = answer
+        path = str(tmp_path / 'file_1.llm.jsonl')
+        df = pd.DataFrame({'full_text': ['Panne réseau', 'Ma facture', 'Il pleut', 'Panne réseau']})
+        emitter = Mock()
+        
+        result_df, _ = calling_llm('file_1', df, sample_ai_config, emitter, checkpoint=LlmCheckpoint(path, '1'))
+        
+        assert result_df['main_topic'].tolist() == ['Network outage', 'billing', 'other', 'Network outage']
+        assert list(result_df['main_topic'].cat.categories) == ['other', 'Network outage', 'billing']
+        done = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_DONE][0]
+        assert done['topic_vocabulary'] == ['other', 'Network outage', 'billing']
+        
+        # A later chunk of the same file reuses the recorded vocabulary
+        calling_llm('file_1', pd.DataFrame({'full_text': ['Autre facture']}), sample_ai_config, Mock(),
+                    checkpoint=LlmCheckpoint(path, '1'))
+        assert mock_send_prompt.call_count == 1
+    
+    @patch('src.services.calling_llm._send_prompt')
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_free_topics_when_vocabulary_fails(self, mock_call_api, mock_send_prompt, sample_ai_config):
+        """Test that the run goes on with free topics when no vocabulary could be derived."""
+        mock_send_prompt.side_effect = Exception("LLM API call failed")
+        mock_call_api.side_effect = lambda model, texts, ai_config, **kwargs: {
+            'r': [[position, 'n', 'h', 'network'] for position in range(1, len(texts) + 1)]
+        }
+        
+        result_df, _ = calling_llm('file_1', pd.DataFrame({'full_text': ['Panne']}), sample_ai_config, Mock())
+        
+        assert mock_call_api.call_args[1]['topics'] is None
+        assert result_df['main_topic'].tolist() == ['network']
+    
+    @patch('src.services.calling_llm._send_prompt')
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_dataset_vocabulary_shared_by_chunks(self, mock_call_api, mock_send_prompt, sample_ai_config):
+        """Test that chunks given the dataset vocabulary do not derive their own."""
+        mock_send_prompt.return_value = {'topics': ['network', 'billing']}
+        mock_call_api.side_effect = lambda model, texts, ai_config, **kwargs: {
+            'r': [[position, 'n', 'h', 2] for position in range(1, len(texts) + 1)]
+        }
+        
+        vocabulary = derive_dataset_topic_vocabulary(
+            pd.DataFrame({'full_text': ['Panne réseau', 'Ma facture', 'Panne réseau']}), sample_ai_config
+        )
+        assert vocabulary == ['other', 'network', 'billing']
+        for text in ['Autre facture', 'Facture payée']:
+            result_df, _ = calling_llm('file_1', pd.DataFrame({'full_text': [text]}), sample_ai_config, Mock(),
+                                       topic_vocabulary=vocabulary)
+            assert result_df['main_topic'].tolist() == ['billing']
+        assert mock_send_prompt.call_count == 1
+        
+        # An empty vocabulary keeps free topics without asking for one
+        calling_llm('file_1', pd.DataFrame({'full_text': ['Panne']}), sample_ai_config, Mock(), topic_vocabulary=[])
+        assert mock_call_api.call_args[1]['topics'] is None
+        assert mock_send_prompt.call_count == 1
+    
+    def test_topic_label(self):
+        """Test that ids, labels and unusable answers map to a vocabulary label."""
+        topics = ['other', 'network', 'billing']
+        assert _topic_label(1, topics) == 'network'
+        assert _topic_label('2', topics) == 'billing'
+        assert _topic_label(' Network ', topics) == 'network'
+        assert _topic_label(7, topics) == 'other'
+        assert _topic_label(None, topics) == 'other'
+        # JSON answers may hold Infinity and NaN
+        assert _topic_label(float('inf'), topics) == 'other'
+        assert _topic_label(float('nan'), topics) == 'other'
+
+
+class TestRequestHedging:
+    """Test cases for hedged requests in calling_llm."""
+    
+    @pytest.fixture
+    def sample_dataframe(self):
+        """Create sample DataFrame split into one-row batches."""
+        return pd.DataFrame({'full_text': [f'Post {i}' for i in range(8)]})
+    
+    @pytest.fixture
+    def sample_ai_config(self):
+        """Create AI configuration with a hedged primary model and a backup."""
+        return {
+            'preferences': {'mode': 'local', 'default_local_model_id': 'local1'},
+            'local': [
+                {'uid': 'local1', 'data': {'baseUrl': 'http://localhost:11434', 'model': 'llama3',
+                                           'paginateRowsLimit': 1, 'hedgeRequests': True}},
+                {'uid': 'local2', 'data': {'baseUrl': 'http://localhost:11434', 'model': 'mistral',
+                                           'paginateRowsLimit': 1}},
+            ]
+        }
+    
+    @staticmethod
+    def _slow_post(model, texts, ai_config, **kwargs):
+        """Answer fast, except the primary model on 'Post 6'."""
+        import time
+        time.sleep(1.0 if model['uid'] == 'local1' and texts == ['Post 6'] else 0.01)
+        return {'data': {'sentiment': ['positive'] * len(texts), 'priority': ['low'] * len(texts),
+                         'topic': [f"{model['uid']}:{text}" for text in texts]}}
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_slow_batch_answered_by_hedge(self, mock_call_api, sample_dataframe, sample_ai_config):
+        """Test that a batch slower than the latency percentile takes the backup model's answer."""
+        mock_call_api.side_effect = self._slow_post
+        hedger = RequestHedger(percentile=100, max_fraction=1.0, min_samples=3)
+        emitter = Mock()
+        
+        with patch('src.services.calling_llm.create_request_hedger', return_value=hedger):
+            result_df, _ = calling_llm('file_1', sample_dataframe, sample_ai_config, emitter)
+        
+        topics = result_df['main_topic'].tolist()
+        assert topics[6] == 'local2:Post 6'
+        assert [topic.split(':')[1] for topic in topics] == result_df['full_text'].tolist()
+        done = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_DONE][0]
+        assert done['hedge_wins'] >= 1
+        assert done['hedged_requests'] >= done['hedge_wins']
+    
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_hedging_capped(self, mock_call_api, sample_dataframe, sample_ai_config):
+        """Test that no hedge is sent once the hedge share is used up."""
+        mock_call_api.side_effect = self._slow_post
+        hedger = RequestHedger(percentile=100, max_fraction=0.0, min_samples=3)
+        emitter = Mock()
+        
+        with patch('src.services.calling_llm.create_request_hedger', return_value=hedger):
+            result_df, _ = calling_llm('file_1', sample_dataframe, sample_ai_config, emitter)
+        
+        assert result_df['main_topic'].tolist() == [f'local1:Post {i}' for i in range(8)]
+        assert {c[0][0]['uid'] for c in mock_call_api.call_args_list} == {'local1'}
+        done = [c[0][2] for c in emitter.call_args_list if c[0][1] == TASK_STATUS_SENDING_TO_LLM_DONE][0]
+        assert 'hedged_requests' not in done
+    
+    @pytest.mark.parametrize('primary_seconds, backup_seconds', [(0.1, 0.3), (0.3, 0.01)])
+    @patch('src.services.calling_llm._call_llm_api')
+    def test_primary_failure_recorded_when_hedge_wins(self, mock_call_api, primary_seconds, backup_seconds,
+                                                      sample_dataframe, sample_ai_config):
+        """Test that the primary's failure counts against its breaker, before or after the backup wins."""
+        import time
+        
+        def slow_primary_down(model, texts, ai_config, **kwargs):
+            if texts == ['Post 6']:
+                time.sleep(primary_seconds if model['uid'] == 'local1' else backup_seconds)
+                if model['uid'] == 'local1':
+                    raise Exception('connection reset')
+            return self._slow_post(model, texts, ai_config)
+        
+        mock_call_api.side_effect = slow_primary_down
+        hedger = RequestHedger(percentile=100, max_fraction=1.0, min_samples=3)
+        health = ModelHealthRegistry(failure_threshold=1)
+        with patch('src.services.calling_llm.create_request_hedger', return_value=hedger), \
+             patch('src.services.calling_llm.get_model_health_registry', return_value=health):
+            result_df, _ = calling_llm('file_1', sample_dataframe, sample_ai_config, Mock())
+        
+        assert result_df['main_topic'].tolist()[6] == 'local2:Post 6'
+        # Every other request of local1 succeeded, only a recorded failure raises its error rate
+        deadline = time.monotonic() + 2.0
+        while not health.snapshot()['local1']['errorRate'] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert health.snapshot()['local1']['errorRate'] > 0
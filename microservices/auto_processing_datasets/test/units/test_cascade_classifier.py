@@ -0,0 +1,76 @@
+"""Unit tests for the cascade classifier distilled from LLM labels."""
+import json
+import os
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.lib.llm import CascadeClassifier
+
+
+TEXTS = ['network down again', 'no network since this morning', 'thanks for the great service',
+         'great service, thanks a lot']
+SENTIMENTS = ['negative', 'negative', 'positive', 'positive']
+PRIORITIES = [2, 2, 0, 0]
+TOPICS = ['network', 'network', 'service', 'service']
+
+
+def train(cascade, rounds=20):
+    for _ in range(rounds):
+        cascade.update(TEXTS, SENTIMENTS, PRIORITIES, TOPICS)
+
+
+class TestCascadeClassifier:
+    """Test cases for CascadeClassifier."""
+
+    def test_not_trusted_before_min_samples(self, tmp_path):
+        """Test that no text skips the LLM until enough labels were seen."""
+        cascade = CascadeClassifier(str(tmp_path), '1', threshold=0.5, min_samples=100)
+        train(cascade, rounds=20)
+        assert cascade.samples == 80
+        assert cascade.classify(TEXTS) == [None] * 4
+
+    def test_learns_confident_labels(self, tmp_path):
+        """Test that trained texts are labelled and unrelated ones go to the LLM."""
+        cascade = CascadeClassifier(str(tmp_path), '1', threshold=0.8, min_samples=10)
+        train(cascade)
+
+        labels = cascade.classify(['network down again', 'thanks for the great service', 'zzz qqq'])
+        assert labels[0] == ('negative', 2, 'network')
+        assert labels[1] == ('positive', 0, 'service')
+        assert labels[2] is None
+
+    def test_rare_topics_are_never_trusted(self, tmp_path):
+        """Test that topics beyond max_topics are learnt as 'other' and sent to the LLM."""
+        cascade = CascadeClassifier(str(tmp_path), '1', threshold=0.5, min_samples=1, max_topics=1)
+        train(cascade)
+
+        assert cascade.topics == [CascadeClassifier.OTHER_TOPIC, 'network']
+        assert cascade.classify(['network down again'])[0] == ('negative', 2, 'network')
+        assert cascade.classify(['great service, thanks a lot']) == [None]
+
+    def test_save_versions_and_load(self, tmp_path):
+        """Test that saves are versioned, pruned and picked up by another instance."""
+        cascade = CascadeClassifier(str(tmp_path), '1', min_samples=1, keep_versions=2)
+        for _ in range(3):
+            train(cascade, rounds=1)
+            cascade.save()
+
+        assert sorted(os.listdir(tmp_path)) == ['cascade-v2.npz', 'cascade-v3.npz', 'current.json']
+        with open(tmp_path / 'current.json') as f:
+            assert json.load(f)['version'] == 3
+
+        other = CascadeClassifier(str(tmp_path), '1', min_samples=1)
+        assert other.load()
+        assert not other.load()
+        assert other.version == 3
+        assert other.samples == 12
+        assert other.predict(TEXTS) == cascade.predict(TEXTS)
+
+    def test_other_prompt_version_ignored(self, tmp_path):
+        """Test that a model trained on another prompt version is not loaded."""
+        cascade = CascadeClassifier(str(tmp_path), '1', min_samples=1)
+        train(cascade, rounds=1)
+        cascade.save()
+
+        assert not CascadeClassifier(str(tmp_path), '2').load()
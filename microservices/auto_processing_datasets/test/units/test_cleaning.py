@@ -10,12 +10,15 @@ from unittest.mock import Mock, patch, MagicMock
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
 
-from src.services.cleaning import remove_emoji, cleaning
+from src.services.cleaning import remove_emoji, clean_text_series, cleaning
 from src.configs.constants import (
     TASK_STATUS_PROCESS_CLEANING,
     TASK_STATUS_PROCESS_CLEANING_DONE,
 )
 
+# src.services re-exports the cleaning() function under the module name
+cleaning_module = sys.modules['src.services.cleaning']
+
 
 class TestRemoveEmoji:
     """Test cases for remove_emoji function."""
@@ -81,6 +84,78 @@ class TestRemoveEmoji:
         assert "Hello world test" in result or "Hello world test" == result.strip()
 
 
+class TestCleanTextSeries:
+    """Test cases for clean_text_series function."""
+    
+    TEXTS = [
+        "Hello 😀 world! 🎉",
+        "@user😀name and @ alone @",
+        "Contact @Free_Support ©®™ now!!",
+        "  lots\t of\n\n   spaces\u3000here  ",
+        "日本語のテキスト 👍🏽 ok",
+        "Math 𝔸𝔹 and ancient 𐌰 letters",
+        "😀😀😀",
+        "",
+        "price: 10€ (approx.) - good; right?",
+    ]
+    
+    def test_matches_remove_emoji(self):
+        """Test that the column engine produces the same output as remove_emoji."""
+        series = pd.Series(self.TEXTS)
+        result = clean_text_series(series)
+        assert result.tolist() == [remove_emoji(text) for text in self.TEXTS]
+    
+    def test_preserves_missing_values_and_index(self):
+        """Test that missing values stay missing and the index is kept."""
+        series = pd.Series(["Hi 😀 @bob", None, np.nan, 42], index=[10, 11, 12, 13], name='full_text')
+        result = clean_text_series(series)
+        assert list(result.index) == [10, 11, 12, 13]
+        assert result.name == 'full_text'
+        assert result[10] == "Hi @bob"
+        assert pd.isna(result[11])
+        assert pd.isna(result[12])
+        assert result[13] == "42"
+    
+    def test_all_missing(self):
+        """Test that a Series with only missing values is returned unchanged."""
+        series = pd.Series([None, np.nan])
+        result = clean_text_series(series)
+        assert result.isna().all()
+    
+    def test_encoded_chunk_round_trip(self):
+        """Test that the pool worker function cleans raw buffers like the in-process engine."""
+        code_points, lengths = cleaning_module._encode_texts(self.TEXTS)
+        buffer, cleaned_lengths = cleaning_module._clean_encoded_chunk(code_points.tobytes(), lengths.tobytes())
+        result = cleaning_module._decode_texts(
+            np.frombuffer(buffer, dtype=np.uint32),
+            np.frombuffer(cleaned_lengths, dtype=np.int64),
+        )
+        assert result == [remove_emoji(text) for text in self.TEXTS]
+    
+    def test_small_series_cleaned_in_process(self):
+        """Test that the process pool is skipped below the row threshold."""
+        series = pd.Series(self.TEXTS)
+        with patch.object(cleaning_module, '_clean_texts_parallel') as mock_parallel:
+            clean_text_series(series, workers=4, parallel_min_rows=len(self.TEXTS) + 1)
+        mock_parallel.assert_not_called()
+    
+    def test_large_series_uses_pool(self):
+        """Test that the process pool is used at or above the row threshold."""
+        series = pd.Series(self.TEXTS)
+        expected = [remove_emoji(text) for text in self.TEXTS]
+        with patch.object(cleaning_module, '_clean_texts_parallel', return_value=expected) as mock_parallel:
+            result = clean_text_series(series, workers=4, parallel_min_rows=len(self.TEXTS))
+        mock_parallel.assert_called_once_with(self.TEXTS, 4)
+        assert result.tolist() == expected
+    
+    def test_pool_failure_falls_back_to_in_process(self):
+        """Test that a broken process pool falls back to in-process cleaning."""
+        series = pd.Series(self.TEXTS)
+        with patch.object(cleaning_module, '_clean_texts_parallel', side_effect=RuntimeError("pool broken")):
+            result = clean_text_series(series, workers=4, parallel_min_rows=0)
+        assert result.tolist() == [remove_emoji(text) for text in self.TEXTS]
+
+
 class TestCleaning:
     """Test cases for cleaning function."""
     
@@ -0,0 +1,231 @@
+"""Unit tests for the RabbitMQ event publisher."""
+import pytest
+import queue
+import threading
+from unittest.mock import MagicMock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from pika.spec import Basic
+
+from src.lib.rabbitmq import EventPublisher
+
+publisher_module = sys.modules['src.lib.rabbitmq.EventPublisher']
+
+
+class FakeIOLoop:
+    """I/O loop running callbacks queued from any thread."""
+
+    def __init__(self):
+        self.callbacks = queue.Queue()
+        self.running = False
+
+    def add_callback_threadsafe(self, callback):
+        self.callbacks.put(callback)
+
+    def start(self):
+        self.running = True
+        while self.running:
+            try:
+                callback = self.callbacks.get(timeout=0.01)
+            except queue.Empty:
+                continue
+            callback()
+
+    def stop(self):
+        self.running = False
+
+
+class FakeBroker:
+    """Stands in for pika.SelectConnection, answering publishes with the scripted outcomes."""
+
+    def __init__(self):
+        self.connections = 0
+        self.published = []
+        # Unconfirmed messages on the channel when each message was published
+        self.in_flight = []
+        # Outcome of each publish in order: 'ack', 'nack' or 'drop' (connection lost); then 'ack'
+        self.outcomes = []
+        self.fail_connections = 0
+        self.gate = threading.Event()
+        self.gate.set()
+        self.ack_multiple = False
+
+    def __call__(self, parameters, on_open_callback, on_open_error_callback, on_close_callback):
+        broker = self
+        broker.connections += 1
+        ioloop = FakeIOLoop()
+        connection = MagicMock()
+        connection.ioloop = ioloop
+        connection.is_closing = False
+        connection.is_closed = False
+        channel = MagicMock()
+        state = {'tag': 0, 'unconfirmed': []}
+
+        def close():
+            connection.is_closed = True
+            ioloop.add_callback_threadsafe(lambda: on_close_callback(connection, Exception('closed')))
+
+        def confirm(method):
+            channel.ack_nack_callback(MagicMock(method=method))
+
+        def basic_publish(exchange, routing_key, body, properties):
+            assert connection.is_closed is False
+            state['tag'] += 1
+            tag = state['tag']
+            state['unconfirmed'].append(tag)
+            broker.published.append(body)
+            broker.in_flight.append(len(state['unconfirmed']))
+            outcome = broker.outcomes.pop(0) if broker.outcomes else 'ack'
+            if outcome == 'drop':
+                close()
+            elif outcome == 'nack':
+                state['unconfirmed'].remove(tag)
+                ioloop.add_callback_threadsafe(lambda: confirm(Basic.Nack(delivery_tag=tag)))
+            elif broker.ack_multiple:
+                def ack_all():
+                    if tag in state['unconfirmed']:
+                        state['unconfirmed'].clear()
+                        confirm(Basic.Ack(delivery_tag=state['tag'], multiple=True))
+                ioloop.add_callback_threadsafe(ack_all)
+            else:
+                state['unconfirmed'].remove(tag)
+                ioloop.add_callback_threadsafe(lambda: confirm(Basic.Ack(delivery_tag=tag)))
+
+        def confirm_delivery(ack_nack_callback, callback):
+            channel.ack_nack_callback = ack_nack_callback
+            ioloop.add_callback_threadsafe(lambda: callback(MagicMock()))
+
+        channel.basic_publish.side_effect = basic_publish
+        channel.confirm_delivery.side_effect = confirm_delivery
+        channel.exchange_declare.side_effect = lambda callback, **kwargs: \
+            ioloop.add_callback_threadsafe(lambda: callback(MagicMock()))
+        connection.channel.side_effect = lambda on_open_callback: \
+            ioloop.add_callback_threadsafe(lambda: on_open_callback(channel))
+        connection.close.side_effect = close
+
+        def open_connection():
+            broker.gate.wait()
+            if broker.fail_connections:
+                broker.fail_connections -= 1
+                on_open_error_callback(connection, Exception('connection refused'))
+            else:
+                on_open_callback(connection)
+        ioloop.add_callback_threadsafe(open_connection)
+        self.channel = channel
+        return connection
+
+
+class TestEventPublisher:
+    """Test cases for EventPublisher."""
+
+    @pytest.fixture
+    def broker(self):
+        """Patch pika's SelectConnection with a fake broker."""
+        broker = FakeBroker()
+        with patch.object(publisher_module.pika, 'SelectConnection', broker), \
+             patch.object(publisher_module.time, 'sleep'):
+            yield broker
+
+    def test_reuses_single_connection(self, broker):
+        """Test that many events share one connection in confirm mode."""
+        publisher = EventPublisher('amqp://test', 'tasks')
+
+        for i in range(20):
+            publisher.publish(f'file.event{i}', '{}')
+        assert publisher.flush(timeout=5)
+        publisher.close()
+
+        assert broker.connections == 1
+        broker.channel.exchange_declare.assert_called_once()
+        broker.channel.confirm_delivery.assert_called_once()
+        assert broker.channel.basic_publish.call_count == 20
+        assert all('mandatory' not in c.kwargs for c in broker.channel.basic_publish.call_args_list)
+
+    def test_publishes_batch_before_confirms(self, broker):
+        """Test that a batch is published without waiting for each confirm, and one ack settles it."""
+        broker.gate.clear()
+        broker.ack_multiple = True
+        publisher = EventPublisher('amqp://test', 'tasks', batch_size=8)
+
+        for i in range(20):
+            publisher.publish(f'file.event{i}', str(i))
+        broker.gate.set()
+        assert publisher.flush(timeout=5)
+        publisher.close()
+
+        assert broker.published == [str(i) for i in range(20)]
+        assert max(broker.in_flight) == 8
+
+    def test_preserves_publish_order(self, broker):
+        """Test that events are published in the order they were queued."""
+        publisher = EventPublisher('amqp://test', 'tasks', batch_size=3)
+
+        for i in range(10):
+            publisher.publish(f'file.event{i}', str(i))
+        assert publisher.flush(timeout=5)
+        publisher.close()
+
+        assert broker.published == [str(i) for i in range(10)]
+
+    def test_reconnects_after_failure(self, broker):
+        """Test that a lost connection triggers a reconnect and re-publishes the unconfirmed events."""
+        broker.gate.clear()
+        broker.outcomes = ['ack', 'drop']
+        publisher = EventPublisher('amqp://test', 'tasks')
+
+        publisher.publish('file.event1', '1')
+        publisher.publish('file.event2', '2')
+        broker.gate.set()
+        assert publisher.flush(timeout=5)
+        publisher.close()
+
+        assert broker.connections == 2
+        assert broker.published == ['1', '2', '2']
+
+    def test_nacked_event_republished(self, broker):
+        """Test that a nacked event is published again on the same channel."""
+        broker.gate.clear()
+        broker.outcomes = ['nack', 'ack']
+        publisher = EventPublisher('amqp://test', 'tasks')
+
+        publisher.publish('file.event1', '1')
+        publisher.publish('file.event2', '2')
+        broker.gate.set()
+        assert publisher.flush(timeout=5)
+        publisher.close()
+
+        assert broker.connections == 1
+        assert broker.published == ['1', '2', '1']
+
+    def test_drops_events_when_broker_unreachable(self, broker):
+        """Test that events are dropped after max_attempts failed connections, so flush returns."""
+        broker.fail_connections = 3
+        publisher = EventPublisher('amqp://test', 'tasks', max_attempts=3)
+
+        publisher.publish('file.event1', '1')
+        assert publisher.flush(timeout=5)
+        publisher.close()
+
+        assert broker.connections == 3
+        assert broker.published == []
+
+    def test_thread_safe_publish(self, broker):
+        """Test that concurrent publishers do not lose events."""
+        publisher = EventPublisher('amqp://test', 'tasks')
+
+        def worker(n):
+            for i in range(25):
+                publisher.publish(f'file{n}.event', f'{n}-{i}')
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert publisher.flush(timeout=5)
+        publisher.close()
+
+        assert len(broker.published) == 100
@@ -3,12 +3,15 @@ import pytest
 import os
 import tempfile
 import shutil
+import json
 from pathlib import Path
 
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
 
-from src.utils.helpers import ensure_directory_exists, get_file_id_from_path
+from src.utils.helpers import (
+    ensure_directory_exists, get_file_id_from_path, normalize_text_key, repair_truncated_json
+)
 
 
 class TestEnsureDirectoryExists:
@@ -100,3 +103,55 @@ class TestGetFileIdFromPath:
         file_id = get_file_id_from_path(file_path)
         assert file_id == 'file_123'
 
+
+
+class TestNormalizeTextKey:
+    """Test cases for normalize_text_key function."""
+    
+    def test_folds_case_and_whitespace(self):
+        """Test that case and whitespace differences are folded."""
+        assert normalize_text_key('  Hello\tWORLD \n') == 'hello world'
+    
+    def test_handles_missing_values(self):
+        """Test that None and NaN map to an empty key."""
+        assert normalize_text_key(None) == ''
+        assert normalize_text_key(float('nan')) == ''
+    
+    def test_folds_retweet_prefix(self):
+        """Test that leading RT @user: prefixes are removed."""
+        assert normalize_text_key('RT @free: Panne réseau') == 'panne réseau'
+        assert normalize_text_key('RT @a: RT @b: Panne') == 'panne'
+        assert normalize_text_key('Panne RT @free: réseau') == 'panne rt @free: réseau'
+
+
+class TestRepairTruncatedJson:
+    """Test cases for repair_truncated_json function."""
+    
+    def test_complete_document_extracted(self):
+        """Test that a complete document is returned without surrounding text."""
+        assert repair_truncated_json('```json\n{"a": [1, 2]}\n```') == '{"a": [1, 2]}'
+    
+    def test_truncated_document_closed(self):
+        """Test that complete elements are kept and partial ones dropped."""
+        repaired = repair_truncated_json('{"data": {"sentiment": ["neg", "pos", "ne')
+        assert json.loads(repaired) == {'data': {'sentiment': ['neg', 'pos']}}
+        assert json.loads(repair_truncated_json('{"a": [1, 23')) == {'a': [1]}
+    
+    def test_escaped_quotes_in_strings(self):
+        """Test that brackets and commas inside strings are ignored."""
+        repaired = repair_truncated_json('{"t": ["say \\"hi\\", [x]", "cut')
+        assert json.loads(repaired) == {'t': ['say "hi", [x]']}
+    
+    def test_nothing_recoverable(self):
+        """Test that text without a complete element gives None."""
+        assert repair_truncated_json('no json here') is None
+        assert repair_truncated_json('{"a": [') is None
+    
+    def test_prefers_longest_document_of_expected_shape(self):
+        """Test that a short preamble object does not hide the answer after it."""
+        text = 'Format: {"id": 1} then the answer:\n{"r": [[1, "p", 0, "a"], [2, "n'
+        expected = lambda value: isinstance(value, list) or 'r' in value
+        assert json.loads(repair_truncated_json(text, expected)) == {'r': [[1, 'p', 0, 'a'], [2]]}
+        assert json.loads(repair_truncated_json('Ids like [1, 2]: {"r": [[1, "p", 0, "a"]]}')) == \
+            {'r': [[1, 'p', 0, 'a']]}
+        assert repair_truncated_json('See {"note": "x"} or {"n": 1}', lambda value: False) == '{"note": "x"}'
@@ -0,0 +1,46 @@
+"""Unit tests for the LLM input normaliser."""
+import os
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.lib.llm import InputNormalizer, TokenEstimator
+from src.services.cleaning import remove_emoji
+
+
+class TestInputNormalizer:
+    """Test cases for InputNormalizer."""
+
+    def test_strips_noise(self):
+        """Test that RT prefixes, links, mention chains and repeated hashtags are dropped."""
+        normalizer = InputNormalizer(max_mentions=2)
+        text = 'RT @free: RT @sfr: @a @b @c @d pas de réseau https://t.co/xYz  #panne #Panne #free'
+        assert normalizer.normalize(text) == '@a @b pas de réseau #panne #free'
+        assert normalizer.normalize('merci @free pour www.free.fr') == 'merci @free pour'
+
+    def test_strips_noise_after_cleaning(self):
+        """Test that links and repeated hashtags are still dropped once cleaning() rewrote them."""
+        normalizer = InputNormalizer(max_mentions=2)
+        cleaned = remove_emoji('RT @free: @a @b @c pas de réseau #free #Free https://t.co/AbC123xyz www.free.fr/x?y=1')
+        assert 'https:t.coAbC123xyz' in cleaned and 'free Free' in cleaned
+        assert normalizer.normalize(cleaned) == '@a @b pas de réseau free'
+        assert normalizer.normalize('très très lent') == 'très lent'
+
+    def test_truncates_at_word_boundary(self):
+        """Test that long posts are cut before max_chars at a word boundary."""
+        normalizer = InputNormalizer(max_chars=20)
+        assert normalizer.normalize('facture trop élevée encore ce mois-ci') == 'facture trop élevée…'
+        words = ' '.join(f'mot{i}' for i in range(500))
+        assert InputNormalizer(max_chars=0).normalize(words) == words
+
+    def test_keeps_clean_posts(self):
+        """Test that posts without noise and non-string values are left unchanged."""
+        normalizer = InputNormalizer()
+        assert normalizer.normalize('pas de réseau depuis ce matin #panne') == 'pas de réseau depuis ce matin #panne'
+        assert normalizer.normalize(None) is None
+
+    def test_saves_tokens(self):
+        """Test that normalised posts cost fewer tokens."""
+        estimator = TokenEstimator()
+        text = 'RT @orange: @free @sfr @bouygues réseau coupé https://t.co/abcdef123 #panne #panne'
+        assert estimator.count(InputNormalizer().normalize(text)) < estimator.count(text) - 10
@@ -0,0 +1,116 @@
+"""Unit tests for the persistent LLM classification cache."""
+import pytest
+import time
+from unittest.mock import Mock, patch
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.lib.cache import BaseCache, SqliteCache
+from src.lib.cache.mongodb.MongoCache import MongoCache
+
+sqlite_module = sys.modules['src.lib.cache.sqlite.SqliteCache']
+
+
+class TestMakeKey:
+    """Test cases for BaseCache.make_key."""
+    
+    def test_key_depends_on_model_and_prompt_version(self):
+        """Test that model uid and prompt version are part of the key."""
+        key = BaseCache.make_key('hello', 'model1', '1')
+        assert key == BaseCache.make_key('hello', 'model1', '1')
+        assert key != BaseCache.make_key('hello', 'model2', '1')
+        assert key != BaseCache.make_key('hello', 'model1', '2')
+        assert key != BaseCache.make_key('hello!', 'model1', '1')
+
+
+class TestSqliteCache:
+    """Test cases for SqliteCache."""
+    
+    @pytest.fixture
+    def cache_path(self, tmp_path):
+        """Path of a temporary cache database."""
+        return str(tmp_path / 'cache' / 'llm_cache.sqlite')
+    
+    def test_get_many_returns_only_hits(self, cache_path):
+        """Test that stored values are returned and misses are omitted."""
+        cache = SqliteCache(cache_path, max_entries=100, ttl_seconds=3600)
+        value = {'sentiment': 'negative', 'priority': 2, 'topic': 'réseau'}
+        cache.set_many({'a': value})
+        
+        assert cache.get_many(['a', 'b']) == {'a': value}
+    
+    def test_persists_across_instances(self, cache_path):
+        """Test that entries survive reopening the database."""
+        SqliteCache(cache_path, 100, 3600).set_many({'a': {'sentiment': 'positive', 'priority': 0, 'topic': 't'}})
+        
+        assert 'a' in SqliteCache(cache_path, 100, 3600).get_many(['a'])
+    
+    def test_expired_entries_are_misses(self, cache_path):
+        """Test TTL expiry."""
+        cache = SqliteCache(cache_path, max_entries=100, ttl_seconds=10)
+        now = time.time()
+        with patch.object(sqlite_module.time, 'time', return_value=now - 60):
+            cache.set_many({'old': {'sentiment': 'neutral', 'priority': 1, 'topic': 't'}})
+        cache.set_many({'new': {'sentiment': 'neutral', 'priority': 1, 'topic': 't'}})
+        
+        assert set(cache.get_many(['old', 'new'])) == {'new'}
+    
+    def test_evicts_least_recently_used(self, cache_path):
+        """Test that the least recently accessed entries are evicted past max_entries."""
+        cache = SqliteCache(cache_path, max_entries=2, ttl_seconds=3600)
+        value = {'sentiment': 'neutral', 'priority': 1, 'topic': 't'}
+        now = time.time()
+        with patch.object(sqlite_module.time, 'time', return_value=now - 3):
+            cache.set_many({'a': value, 'b': value})
+        with patch.object(sqlite_module.time, 'time', return_value=now - 2):
+            cache.get_many(['a'])
+        cache.set_many({'c': value})
+        
+        assert set(cache.get_many(['a', 'b', 'c'])) == {'a', 'c'}
+    
+    def test_counts_entries_without_scanning_every_write(self, cache_path):
+        """Test that rewritten keys do not count twice and the table is only counted once per recount period."""
+        cache = SqliteCache(cache_path, max_entries=2, ttl_seconds=3600)
+        value = {'sentiment': 'neutral', 'priority': 1, 'topic': 't'}
+        cache.set_many({'a': value, 'b': value})
+        statements = []
+        cache.conn.set_trace_callback(statements.append)
+        for _ in range(5):
+            cache.set_many({'b': value})
+        
+        assert set(cache.get_many(['a', 'b'])) == {'a', 'b'}
+        assert not [s for s in statements if s.startswith('SELECT COUNT(*) FROM llm_cache') and 'WHERE' not in s]
+        assert cache._count == 2
+
+
+class TestMongoCache:
+    """Test cases for MongoCache."""
+
+    def test_queries_keys_in_chunks(self):
+        """Test that no $in query holds more than a chunk of keys."""
+        def find(query, projection=None):
+            if projection is None:
+                # Lookup: the first key of each chunk is a hit
+                return [{'_id': key, 'value': key} for key in query['_id']['$in'][:1]]
+            # Eviction: the least recently used ids
+            stale = [{'_id': i} for i in range(1200)]
+            return Mock(sort=Mock(return_value=Mock(limit=Mock(return_value=stale))))
+
+        collection = Mock()
+        collection.find.side_effect = find
+        collection.estimated_document_count.return_value = 1300
+        db_adapter = Mock(get_collection=Mock(return_value=collection))
+        cache = MongoCache(db_adapter, 'llm_cache', max_entries=100, ttl_seconds=60)
+        keys = [f'k{i}' for i in range(1200)]
+
+        hits = cache.get_many(keys)
+        cache.set_many({'k0': 'v'})
+
+        assert hits == {'k0': 'k0', 'k500': 'k500', 'k1000': 'k1000'}
+        queries = [c[0][0] for c in collection.find.call_args_list if '_id' in c[0][0]]
+        assert [len(query['_id']['$in']) for query in queries] == [500, 500, 200]
+        deletes = [len(c[0][0]['_id']['$in']) for c in collection.delete_many.call_args_list]
+        assert deletes == [500, 500, 200]
+        assert collection.update_many.call_count == 3
@@ -0,0 +1,66 @@
+"""Unit tests for the LLM batch checkpoint."""
+import pytest
+import os
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.lib.llm import LlmCheckpoint
+
+
+class TestLlmCheckpoint:
+    """Test cases for LlmCheckpoint."""
+    
+    @pytest.fixture
+    def path(self, tmp_path):
+        """Checkpoint file path in a not yet existing directory."""
+        return str(tmp_path / 'checkpoints' / 'file_1.llm.jsonl')
+    
+    def test_append_and_reload(self, path):
+        """Test that appended batches are found by a new instance."""
+        checkpoint = LlmCheckpoint(path, '1')
+        checkpoint.append(['network down', 'bill'], ['negative', 'neutral'], [2, 1], ['network', 'billing'], 'model1')
+        
+        reloaded = LlmCheckpoint(path, '1')
+        hits = reloaded.get_many(['network down', 'bill', 'unknown'])
+        assert hits == {
+            'network down': {'sentiment': 'negative', 'priority': 2, 'topic': 'network'},
+            'bill': {'sentiment': 'neutral', 'priority': 1, 'topic': 'billing'},
+        }
+    
+    def test_prompt_version_isolates_results(self, path):
+        """Test that results from another prompt version are not reused."""
+        LlmCheckpoint(path, '1').append(['bill'], ['neutral'], [1], ['billing'])
+        assert LlmCheckpoint(path, '2').get_many(['bill']) == {}
+    
+    def test_torn_last_line_is_dropped(self, path):
+        """Test that a partially written line is ignored and does not corrupt later appends."""
+        checkpoint = LlmCheckpoint(path, '1')
+        checkpoint.append(['a'], ['positive'], [0], ['general'])
+        with open(path, 'a') as f:
+            f.write('{"keys": ["trunc')
+        
+        resumed = LlmCheckpoint(path, '1')
+        assert set(resumed.get_many(['a'])) == {'a'}
+        resumed.append(['b'], ['negative'], [2], ['network'])
+        
+        assert set(LlmCheckpoint(path, '1').get_many(['a', 'b'])) == {'a', 'b'}
+    
+    def test_topics_recorded(self, path):
+        """Test that the topic vocabulary is kept alongside the results."""
+        checkpoint = LlmCheckpoint(path, '1')
+        assert checkpoint.get_topics() is None
+        checkpoint.set_topics(['other', 'network'])
+        checkpoint.append(['a'], ['negative'], [2], ['network'])
+        
+        reloaded = LlmCheckpoint(path, '1')
+        assert reloaded.get_topics() == ['other', 'network']
+        assert set(reloaded.get_many(['a'])) == {'a'}
+    
+    def test_remove(self, path):
+        """Test that remove deletes the checkpoint file."""
+        checkpoint = LlmCheckpoint(path, '1')
+        checkpoint.append(['a'], ['positive'], [0], ['general'])
+        checkpoint.remove()
+        assert not os.path.exists(path)
+        assert checkpoint.get_many(['a']) == {}
@@ -0,0 +1,63 @@
+"""Unit tests for the pooled LLM HTTP client."""
+import gzip
+import json
+import os
+from unittest.mock import Mock, patch
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.lib.llm import LlmHttpClient, get_llm_http_client
+from src.services.calling_llm import _call_llm_api
+
+
+class TestLlmHttpClient:
+    """Test cases for LlmHttpClient."""
+    
+    @patch('requests.Session.post')
+    def test_small_body_sent_plain(self, mock_post):
+        """Test that bodies below the threshold are not compressed."""
+        LlmHttpClient(4, 1024).post_json('http://llm/v1', {'text': 'é'}, headers={'X': '1'}, compress=True)
+        
+        kwargs = mock_post.call_args[1]
+        assert json.loads(kwargs['data'].decode('utf-8')) == {'text': 'é'}
+        assert kwargs['headers'] == {'Content-Type': 'application/json', 'X': '1'}
+    
+    @patch('requests.Session.post')
+    def test_large_body_gzipped(self, mock_post):
+        """Test that large bodies are gzipped when compression is requested."""
+        body = {'text': 'x' * 5000}
+        LlmHttpClient(4, 1024).post_json('http://llm/v1', body, compress=True, timeout=(1, 2))
+        
+        kwargs = mock_post.call_args[1]
+        assert kwargs['headers']['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(kwargs['data'])) == body
+        assert kwargs['timeout'] == (1, 2)
+    
+    def test_client_shared_per_host(self):
+        """Test that one client is kept per scheme and host in a process."""
+        first = get_llm_http_client('http://llm-host:11434/v1/chat/completions')
+        assert get_llm_http_client('http://llm-host:11434/other') is first
+        assert get_llm_http_client('https://llm-host:11434/v1') is not first
+
+
+class TestCallLlmApiHttp:
+    """Test cases for the HTTP options of _call_llm_api."""
+    
+    @patch('requests.Session.post')
+    def test_model_timeouts_and_compression(self, mock_post):
+        """Test that per-model timeouts and gzip settings are used."""
+        response = Mock()
+        response.json.return_value = {'choices': [{'message': {'content': '{"data": {"sentiment": ["u"]}}'}}]}
+        mock_post.return_value = response
+        model = {'uid': 'm1', 'data': {
+            'baseUrl': 'http://llm-gzip:8000/v1', 'model': 'm', 'connectTimeout': 3,
+            'readTimeout': 45, 'gzipRequests': True,
+        }}
+        
+        _call_llm_api(model, ['x' * 40000], {})
+        
+        kwargs = mock_post.call_args[1]
+        assert mock_post.call_args[0][0] == 'http://llm-gzip:8000/v1/chat/completions'
+        assert kwargs['timeout'] == (3.0, 45.0)
+        assert kwargs['headers']['Content-Encoding'] == 'gzip'
@@ -0,0 +1,120 @@
+"""Unit tests for the model health registry."""
+import os
+from unittest.mock import Mock
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.lib.llm import ModelHealthRegistry, get_model_health_registry
+
+
+class FakeClock:
+    """Manually advanced time source."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestModelHealthRegistry:
+    """Test cases for ModelHealthRegistry."""
+
+    def test_breaker_opens_after_consecutive_failures(self):
+        """Test that the breaker opens after failure_threshold failures in a row."""
+        health = ModelHealthRegistry(failure_threshold=2, clock=FakeClock())
+        health.record_failure('m1')
+        health.record_success('m1', 1.0)
+        health.record_failure('m1')
+        assert health.state('m1') == ModelHealthRegistry.CLOSED
+
+        health.record_failure('m1')
+        assert health.state('m1') == ModelHealthRegistry.OPEN
+        assert health.pick(['m1', 'm2']) == 'm2'
+        assert health.pick(['m1']) is None
+
+    def test_probes_are_rate_limited(self):
+        """Test that a half-open model gets one probe per probe_interval."""
+        clock = FakeClock()
+        health = ModelHealthRegistry(failure_threshold=1, open_seconds=60, probe_interval=30, clock=clock)
+        health.record_failure('m1')
+
+        clock.now += 59
+        assert health.pick(['m1', 'm2']) == 'm2'
+        clock.now += 1
+        assert health.state('m1') == ModelHealthRegistry.HALF_OPEN
+        assert health.pick(['m1', 'm2']) == 'm1'
+        # The probe is in flight, other tasks keep away
+        assert health.pick(['m1', 'm2']) == 'm2'
+        clock.now += 30
+        assert health.pick(['m1', 'm2']) == 'm1'
+
+    def test_probe_result_closes_or_reopens(self):
+        """Test that a successful probe closes the breaker and a failed one reopens it."""
+        clock = FakeClock()
+        health = ModelHealthRegistry(failure_threshold=3, open_seconds=10, clock=clock)
+        for _ in range(3):
+            health.record_failure('m1')
+
+        clock.now += 10
+        assert health.pick(['m1']) == 'm1'
+        health.record_failure('m1')
+        assert health.state('m1') == ModelHealthRegistry.OPEN
+
+        clock.now += 10
+        assert health.pick(['m1']) == 'm1'
+        health.record_success('m1', 2.0)
+        assert health.state('m1') == ModelHealthRegistry.CLOSED
+        assert health.snapshot()['m1']['failures'] == 0
+
+    def test_healthy_models_preferred(self):
+        """Test that degraded models come after healthy ones, in preference order otherwise."""
+        health = ModelHealthRegistry(failure_threshold=10, degraded_error_rate=0.3, clock=FakeClock())
+        health.record_failure('m1')
+        health.record_failure('m1')
+        health.record_success('m2', 5.0)
+        health.record_success('m3', 1.0)
+
+        assert health.pick(['m1', 'm2', 'm3']) == 'm2'
+        assert health.pick(['m1', 'm3', 'm2']) == 'm3'
+        assert health.pick(['m1']) == 'm1'
+        assert health.snapshot()['m2']['latency'] == 5.0
+
+    def test_breaker_state_shared_through_database(self):
+        """Test that breaker changes are published and newer shared states adopted."""
+        clock = FakeClock()
+        collection = Mock()
+        adapter = Mock()
+        adapter.get_collection.return_value = collection
+        health = ModelHealthRegistry(failure_threshold=1, db_adapter=adapter, sync_seconds=5, clock=clock)
+
+        health.record_failure('m1')
+        filter_, update = collection.update_one.call_args[0]
+        assert filter_ == {'_id': 'm1'}
+        assert update['$set']['state'] == ModelHealthRegistry.OPEN
+
+        # Another worker saw m2 fail after our last update
+        collection.find.return_value = [{
+            '_id': 'm2', 'state': 'open', 'failures': 3, 'openedAt': clock.now,
+            'latency': None, 'errorRate': 0.6, 'updatedAt': clock.now + 1,
+        }]
+        assert health.pick(['m1', 'm2', 'm3']) == 'm3'
+        assert health.state('m2') == ModelHealthRegistry.OPEN
+
+        # Shared states are read at most every sync_seconds
+        health.pick(['m1', 'm2', 'm3'])
+        assert collection.find.call_count == 1
+
+    def test_shared_registry_failures_are_not_fatal(self):
+        """Test that database errors leave the local registry working."""
+        adapter = Mock()
+        adapter.get_collection.side_effect = RuntimeError('db down')
+        health = ModelHealthRegistry(failure_threshold=1, db_adapter=adapter, clock=FakeClock())
+
+        health.record_failure('m1')
+        assert health.pick(['m1', 'm2']) == 'm2'
+
+    def test_registry_is_process_wide(self):
+        """Test that every task of a process gets the same registry."""
+        assert get_model_health_registry() is get_model_health_registry()
@@ -0,0 +1,54 @@
+"""Unit tests for the near-duplicate clusterer."""
+import os
+import random
+
+import numpy as np
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.lib.llm import NearDuplicateClusterer
+from src.services.cleaning import remove_emoji
+
+
+class TestNearDuplicateClusterer:
+    """Test cases for NearDuplicateClusterer."""
+
+    def test_variants_join_first_post(self):
+        """Test that posts differing by mentions, links or a hashtag share a representative."""
+        texts = [
+            '@orange pas de réseau depuis ce matin à Lyon https://t.co/abc',
+            'facture trop élevée encore ce mois-ci',
+            '@sfr @orange pas de réseau depuis ce matin à Lyon https://t.co/xyz',
+            'pas de réseau depuis ce matin à Lyon #panne',
+            'pas de réseau depuis hier soir à Paris',
+        ]
+        assert NearDuplicateClusterer(threshold=0.7).cluster(texts) == [0, 1, 0, 0, 4]
+
+    def test_cleaned_links_dropped(self):
+        """Test that links left by cleaning (slashes stripped) are dropped like raw ones."""
+        clusterer = NearDuplicateClusterer(threshold=0.7)
+        raw = 'pas de réseau depuis ce matin à Lyon https://t.co/AbC123xyz'
+        cleaned = remove_emoji(raw)
+        assert 'https:t.co' in cleaned
+        assert np.array_equal(clusterer.signature(cleaned), clusterer.signature(raw))
+
+    def test_short_posts_left_alone(self):
+        """Test that posts below min_tokens are never clustered."""
+        clusterer = NearDuplicateClusterer(threshold=0.5, min_tokens=3)
+        assert clusterer.signature('merci @orange') is None
+        assert clusterer.cluster(['merci @orange', 'merci @sfr']) == [0, 1]
+
+    def test_banding_below_threshold(self):
+        """Test that the LSH bands collide well below the similarity threshold."""
+        for threshold in (0.6, 0.8, 0.9):
+            clusterer = NearDuplicateClusterer(threshold=threshold)
+            assert clusterer.bands * clusterer.rows == clusterer.num_perm
+            assert (1 / clusterer.bands) ** (1 / clusterer.rows) <= threshold - 0.1
+
+    def test_unrelated_posts_not_merged(self):
+        """Test that random posts stay in their own cluster."""
+        rng = random.Random(0)
+        words = [f"mot{i}" for i in range(2000)]
+        texts = [' '.join(rng.choices(words, k=12)) for _ in range(2000)]
+        assert NearDuplicateClusterer(threshold=0.8).cluster(texts) == list(range(2000))
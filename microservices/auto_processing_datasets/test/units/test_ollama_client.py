@@ -0,0 +1,156 @@
+"""Unit tests for the native Ollama backend, against a local stub server."""
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from unittest.mock import patch
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.lib.llm import OllamaClient, get_ollama_client, get_ollama_num_ctx, warmup_ollama_model, warmup_ollama_models
+from src.services.calling_llm import _call_llm_api
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Answer /api/chat and /api/generate like Ollama, recording the requests."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append((self.path, body))
+        if body.get('model') == 'missing':
+            self._reply(404, {'error': f"model '{body['model']}' not found"})
+        elif self.path == '/api/chat':
+            self._reply(200, {'model': body['model'], 'message': {'role': 'assistant', 'content': self.server.content},
+                              'done': True, 'done_reason': 'stop'})
+        elif self.path == '/api/generate':
+            self._reply(200, {'model': body['model'], 'response': '', 'done': True})
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    """Run a stub Ollama server on a free local port."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOllamaHandler)
+    server.requests = []
+    server.content = '{"data": {"sentiment": ["negative"], "priority": ["high"], "topic": ["network"]}}'
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestOllamaClient:
+    """Test cases for OllamaClient."""
+
+    @pytest.mark.parametrize('base_url', [
+        'http://localhost:11434', 'http://localhost:11434/', 'http://localhost:11434/v1',
+        'http://localhost:11434/v1/chat/completions', 'http://localhost:11434/api/chat',
+    ])
+    def test_api_base(self, base_url):
+        """Test that configured URLs are reduced to the server root."""
+        assert OllamaClient.api_base(base_url) == 'http://localhost:11434'
+
+    def test_chat_request(self, stub_server):
+        """Test that chat asks for JSON with keep_alive and an explicit context window."""
+        content, done_reason = get_ollama_client(f"{stub_server.url}/v1").chat(
+            'llama3', 'Classify', '300', 8192, timeout=5
+        )
+
+        assert json.loads(content)['data']['topic'] == ['network']
+        assert done_reason == 'stop'
+        path, body = stub_server.requests[0]
+        assert path == '/api/chat'
+        assert body['format'] == 'json'
+        assert body['stream'] is False
+        assert body['keep_alive'] == 300
+        assert body['options']['num_ctx'] == 8192
+        assert body['messages'] == [{'role': 'user', 'content': 'Classify'}]
+
+    def test_warmup_once_per_process(self, stub_server):
+        """Test that a model is loaded once, with the context window used by requests."""
+        assert warmup_ollama_model(stub_server.url, 'warm-model', '30m', 4096, timeout=5)
+        assert not warmup_ollama_model(stub_server.url, 'warm-model', '30m', 4096, timeout=5)
+
+        assert len(stub_server.requests) == 1
+        path, body = stub_server.requests[0]
+        assert path == '/api/generate'
+        assert body['prompt'] == ''
+        assert body['keep_alive'] == '30m'
+        assert body['options'] == {'num_ctx': 4096}
+
+    @patch('src.configs.env.OLLAMA_WARMUP_MODELS', 'model-a, model-b')
+    @patch('src.configs.env.DEFAULT_BATCH_TOKEN_BUDGET', 12000)
+    def test_warmup_uses_request_context_window(self, stub_server):
+        """Test that worker start loads models with the num_ctx their requests send."""
+        with patch('src.configs.env.OLLAMA_BASE_URL', stub_server.url):
+            warmup_ollama_models()
+
+        assert [body['model'] for _, body in stub_server.requests] == ['model-a', 'model-b']
+        num_ctx = get_ollama_num_ctx({'data': {'model': 'model-a'}})
+        assert num_ctx == 12000
+        assert all(body['options'] == {'num_ctx': num_ctx} for _, body in stub_server.requests)
+
+    def test_warmup_failure_is_not_fatal(self, stub_server):
+        """Test that a model that cannot be loaded is reported and retried later."""
+        assert not warmup_ollama_model(stub_server.url, 'missing', '30m', 4096, timeout=5)
+        assert not warmup_ollama_model(stub_server.url, 'missing', '30m', 4096, timeout=5)
+        assert len(stub_server.requests) == 2
+
+
+class TestCallLlmApiOllama:
+    """Test cases for the native Ollama path of _call_llm_api."""
+
+    def test_local_model_uses_native_api(self, stub_server):
+        """Test that models with the ollama backend are classified through /api/chat with the model settings."""
+        model = {'uid': 'local1', 'data': {
+            'baseUrl': stub_server.url, 'model': 'llama3', 'keepAlive': '1h', 'maxBatchTokens': 12000,
+            'backend': 'ollama',
+        }}
+        ai_config = {'preferences': {'mode': 'local'}, 'local': [model]}
+
+        result = _call_llm_api(model, ['Pas de réseau'], ai_config)
+
+        assert result == {'data': {'sentiment': ['negative'], 'priority': ['high'], 'topic': ['network']}}
+        path, body = stub_server.requests[0]
+        assert path == '/api/chat'
+        assert body['keep_alive'] == '1h'
+        # The context window holds a whole batch
+        assert body['options']['num_ctx'] == 12000
+        assert 'Pas de réseau' in body['messages'][0]['content']
+
+    def test_local_models_default_to_openai(self, stub_server):
+        """Test that local models without a backend keep the OpenAI-compatible endpoint."""
+        model = {'uid': 'local1', 'data': {'baseUrl': f"{stub_server.url}/v1", 'model': 'llama3', 'retryRequests': 0}}
+
+        with pytest.raises(Exception):
+            _call_llm_api(model, ['a'], {'preferences': {'mode': 'local'}, 'local': [model]})
+
+        assert stub_server.requests[0][0] == '/v1/chat/completions'
+
+    @patch('src.services.calling_llm.LOCAL_LLM_BACKEND', 'ollama')
+    def test_openai_backend_override(self, stub_server):
+        """Test that a local model can keep the OpenAI-compatible endpoint."""
+        model = {'uid': 'local1', 'data': {'baseUrl': f"{stub_server.url}/v1", 'model': 'llama3',
+                                           'backend': 'openai', 'retryRequests': 0}}
+
+        with pytest.raises(Exception):
+            _call_llm_api(model, ['a'], {'preferences': {'mode': 'local'}, 'local': [model]})
+
+        assert stub_server.requests[0][0] == '/v1/chat/completions'
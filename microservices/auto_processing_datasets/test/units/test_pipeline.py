@@ -0,0 +1,254 @@
+"""Unit tests for the chunked processing pipeline."""
+import pytest
+import pandas as pd
+import numpy as np
+import os
+import tempfile
+import shutil
+import io
+import threading
+from unittest.mock import Mock, patch
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.tasks.pipeline import run_stages, run_pipeline
+from src.services.cleaning import cleaning
+from src.configs.constants import (
+    TASK_STATUS_PROCESS_CLEANING_DONE,
+    TASK_STATUS_SENDING_TO_LLM,
+    TASK_STATUS_SENDING_TO_LLM_PROGRESS,
+    TASK_STATUS_SENDING_TO_LLM_DONE,
+    TASK_STATUS_DONE,
+)
+
+
+def fake_calling_llm(file_id, df, ai_config, event_emitter, tried_models=None, cache=None, checkpoint=None,
+                     retry_policy=None, cascade=None, topic_vocabulary=None, save_state=True):
+    """Deterministic stand-in for calling_llm emitting the same events."""
+    event_emitter(file_id, TASK_STATUS_SENDING_TO_LLM)
+    total = len(df)
+    event_emitter(file_id, TASK_STATUS_SENDING_TO_LLM_PROGRESS, {
+        'batch': 1, 'total_batches': 1, 'batches_completed': 1, 'batch_size': total,
+        'total_rows': total, 'rows_processed': total, 'rows_remaining': 0,
+        'total_unique_texts': total, 'unique_texts_processed': total,
+        'progress_percentage': 100, 'current_row_index': 1, 'current_row_end': total,
+        'model_uid': 'model1',
+    })
+    texts = df['full_text'].fillna('').astype(str)
+    df['sentiment'] = np.where(texts.str.len() % 2 == 0, 'positive', 'negative')
+    df['priority'] = texts.str.len() % 3
+    df['main_topic'] = 'general'
+    event_emitter(file_id, TASK_STATUS_SENDING_TO_LLM_DONE, {
+        'total_rows': total, 'total_batches': 1, 'model_uid': 'model1',
+        'unique_texts': total, 'duplicates_skipped': 0, 'cache_hits': 0, 'cache_misses': total,
+    })
+    return df, 'model1'
+
+
+class TestRunStages:
+    """Test cases for run_stages function."""
+
+    def test_items_flow_in_order(self):
+        """Test that items pass through every stage in source order."""
+        output = []
+        run_stages(range(20), [lambda x: x * 2, lambda x: x + 1, output.append], queue_depth=2)
+        assert output == [x * 2 + 1 for x in range(20)]
+
+    def test_none_drops_item(self):
+        """Test that a stage returning None drops the item."""
+        output = []
+        run_stages(range(10), [lambda x: x if x % 2 else None, output.append], queue_depth=1)
+        assert output == [1, 3, 5, 7, 9]
+
+    def test_source_is_bounded_by_queue_depth(self):
+        """Test that a slow stage holds back the source."""
+        produced = []
+        release = threading.Event()
+
+        def source():
+            for i in range(50):
+                produced.append(i)
+                yield i
+
+        def slow(item):
+            release.wait(timeout=5)
+            return item
+
+        thread = threading.Thread(target=run_stages, args=(source(), [slow], 2))
+        thread.start()
+        # Give the source time to run ahead as far as it can
+        threading.Event().wait(0.3)
+        # One item in the stage, two in the queue, one blocked on put
+        assert len(produced) <= 4
+        release.set()
+        thread.join(timeout=5)
+        assert len(produced) == 50
+
+    def test_stage_error_is_raised(self):
+        """Test that an error in any stage stops the pipeline and is re-raised."""
+        def fail(item):
+            if item == 3:
+                raise ValueError("bad chunk")
+            return item
+
+        with pytest.raises(ValueError, match="bad chunk"):
+            run_stages(range(100), [fail, lambda x: x], queue_depth=1)
+
+
+class TestRunPipeline:
+    """Test cases for run_pipeline function."""
+
+    @pytest.fixture
+    def temp_dir(self):
+        """Create temporary directory for test files."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def dataset(self):
+        """Dataset with emojis, duplicates across chunks and numeric outliers."""
+        rows = []
+        for i in range(40):
+            rows.append({
+                'id': i % 35,
+                'full_text': f"Post {i % 35} 😀 @user{i % 7} !!",
+                'user_id': 100 + (i % 35),
+                'retweet_count': 1000 if i == 5 else (i % 35) % 10,
+            })
+        return pd.DataFrame(rows)
+
+    def _chunks(self, df, size):
+        for start in range(0, len(df), size):
+            yield df.iloc[start:start + size].reset_index(drop=True)
+
+    def test_matches_sequential_steps(self, temp_dir, dataset):
+        """Test that the chunked pipeline produces the same files as the one-shot steps."""
+        sequential_dir = os.path.join(temp_dir, 'sequential')
+        pipeline_dir = os.path.join(temp_dir, 'pipeline')
+
+        with patch('src.services.cleaning.STORAGE_CLEANED', sequential_dir):
+            expected = cleaning('file1', dataset.copy(), Mock())
+        expected, _ = fake_calling_llm('file1', expected.reset_index(drop=True), {}, Mock())
+
+        with patch('src.tasks.pipeline.STORAGE_CLEANED', os.path.join(pipeline_dir, 'cleaned')), \
+             patch('src.tasks.pipeline.STORAGE_ANALYSED', os.path.join(pipeline_dir, 'analysed')), \
+             patch('src.tasks.pipeline.calling_llm', side_effect=fake_calling_llm):
+            analysed_path = run_pipeline('file1', self._chunks(dataset, 12), {}, Mock(), queue_depth=1)
+
+        result = pd.read_csv(analysed_path)
+        assert len(result) == len(expected)
+        pd.testing.assert_frame_equal(result, pd.read_csv(io.StringIO(expected.to_csv(index=False))))
+
+        cleaned = pd.read_csv(os.path.join(pipeline_dir, 'cleaned', 'file1.csv'))
+        pd.testing.assert_frame_equal(cleaned, pd.read_csv(os.path.join(sequential_dir, 'file1.csv')))
+
+        # Spilled chunks and partial files are removed
+        assert os.listdir(os.path.join(pipeline_dir, 'cleaned')) == ['file1.csv']
+        assert os.listdir(os.path.join(pipeline_dir, 'analysed')) == ['file1.csv']
+
+    def test_events_and_progress_cover_whole_dataset(self, temp_dir, dataset):
+        """Test that LLM events are emitted once and progress spans all chunks."""
+        emitter = Mock()
+        statuses = []
+        with patch('src.tasks.pipeline.STORAGE_CLEANED', os.path.join(temp_dir, 'cleaned')), \
+             patch('src.tasks.pipeline.STORAGE_ANALYSED', os.path.join(temp_dir, 'analysed')), \
+             patch('src.tasks.pipeline.calling_llm', side_effect=fake_calling_llm):
+            run_pipeline('file1', self._chunks(dataset, 10), {}, emitter,
+                         update_status=statuses.append, queue_depth=1, outlier_sample_rows=10)
+
+        events = [call[0][1] for call in emitter.call_args_list]
+        assert events.count(TASK_STATUS_SENDING_TO_LLM) == 1
+        assert events.count(TASK_STATUS_SENDING_TO_LLM_DONE) == 1
+        assert events[-1] == TASK_STATUS_DONE
+        assert statuses[-1] == TASK_STATUS_DONE
+
+        cleaning_done = next(call[0][2] for call in emitter.call_args_list
+                             if call[0][1] == TASK_STATUS_PROCESS_CLEANING_DONE)
+        progress = [call[0][2] for call in emitter.call_args_list
+                    if call[0][1] == TASK_STATUS_SENDING_TO_LLM_PROGRESS]
+        assert len(progress) == 4
+        assert [p['batch'] for p in progress] == [1, 2, 3, 4]
+        assert all(p['total_rows'] <= cleaning_done['final_rows'] for p in progress)
+        assert progress[-1]['total_rows'] == cleaning_done['final_rows']
+        assert progress[-1]['rows_processed'] == cleaning_done['final_rows']
+        assert progress[-1]['progress_percentage'] == 100
+
+        done = next(call[0][2] for call in emitter.call_args_list
+                    if call[0][1] == TASK_STATUS_SENDING_TO_LLM_DONE)
+        assert done['total_rows'] == cleaning_done['final_rows']
+        assert done['total_batches'] == 4
+
+    def test_llm_overlaps_reading_and_cleaning(self, temp_dir, dataset):
+        """Test that the LLM starts on the first chunks before the dataset has been read."""
+        produced = []
+        chunks_read_at_llm = []
+
+        def source():
+            for chunk in self._chunks(dataset, 5):
+                produced.append(len(chunk))
+                yield chunk
+
+        def calling_llm_recording(file_id, df, ai_config, event_emitter, **kwargs):
+            chunks_read_at_llm.append(len(produced))
+            return fake_calling_llm(file_id, df, ai_config, event_emitter, **kwargs)
+
+        emitter = Mock()
+        with patch('src.tasks.pipeline.STORAGE_CLEANED', os.path.join(temp_dir, 'cleaned')), \
+             patch('src.tasks.pipeline.STORAGE_ANALYSED', os.path.join(temp_dir, 'analysed')), \
+             patch('src.tasks.pipeline.calling_llm', side_effect=calling_llm_recording):
+            analysed_path = run_pipeline('file1', source(), {}, emitter, queue_depth=1, outlier_sample_rows=5)
+
+        assert chunks_read_at_llm[0] < len(produced) == 8
+        # Duplicates spread over chunks are still dropped once
+        result = pd.read_csv(analysed_path)
+        assert not result.duplicated(subset=['id', 'full_text', 'user_id', 'retweet_count']).any()
+        cleaning_done = next(call[0][2] for call in emitter.call_args_list
+                             if call[0][1] == TASK_STATUS_PROCESS_CLEANING_DONE)
+        assert cleaning_done['duplicates_removed'] == 5
+        assert len(result) == cleaning_done['final_rows']
+
+    def test_shared_state_handled_once(self, temp_dir, dataset):
+        """Test that the vocabulary is derived and the cascade and aliases saved once per dataset."""
+        calls = []
+
+        def calling_llm_recording(file_id, df, ai_config, event_emitter, **kwargs):
+            calls.append(kwargs)
+            return fake_calling_llm(file_id, df, ai_config, event_emitter, **kwargs)
+
+        cascade = Mock()
+        with patch('src.tasks.pipeline.STORAGE_CLEANED', os.path.join(temp_dir, 'cleaned')), \
+             patch('src.tasks.pipeline.STORAGE_ANALYSED', os.path.join(temp_dir, 'analysed')), \
+             patch('src.tasks.pipeline.calling_llm', side_effect=calling_llm_recording), \
+             patch('src.tasks.pipeline.derive_dataset_topic_vocabulary',
+                   return_value=['other', 'network']) as mock_derive, \
+             patch('src.tasks.pipeline.save_shared_llm_state') as mock_save:
+            run_pipeline('file1', self._chunks(dataset, 5), {}, Mock(), cascade=cascade,
+                         queue_depth=1, outlier_sample_rows=15)
+
+        assert len(calls) > 1
+        # Derived from the rows of the outlier sample, released as the first chunk
+        mock_derive.assert_called_once()
+        assert len(mock_derive.call_args[0][0]) >= 14
+        assert all(call['topic_vocabulary'] == ['other', 'network'] for call in calls)
+        assert all(call['save_state'] is False for call in calls)
+        mock_save.assert_called_once_with(cascade)
+
+    def test_failure_keeps_previous_output(self, temp_dir, dataset):
+        """Test that a failing LLM stage leaves no partial analysed file behind."""
+        analysed_dir = os.path.join(temp_dir, 'analysed')
+        os.makedirs(analysed_dir)
+        previous = os.path.join(analysed_dir, 'file1.csv')
+        with open(previous, 'w') as f:
+            f.write('previous\n')
+
+        with patch('src.tasks.pipeline.STORAGE_CLEANED', os.path.join(temp_dir, 'cleaned')), \
+             patch('src.tasks.pipeline.STORAGE_ANALYSED', analysed_dir), \
+             patch('src.tasks.pipeline.calling_llm', side_effect=ValueError("No AI model available")):
+            with pytest.raises(ValueError):
+                run_pipeline('file1', self._chunks(dataset, 10), {}, Mock(), queue_depth=1)
+
+        assert os.listdir(analysed_dir) == ['file1.csv']
+        with open(previous) as f:
+            assert f.read() == 'previous\n'
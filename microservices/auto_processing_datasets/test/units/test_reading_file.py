@@ -9,9 +9,10 @@ from unittest.mock import Mock, patch
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
 
-from src.services.reading_file import reading_file
+from src.services.reading_file import reading_file, collect_dataset
 from src.configs.constants import (
     TASK_STATUS_READING_DATASET,
+    TASK_STATUS_READING_DATASET_PROGRESS,
     TASK_STATUS_READING_DATASET_DONE,
 )
 
@@ -102,3 +103,88 @@ class TestReadingFile:
         file_id, _ = reading_file(file_path, mock_event_emitter)
         assert file_id == 'file_abc'
 
+
+
+class TestReadingFileStreaming:
+    """Test cases for chunked streaming in reading_file."""
+    
+    @pytest.fixture
+    def temp_dir(self):
+        """Create temporary directory for test files."""
+        temp_dir = tempfile.mkdtemp()
+        yield temp_dir
+        shutil.rmtree(temp_dir)
+    
+    @pytest.fixture
+    def large_csv_file(self, temp_dir):
+        """Create a CSV file with enough rows to span several chunks."""
+        file_path = os.path.join(temp_dir, 'large_file_456.csv')
+        df = pd.DataFrame({
+            'id': range(25),
+            'full_text': [f'Text {i}' for i in range(25)],
+        })
+        df.to_csv(file_path, index=False)
+        return file_path
+    
+    def _events(self, emitter, event):
+        return [call[0] for call in emitter.call_args_list if call[0][1] == event]
+    
+    def test_stream_yields_bounded_chunks(self, large_csv_file):
+        """Test that streaming returns an iterator of bounded DataFrame chunks."""
+        emitter = Mock()
+        file_id, chunks = reading_file(large_csv_file, emitter, stream=True, chunk_rows=10)
+        
+        assert file_id == 'large_file_456'
+        assert not isinstance(chunks, pd.DataFrame)
+        sizes = [len(chunk) for chunk in chunks]
+        assert sizes == [10, 10, 5]
+    
+    def test_stream_emits_byte_progress_and_done(self, large_csv_file):
+        """Test that progress events report bytes and done is emitted after the last chunk."""
+        emitter = Mock()
+        _, chunks = reading_file(large_csv_file, emitter, stream=True, chunk_rows=10)
+        
+        # Nothing is read until the iterator is consumed
+        assert not self._events(emitter, TASK_STATUS_READING_DATASET_PROGRESS)
+        assert not self._events(emitter, TASK_STATUS_READING_DATASET_DONE)
+        
+        list(chunks)
+        progress = [args[2] for args in self._events(emitter, TASK_STATUS_READING_DATASET_PROGRESS)]
+        assert [p['chunk'] for p in progress] == [1, 2, 3]
+        assert progress[-1]['rows_read'] == 25
+        assert progress[-1]['bytes_read'] == progress[-1]['total_bytes'] == os.path.getsize(large_csv_file)
+        assert progress[-1]['progress_percentage'] == 100.0
+        
+        done = self._events(emitter, TASK_STATUS_READING_DATASET_DONE)
+        assert len(done) == 1
+        assert done[0][2]['rows'] == 25
+        assert done[0][2]['columns'] == 2
+    
+    def test_chunk_rows_derived_from_bytes(self, large_csv_file):
+        """Test that chunk size can be given in bytes."""
+        emitter = Mock()
+        _, chunks = reading_file(large_csv_file, emitter, stream=True, chunk_bytes=50)
+        sizes = [len(chunk) for chunk in chunks]
+        assert len(sizes) > 1
+        assert sum(sizes) == 25
+    
+    def test_stream_selected_by_file_size(self, large_csv_file):
+        """Test that large files are streamed and small files read in one shot."""
+        emitter = Mock()
+        with patch('src.services.reading_file.READING_STREAM_MIN_BYTES', 1):
+            _, data = reading_file(large_csv_file, emitter, chunk_rows=10)
+        assert not isinstance(data, pd.DataFrame)
+        
+        with patch('src.services.reading_file.READING_STREAM_MIN_BYTES', 10 ** 12):
+            _, data = reading_file(large_csv_file, emitter)
+        assert isinstance(data, pd.DataFrame)
+    
+    def test_collect_dataset(self, large_csv_file):
+        """Test that collect_dataset concatenates chunks into one DataFrame."""
+        emitter = Mock()
+        _, chunks = reading_file(large_csv_file, emitter, stream=True, chunk_rows=10)
+        df = collect_dataset(chunks)
+        assert list(df['id']) == list(range(25))
+        
+        same = pd.DataFrame({'a': [1]})
+        assert collect_dataset(same) is same
@@ -0,0 +1,51 @@
+"""Unit tests for the LLM request hedger."""
+import os
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.lib.llm import RequestHedger
+
+
+class TestRequestHedger:
+    """Test cases for RequestHedger."""
+
+    def test_no_hedging_before_min_samples(self):
+        """Test that the delay is unknown until enough answers were seen."""
+        hedger = RequestHedger(percentile=95, min_samples=3)
+        hedger.record(1.0)
+        hedger.record(2.0)
+        assert hedger.delay() is None
+        hedger.record(3.0)
+        assert hedger.delay() == 3.0
+
+    def test_delay_is_latency_percentile(self):
+        """Test that the delay is the configured percentile of recent latencies."""
+        hedger = RequestHedger(percentile=90, min_samples=1, window=100)
+        for latency in range(1, 101):
+            hedger.record(float(latency))
+        assert hedger.delay() == 90.0
+
+        # Only the window of recent latencies counts
+        for _ in range(100):
+            hedger.record(5.0)
+        assert hedger.delay() == 5.0
+
+    def test_hedges_capped_by_fraction(self):
+        """Test that hedges stay within max_fraction of the answered requests."""
+        hedger = RequestHedger(max_fraction=0.1)
+        assert not hedger.acquire()
+        for _ in range(20):
+            hedger.record(1.0)
+        assert hedger.acquire()
+        assert hedger.acquire()
+        assert not hedger.acquire()
+        assert hedger.hedges == 2
+
+    def test_submit_and_close(self):
+        """Test that requests run on the hedging pool until it is closed."""
+        hedger = RequestHedger()
+        assert hedger.submit(lambda x: x * 2, 21).result(timeout=5) == 42
+        hedger.close()
+        assert hedger.submit(lambda: 'again').result(timeout=5) == 'again'
+        hedger.close()
@@ -0,0 +1,147 @@
+"""Unit tests for the LLM retry policy."""
+import random
+import os
+from email.utils import formatdate
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.lib.llm import RetryPolicy
+from src.services.calling_llm import _call_llm_api
+
+
+def http_error(status, headers=None):
+    """Build the error raised by raise_for_status for a status code."""
+    response = Mock(status_code=status, headers=headers or {}, text='')
+    response.json.side_effect = ValueError('no json')
+    return requests.exceptions.HTTPError(f"{status} error", response=response)
+
+
+class TestRetryPolicy:
+    """Test cases for RetryPolicy."""
+
+    @pytest.mark.parametrize('error, kind', [
+        (http_error(429), RetryPolicy.RATE_LIMIT),
+        (http_error(503), RetryPolicy.SERVER),
+        (http_error(408), RetryPolicy.TIMEOUT),
+        (http_error(400), RetryPolicy.CLIENT),
+        (requests.exceptions.ReadTimeout('slow'), RetryPolicy.TIMEOUT),
+        (requests.exceptions.ConnectTimeout('slow'), RetryPolicy.TIMEOUT),
+        (requests.exceptions.ConnectionError('refused'), RetryPolicy.CONNECTION),
+        (ValueError('bad json'), RetryPolicy.PARSE),
+        (RuntimeError('?'), RetryPolicy.UNKNOWN),
+    ])
+    def test_classify(self, error, kind):
+        """Test that errors are classified by kind."""
+        assert RetryPolicy.classify(error) == kind
+
+    def test_retry_after_seconds_and_date(self):
+        """Test that Retry-After is read as seconds or as an HTTP date."""
+        assert RetryPolicy.retry_after(http_error(429, {'Retry-After': '7'})) == 7.0
+        waited = RetryPolicy.retry_after(http_error(503, {'Retry-After': formatdate(usegmt=True)}))
+        assert 0.0 <= waited < 2.0
+        assert RetryPolicy.retry_after(http_error(500, {'Retry-After': '7'})) is None
+        assert RetryPolicy.retry_after(http_error(429)) is None
+
+    def test_retry_after_is_honoured(self):
+        """Test that the server wait replaces the jitter delay, unless too long."""
+        policy = RetryPolicy(base_delay=1, max_delay=30)
+        assert policy.next_delay(http_error(429, {'Retry-After': '12'}), 0, 3) == 12.0
+        assert policy.next_delay(http_error(429, {'Retry-After': '120'}), 0, 3) is None
+
+    def test_decorrelated_jitter_bounds(self):
+        """Test that delays stay between the base and three times the last delay, capped."""
+        policy = RetryPolicy(base_delay=1, max_delay=20, budget_retries=1000,
+                             budget_seconds=1e6, rng=random.Random(3))
+        delay = 0.0
+        delays = []
+        for _ in range(50):
+            previous = delay
+            delay = policy.next_delay(http_error(500), 0, 3, previous)
+            assert 1.0 <= delay <= min(20.0, max(1.0, previous * 3))
+            delays.append(delay)
+        assert len(set(delays)) > 1
+        assert max(delays) <= 20.0
+
+    def test_non_transient_errors_not_retried(self):
+        """Test that client errors are never retried and parse errors only parse_retries times."""
+        policy = RetryPolicy(parse_retries=1)
+        assert policy.next_delay(http_error(422), 0, 5) is None
+        assert policy.next_delay(ValueError('bad json'), 0, 5) is not None
+        assert policy.next_delay(ValueError('bad json'), 1, 5) is None
+        assert policy.next_delay(http_error(500), 5, 5) is None
+
+    def test_budget_shared_across_requests(self):
+        """Test that retries stop once the task budget is spent."""
+        policy = RetryPolicy(base_delay=1, max_delay=1, budget_retries=3, budget_seconds=100)
+        assert [policy.next_delay(http_error(500), 0, 5) for _ in range(4)] == [1.0, 1.0, 1.0, None]
+        assert policy.exhausted
+
+        policy = RetryPolicy(base_delay=1, max_delay=60, budget_seconds=10)
+        assert policy.next_delay(http_error(429, {'Retry-After': '8'}), 0, 5) == 8.0
+        assert policy.next_delay(http_error(429, {'Retry-After': '8'}), 0, 5) is None
+
+
+class TestCallLlmApiRetries:
+    """Test cases for the retry loop of _call_llm_api."""
+
+    @pytest.fixture
+    def model(self):
+        """Model allowing three retries."""
+        return {'uid': 'm1', 'data': {'baseUrl': 'http://llm-retry:8000/v1', 'model': 'm', 'retryRequests': 3}}
+
+    @staticmethod
+    def ok_response():
+        """Build a successful chat completions response."""
+        response = Mock(status_code=200)
+        response.json.return_value = {'choices': [{'message': {
+            'content': '{"analysis": ["positive"], "priority": [1], "topics": ["a"]}'
+        }}]}
+        return response
+
+    @patch('src.services.calling_llm.time.sleep')
+    @patch('requests.Session.post')
+    def test_rate_limit_waits_retry_after(self, mock_post, mock_sleep, model):
+        """Test that a 429 is retried after the requested wait."""
+        limited = Mock(status_code=429)
+        limited.raise_for_status.side_effect = http_error(429, {'Retry-After': '5'})
+        mock_post.side_effect = [limited, self.ok_response()]
+
+        result = _call_llm_api(model, ['a'], {}, retry_policy=RetryPolicy())
+
+        assert result['analysis'] == ['positive']
+        mock_sleep.assert_called_once_with(5.0)
+
+    @patch('src.services.calling_llm.time.sleep')
+    @patch('requests.Session.post')
+    def test_client_error_raised_without_retry(self, mock_post, mock_sleep, model):
+        """Test that a rejected request fails at once, keeping the cause."""
+        rejected = Mock(status_code=413)
+        rejected.raise_for_status.side_effect = http_error(413)
+        mock_post.return_value = rejected
+
+        with pytest.raises(Exception) as info:
+            _call_llm_api(model, ['a'], {}, retry_policy=RetryPolicy())
+
+        assert mock_post.call_count == 1
+        assert info.value.__cause__.response.status_code == 413
+        mock_sleep.assert_not_called()
+
+    @patch('src.services.calling_llm.time.sleep')
+    @patch('requests.Session.post')
+    def test_spent_budget_stops_retries(self, mock_post, mock_sleep, model):
+        """Test that requests of a task stop retrying once its budget is spent."""
+        mock_post.side_effect = requests.exceptions.ConnectionError('refused')
+        policy = RetryPolicy(base_delay=1, max_delay=1, budget_retries=4)
+
+        for _ in range(2):
+            with pytest.raises(Exception):
+                _call_llm_api(model, ['a'], {}, retry_policy=policy)
+
+        # 4 attempts for the first request, 2 for the second (one retry left)
+        assert mock_post.call_count == 6
+        assert mock_sleep.call_count == 4
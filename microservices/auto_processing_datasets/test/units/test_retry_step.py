@@ -14,6 +14,7 @@ from src.configs.constants import (
     TASK_STATUS_IN_QUEUE,
     TASK_STATUS_READING_DATASET,
     TASK_STATUS_PROCESS_CLEANING,
+    TASK_STATUS_PROCESS_CLEANING_DONE,
     TASK_STATUS_SENDING_TO_LLM,
     TASK_STATUS_APPENDING_COLUMNS,
     TASK_STATUS_SAVING_FILE,
@@ -61,12 +62,30 @@ class TestRetryStep:
             'local': [{'uid': 'local1', 'data': {'model': 'llama3', 'baseUrl': 'http://localhost:11434'}}]
         }
     
-    @patch('src.services.retry_step.calling_llm')
-    @patch('src.services.retry_step.cleaning')
-    @patch('src.services.retry_step.reading_file')
+    @pytest.fixture
+    def storage(self, temp_dir):
+        """Point stage artifacts to the temporary directory."""
+        cleaned_dir = os.path.join(temp_dir, 'cleaned')
+        os.makedirs(cleaned_dir)
+        with patch('src.tasks.stages.STORAGE_CLEANED', cleaned_dir), \
+             patch('src.tasks.stages.STORAGE_STAGES', os.path.join(temp_dir, 'stages')), \
+             patch('src.tasks.stages.appending_columns'), \
+             patch('src.tasks.stages.saving'):
+            yield cleaned_dir
+
+    def _writing_cleaning(self, cleaned_dir):
+        """Cleaning stand-in that writes the cleaned file like the real one."""
+        def clean(file_id, df, event_emitter, db_adapter=None):
+            df.to_csv(os.path.join(cleaned_dir, f"{file_id}.csv"), index=False)
+            return df
+        return clean
+
+    @patch('src.tasks.stages.calling_llm')
+    @patch('src.tasks.stages.cleaning')
+    @patch('src.tasks.stages.reading_file')
     def test_retry_step_from_in_queue(self, mock_read, mock_clean, mock_llm,
                                       sample_csv_file, sample_ai_config, 
-                                      mock_event_emitter, mock_db_adapter):
+                                      mock_event_emitter, mock_db_adapter, storage):
         """Test retry_step starting from in_queue."""
         mock_read.return_value = ('test_file_123', pd.DataFrame({'id': [1], 'full_text': ['Text']}))
         mock_clean.return_value = pd.DataFrame({'id': [1], 'full_text': ['Text']})
@@ -86,13 +105,14 @@ class TestRetryStep:
         assert mock_clean.called
         assert mock_llm.called
     
-    @patch('src.services.retry_step.calling_llm')
-    @patch('src.services.retry_step.cleaning')
-    @patch('src.services.retry_step.reading_file')
+    @patch('src.tasks.stages.calling_llm')
+    @patch('src.tasks.stages.cleaning')
+    @patch('src.tasks.stages.reading_file')
     def test_retry_step_from_reading_done(self, mock_read, mock_clean, mock_llm,
                                           sample_csv_file, sample_ai_config,
-                                          mock_event_emitter, mock_db_adapter):
-        """Test retry_step starting from reading_dataset done."""
+                                          mock_event_emitter, mock_db_adapter, storage):
+        """Test retry_step starting from reading_dataset done without artifacts."""
+        mock_read.return_value = ('test_file_123', pd.DataFrame({'id': [1], 'full_text': ['Text']}))
         mock_clean.return_value = pd.DataFrame({'id': [1], 'full_text': ['Text']})
         mock_llm.return_value = (pd.DataFrame({'id': [1], 'full_text': ['Text']}), 'local1')
         
@@ -105,23 +125,33 @@ class TestRetryStep:
             mock_event_emitter
         )
         
-        # Should skip reading, start from cleaning
-        assert not mock_read.called
+        # No cleaned artifact, reading is needed to clean again
+        assert mock_read.called
         assert mock_clean.called
         assert mock_llm.called
     
-    @patch('src.services.retry_step.calling_llm')
-    @patch('src.services.retry_step.cleaning')
-    @patch('src.services.retry_step.reading_file')
+    @patch('src.tasks.stages.calling_llm')
+    @patch('src.tasks.stages.cleaning')
+    @patch('src.tasks.stages.reading_file')
     def test_retry_step_from_cleaning_done(self, mock_read, mock_clean, mock_llm,
                                            sample_csv_file, sample_ai_config,
-                                           mock_event_emitter, mock_db_adapter):
+                                           mock_event_emitter, mock_db_adapter, storage):
         """Test retry_step starting from cleaning done."""
+        mock_read.return_value = ('test_file_123', pd.DataFrame({'id': [1], 'full_text': ['Text']}))
+        mock_clean.side_effect = self._writing_cleaning(storage)
+        # First attempt fails at the LLM step, after cleaning was recorded
+        mock_llm.side_effect = ValueError("No AI model available")
+        with pytest.raises(ValueError):
+            retry_step('test_file_123', TASK_STATUS_IN_QUEUE, sample_csv_file,
+                       sample_ai_config, mock_db_adapter, mock_event_emitter)
+        mock_read.reset_mock()
+        mock_clean.reset_mock()
+        mock_llm.side_effect = None
         mock_llm.return_value = (pd.DataFrame({'id': [1], 'full_text': ['Text']}), 'local1')
         
         retry_step(
             'test_file_123',
-            TASK_STATUS_PROCESS_CLEANING,
+            TASK_STATUS_PROCESS_CLEANING_DONE,
             sample_csv_file,
             sample_ai_config,
             mock_db_adapter,
@@ -133,3 +163,25 @@ class TestRetryStep:
         assert not mock_clean.called
         assert mock_llm.called
 
+    @patch('src.tasks.stages.calling_llm')
+    @patch('src.tasks.stages.cleaning')
+    @patch('src.tasks.stages.reading_file')
+    def test_retry_step_reruns_step_despite_artifacts(self, mock_read, mock_clean, mock_llm,
+                                                      sample_csv_file, sample_ai_config,
+                                                      mock_event_emitter, mock_db_adapter, storage):
+        """Test that the retried step runs again even though its artifact is valid."""
+        mock_read.return_value = ('test_file_123', pd.DataFrame({'id': [1], 'full_text': ['Text']}))
+        mock_clean.side_effect = self._writing_cleaning(storage)
+        mock_llm.return_value = (pd.DataFrame({'id': [1], 'full_text': ['Text']}), 'local1')
+        retry_step('test_file_123', TASK_STATUS_IN_QUEUE, sample_csv_file,
+                   sample_ai_config, mock_db_adapter, mock_event_emitter)
+        mock_read.reset_mock()
+        mock_clean.reset_mock()
+        mock_llm.reset_mock()
+
+        retry_step('test_file_123', TASK_STATUS_PROCESS_CLEANING, sample_csv_file,
+                   sample_ai_config, mock_db_adapter, mock_event_emitter)
+
+        assert mock_read.called
+        assert mock_clean.called
+        assert mock_llm.called
@@ -0,0 +1,202 @@
+"""Unit tests for the stage graph runner."""
+import pytest
+import pandas as pd
+import os
+import tempfile
+import shutil
+from unittest.mock import Mock, patch
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.tasks.stages import (
+    Stage,
+    StageContext,
+    run_stage_graph,
+    pending_stages,
+    record_stage,
+    load_manifest,
+    remove_stage_artifacts,
+    rerun_from_status,
+)
+from src.configs.constants import (
+    TASK_STATUS_IN_QUEUE,
+    TASK_STATUS_PROCESS_CLEANING,
+    TASK_STATUS_PROCESS_CLEANING_DONE,
+)
+
+
+class TestRunStageGraph:
+    """Test cases for run_stage_graph function."""
+
+    @pytest.fixture
+    def temp_dir(self):
+        """Create temporary directory for test files."""
+        temp_dir = tempfile.mkdtemp()
+        with patch('src.tasks.stages.STORAGE_STAGES', os.path.join(temp_dir, 'stages')):
+            yield temp_dir
+        shutil.rmtree(temp_dir)
+
+    @pytest.fixture
+    def source(self, temp_dir):
+        """Create the source dataset."""
+        path = os.path.join(temp_dir, 'file1.csv')
+        pd.DataFrame({'value': [1, 2, 3]}).to_csv(path, index=False)
+        return path
+
+    @pytest.fixture
+    def calls(self):
+        """Record of the stages that ran."""
+        return []
+
+    def _stages(self, temp_dir, calls, double_version='1', factor_setting=False):
+        """Build read -> double -> notify -> total, where double keeps an artifact."""
+        def read(ctx):
+            calls.append('read')
+            return pd.read_csv(ctx.file_path)
+
+        def double(ctx, raw):
+            calls.append('double')
+            return raw * 2
+
+        def notify(ctx):
+            calls.append('notify')
+
+        def total(ctx, doubled):
+            calls.append('total')
+            return int(doubled['value'].sum())
+
+        return [
+            Stage('read', 'read_done', '1', read, output='raw'),
+            Stage(
+                'double', 'double_done', double_version, double,
+                inputs=('raw',), output='doubled',
+                artifact=lambda file_id: os.path.join(temp_dir, f"{file_id}.doubled.pkl"),
+                dump=lambda df, path: df.to_pickle(path), load=pd.read_pickle,
+                settings=(lambda ctx: ctx.ai_config.get('factor')) if factor_setting else None,
+                transient=True,
+            ),
+            Stage('notify', 'notify_done', '1', notify),
+            Stage('total', 'total_done', '1', total, inputs=('doubled',), output='total'),
+        ]
+
+    def test_runs_every_stage_first_time(self, temp_dir, source, calls):
+        """Test that all stages run and the artifact is recorded."""
+        statuses = []
+        ctx = StageContext('file1', source, {}, Mock(), update_status=statuses.append)
+        values = run_stage_graph(ctx, self._stages(temp_dir, calls))
+
+        assert calls == ['read', 'double', 'notify', 'total']
+        assert values['total'] == 12
+        assert statuses == ['read_done', 'double_done', 'notify_done', 'total_done']
+        manifest = load_manifest('file1')
+        assert list(manifest) == ['read', 'double', 'notify', 'total']
+        assert manifest['double']['version'] == '1'
+        assert 'checksum' in manifest['double'] and 'checksum' not in manifest['read']
+
+    def test_resume_loads_valid_artifact(self, temp_dir, source, calls):
+        """Test that a valid artifact is loaded and upstream stages are skipped."""
+        run_stage_graph(StageContext('file1', source, {}, Mock()), self._stages(temp_dir, calls))
+        calls.clear()
+
+        emitter = Mock()
+        statuses = []
+        ctx = StageContext('file1', source, {}, emitter, update_status=statuses.append)
+        values = run_stage_graph(ctx, self._stages(temp_dir, calls))
+
+        assert calls == ['total']
+        assert values['total'] == 12
+        assert 'raw' not in values
+        skipped = [call[0][1] for call in emitter.call_args_list if call[0][2] == {'skipped': True}]
+        assert skipped == ['read_done', 'double_done', 'notify_done']
+        assert statuses == ['read_done', 'double_done', 'notify_done', 'total_done']
+
+    def test_version_bump_invalidates_artifact(self, temp_dir, source, calls):
+        """Test that changing a stage version re-runs it."""
+        run_stage_graph(StageContext('file1', source, {}, Mock()), self._stages(temp_dir, calls))
+        calls.clear()
+
+        stages = self._stages(temp_dir, calls, double_version='2')
+        assert pending_stages(StageContext('file1', source, {}, Mock()), stages) == \
+            ['read', 'double', 'notify', 'total']
+        run_stage_graph(StageContext('file1', source, {}, Mock()), stages)
+        assert calls == ['read', 'double', 'notify', 'total']
+
+    def test_source_change_invalidates_artifact(self, temp_dir, source, calls):
+        """Test that a modified source dataset re-runs every stage."""
+        run_stage_graph(StageContext('file1', source, {}, Mock()), self._stages(temp_dir, calls))
+        calls.clear()
+        pd.DataFrame({'value': [5]}).to_csv(source, index=False)
+
+        values = run_stage_graph(StageContext('file1', source, {}, Mock()), self._stages(temp_dir, calls))
+        assert calls == ['read', 'double', 'notify', 'total']
+        assert values['total'] == 10
+
+    def test_corrupted_artifact_is_rebuilt(self, temp_dir, source, calls):
+        """Test that an artifact not matching its checksum is rebuilt."""
+        run_stage_graph(StageContext('file1', source, {}, Mock()), self._stages(temp_dir, calls))
+        calls.clear()
+        pd.DataFrame({'value': [0]}).to_pickle(os.path.join(temp_dir, 'file1.doubled.pkl'))
+
+        values = run_stage_graph(StageContext('file1', source, {}, Mock()), self._stages(temp_dir, calls))
+        assert calls == ['read', 'double', 'notify', 'total']
+        assert values['total'] == 12
+
+    def test_record_stage_for_external_artifact(self, temp_dir, source, calls):
+        """Test that an artifact written outside the graph can be recorded and reused."""
+        stages = self._stages(temp_dir, calls)
+        pd.DataFrame({'value': [2, 4, 6]}).to_pickle(os.path.join(temp_dir, 'file1.doubled.pkl'))
+        ctx = StageContext('file1', source, {}, Mock())
+        assert 'double' in pending_stages(ctx, stages)
+
+        record_stage(ctx, 'double', stages)
+        assert pending_stages(ctx, stages) == ['total']
+
+    def test_settings_change_invalidates_artifact(self, temp_dir, source, calls):
+        """Test that changing the settings a stage depends on re-runs it."""
+        stages = self._stages(temp_dir, calls, factor_setting=True)
+        run_stage_graph(StageContext('file1', source, {'factor': 2}, Mock()), stages)
+        calls.clear()
+
+        assert pending_stages(StageContext('file1', source, {'factor': 2}, Mock()), stages) == ['total']
+        run_stage_graph(StageContext('file1', source, {'factor': 3}, Mock()), stages)
+        assert calls == ['read', 'double', 'notify', 'total']
+
+    def test_rerun_from_invalidates_downstream_stages(self, temp_dir, source, calls):
+        """Test that the stage to rerun and those after it run despite valid artifacts."""
+        stages = self._stages(temp_dir, calls)
+        run_stage_graph(StageContext('file1', source, {}, Mock()), stages)
+        calls.clear()
+        ctx = StageContext('file1', source, {}, Mock())
+
+        assert pending_stages(ctx, stages, rerun_from='total') == ['total']
+        assert pending_stages(ctx, stages, rerun_from='double') == ['read', 'double', 'notify', 'total']
+        run_stage_graph(ctx, stages, rerun_from='double')
+        assert calls == ['read', 'double', 'notify', 'total']
+
+    def test_rerun_from_status(self):
+        """Test that a task status maps to the first stage to run again."""
+        assert rerun_from_status(TASK_STATUS_PROCESS_CLEANING) == 'clean'
+        assert rerun_from_status(TASK_STATUS_PROCESS_CLEANING_DONE) == 'llm'
+        assert rerun_from_status(TASK_STATUS_IN_QUEUE) is None
+        assert rerun_from_status(None) is None
+
+    def test_remove_stage_artifacts(self, temp_dir, source, calls):
+        """Test that transient artifacts and the manifest are removed once done."""
+        stages = self._stages(temp_dir, calls)
+        run_stage_graph(StageContext('file1', source, {}, Mock()), stages)
+        artifact = os.path.join(temp_dir, 'file1.doubled.pkl')
+        assert os.path.exists(artifact)
+
+        remove_stage_artifacts('file1', stages)
+        assert not os.path.exists(artifact)
+        assert load_manifest('file1') == {}
+        remove_stage_artifacts('file1', stages)
+
+    def test_fresh_run_does_not_checksum_source_to_plan(self, temp_dir, source, calls):
+        """Test that planning without a manifest does not read the source dataset."""
+        stages = self._stages(temp_dir, calls)
+        ctx = StageContext('file1', source, {}, Mock())
+        with patch('src.tasks.stages.file_checksum') as checksum:
+            assert pending_stages(ctx, stages) == ['read', 'double', 'notify', 'total']
+        checksum.assert_not_called()
@@ -0,0 +1,42 @@
+"""Unit tests for the local token estimators."""
+import os
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.lib.llm import TokenEstimator, CharTokenEstimator, get_token_estimator
+
+
+class TestTokenEstimator:
+    """Test cases for TokenEstimator."""
+    
+    def test_counts_words_and_symbols(self):
+        """Test that short words cost one token and symbols one each."""
+        estimator = TokenEstimator()
+        assert estimator.count('') == 0
+        assert estimator.count('free call') == 2
+        assert estimator.count('@free !!') == 4
+    
+    def test_long_words_are_split(self):
+        """Test that long words cost one token per chars_per_token characters."""
+        assert TokenEstimator(4).count('telecommunications') == 5
+        assert TokenEstimator(6).count('telecommunications') == 3
+    
+    def test_char_estimator(self):
+        """Test that the char estimator only depends on the length."""
+        assert CharTokenEstimator(4).count('abc def!') == 2
+
+
+class TestGetTokenEstimator:
+    """Test cases for get_token_estimator."""
+    
+    def test_selected_from_model_data(self):
+        """Test that data.tokenizer and data.charsPerToken configure the estimator."""
+        estimator = get_token_estimator({'data': {'tokenizer': 'chars', 'charsPerToken': 2}})
+        assert isinstance(estimator, CharTokenEstimator)
+        assert estimator.chars_per_token == 2.0
+    
+    def test_defaults_to_word_estimator(self):
+        """Test that missing or unknown tokenizers use the word estimator."""
+        assert type(get_token_estimator({'data': {}})) is TokenEstimator
+        assert type(get_token_estimator({'data': {'tokenizer': 'unknown'}})) is TokenEstimator
@@ -0,0 +1,61 @@
+"""Unit tests for the topic canonicalizer."""
+import json
+import os
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+
+from src.lib.llm import TopicCanonicalizer
+
+
+class TestTopicCanonicalizer:
+    """Test cases for TopicCanonicalizer."""
+
+    def test_key_folds_variants(self):
+        """Test that case, accents, stop words, plurals and word order share a key."""
+        key = TopicCanonicalizer.key('Problèmes de Réseaux')
+        assert key == 'probleme reseau'
+        assert TopicCanonicalizer.key('réseau  PROBLÈME!') == key
+        assert TopicCanonicalizer.key('Bureaux') == 'bureau'
+        assert TopicCanonicalizer.key('...') == ''
+
+    def test_most_frequent_variant_is_canonical(self, tmp_path):
+        """Test that variants map to the most frequent one and typos join it."""
+        canonicalizer = TopicCanonicalizer(str(tmp_path / 'aliases.json'))
+        mapping = canonicalizer.canonicalize(
+            ['network issue', 'Network Issues', 'Facturation', 'facturations', 'nettwork issue', 'Service client'],
+            [1, 5, 2, 1, 1, 3],
+        )
+        assert mapping['network issue'] == 'Network Issues'
+        assert mapping['nettwork issue'] == 'Network Issues'
+        assert mapping['facturations'] == 'Facturation'
+        assert mapping['Service client'] == 'Service client'
+        assert set(canonicalizer.canonical_labels) == {'Network Issues', 'Facturation', 'Service client'}
+
+    def test_unrelated_topics_kept_apart(self, tmp_path):
+        """Test that topics sharing a word but not a meaning stay separate."""
+        canonicalizer = TopicCanonicalizer(str(tmp_path / 'aliases.json'))
+        mapping = canonicalizer.canonicalize(['network outage', 'network speed', None, ''])
+        assert mapping == {'network outage': 'network outage', 'network speed': 'network speed'}
+
+    def test_aliases_persist_across_datasets(self, tmp_path):
+        """Test that saved aliases keep their label for later datasets and other workers."""
+        path = str(tmp_path / 'topics' / 'aliases.json')
+        first = TopicCanonicalizer(path)
+        first.canonicalize(['Réseau mobile'])
+        assert first.save() == 1
+        assert first.save() == 0
+
+        other = TopicCanonicalizer(path)
+        other.canonicalize(['Facture'])
+        # A key saved meanwhile by another worker keeps that worker's label
+        first.canonicalize(['Facturé'])
+        assert other.save() == 1
+        assert first.save() == 1
+
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)['aliases']
+        assert saved == {'mobile reseau': 'Réseau mobile', 'facture': 'Facture'}
+        assert TopicCanonicalizer(path).canonicalize(['RESEAU MOBILES', 'facture']) == {
+            'RESEAU MOBILES': 'Réseau mobile', 'facture': 'Facture'
+        }